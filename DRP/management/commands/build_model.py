@@ -49,6 +49,10 @@ class Command(BaseCommand):
                             help='A dictionary of the options to give to the splitter in JSON format')
         parser.add_argument('-vo', '--visitor-options', default=None,
                             help='A dictionary of the options to give to the visitor in JSON format')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Train the stats models of the container in this many worker processes (default 0, train in this process).')
+        parser.add_argument('--retrain', action='store_true',
+                            help='Train every stats model, even those matching a previously trained model in the training cache.')
 
     def handle(self, *args, **kwargs):
         """Handle the call for this command."""
@@ -68,11 +72,12 @@ class Command(BaseCommand):
         prepare_build_display_model(predictor_headers=predictor_headers, response_headers=response_headers,
                                     modelVisitorLibrary=kwargs[
                                         'model_library'], modelVisitorTool=kwargs['model_tool'],
-                                    splitter=kwargs['splitter'], training_set_name=kwargs['training_set_name'], test_set_name=kwargs['test_set_name'], reaction_set_name=kwargs['reaction_set_name'], description=kwargs['description'], verbose=verbose, container_id=kwargs['model_container_id'], splitterOptions=splitterOptions, visitorOptions=visitorOptions)
+                                    splitter=kwargs['splitter'], training_set_name=kwargs['training_set_name'], test_set_name=kwargs['test_set_name'], reaction_set_name=kwargs['reaction_set_name'], description=kwargs['description'], verbose=verbose, container_id=kwargs['model_container_id'], splitterOptions=splitterOptions, visitorOptions=visitorOptions,
+                                    workers=kwargs['workers'], retrain=kwargs['retrain'])
 
 
 def create_build_model(reactions=None, predictors=None, responses=None, modelVisitorLibrary=None, modelVisitorTool=None, splitter=None, trainingSet=None, testSet=None,
-                       description=None, verbose=False, splitterOptions=None, visitorOptions=None):
+                       description=None, verbose=False, splitterOptions=None, visitorOptions=None, workers=0, retrain=False):
     """Build the model and puts it into the DB."""
     if trainingSet is not None:
         container = ModelContainer.create(modelVisitorLibrary, modelVisitorTool, predictors, responses, description=description, reactions=reactions,
@@ -85,14 +90,14 @@ def create_build_model(reactions=None, predictors=None, responses=None, modelVis
 
     container.full_clean()
     container.save()
-    return build_model(container, verbose=verbose)
+    return build_model(container, verbose=verbose, workers=workers, retrain=retrain)
 
 
-def build_model(container, verbose=False):
+def build_model(container, verbose=False, workers=0, retrain=False):
     """An additional function by GMN to build models. I don't really know what it's for- PA."""
     for attempt in range(5):
         try:
-            container.build(verbose=verbose)
+            container.build(verbose=verbose, workers=workers, retrain=retrain)
             break
         except OperationalError as e:
             logger.warning(
@@ -172,7 +177,8 @@ def display_model_results(container, reactions=None, heading=""):
 
 
 def prepare_build_model(predictor_headers=None, response_headers=None, modelVisitorLibrary=None, modelVisitorTool=None, splitter=None, training_set_name=None,
-                        test_set_name=None, reaction_set_name=None, description=None, verbose=False, splitterOptions=None, visitorOptions=None, container_id=None):
+                        test_set_name=None, reaction_set_name=None, description=None, verbose=False, splitterOptions=None, visitorOptions=None, container_id=None,
+                        workers=0, retrain=False):
     """Build a model with the specified tools."""
     if predictor_headers is not None:
         predictors = Descriptor.objects.filter(heading__in=predictor_headers)
@@ -204,7 +210,7 @@ def prepare_build_model(predictor_headers=None, response_headers=None, modelVisi
         new_container = parent_container.create_duplicate(
             modelVisitorTool=modelVisitorTool, modelVisitorOptions=visitorOptions, description=description, predictors=predictors, responses=responses)
         new_container.full_clean()
-        container = build_model(new_container, verbose=verbose)
+        container = build_model(new_container, verbose=verbose, workers=workers, retrain=retrain)
     else:
         if training_set_name is None and reaction_set_name is None:
             assert(test_set_name is None)
@@ -225,16 +231,18 @@ def prepare_build_model(predictor_headers=None, response_headers=None, modelVisi
                                        modelVisitorLibrary=modelVisitorLibrary, modelVisitorTool=modelVisitorTool,
                                        splitter=splitter, trainingSet=trainingSet, testSet=testSet,
                                        description=description, verbose=verbose, splitterOptions=splitterOptions,
-                                       visitorOptions=visitorOptions)
+                                       visitorOptions=visitorOptions, workers=workers, retrain=retrain)
 
     return container
 
 
 def prepare_build_display_model(predictor_headers=None, response_headers=None, modelVisitorLibrary=None, modelVisitorTool=None, splitter=None, training_set_name=None, test_set_name=None,
-                                reaction_set_name=None, description=None, verbose=False, splitterOptions=None, visitorOptions=None, container_id=None):
+                                reaction_set_name=None, description=None, verbose=False, splitterOptions=None, visitorOptions=None, container_id=None,
+                                workers=0, retrain=False):
     """I'm not exactly clear on what this function by GMN is for- PA."""
     container = prepare_build_model(predictor_headers=predictor_headers, response_headers=response_headers, modelVisitorLibrary=modelVisitorLibrary, modelVisitorTool=modelVisitorTool,
                                     splitter=splitter, training_set_name=training_set_name, test_set_name=test_set_name, reaction_set_name=reaction_set_name, description=description,
-                                    verbose=verbose, splitterOptions=splitterOptions, visitorOptions=visitorOptions, container_id=container_id)
+                                    verbose=verbose, splitterOptions=splitterOptions, visitorOptions=visitorOptions, container_id=container_id,
+                                    workers=workers, retrain=retrain)
 
     display_model_results(container)
@@ -1,11 +1,19 @@
 """Recalculate the descriptors for all compounds and reactions."""
 from django.core.management.base import BaseCommand
-from DRP.models import Reaction, Compound, NumMolDescriptorValue
+from DRP.models import Reaction, Compound, NumMolDescriptorValue, PendingRxnCalculation
+from DRP.models.pendingRxnCalculation import compoundsChanged
+from DRP.models.pendingCalculation import claimObjects
 from django import db
 from django.conf import settings
 import logging
 import importlib
+import warnings
+import socket
+import os
+from time import time
+from multiprocessing import Pool
 from django.db import transaction
+from django.utils import timezone
 
 molDescriptorPlugins = [importlib.import_module(plugin) for
 						plugin in settings.MOL_DESCRIPTOR_PLUGINS]
@@ -19,31 +27,140 @@ logger = logging.getLogger('DRP.management')
 desc_headers = ["C_mols","Cr_mols","Ga_mols","H_mols","I_mols","Inorg_amount_molarity","Inorg_boolean_group_10_DRP_1_5_False_molarity","Inorg_boolean_group_11_DRP_1_5_False_molarity","Inorg_boolean_group_12_DRP_1_5_any","Inorg_boolean_group_12_DRP_1_5_False_molarity","Inorg_boolean_group_13_DRP_1_5_any","Inorg_boolean_group_13_DRP_1_5_False_count","Inorg_boolean_group_13_DRP_1_5_False_molarity","Inorg_boolean_group_13_DRP_1_5_True_count","Inorg_boolean_group_13_DRP_1_5_True_molarity","Inorg_boolean_group_14_DRP_1_5_any","Inorg_boolean_group_14_DRP_1_5_False_molarity","Inorg_boolean_group_14_DRP_1_5_True_count","Inorg_boolean_group_15_DRP_1_5_any","Inorg_boolean_group_15_DRP_1_5_False_molarity","Inorg_boolean_group_16_DRP_1_5_True_molarity","Inorg_boolean_group_17_DRP_1_5_any","Inorg_boolean_group_17_DRP_1_5_False_molarity","Inorg_boolean_group_18_DRP_1_5_False_molarity","Inorg_boolean_group_1_DRP_1_5_any","Inorg_boolean_group_1_DRP_1_5_False_count","Inorg_boolean_group_1_DRP_1_5_False_molarity","Inorg_boolean_group_1_DRP_1_5_True_count","Inorg_boolean_group_1_DRP_1_5_True_molarity","Inorg_boolean_group_2_DRP_1_5_False_molarity","Inorg_boolean_group_3_DRP_1_5_False_molarity","Inorg_boolean_group_4_DRP_1_5_False_molarity","Inorg_boolean_group_5_DRP_1_5_any","Inorg_boolean_group_5_DRP_1_5_False_count","Inorg_boolean_group_5_DRP_1_5_False_molarity","Inorg_boolean_group_5_DRP_1_5_True_molarity","Inorg_boolean_group_6_DRP_1_5_any","Inorg_boolean_group_6_DRP_1_5_False_count","Inorg_boolean_group_6_DRP_1_5_False_molarity","Inorg_boolean_group_7_DRP_1_5_False_molarity","Inorg_boolean_group_8_DRP_1_5_False_molarity","Inorg_boolean_group_9_DRP_1_5_any","Inorg_boolean_group_9_DRP_1_5_False_molarity","Inorg_boolean_period_1_DRP_1_5_any","Inorg_boolean_period_1_DRP_1_5_False_molarity","Inorg_boolean_period_2_DRP_1_5_True_molarity","Inorg_boolean_period_3_DRP_1_5_any","Inorg_boolean_period_3_DRP_1_5_False_count","Inorg_boolean_period_3_DRP_1_5_False_molarity","Inorg_boolean_period_3_DRP_1_5_True_count","Inorg_boolean_period_3_DRP_1_5_True_molarity","Inorg_boolean_period_4_DRP_1_5_any","Inorg_boolean_period_4_DRP_1_5_False_count","Inorg_boolean_period_4_DRP_1_5_False_molarity","Inorg_boolean_period_4_DRP_1_5_True_count","Inorg_boolean_period_4_DRP_1_5_True_molarity","Inorg_boolean_period_5_DRP_1_5_any","Inorg_boolean_period_5_DRP_1_5_False_count","Inorg_boolean_period_5_DRP_1_5_False_molarity","Inorg_boolean_period_5_DRP_1_5_True_count","Inorg_boolean_period_5_DRP_1_5_True_molarity","Inorg_boolean_period_6_DRP_1_5_False_molarity","Inorg_boolean_period_7_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_10_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_11_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_12_DRP_1_5_any","Inorg_drpInorgAtom_boolean_group_12_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_13_DRP_1_5_any","Inorg_drpInorgAtom_boolean_group_13_DRP_1_5_False_count","Inorg_drpInorgAtom_boolean_group_13_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_13_DRP_1_5_True_count","Inorg_drpInorgAtom_boolean_group_13_DRP_1_5_True_molarity","Inorg_drpInorgAtom_boolean_group_14_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_15_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_16_DRP_1_5_any","Inorg_drpInorgAtom_boolean_group_16_DRP_1_5_False_count","Inorg_drpInorgAtom_boolean_group_16_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_16_DRP_1_5_True_molarity","Inorg_drpInorgAtom_boolean_group_17_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_18_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_1_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_2_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_3_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_4_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_5_DRP_1_5_any","Inorg_drpInorgAtom_boolean_group_5_DRP_1_5_False_count","Inorg_drpInorgAtom_boolean_group_5_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_5_DRP_1_5_True_molarity","Inorg_drpInorgAtom_boolean_group_6_DRP_1_5_any","Inorg_drpInorgAtom_boolean_group_6_DRP_1_5_False_count","Inorg_drpInorgAtom_boolean_group_6_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_7_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_8_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_group_9_DRP_1_5_any","Inorg_drpInorgAtom_boolean_group_9_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_period_1_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_period_2_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_period_3_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_period_4_DRP_1_5_any","Inorg_drpInorgAtom_boolean_period_4_DRP_1_5_False_count","Inorg_drpInorgAtom_boolean_period_4_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_period_4_DRP_1_5_True_count","Inorg_drpInorgAtom_boolean_period_4_DRP_1_5_True_molarity","Inorg_drpInorgAtom_boolean_period_5_DRP_1_5_any","Inorg_drpInorgAtom_boolean_period_5_DRP_1_5_False_count","Inorg_drpInorgAtom_boolean_period_5_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_period_5_DRP_1_5_True_count","Inorg_drpInorgAtom_boolean_period_5_DRP_1_5_True_molarity","Inorg_drpInorgAtom_boolean_period_6_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_period_7_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_valence_0_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_valence_1_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_valence_2_DRP_1_5_any","Inorg_drpInorgAtom_boolean_valence_2_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_valence_3_DRP_1_5_any","Inorg_drpInorgAtom_boolean_valence_3_DRP_1_5_False_count","Inorg_drpInorgAtom_boolean_valence_3_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_valence_3_DRP_1_5_True_count","Inorg_drpInorgAtom_boolean_valence_3_DRP_1_5_True_molarity","Inorg_drpInorgAtom_boolean_valence_4_DRP_1_5_any","Inorg_drpInorgAtom_boolean_valence_4_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_valence_5_DRP_1_5_any","Inorg_drpInorgAtom_boolean_valence_5_DRP_1_5_False_count","Inorg_drpInorgAtom_boolean_valence_5_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_valence_5_DRP_1_5_True_molarity","Inorg_drpInorgAtom_boolean_valence_6_DRP_1_5_any","Inorg_drpInorgAtom_boolean_valence_6_DRP_1_5_False_molarity","Inorg_drpInorgAtom_boolean_valence_6_DRP_1_5_True_count","Inorg_drpInorgAtom_boolean_valence_6_DRP_1_5_True_molarity","Inorg_drpInorgAtom_boolean_valence_7_DRP_1_5_False_molarity","Inorg_drpInorgAtomAtomicRadius_geom_stoich_DRP_0_02_gmean_count","Inorg_drpInorgAtomAtomicRadius_geom_stoich_DRP_0_02_gmean_molarity","Inorg_drpInorgAtomAtomicRadius_geom_stoich_DRP_0_02_Max","Inorg_drpInorgAtomAtomicRadius_geom_stoich_DRP_0_02_Range","Inorg_drpInorgAtomAtomicRadius_geom_unw_DRP_0_02_gmean_count","Inorg_drpInorgAtomAtomicRadius_geom_unw_DRP_0_02_gmean_molarity","Inorg_drpInorgAtomAtomicRadius_geom_unw_DRP_0_02_Max","Inorg_drpInorgAtomAtomicRadius_geom_unw_DRP_0_02_Range","Inorg_drpInorgAtomAtomicRadius_max_DRP_0_02_gmean_count","Inorg_drpInorgAtomAtomicRadius_max_DRP_0_02_gmean_molarity","Inorg_drpInorgAtomAtomicRadius_max_DRP_0_02_Max","Inorg_drpInorgAtomAtomicRadius_max_DRP_0_02_Range","Inorg_drpInorgAtomElectronAffinity_geom_stoich_DRP_0_02_gmean_count","Inorg_drpInorgAtomElectronAffinity_geom_stoich_DRP_0_02_Max","Inorg_drpInorgAtomElectronAffinity_geom_stoich_DRP_0_02_Range","Inorg_drpInorgAtomElectronAffinity_geom_unw_DRP_0_02_gmean_count","Inorg_drpInorgAtomElectronAffinity_geom_unw_DRP_0_02_Max","Inorg_drpInorgAtomElectronAffinity_geom_unw_DRP_0_02_Range","Inorg_drpInorgAtomElectronAffinity_max_DRP_0_02_gmean_count","Inorg_drpInorgAtomElectronAffinity_max_DRP_0_02_Max","Inorg_drpInorgAtomElectronAffinity_max_DRP_0_02_Range","Inorg_drpInorgAtomHardness_geom_stoich_DRP_0_02_gmean_count","Inorg_drpInorgAtomHardness_geom_stoich_DRP_0_02_Max","Inorg_drpInorgAtomHardness_geom_stoich_DRP_0_02_Range","Inorg_drpInorgAtomHardness_geom_unw_DRP_0_02_gmean_count","Inorg_drpInorgAtomHardness_geom_unw_DRP_0_02_Max","Inorg_drpInorgAtomHardness_geom_unw_DRP_0_02_Range","Inorg_drpInorgAtomHardness_max_DRP_0_02_gmean_count","Inorg_drpInorgAtomHardness_max_DRP_0_02_Max","Inorg_drpInorgAtomHardness_max_DRP_0_02_Range","Inorg_drpInorgAtomIonizationEnergy_geom_stoich_DRP_0_02_gmean_count","Inorg_drpInorgAtomIonizationEnergy_geom_stoich_DRP_0_02_Max","Inorg_drpInorgAtomIonizationEnergy_geom_stoich_DRP_0_02_Range","Inorg_drpInorgAtomIonizationEnergy_geom_unw_DRP_0_02_gmean_count","Inorg_drpInorgAtomIonizationEnergy_geom_unw_DRP_0_02_Max","Inorg_drpInorgAtomIonizationEnergy_geom_unw_DRP_0_02_Range","Inorg_drpInorgAtomIonizationEnergy_max_DRP_0_02_gmean_count","Inorg_drpInorgAtomIonizationEnergy_max_DRP_0_02_Max","Inorg_drpInorgAtomIonizationEnergy_max_DRP_0_02_Range","Inorg_drpInorgAtomPaulingElectronegativity_geom_stoich_DRP_0_02_gmean_count","Inorg_drpInorgAtomPaulingElectronegativity_geom_stoich_DRP_0_02_Max","Inorg_drpInorgAtomPaulingElectronegativity_geom_stoich_DRP_0_02_Range","Inorg_drpInorgAtomPaulingElectronegativity_geom_unw_DRP_0_02_gmean_count","Inorg_drpInorgAtomPaulingElectronegativity_geom_unw_DRP_0_02_Max","Inorg_drpInorgAtomPaulingElectronegativity_geom_unw_DRP_0_02_Range","Inorg_drpInorgAtomPaulingElectronegativity_max_DRP_0_02_gmean_count","Inorg_drpInorgAtomPaulingElectronegativity_max_DRP_0_02_Max","Inorg_drpInorgAtomPaulingElectronegativity_max_DRP_0_02_Range","Inorg_drpInorgAtomPearsonElectronegativity_geom_stoich_DRP_0_02_gmean_count","Inorg_drpInorgAtomPearsonElectronegativity_geom_stoich_DRP_0_02_Max","Inorg_drpInorgAtomPearsonElectronegativity_geom_stoich_DRP_0_02_Range","Inorg_drpInorgAtomPearsonElectronegativity_geom_unw_DRP_0_02_gmean_count","Inorg_drpInorgAtomPearsonElectronegativity_geom_unw_DRP_0_02_Max","Inorg_drpInorgAtomPearsonElectronegativity_geom_unw_DRP_0_02_Range","Inorg_drpInorgAtomPearsonElectronegativity_max_DRP_0_02_gmean_count","Inorg_drpInorgAtomPearsonElectronegativity_max_DRP_0_02_Max","Inorg_drpInorgAtomPearsonElectronegativity_max_DRP_0_02_Range","Inorg_mw_DRP_rdkit_0_02_gmean_count","Inorg_mw_DRP_rdkit_0_02_gmean_molarity","Inorg_mw_DRP_rdkit_0_02_Max","Inorg_mw_DRP_rdkit_0_02_Range","K_mols","leak","Mo_mols","N_mols","Na_mols","O_mols","Org_amount_molarity","Org_boolean_group_10_DRP_1_5_False_molarity","Org_boolean_group_11_DRP_1_5_False_molarity","Org_boolean_group_12_DRP_1_5_False_molarity","Org_boolean_group_13_DRP_1_5_False_molarity","Org_boolean_group_14_DRP_1_5_True_molarity","Org_boolean_group_15_DRP_1_5_any","Org_boolean_group_15_DRP_1_5_False_count","Org_boolean_group_15_DRP_1_5_True_molarity","Org_boolean_group_16_DRP_1_5_any","Org_boolean_group_16_DRP_1_5_False_molarity","Org_boolean_group_17_DRP_1_5_any","Org_boolean_group_17_DRP_1_5_False_molarity","Org_boolean_group_18_DRP_1_5_False_molarity","Org_boolean_group_1_DRP_1_5_True_molarity","Org_boolean_group_2_DRP_1_5_False_molarity","Org_boolean_group_3_DRP_1_5_False_molarity","Org_boolean_group_4_DRP_1_5_False_molarity","Org_boolean_group_5_DRP_1_5_False_molarity","Org_boolean_group_6_DRP_1_5_False_molarity","Org_boolean_group_7_DRP_1_5_False_molarity","Org_boolean_group_8_DRP_1_5_False_molarity","Org_boolean_group_9_DRP_1_5_False_molarity","Org_boolean_period_1_DRP_1_5_True_molarity","Org_boolean_period_2_DRP_1_5_True_molarity","Org_boolean_period_3_DRP_1_5_any","Org_boolean_period_3_DRP_1_5_False_molarity","Org_boolean_period_4_DRP_1_5_any","Org_boolean_period_4_DRP_1_5_False_molarity","Org_boolean_period_5_DRP_1_5_False_molarity","Org_boolean_period_6_DRP_1_5_False_molarity","Org_boolean_period_7_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_10_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_11_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_12_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_13_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_14_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_15_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_16_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_17_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_18_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_1_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_2_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_3_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_4_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_5_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_6_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_7_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_8_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_group_9_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_period_1_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_period_2_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_period_3_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_period_4_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_period_5_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_period_6_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_period_7_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_valence_0_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_valence_1_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_valence_2_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_valence_3_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_valence_4_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_valence_5_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_valence_6_DRP_1_5_False_molarity","Org_drpInorgAtom_boolean_valence_7_DRP_1_5_False_molarity","Org_mw_DRP_rdkit_0_02_gmean_count","Org_mw_DRP_rdkit_0_02_gmean_molarity","Org_mw_DRP_rdkit_0_02_Max","Ox_amount_count","Ox_amount_molarity","Ox_boolean_group_10_DRP_1_5_False_molarity","Ox_boolean_group_11_DRP_1_5_False_molarity","Ox_boolean_group_12_DRP_1_5_False_molarity","Ox_boolean_group_13_DRP_1_5_False_molarity","Ox_boolean_group_14_DRP_1_5_True_molarity","Ox_boolean_group_15_DRP_1_5_False_molarity","Ox_boolean_group_16_DRP_1_5_True_molarity","Ox_boolean_group_17_DRP_1_5_False_molarity","Ox_boolean_group_18_DRP_1_5_False_molarity","Ox_boolean_group_1_DRP_1_5_True_molarity","Ox_boolean_group_2_DRP_1_5_False_molarity","Ox_boolean_group_3_DRP_1_5_False_molarity","Ox_boolean_group_4_DRP_1_5_False_molarity","Ox_boolean_group_5_DRP_1_5_False_molarity","Ox_boolean_group_6_DRP_1_5_False_molarity","Ox_boolean_group_7_DRP_1_5_False_molarity","Ox_boolean_group_8_DRP_1_5_False_molarity","Ox_boolean_group_9_DRP_1_5_False_molarity","Ox_boolean_period_1_DRP_1_5_False_molarity","Ox_boolean_period_2_DRP_1_5_True_molarity","Ox_boolean_period_3_DRP_1_5_True_molarity","Ox_boolean_period_4_DRP_1_5_False_molarity","Ox_boolean_period_5_DRP_1_5_False_molarity","Ox_boolean_period_6_DRP_1_5_False_molarity","Ox_boolean_period_7_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_10_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_11_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_12_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_13_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_14_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_15_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_16_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_17_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_18_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_1_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_2_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_3_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_4_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_5_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_6_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_7_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_8_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_group_9_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_period_1_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_period_2_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_period_3_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_period_4_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_period_5_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_period_6_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_period_7_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_valence_0_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_valence_1_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_valence_2_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_valence_3_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_valence_4_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_valence_5_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_valence_6_DRP_1_5_False_molarity","Ox_drpInorgAtom_boolean_valence_7_DRP_1_5_False_molarity","reaction_pH","reaction_temperature","reaction_time","Se_mols","slow_cool","Solv_amount_molarity","Solv_boolean_group_10_DRP_1_5_False_molarity","Solv_boolean_group_11_DRP_1_5_False_molarity","Solv_boolean_group_12_DRP_1_5_False_molarity","Solv_boolean_group_13_DRP_1_5_False_molarity","Solv_boolean_group_14_DRP_1_5_False_molarity","Solv_boolean_group_15_DRP_1_5_False_molarity","Solv_boolean_group_16_DRP_1_5_True_molarity","Solv_boolean_group_17_DRP_1_5_False_molarity","Solv_boolean_group_18_DRP_1_5_False_molarity","Solv_boolean_group_1_DRP_1_5_True_molarity","Solv_boolean_group_2_DRP_1_5_False_molarity","Solv_boolean_group_3_DRP_1_5_False_molarity","Solv_boolean_group_4_DRP_1_5_False_molarity","Solv_boolean_group_5_DRP_1_5_False_molarity","Solv_boolean_group_6_DRP_1_5_False_molarity","Solv_boolean_group_7_DRP_1_5_False_molarity","Solv_boolean_group_8_DRP_1_5_False_molarity","Solv_boolean_group_9_DRP_1_5_False_molarity","Solv_boolean_period_1_DRP_1_5_True_molarity","Solv_boolean_period_2_DRP_1_5_True_molarity","Solv_boolean_period_3_DRP_1_5_False_molarity","Solv_boolean_period_4_DRP_1_5_False_molarity","Solv_boolean_period_5_DRP_1_5_False_molarity","Solv_boolean_period_6_DRP_1_5_False_molarity","Solv_boolean_period_7_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_10_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_11_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_12_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_13_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_14_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_15_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_16_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_17_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_18_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_1_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_2_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_3_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_4_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_5_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_6_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_7_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_8_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_group_9_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_period_1_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_period_2_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_period_3_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_period_4_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_period_5_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_period_6_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_period_7_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_valence_0_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_valence_1_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_valence_2_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_valence_3_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_valence_4_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_valence_5_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_valence_6_DRP_1_5_False_molarity","Solv_drpInorgAtom_boolean_valence_7_DRP_1_5_False_molarity","Te_mols","V_mols"]
 
 def calculate_rxn_descriptors(queryset, descriptorPlugins, verbose=False, plugins=None, **kwargs):
-	"""Helper function for reaction descriptor calculation."""
+	"""Helper function for reaction descriptor calculation. Return the seconds spent in each plugin."""
 	if verbose:
 		logger.info(
 			"Calculating descriptors for {} objects".format(queryset.count()))
+	timings = {}
 	for plugin in descriptorPlugins:
 		if plugins is None or plugin.__name__ in plugins:
 			if verbose:
 				logger.info("Calculating for plugin: {}".format(plugin))
+			started = time()
 			plugin.calculate_many(queryset, verbose=verbose, **kwargs)
+			timings[plugin.__name__] = time() - started
 			if verbose:
 				logger.info("Done with plugin: {}\n".format(plugin))
+	return timings
 
 def calculate_mol_descriptors(queryset, descriptorPlugins, verbose=False, plugins=None, **kwargs):
 	"""Helper function for compound mol descriptor calculation."""
 	if verbose:
 		logger.info(
 			"Calculating descriptors for {} objects".format(queryset.count()))
-	counter = 0
-	for comp in queryset:
-		counter += 1
-		print(comp.smiles)
-		print("Count: {}".format(counter))
-		for plugin in molDescriptorPlugins:
-			plugin.calculate(comp)
+	for plugin in descriptorPlugins:
+		if plugins is None or plugin.__name__ in plugins:
+			if verbose:
+				logger.info("Calculating for plugin: {}".format(plugin))
+			plugin.calculate_many(queryset, verbose=verbose, **kwargs)
+			if verbose:
+				logger.info("Done with plugin: {}\n".format(plugin))
+
+def claim_reactions(pks):
+	"""
+	Atomically mark those of the given reactions not already being calculated as calculating.
+
+	Concurrent workers, concurrent invocations of this command and the descriptor_worker command
+	all claim through claimObjects, so they never claim the same reaction. Return the list of claimed pks.
+	"""
+	return claimObjects(Reaction, pks)
 
+def release_reactions(reactions):
+	"""Clear the flags of calculated reactions and return the queryset of those needing recalculation."""
+	with transaction.atomic():
+		reactions = reactions.all()  # refresh the qs
+		reactions.filter(recalculate=False).update(
+			dirty=False, calculating=False)
+		# read the pks first, as the flag the filter relies on is about to be cleared
+		again = list(reactions.filter(recalculate=True).values_list('pk', flat=True))
+		Reaction.objects.filter(pk__in=again).update(recalculate=False)
+	return Reaction.objects.filter(pk__in=again)
+
+def calculate_pending_rxn_descriptors(verbose=False, whitelist=None, plugins=None, limit=None, lease=3600):
+	"""
+	Recalculate each plugin's values for only the reactions marked as pending for that plugin.
+
+	The pending rows are claimed from the queue, and their reactions through claim_reactions, just as the
+	descriptor_worker command claims them, so the two may run side by side. At most limit reactions are
+	taken per plugin, soonest due first; rows whose reactions are being calculated elsewhere are left for
+	later. A mark refreshed while its reaction is being calculated is kept for the next run.
+	Return the number of (reaction, plugin) pairs calculated.
+	"""
+	name = 'calculate_descriptors:{}:{}'.format(socket.gethostname(), os.getpid())
+	cutoff = timezone.now()
+	calculated = 0
+	for plugin in rxnDescriptorPlugins:
+		if plugins is not None and plugin.__name__ not in plugins:
+			continue
+		rows = PendingRxnCalculation.objects.filter(
+			plugin=plugin.__name__, marked__lte=cutoff).claim(name, limit, lease)
+		if not rows:
+			continue
+		claimed = set(claim_reactions(set(row.reaction_id for row in rows)))
+		PendingRxnCalculation.objects.all().release([row for row in rows if row.reaction_id not in claimed])
+		rows = [row for row in rows if row.reaction_id in claimed]
+		if verbose:
+			logger.info("{} pending reactions for plugin: {}".format(len(rows), plugin.__name__))
+		try:
+			calculate_rxn_descriptors(Reaction.objects.filter(pk__in=claimed), [plugin],
+									  verbose=verbose, whitelist=whitelist)
+		except Exception:
+			PendingRxnCalculation.objects.all().fail(rows)
+			raise
+		finally:
+			Reaction.objects.filter(pk__in=claimed).update(calculating=False)
+		PendingRxnCalculation.objects.all().finish(rows)
+		calculated += len(rows)
+	return calculated
+
+def _calculate_rxn_chunk(args):
+	"""Claim a chunk of reactions, calculate their descriptors and release them; the entry point of worker processes."""
+	pks, whitelist, plugins, verbose = args
+	claimed = claim_reactions(pks)
+	reactions = Reaction.objects.filter(pk__in=claimed)
+	timings = {}
+	while reactions.exists():
+		try:
+			chunkTimings = calculate_rxn_descriptors(reactions, rxnDescriptorPlugins, verbose=verbose,
+													 whitelist=whitelist, plugins=plugins)
+		except Exception:
+			reactions.update(calculating=False)
+			raise
+		for name, seconds in chunkTimings.items():
+			timings[name] = timings.get(name, 0) + seconds
+		reactions = release_reactions(reactions)
+	return len(claimed), timings
+
+def calculate_rxn_descriptors_parallel(pks, workers, chunk_size, verbose=False, whitelist=None, plugins=None):
+	"""Calculate reaction descriptors for the given reaction pks in chunks across a pool of worker processes."""
+	chunks = [(pks[i:i + chunk_size], whitelist, plugins, False) for i in range(0, len(pks), chunk_size)]
+	# forked workers must open their own connections rather than share the parent's
+	for connection in db.connections.all():
+		connection.close()
+	started = time()
+	calculated = 0
+	timings = {}
+	pool = Pool(workers)
+	try:
+		for count, chunkTimings in pool.imap_unordered(_calculate_rxn_chunk, chunks):
+			calculated += count
+			for name, seconds in chunkTimings.items():
+				timings[name] = timings.get(name, 0) + seconds
+			if verbose:
+				logger.info("Calculated {}/{} reactions".format(calculated, len(pks)))
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+	elapsed = time() - started
+	for name, seconds in sorted(timings.items()):
+		logger.info("{}: {} reactions, {:.1f} worker seconds, {:.2f} reactions per worker second".format(
+			name, calculated, seconds, calculated / seconds if seconds else float('inf')))
+	logger.info("{} reactions in {:.1f}s with {} workers ({:.2f} reactions per second)".format(
+		calculated, elapsed, workers, calculated / elapsed if elapsed else float('inf')))
+	return timings
 
 
 class Command(BaseCommand):
@@ -71,6 +188,10 @@ class Command(BaseCommand):
 							help='Plugins to use (default all).')
 		parser.add_argument('-w', '--whitelist', nargs='+', default= desc_headers,
 							help='One or more descriptor headers to calculate from specified plugins (default all for given plugins).')
+		parser.add_argument('--workers', type=int, default=0,
+							help='Calculate reaction descriptors in this many worker processes (default 0, calculate in this process).')
+		parser.add_argument('--chunk-size', type=int, default=100,
+							help='Number of reactions claimed at a time, by each worker when using --workers.')
 		group = parser.add_mutually_exclusive_group(required=False)
 		group.add_argument('-r', '--reactions', '--rxns', action='store_true',
 						   help='Calculate descriptors for reactions only.')
@@ -82,6 +203,8 @@ class Command(BaseCommand):
 						   help='Calculate descriptors for non-performed reactions also.')
 		group.add_argument('--only-dirty', action='store_true',
 						   help='Calculate descriptors only for those objects which have been flagged for calculation.')
+		group.add_argument('--incremental', action='store_true',
+						   help='Calculate descriptors for dirty compounds, then only the reaction descriptors made out of date by changes since the last run.')
 
 	def handle(self, *args, **kwargs):
 		"""Handle the function call."""
@@ -94,7 +217,10 @@ class Command(BaseCommand):
 		include_invalid = kwargs['include_invalid']
 		include_non_performed = kwargs['include_non_performed']
 		only_dirty = kwargs['only_dirty']
+		incremental = kwargs['incremental']
 		limit = kwargs['count']
+		workers = kwargs['workers']
+		chunk_size = kwargs['chunk_size']
 
 		if whitelist is not None:
 			# just a little optimization
@@ -113,8 +239,8 @@ class Command(BaseCommand):
 				compounds = Compound.objects.order_by('pk').filter(
 					pk__gte=start) # TODO: removed .exclude(calculating=True) since database is inconsistent by setting all all compounts to have calculating=True
 				logger.debug('Compounds count is {}'.format(compounds.count()))
-				if only_dirty:
-					compounds = compounds.objects.filter(dirty=True)
+				if only_dirty or incremental:
+					compounds = compounds.filter(dirty=True)
 				compounds = compounds[:limit]
 				# This hits our database again, but we have to because slices
 				# can't be updated and we need to call these specific reactions
@@ -122,9 +248,11 @@ class Command(BaseCommand):
 				compounds = Compound.objects.filter(
 					id__in=(compound.id for compound in compounds))
 				compounds.update(calculating=True)
+				compoundPks = list(compounds.values_list('pk', flat=True))
 			logger.debug('Compounds count is {}'.format(compounds.count()))
-			print("Number of compounds: {}".format(compounds.count()))
-			while compounds.count() > 1:
+			if verbose:
+				logger.info("Number of compounds: {}".format(compounds.count()))
+			while compounds.exists():
 				try:
 					calculate_mol_descriptors(compounds, molDescriptorPlugins,
 										  verbose=verbose, plugins=plugins)
@@ -137,37 +265,40 @@ class Command(BaseCommand):
 						dirty=False, calculating=False)
 					compounds = compounds.filter(recalculate=True)
 					compounds.update(recalculate=False)
-		if not only_compounds:
-			with transaction.atomic():
-				reactions = Reaction.objects.order_by(
-					'pk').exclude(calculating=True)
-				reactions = reactions # TODO: removed .exclude(compounds__dirty=True) since database is inconsistent by setting all reactions to dirty=True
-				if only_dirty:
-					reactions = reactions.objects.filter(dirty=True)
-				if only_reactions:
-					reactions = reactions.filter(pk__gte=start)
-				if not include_invalid:
-					reactions = reactions.exclude(
-						performedreaction__valid=False)
-				if not include_non_performed:
-					reactions = reactions.exclude(performedreaction=None)
-				reactions = reactions[:limit]
-				reactions = Reaction.objects.filter(
-					id__in=(reaction.id for reaction in reactions))
-				reactions.update(calculating=True)
-			print("Number of reactions: {}".format(reactions.count()))
-			reactions_counter = 0
-			while reactions.count() > 1:
-				print("Run {} through reactions".format(reactions_counter))
-				try:
-					calculate_rxn_descriptors(reactions, rxnDescriptorPlugins,
-										  verbose=verbose, whitelist=whitelist, plugins=plugins)
-				except Exception as e:
-					reactions.update(calculating=False)
-					raise e
-				with transaction.atomic():
-					reactions = reactions.all()  # refresh the qs
-					reactions.filter(recalculate=False).update(
-						dirty=False, calculating=False)
-					reactions = reactions.filter(recalculate=True)
-					reactions.update(recalculate=False)
+			if incremental:
+				compoundsChanged(compoundPks)
+		if incremental and not only_compounds:
+			calculated = calculate_pending_rxn_descriptors(verbose=verbose, whitelist=whitelist,
+														   plugins=plugins, limit=limit)
+			if verbose:
+				logger.info("Calculated {} pending reaction descriptor sets".format(calculated))
+		elif not only_compounds:
+			reactions = Reaction.objects.order_by(
+				'pk').exclude(calculating=True)
+			reactions = reactions # TODO: removed .exclude(compounds__dirty=True) since database is inconsistent by setting all reactions to dirty=True
+			if only_dirty:
+				reactions = reactions.filter(dirty=True)
+			if only_reactions:
+				reactions = reactions.filter(pk__gte=start)
+			if not include_invalid:
+				reactions = reactions.exclude(
+					performedreaction__valid=False)
+			if not include_non_performed:
+				reactions = reactions.exclude(performedreaction=None)
+			pks = list(reactions.values_list('pk', flat=True)[:limit])
+			if verbose:
+				logger.info("Number of reactions: {}".format(len(pks)))
+			if workers > 0:
+				calculate_rxn_descriptors_parallel(pks, workers, chunk_size, verbose=verbose,
+												   whitelist=whitelist, plugins=plugins)
+			else:
+				# claim in chunks as the workers do, keeping each IN list and claim transaction small
+				calculated = 0
+				for i in range(0, len(pks), chunk_size):
+					count, timings = _calculate_rxn_chunk((pks[i:i + chunk_size], whitelist, plugins, verbose))
+					calculated += count
+					if verbose:
+						for name, seconds in sorted(timings.items()):
+							logger.info("{}: {} reactions in {:.1f}s ({:.2f} reactions per second)".format(
+								name, count, seconds, count / seconds if seconds else float('inf')))
+						logger.info("Calculated {}/{} reactions".format(calculated, len(pks)))
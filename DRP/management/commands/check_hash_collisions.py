@@ -1,34 +1,44 @@
 """This command is to check whether the hashing algorithm for non-alike reactions has clashed."""
 from django.core.management.base import BaseCommand
 from DRP.email import EmailToAdmins
-from DRP.models import Reaction
-import xxhash
+from DRP.models import ReactionSpaceHash
+from DRP.models.reactionSpaceHash import reactionCompounds, spaceHash, updateSpaceHashes
 
 
 class Command(BaseCommand):
     """Runs a check on the database to make sure reaction hashes don't have collisions.
 
-    The current hash is the same as the one used in rxnSpaceHash1 descriptor.
-    Exits nonzero if a collision is found.
+    The current hash is the reaction space hash stored in ReactionSpaceHash, which is the same as the one
+    used in the rxnSpaceHash1 descriptor. Exits nonzero if a collision is found.
     """
 
     help = 'Checks Reaction Chemical Space Hashes for collisions, which could cause problematic behaviour in model building'
 
+    def add_arguments(self, parser):
+        """Add arguments for the parser."""
+        parser.add_argument('--update', action='store_true',
+                            help='Store the hashes of reactions whose stored hash is missing or out of date.')
+
     def handle(self, *args, **kwargs):
         """Handle the command call."""
         hashDictionary = {}
         collisionCount = 0
-        for reaction in Reaction.objects.all():
-            reactantString = ''
-            h = xxhash.xxh64()
-            for reactant in reaction.compounds:
-                h.update(reactant.abbrev)
-                reactantString += reactant.abbrev
+        stored = dict(ReactionSpaceHash.objects.values_list('reaction_id', 'value'))
+        stale = []
+        for reactionPk, compoundPks in reactionCompounds().items():
+            h = spaceHash(compoundPks)
+            if stored.get(reactionPk) != h:
+                stale.append(reactionPk)
+            compoundSet = tuple(compoundPks)
             if h in hashDictionary:
-                if hashDictionary[h].hexdigest() != reactantString:
+                if hashDictionary[h] != compoundSet:
                     collisionCount += 1
             else:
-                hashDictionary[h] = reactantString
+                hashDictionary[h] = compoundSet
+        if stale:
+            self.stdout.write('{} reactions have a missing or out of date hash'.format(len(stale)))
+            if kwargs['update']:
+                updateSpaceHashes(stale)
         if collisionCount > 0:
             e = EmailToAdmins('Dark Reactions Project: Hash Collision Failure',
                               'A collision between reaction space hashes has occured. Please contact the DRP development team and file a bug report.')
@@ -0,0 +1,169 @@
+"""A long running worker calculating descriptors as compounds and reactions are queued for calculation."""
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django import db
+from DRP.models import Compound, Reaction, PendingMolCalculation, PendingRxnCalculation
+from DRP.models.pendingRxnCalculation import compoundsChanged
+from DRP.models.pendingCalculation import claimObjects
+from collections import defaultdict
+from time import sleep, time
+import importlib
+import socket
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def queue_stats():
+    """Return the stats of the compound and reaction queues, keyed by 'compounds' and 'reactions'."""
+    return {
+        'compounds': PendingMolCalculation.objects.all().stats(),
+        'reactions': PendingRxnCalculation.objects.all().stats(),
+    }
+
+
+def log_queue_stats():
+    """Log the depth and lag of the compound and reaction queues."""
+    for name, stats in sorted(queue_stats().items()):
+        logger.info('{} queue: depth {depth}, due {due}, claimed {claimed}, retrying {retrying}, lag {lag:.1f}s'.format(
+            name, **stats))
+
+
+class Worker(object):
+    """Claims batches of queued compounds and reactions and calculates their descriptors."""
+
+    def __init__(self, name, batch_size, lease, backoff_base, backoff_cap, verbose=False):
+        """Import the descriptor plugins and remember the settings."""
+        self.name = name
+        self.batch_size = batch_size
+        self.lease = lease
+        self.backoff = {'base': backoff_base, 'cap': backoff_cap}
+        self.verbose = verbose
+        self.mol_plugins = [importlib.import_module(plugin) for plugin in settings.MOL_DESCRIPTOR_PLUGINS]
+        self.rxn_plugins = {plugin: importlib.import_module(plugin) for plugin in settings.RXN_DESCRIPTOR_PLUGINS}
+
+    def calculate_compounds(self):
+        """Calculate one batch of queued compounds, returning how many were claimed."""
+        rows = PendingMolCalculation.objects.all().claim(self.name, self.batch_size, self.lease)
+        if not rows:
+            return 0
+        # compounds being calculated by calculate_descriptors are left for a later batch
+        claimed = set(claimObjects(Compound, set(row.compound_id for row in rows)))
+        busy = [row for row in rows if row.compound_id not in claimed]
+        if busy:
+            PendingMolCalculation.objects.all().release(busy, self.backoff['base'])
+        if not claimed:
+            return len(rows)
+        claimed_rows = [row for row in rows if row.compound_id in claimed]
+        compounds = Compound.objects.filter(pk__in=claimed)
+        try:
+            try:
+                for plugin in self.mol_plugins:
+                    PendingMolCalculation.objects.all().renew(claimed_rows, self.lease)
+                    plugin.calculate_many(compounds, verbose=self.verbose)
+            except Exception:
+                logger.exception('{} failed calculating compounds {}'.format(self.name, sorted(claimed)))
+                PendingMolCalculation.objects.all().fail(claimed_rows, **self.backoff)
+                return len(rows)
+            compounds.update(dirty=False)
+            PendingMolCalculation.objects.all().finish(claimed_rows)
+        finally:
+            Compound.objects.filter(pk__in=claimed).update(calculating=False)
+        compoundsChanged(list(claimed))
+        return len(rows)
+
+    def calculate_reactions(self):
+        """Calculate one batch of queued (reaction, plugin) pairs, returning how many were claimed."""
+        rows = PendingRxnCalculation.objects.filter(
+            plugin__in=list(self.rxn_plugins)).claim(self.name, self.batch_size, self.lease)
+        if not rows:
+            return 0
+        # reactions being calculated by calculate_descriptors are left for a later batch
+        claimed = set(claimObjects(Reaction, set(row.reaction_id for row in rows)))
+        busy = [row for row in rows if row.reaction_id not in claimed]
+        if busy:
+            PendingRxnCalculation.objects.all().release(busy, self.backoff['base'])
+        by_plugin = defaultdict(list)
+        for row in rows:
+            if row.reaction_id in claimed:
+                by_plugin[row.plugin].append(row)
+        try:
+            for plugin, plugin_rows in by_plugin.items():
+                PendingRxnCalculation.objects.all().renew(plugin_rows, self.lease)
+                pks = [row.reaction_id for row in plugin_rows]
+                try:
+                    self.rxn_plugins[plugin].calculate_many(Reaction.objects.filter(pk__in=pks), verbose=self.verbose)
+                except Exception:
+                    logger.exception('{} failed calculating {} for reactions {}'.format(self.name, plugin, pks))
+                    PendingRxnCalculation.objects.all().fail(plugin_rows, **self.backoff)
+                else:
+                    PendingRxnCalculation.objects.all().finish(plugin_rows)
+        finally:
+            Reaction.objects.filter(pk__in=claimed).update(calculating=False)
+        Reaction.objects.filter(pk__in=claimed).exclude(
+            pk__in=PendingRxnCalculation.objects.filter(reaction_id__in=claimed).values('reaction_id')).update(dirty=False)
+        return len(rows)
+
+    def run_once(self):
+        """Calculate a batch of each queue, compounds first as reactions depend on them. Return how many rows were claimed."""
+        return self.calculate_compounds() + self.calculate_reactions()
+
+
+class Command(BaseCommand):
+    """Run a worker calculating the descriptors of queued compounds and reactions until interrupted."""
+
+    help = 'Calculate descriptors for queued compounds and reactions as they are queued.'
+
+    def add_arguments(self, parser):
+        """Add arguments for the parser."""
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of queued objects to claim at a time. (default: %(default)s)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait before looking again when the queues are empty. (default: %(default)s)')
+        parser.add_argument('--lease', type=int, default=600,
+                            help='Seconds after which objects claimed by a worker which has not finished may be claimed by another. (default: %(default)s)')
+        parser.add_argument('--backoff-base', type=int, default=5,
+                            help='Seconds to wait before retrying a failed calculation the first time, doubling for each further failure. (default: %(default)s)')
+        parser.add_argument('--backoff-cap', type=int, default=3600,
+                            help='The most seconds to wait before retrying a failed calculation. (default: %(default)s)')
+        parser.add_argument('--stats-interval', type=float, default=60.0,
+                            help='Seconds between logging the depth and lag of the queues. (default: %(default)s)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queues hold nothing due rather than waiting for more.')
+        parser.add_argument('--stats', action='store_true',
+                            help='Print the depth and lag of the queues and exit.')
+        parser.add_argument('--name', default='{}:{}'.format(socket.gethostname(), os.getpid()),
+                            help='Name of this worker, recorded against the objects it claims. (default: host:pid)')
+
+    def handle(self, *args, **kwargs):
+        """Handle the function call."""
+        if kwargs['stats']:
+            for name, stats in sorted(queue_stats().items()):
+                self.stdout.write('{}: {}'.format(name, ', '.join('{}={}'.format(k, v) for k, v in sorted(stats.items()))))
+            return
+        verbose = (kwargs['verbosity'] > 1)
+        worker = Worker(kwargs['name'], kwargs['batch_size'], kwargs['lease'],
+                        kwargs['backoff_base'], kwargs['backoff_cap'], verbose=verbose)
+        logger.info('Descriptor worker {} started'.format(worker.name))
+        last_stats = 0
+        try:
+            while True:
+                if time() - last_stats >= kwargs['stats_interval']:
+                    log_queue_stats()
+                    last_stats = time()
+                try:
+                    claimed = worker.run_once()
+                except db.OperationalError:
+                    # lost the connection or a lock wait timed out; reconnect and carry on
+                    logger.exception('Database error in descriptor worker {}'.format(worker.name))
+                    db.close_old_connections()
+                    db.connection.close()
+                    claimed = 0
+                if not claimed:
+                    if kwargs['once']:
+                        break
+                    sleep(kwargs['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        logger.info('Descriptor worker {} stopped'.format(worker.name))
@@ -0,0 +1,23 @@
+"""Delete the least recently used data set artifacts, such as cached ARFF exports and trained models."""
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from DRP.models.dataSets import evictArtifacts
+
+
+class Command(BaseCommand):
+    """Delete data set artifacts beyond the configured size and age limits."""
+
+    help = 'Delete the least recently used files in DATASET_ARTIFACT_DIR beyond the size and age limits.'
+
+    def add_arguments(self, parser):
+        """Add arguments for the parser."""
+        parser.add_argument('--max-size', type=int, default=settings.DATASET_ARTIFACT_MAX_SIZE,
+                            help='Bytes the artifacts may take up in total. (default: %(default)s)')
+        parser.add_argument('--max-age', type=float, default=settings.DATASET_ARTIFACT_MAX_AGE,
+                            help='Days after which an unused artifact is deleted. (default: %(default)s)')
+
+    def handle(self, *args, **kwargs):
+        """Handle the command call."""
+        maxAge = None if kwargs['max_age'] is None else kwargs['max_age'] * 86400
+        freed = evictArtifacts(maxBytes=kwargs['max_size'], maxAge=maxAge)
+        self.stdout.write('Freed {} bytes'.format(freed))
@@ -7,6 +7,8 @@ from decimal import Decimal, getcontext, InvalidOperation
 import requests
 from django.conf import settings
 import DRP
+from DRP.models.modelInvalidation import suspendedInvalidation
+from DRP.models.reactionSpaceHash import updateSpaceHashes
 import logging
 
 logger = logging.getLogger('DRP.management')
@@ -91,13 +93,15 @@ class Command(BaseCommand):
                 pr.object.duplicateOf = None
                 pr.save()
 
-            for pr in serializers.deserialize('xml', smart_str(r.text)):
-                pr2 = DRP.models.PerformedReaction.objects.get(pk=pr.object.pk)
-                try:
-                    pr2.duplicateOf = pr.object.duplicateOf
-                    pr2.save()
-                except DRP.models.PerformedReaction.DoesNotExist as e:
-                    pass
+            # the database was emptied above, so no stats model can use these reactions
+            with suspendedInvalidation():
+                for pr in serializers.deserialize('xml', smart_str(r.text)):
+                    pr2 = DRP.models.PerformedReaction.objects.get(pk=pr.object.pk)
+                    try:
+                        pr2.duplicateOf = pr.object.duplicateOf
+                        pr2.save()
+                    except DRP.models.PerformedReaction.DoesNotExist as e:
+                        pass
 
             r = s.get(apiUrl + 'compound_quantities.xml', params=data)
             for cq in serializers.deserialize('xml', smart_str(r.text)):
@@ -110,6 +114,8 @@ class Command(BaseCommand):
                         logger.debug(
                             "An invalid decimal conversion occured. Value is: {} from CompoundQuantity object {}".format(cq.amount, cq))
                     raise e
+            # deserialized objects are saved raw, bypassing CompoundQuantity.save, so hash every reaction here
+            updateSpaceHashes()
         else:
             print(s.cookies.get_dict())
             print(r.text)
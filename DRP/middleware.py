@@ -1,6 +1,7 @@
 """Middleware classes for handling specific cases in DRP."""
 from django.shortcuts import render
 from chemspipy.errors import ChemSpiPyServerError
+from DRP.models.modelInvalidation import flushInvalidation, discardInvalidation
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,3 +23,26 @@ class ChemspiderErrorMiddleware(object):
             render(request, "chemspider_500.html")
         else:
             return None
+
+
+class ModelInvalidationMiddleware(object):
+    """
+    Invalidate the stats models of the reactions saved while handling a request, once per request.
+
+    Saving a reaction only records it; see DRP.models.modelInvalidation. Models are invalidated even if the view
+    raises, as anything it saved outside a transaction has already been committed.
+    """
+
+    def process_request(self, request):
+        """Forget reactions left over by anything which ran in this thread before the request."""
+        discardInvalidation()
+
+    def process_response(self, request, response):
+        """Invalidate the models of the reactions saved by the view."""
+        flushInvalidation()
+        return response
+
+    def process_exception(self, request, exception):
+        """Invalidate the models of the reactions saved before the view raised."""
+        flushInvalidation()
+        return None
@@ -35,3 +35,21 @@ class AbstractModelVisitor(object):
         response where the ith prediction corresponds to the ith reaction.
         EG: {<NumRxnDescriptor> "outcome" }:[(<rxn1>, 1), (<rxn2>, 2), (<rxn3>, 1), (<rxn4>, 1)]}
         """
+
+    def loadModel(self):
+        """
+        Return the trained model, loaded into memory for predictUnsaved.
+
+        Visitors which cannot make predictions in process raise NotImplementedError.
+        """
+        raise NotImplementedError('{} models cannot make predictions in process.'.format(type(self).__name__))
+
+    def predictUnsaved(self, model, values):
+        """
+        Return a dictionary of predictions for reactions which are not in the database.
+
+        model is as returned by loadModel and values holds, for each reaction, a dictionary of
+        descriptor heading to value. The dictionary returned has the response descriptor being
+        predicted as its key and a list of the predicted outcome of each reaction as its value.
+        """
+        raise NotImplementedError('{} models cannot make predictions in process.'.format(type(self).__name__))
@@ -0,0 +1,5 @@
+"""Library of scikit-learn model visitors."""
+from .visitors import SVM, KNN, NaiveBayes, DecisionTree, LogisticRegression, RandomForest
+
+tools = ("SVM", "KNN", "NaiveBayes", "DecisionTree",
+         "LogisticRegression", "RandomForest")
@@ -0,0 +1,171 @@
+"""Model visitors which train scikit-learn estimators in process."""
+from DRP.ml_models.model_visitors.abstractModelVisitor import AbstractModelVisitor
+from DRP.models.descriptors import NumericDescriptor, CategoricalDescriptor
+from DRP.models.descriptorMatrix import DescriptorMatrix, decoder, encoder
+from DRP.models.containerDataset import ContainerDataset
+from abc import abstractmethod
+import numpy as np
+import inspect
+import warnings
+import pickle
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AbstractSklearnModelVisitor(AbstractModelVisitor):
+    """
+    The abstract visitor class for training scikit-learn estimators.
+
+    Predictors and the response are read as NumPy arrays from the descriptor
+    matrix store, so no intermediate files or external processes are involved.
+    Categorical predictors are one-hot encoded over their permitted values and
+    missing values are replaced with the training mean of their column, as weka
+    does. The fitted estimator and this preprocessing are pickled together into
+    the stats model's outputFile.
+    """
+
+    maxResponseCount = 1
+    scale = False
+    """Whether to rescale predictors to [0, 1] on the training data, as weka does for kernel and distance based methods."""
+
+    def __init__(self, BCR=False, *args, **kwargs):
+        """
+        Intialise the visitor.
+
+        BCR True will mean that the visitor optimises on BCR by weighting each class by the inverse of its frequency.
+        """
+        self.BCR = BCR
+        super(AbstractSklearnModelVisitor, self).__init__(*args, **kwargs)
+
+    @abstractmethod
+    def estimator(self, regression=False):
+        """Return a new, unfitted estimator, a regressor if regression is True."""
+
+    def _descriptors(self):
+        """Return the predictors, in a stable order, and the response of the model container."""
+        descriptors = sorted(self.statsModel.container.descriptors, key=lambda d: d.pk)
+        response = list(self.statsModel.container.outcomeDescriptors)[0]
+        return descriptors, response
+
+    def _matrix(self, reactionPks, descriptors, response):
+        """Return the encoded predictor matrix and response vector for some reactions, from the container dataset if it holds them."""
+        matrix = ContainerDataset(self.statsModel.container).matrix(reactionPks, descriptors + [response])
+        if matrix is None:
+            matrix = DescriptorMatrix().matrix(reactionPks, descriptors + [response])
+        return matrix[:, :-1], matrix[:, -1]
+
+    def _encode(self, X, descriptorPks, categories):
+        """Replace each categorical column with one indicator column per permitted value."""
+        columns = []
+        for j, descriptorPk in enumerate(descriptorPks):
+            if descriptorPk in categories:
+                columns.extend((X[:, j] == pk).astype(float) for pk in categories[descriptorPk])
+            else:
+                columns.append(X[:, j])
+        return np.column_stack(columns) if columns else np.empty((X.shape[0], 0))
+
+    def _transform(self, X, model):
+        """Fill in missing values and rescale an encoded predictor matrix as recorded in model."""
+        missing = np.isnan(X)
+        X[missing] = np.take(model['fill'], np.nonzero(missing)[1])
+        if model['minimum'] is not None:
+            X = (X - model['minimum']) / model['spread']
+        return X
+
+    def classWeights(self, y):
+        """Return a weight for each instance of total_instances/class_count, as in the weka BCR cost matrix."""
+        classes, inverse = np.unique(y, return_inverse=True)
+        counts = np.bincount(inverse)
+        return (len(y) / counts.astype(float))[inverse]
+
+    def train(self, verbose=False):
+        """Fit the estimator to the training set and pickle it to the stats model's outputFile."""
+        descriptors, response = self._descriptors()
+        regression = isinstance(response, NumericDescriptor)
+        reactionPks = list(self.statsModel.trainingSet.reactions.values_list('pk', flat=True))
+        X, y = self._matrix(reactionPks, descriptors, response)
+        # as in weka, instances with a missing response are not used for training
+        known = ~np.isnan(y)
+        X, y = X[known], y[known]
+        if verbose:
+            logger.info("Training on {} reactions with {} descriptors".format(len(y), len(descriptors)))
+
+        model = {
+            'descriptors': [d.pk for d in descriptors],
+            'categories': {d.pk: sorted(d.permittedValues.values_list('pk', flat=True))
+                           for d in descriptors if isinstance(d, CategoricalDescriptor)},
+            'minimum': None,
+            'spread': None,
+        }
+        X = self._encode(X, model['descriptors'], model['categories'])
+        with warnings.catch_warnings():
+            # columns with no values at all are filled with zero
+            warnings.simplefilter('ignore', RuntimeWarning)
+            fill = np.nanmean(X, axis=0) if len(X) else np.zeros(X.shape[1])
+        fill[np.isnan(fill)] = 0
+        model['fill'] = fill
+        X = self._transform(X, model)
+        if self.scale and len(X):
+            model['minimum'] = X.min(axis=0)
+            spread = X.max(axis=0) - model['minimum']
+            spread[spread == 0] = 1
+            model['spread'] = spread
+            X = (X - model['minimum']) / model['spread']
+
+        estimator = self.estimator(regression=regression)
+        fitArgs = {}
+        if self.BCR:
+            if regression:
+                raise TypeError('Cannot train a classification algorithm to predict a numeric descriptor.')
+            weights = self.classWeights(y)
+            if 'sample_weight' in inspect.signature(estimator.fit).parameters:
+                fitArgs['sample_weight'] = weights
+            else:
+                # estimators which cannot weight instances get a weighted resample, as weka's CostSensitiveClassifier does
+                sample = np.random.RandomState(1).choice(len(y), len(y), p=weights / weights.sum())
+                X, y = X[sample], y[sample]
+        estimator.fit(X, y, **fitArgs)
+        model['estimator'] = estimator
+
+        filePath = self.statsModel.outputFile.name
+        directory = os.path.dirname(filePath)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(filePath, 'wb') as f:
+            pickle.dump(model, f, pickle.HIGHEST_PROTOCOL)
+        if verbose:
+            logger.info("Saved model to {}".format(filePath))
+
+    def loadModel(self):
+        """Unpickle the model, adding what predictUnsaved needs to encode values and decode predictions."""
+        descriptors, response = self._descriptors()
+        with open(self.statsModel.outputFile.name, 'rb') as f:
+            model = pickle.load(f)
+        if model['descriptors'] != [d.pk for d in descriptors]:
+            raise RuntimeError('The descriptors of the model container have changed since this model was trained.')
+        model['encoders'] = [(d.heading, encoder(d)) for d in descriptors]
+        model['response'] = response
+        model['decoder'] = decoder(response)
+        return model
+
+    def predict(self, reactions, verbose=False):
+        """Create the predictions for these reactions for the model."""
+        descriptors, response = self._descriptors()
+        model = self.loadModel()
+        reactions = list(reactions)
+        X = self._matrix([reaction.pk for reaction in reactions], descriptors, response)[0]
+        X = self._transform(self._encode(X, model['descriptors'], model['categories']), model)
+        predicted = model['estimator'].predict(X) if len(reactions) else []
+        convert = model['decoder']
+        return {response: tuple((reaction, convert(value)) for reaction, value in zip(reactions, predicted))}
+
+    def predictUnsaved(self, model, values):
+        """Predict from dictionaries of descriptor heading to value, using only what loadModel holds in memory."""
+        X = np.array([[encode(reactionValues.get(heading)) for heading, encode in model['encoders']]
+                      for reactionValues in values], dtype=np.float64).reshape(len(values), len(model['encoders']))
+        X = self._transform(self._encode(X, model['descriptors'], model['categories']), model)
+        predicted = model['estimator'].predict(X) if len(values) else []
+        convert = model['decoder']
+        return {model['response']: [convert(value) for value in predicted]}
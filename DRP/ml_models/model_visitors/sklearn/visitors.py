@@ -0,0 +1,91 @@
+"""Scikit-learn's model visitor library."""
+from DRP.ml_models.model_visitors.sklearn.abstractSklearnModelVisitor import AbstractSklearnModelVisitor
+from sklearn import svm, ensemble, neighbors, naive_bayes, linear_model, tree
+
+
+class DecisionTree(AbstractSklearnModelVisitor):
+    """CART decision tree, in place of weka's J48."""
+
+    def __init__(self, min_samples_leaf=2, *args, **kwargs):
+        """Additional setup specific to decision trees. The default leaf size matches J48's."""
+        super(DecisionTree, self).__init__(*args, **kwargs)
+        self.min_samples_leaf = min_samples_leaf
+
+    def estimator(self, regression=False):
+        """Return a decision tree classifier or regressor."""
+        cls = tree.DecisionTreeRegressor if regression else tree.DecisionTreeClassifier
+        return cls(min_samples_leaf=self.min_samples_leaf, random_state=1)
+
+
+class KNN(AbstractSklearnModelVisitor):
+    """K nearest neighbours classifier."""
+
+    scale = True
+
+    def __init__(self, n_neighbors=1, *args, **kwargs):
+        """Additional setup specific to nearest neighbours. The default of one neighbour matches weka's IBk."""
+        super(KNN, self).__init__(*args, **kwargs)
+        self.n_neighbors = n_neighbors
+
+    def estimator(self, regression=False):
+        """Return a nearest neighbours classifier or regressor."""
+        cls = neighbors.KNeighborsRegressor if regression else neighbors.KNeighborsClassifier
+        return cls(n_neighbors=self.n_neighbors)
+
+
+class LogisticRegression(AbstractSklearnModelVisitor):
+    """Standard regression for categorical outcomes."""
+
+    scale = True
+
+    def __init__(self, C=1.0, *args, **kwargs):
+        """Additional setup specific to logistic regression."""
+        super(LogisticRegression, self).__init__(*args, **kwargs)
+        self.C = C
+
+    def estimator(self, regression=False):
+        """Return a logistic regression classifier."""
+        if regression:
+            raise TypeError('Cannot train a classification algorithm to predict a numeric descriptor.')
+        return linear_model.LogisticRegression(C=self.C)
+
+
+class NaiveBayes(AbstractSklearnModelVisitor):
+    """Gaussian Naive Bayes predictor."""
+
+    def estimator(self, regression=False):
+        """Return a Gaussian naive Bayes classifier."""
+        if regression:
+            raise TypeError('Cannot train a classification algorithm to predict a numeric descriptor.')
+        return naive_bayes.GaussianNB()
+
+
+class RandomForest(AbstractSklearnModelVisitor):
+    """Random forest classifier."""
+
+    def __init__(self, n_estimators=10, *args, **kwargs):
+        """Additional setup specific to random forests. The default of ten trees matches weka's."""
+        super(RandomForest, self).__init__(*args, **kwargs)
+        self.n_estimators = n_estimators
+
+    def estimator(self, regression=False):
+        """Return a random forest classifier or regressor."""
+        cls = ensemble.RandomForestRegressor if regression else ensemble.RandomForestClassifier
+        return cls(n_estimators=self.n_estimators, random_state=1)
+
+
+class SVM(AbstractSklearnModelVisitor):
+    """Support vector machine with a radial basis function kernel by default."""
+
+    scale = True
+
+    def __init__(self, C=1.0, kernel='rbf', *args, **kwargs):
+        """Additional setup specific to support vector machines."""
+        super(SVM, self).__init__(*args, **kwargs)
+        self.C = C
+        self.kernel = kernel
+
+    def estimator(self, regression=False):
+        """Return a support vector classifier or regressor."""
+        cls = svm.SVR if regression else svm.SVC
+        return cls(C=self.C, kernel=self.kernel)
@@ -0,0 +1,142 @@
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStreamWriter;
+import java.io.PrintStream;
+import java.io.PrintWriter;
+import java.util.Arrays;
+import java.util.LinkedHashMap;
+import java.util.Map;
+
+import weka.classifiers.Classifier;
+import weka.classifiers.Evaluation;
+import weka.core.Instance;
+import weka.core.Instances;
+import weka.core.SerializationHelper;
+import weka.core.converters.ConverterUtils.DataSource;
+
+/**
+ * A long lived Weka process for DRP's Weka model visitors.
+ *
+ * Jobs are read from stdin one per line, as tab separated fields, and each is
+ * answered with a single line on stdout: "ok" or "error" followed by a tab and
+ * the message. Anything Weka itself prints goes to stderr.
+ *
+ *   run OUTPUT ARGS...        Run the command line classifier ARGS (the class
+ *                             name followed by its options) in process and
+ *                             write its output to OUTPUT, or discard it if
+ *                             OUTPUT is "-".
+ *   predict OUTPUT MODEL ARFF CLASS
+ *                             Predict the instances in ARFF with the serialised
+ *                             MODEL, CLASS being the 1-based class index, and
+ *                             write the predictions to OUTPUT in the layout of
+ *                             the command line "-p 0" option. Models are kept
+ *                             in memory until their file changes, the least
+ *                             recently used going first once more than
+ *                             MAX_MODELS are held.
+ *   quit                      Exit.
+ *
+ * The single optional argument is MAX_MODELS (default 16).
+ */
+public class WekaWorker {
+
+    private static class CachedModel {
+        final Classifier classifier;
+        final long modified;
+
+        CachedModel(Classifier classifier, long modified) {
+            this.classifier = classifier;
+            this.modified = modified;
+        }
+    }
+
+    private static int maxModels = 16;
+
+    /** Deserialised models by path, in access order so that the least recently used is evicted first. */
+    private static final Map<String, CachedModel> models = new LinkedHashMap<String, CachedModel>(16, 0.75f, true) {
+        @Override
+        protected boolean removeEldestEntry(Map.Entry<String, CachedModel> eldest) {
+            return size() > maxModels;
+        }
+    };
+
+    public static void main(String[] args) throws Exception {
+        if (args.length > 0) {
+            maxModels = Integer.parseInt(args[0]);
+        }
+        PrintStream protocol = new PrintStream(new FileOutputStream(java.io.FileDescriptor.out), true, "UTF-8");
+        System.setOut(System.err);
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+        String line;
+        while ((line = in.readLine()) != null) {
+            String[] fields = line.split("\t", -1);
+            if (fields[0].equals("quit")) {
+                break;
+            }
+            try {
+                if (fields[0].equals("run")) {
+                    run(fields[1], Arrays.copyOfRange(fields, 2, fields.length));
+                } else if (fields[0].equals("predict")) {
+                    predict(fields[1], fields[2], fields[3], Integer.parseInt(fields[4]));
+                } else {
+                    throw new IllegalArgumentException("Unknown job " + fields[0]);
+                }
+                protocol.println("ok");
+            } catch (Throwable e) {
+                String message = String.valueOf(e.getMessage()).replace('\n', ' ').replace('\r', ' ').replace('\t', ' ');
+                protocol.println("error\t" + e.getClass().getName() + ": " + message);
+            }
+        }
+    }
+
+    private static void run(String output, String[] args) throws Exception {
+        String result = Evaluation.evaluateModel(args[0], Arrays.copyOfRange(args, 1, args.length));
+        if (!output.equals("-")) {
+            write(output, result);
+        }
+    }
+
+    private static Classifier model(String path) throws Exception {
+        long modified = new File(path).lastModified();
+        CachedModel cached = models.get(path);
+        if (cached == null || cached.modified != modified) {
+            cached = new CachedModel((Classifier) SerializationHelper.read(path), modified);
+            models.put(path, cached);
+        }
+        return cached.classifier;
+    }
+
+    private static void predict(String output, String modelPath, String arffPath, int classIndex) throws Exception {
+        Classifier classifier = model(modelPath);
+        Instances data = new DataSource(arffPath).getDataSet();
+        data.setClassIndex(classIndex - 1);
+        StringBuilder result = new StringBuilder();
+        result.append("\n=== Predictions on test data ===\n\n");
+        result.append(" inst#     actual  predicted error prediction\n\n");
+        for (int i = 0; i < data.numInstances(); i++) {
+            Instance instance = data.instance(i);
+            double predicted = classifier.classifyInstance(instance);
+            result.append(String.format("%6d %s %s\n", i + 1, label(instance, instance.classValue(), instance.classIsMissing()),
+                                        label(instance, predicted, Double.isNaN(predicted))));
+        }
+        result.append("\n");
+        write(output, result.toString());
+    }
+
+    private static String label(Instance instance, double value, boolean missing) {
+        if (instance.classAttribute().isNominal()) {
+            return missing ? "1:?" : ((int) value + 1) + ":" + instance.classAttribute().value((int) value);
+        }
+        return missing ? "?" : Double.toString(value);
+    }
+
+    private static void write(String path, String content) throws Exception {
+        PrintWriter writer = new PrintWriter(new OutputStreamWriter(new FileOutputStream(path), "UTF-8"));
+        try {
+            writer.print(content);
+        } finally {
+            writer.close();
+        }
+    }
+}
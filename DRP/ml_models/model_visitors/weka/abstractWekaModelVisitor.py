@@ -2,11 +2,18 @@
 from django.conf import settings
 import uuid
 from DRP.models import rxnDescriptors
+from DRP.models.containerDataset import ContainerDataset
+from DRP.models.dataSets import contentHash, artifactPath, linkArtifact, touchArtifact
+from DRP.models.rxnDescriptorValues import valuesVersions
+from DRP.models.querysets import sparseAttribute
 from DRP.ml_models.model_visitors.abstractModelVisitor import AbstractModelVisitor, logger
+from DRP.ml_models.model_visitors.weka.worker import getWorker, discardWorker, WekaWorkerUnavailable
 from DRP.models.descriptors import BooleanDescriptor, NumericDescriptor, CategoricalDescriptor, OrdinalDescriptor
 from DRP.models.rxnDescriptorValues import BoolRxnDescriptorValue, OrdRxnDescriptorValue, BoolRxnDescriptorValue
 from django.core.exceptions import ImproperlyConfigured
 import subprocess
+import shlex
+import hashlib
 import os
 from abc import abstractmethod, abstractproperty
 import warnings
@@ -38,22 +45,54 @@ class AbstractWekaModelVisitor(AbstractModelVisitor):
             raise NotImplementedError(
                 'Subclasses of AbstractWekaModelVisitor must define wekaCommand')
 
+    def _writeArff(self, reactions, reactionPks, whitelistHeaders, path):
+        """Write an *.arff file of the reactions, whose sorted primary keys are given, to path."""
+        dataset = ContainerDataset(self.statsModel.container)
+        if dataset.writeArff(reactionPks, path, whitelistHeaders):
+            logger.debug("Copied rows from the container dataset")
+        else:
+            with open(path, "w") as f:
+                # most descriptor values are zero, so the sparse format is far smaller
+                reactions.toArff(f, expanded=True,
+                                 whitelistHeaders=whitelistHeaders, sparse=True)
+
     def _prepareArff(self, reactions, whitelistHeaders, verbose=False):
-        """Write an *.arff file using the provided queryset of reactions."""
+        """
+        Write an *.arff file using the provided queryset of reactions.
+
+        The file is kept as an artifact of the reactions' content hash, named for the attributes and the
+        value versions of the container's descriptors, and reused by any later export of the same data.
+        Artifacts may be evicted (see the evict_dataset_artifacts command), so callers keeping the file
+        should link it rather than holding on to the artifact's path.
+        """
         logger.debug("Preparing ARFF file...")
-        filename = "{}_{}.arff".format(self.statsModel.pk, uuid.uuid4())
-        filepath = os.path.join(settings.TMP_DIR, filename)
-        # uber paranoid making sure we don't race condition
-        while os.path.isfile(filepath):
-            filename = "{}_{}.arff".format(self.statsModel.pk, uuid.uuid4())
-            filepath = os.path.join(settings.TMP_DIR, filename)
+        # rows are in pk order, as toArff writes them
+        reactionPks = sorted(reactions.values_list('pk', flat=True))
+        descriptorPks = [d.pk for d in chain(self.statsModel.container.descriptors, self.statsModel.container.outcomeDescriptors)]
+        versions = valuesVersions(descriptorPks)
+        key = '\n'.join(sorted(whitelistHeaders) + ['{}:{}'.format(pk, versions[pk]) for pk in sorted(descriptorPks)])
+        filepath = artifactPath(contentHash(reactionPks), '{}.arff'.format(hashlib.sha1(key.encode('UTF-8')).hexdigest()))
+        if os.path.isfile(filepath):
+            if verbose:
+                logger.info("Using existing arff file {}".format(filepath))
+            touchArtifact(filepath)
+            return filepath
+
+        directory = os.path.dirname(filepath)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        # written under a unique name and then renamed, so concurrent exports never see a partial file
+        partpath = "{}.{}.part".format(filepath, uuid.uuid4())
         if verbose:
             logger.info("Writing arff to {}".format(filepath))
-        with open(filepath, "w") as f:
-            reactions.toArff(f, expanded=True,
-                             whitelistHeaders=whitelistHeaders)
+        self._writeArff(reactions, reactionPks, whitelistHeaders, partpath)
+        os.rename(partpath, filepath)
         return filepath
 
+    def _inputFilePath(self):
+        """Return the path of this stats model's own copy of its training arff, beside its model file."""
+        return '{}.arff'.format(os.path.splitext(self.statsModel.outputFile.name)[0])
+
     def _readWekaOutputFile(self, filename, typeConversionFunction):
         """Read a *.out file called `filename` and outputs an ordered list of the predicted values in that file."""
         prediction_index = 2
@@ -79,6 +118,28 @@ class AbstractWekaModelVisitor(AbstractModelVisitor):
             logger.info("Running in Shell:\n{}".format(command))
         subprocess.check_output(command, shell=True)
 
+    def _runWeka(self, args, outputPath=None, verbose=False):
+        """
+        Run weka with the argument list `args` (a class name and its options), writing its output to `outputPath` if given.
+
+        The job goes to the persistent weka worker when settings.WEKA_WORKER is set,
+        and to a new java process otherwise or if the worker is unavailable.
+        """
+        worker = getWorker(self.WEKA_VERSION)
+        if worker is not None:
+            if verbose:
+                logger.info("Running in weka worker:\n{}".format(' '.join(args)))
+            try:
+                worker.run(args, outputPath)
+                return
+            except WekaWorkerUnavailable as e:
+                logger.warning("{}; running java instead".format(e))
+                discardWorker(self.WEKA_VERSION)
+        command = "java " + ' '.join(shlex.quote(arg) for arg in args)
+        if outputPath is not None:
+            command += " 1> {}".format(shlex.quote(outputPath))
+        self._runWekaCommand(command, verbose=verbose)
+
     def BCR_cost_matrix(self, reactions, response):
         """
         Return the BCR cost matrix.
@@ -90,7 +151,8 @@ class AbstractWekaModelVisitor(AbstractModelVisitor):
         1/(number of instances of that class). To reduce floating point arithmetic errors, we first multiply by
         total number of data points, so each class is weighted by (total_instances)/(class_count)
         classes for which class_count is 0 do not matter, so their weight is 0 (to avoid division by 0)
-        For boolean classification, True is class 0 and False is class 1 (Because that's how it's set up in the toArff function)
+        For boolean classification, False is class 0 and True is class 1 (Because that's how sparse arff files declare them,
+        see querysets.sparseAttribute)
         """
         if isinstance(response, CategoricalDescriptor):
             num_classes = response.permittedValues.all().count()
@@ -108,8 +170,8 @@ class AbstractWekaModelVisitor(AbstractModelVisitor):
             num_classes = 2
             response_values = BoolRxnDescriptorValue.objects.filter(
                 reaction__in=reactions, descriptor=response)
-            class_counts = [response_values.filter(value=True).count(
-            ), response_values.filter(value=False).count()]
+            class_counts = [response_values.filter(value=False).count(
+            ), response_values.filter(value=True).count()]
         elif isinstance(response, NumericDescriptor):
             raise TypeError(
                 'Cannot train a classification algorithm to predict a numeric descriptor.')
@@ -140,8 +202,9 @@ class AbstractWekaModelVisitor(AbstractModelVisitor):
             self.statsModel.container.descriptors, self.statsModel.container.outcomeDescriptors)]
         filePath = self.statsModel.outputFile.name
         if not self.statsModel.inputFile.name:
-            self.statsModel.inputFile = self._prepareArff(
-                reactions, descriptorHeaders, verbose)
+            # the model keeps its own link to the shared artifact, which may later be evicted
+            self.statsModel.inputFile = linkArtifact(self._prepareArff(
+                reactions, descriptorHeaders, verbose), self._inputFilePath())
             self.statsModel.save(update_fields=['inputFile'])
         elif not os.path.isfile(self.statsModel.inputFile.name):
             if self.invalid:
@@ -150,8 +213,8 @@ class AbstractWekaModelVisitor(AbstractModelVisitor):
             else:
                 raise warning.warn(
                     'Could not find statsModel arff file, but model is valid, so recreating')
-                self.statsModel.inputFile.name = self._prepareArff(
-                    reactions, descriptorHeaders, verbose)
+                self.statsModel.inputFile.name = linkArtifact(self._prepareArff(
+                    reactions, descriptorHeaders, verbose), self._inputFilePath())
                 self.statsModel.save(update_fields=['inputFile'])
         elif verbose:
             logger.info("Using existing arff file.")
@@ -164,26 +227,28 @@ class AbstractWekaModelVisitor(AbstractModelVisitor):
                    if h in descriptorHeaders]
         response_index = headers.index(response.csvHeader) + 1
 
+        options = shlex.split(self.wekaTrainOptions)
         if self.BCR:
             cost_matrix_string = self.BCR_cost_matrix(reactions, response)
-            command = "java weka.classifiers.meta.CostSensitiveClassifier -cost-matrix {} -W {} -t {} -d {} -p 0 -c {} -- {}".format(
-                cost_matrix_string, self.wekaCommand, arff_file, filePath, response_index, self.wekaTrainOptions)
+            args = ['weka.classifiers.meta.CostSensitiveClassifier', '-cost-matrix'] + shlex.split(cost_matrix_string) + [
+                '-W', self.wekaCommand, '-t', arff_file, '-d', filePath, '-p', '0', '-c', str(response_index), '--'] + options
         else:
-            command = "java {} -t {} -d {} -p 0 -c {} {}".format(
-                self.wekaCommand, arff_file, filePath, response_index, self.wekaTrainOptions)
-        self._runWekaCommand(command, verbose=verbose)
+            args = [self.wekaCommand, '-t', arff_file, '-d', filePath,
+                    '-p', '0', '-c', str(response_index)] + options
+        self._runWeka(args, verbose=verbose)
 
     def predict(self, reactions, verbose=False):
         """Create the predictions for these reactions for the model."""
         descriptorHeaders = [d.csvHeader for d in chain(
             self.statsModel.container.descriptors, self.statsModel.container.outcomeDescriptors)]
 
-        arff_file = self._prepareArff(
-            reactions, descriptorHeaders, verbose=verbose)
         model_file = self.statsModel.outputFile.name
 
-        results_file = "{}_{}.out".format(self.statsModel.pk, uuid.uuid4())
-        results_path = os.path.join(settings.TMP_DIR, results_file)
+        # prediction inputs are not reused, so they are written to TMP_DIR and removed afterwards
+        stub = os.path.join(settings.TMP_DIR, "{}_{}".format(self.statsModel.pk, uuid.uuid4()))
+        arff_file = stub + '.arff'
+        results_path = stub + '.out'
+        reactionPks = sorted(reactions.values_list('pk', flat=True))
 
         # Currently, we support only one "response" variable.
         headers = [h for h in reactions.expandedCsvHeaders()
@@ -191,26 +256,105 @@ class AbstractWekaModelVisitor(AbstractModelVisitor):
         response = list(self.statsModel.container.outcomeDescriptors)[0]
         response_index = headers.index(response.csvHeader) + 1
 
-        command = "java {} -T {} -l {} -p 0 -c {} 1> {}".format(
-            self.wekaCommand, arff_file, model_file, response_index, results_path)
+        try:
+            if verbose:
+                logger.info("Writing arff to {}".format(arff_file))
+            self._writeArff(reactions, reactionPks, descriptorHeaders, arff_file)
+            self._runPrediction(model_file, arff_file, response_index, results_path, verbose=verbose)
+            predictions = self._readWekaOutputFile(results_path, conversionFunction(response))
+        finally:
+            for path in (arff_file, results_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        # the arff file, and so the predictions, are in pk order
+        results = tuple((reaction, result) for reaction, result in zip(
+            sorted(reactions, key=lambda reaction: reaction.pk), predictions))
+        return {response: results}
+
+    def _runPrediction(self, model_file, arff_file, response_index, results_path, verbose=False):
+        """Write weka's predictions for an arff file from a saved model to results_path."""
         if verbose:
             logger.info("Writing results to {}".format(results_path))
-        self._runWekaCommand(command, verbose=verbose)
+        worker = getWorker(self.WEKA_VERSION)
+        if worker is not None:
+            try:
+                # the worker keeps the deserialised model between calls
+                worker.predict(model_file, arff_file, response_index, results_path)
+                return
+            except WekaWorkerUnavailable as e:
+                logger.warning("{}; running java instead".format(e))
+                discardWorker(self.WEKA_VERSION)
+        self._runWeka([self.wekaCommand, '-T', arff_file, '-l', model_file, '-p', '0', '-c', str(response_index)],
+                      outputPath=results_path, verbose=verbose)
+
+    def loadModel(self):
+        """
+        Return what predictUnsaved needs: the model file and the attributes it was trained on.
 
-        if isinstance(response, rxnDescriptors.BoolRxnDescriptor):
-            typeConversionFunction = booleanConversion
-        elif isinstance(response, rxnDescriptors.OrdRxnDescriptor):
-            typeConversionFunction = ordConversion
-        elif isinstance(response, rxnDescriptors.NumRxnDescriptor):
-            typeConversionFunction = numConversion
-        elif isinstance(response, rxnDescriptors.CatRxnDescriptor):
-            typeConversionFunction = str
+        Weka models are run by the weka worker or java rather than in this process, so only the
+        model's path and the attribute declarations of its training arff are held.
+        """
+        descriptors = list(self.statsModel.container.descriptors)
+        response = list(self.statsModel.container.outcomeDescriptors)[0]
+        headings = {d.csvHeader: d.heading for d in descriptors}
+        arff_file = self.statsModel.inputFile.name
+        if arff_file and os.path.isfile(arff_file):
+            with open(arff_file) as f:
+                attributes = []
+                for line in f:
+                    if line.lower().startswith('@data'):
+                        break
+                    if line.lower().startswith('@attribute'):
+                        attributes.append(line.strip())
         else:
-            raise TypeError(
-                "Response descriptor is of invalid type {}".format(type(response)))
-        results = tuple((reaction, result) for reaction, result in zip(
-            reactions, self._readWekaOutputFile(results_path, typeConversionFunction)))
-        return {response: results}
+            from DRP.models import Reaction
+            # declared as in the sparse training files
+            attributes = [sparseAttribute(attribute) for attribute in Reaction.objects.none().expandedArffHeaders(
+                [d.csvHeader for d in chain(descriptors, [response])]).values()]
+        names = [attribute.split()[1] for attribute in attributes]
+        return {
+            'modelFile': self.statsModel.outputFile.name,
+            'attributes': attributes,
+            'headings': [headings.get(name) for name in names],
+            'response': response,
+            'responseIndex': names.index(response.csvHeader) + 1,
+        }
+
+    def predictUnsaved(self, model, values):
+        """Predict from dictionaries of descriptor heading to value through a temporary arff file, which is removed afterwards."""
+        if not values:
+            return {model['response']: []}
+        stub = os.path.join(settings.TMP_DIR, "unsaved_{}_{}".format(self.statsModel.pk, uuid.uuid4()))
+        arff_file = stub + '.arff'
+        results_path = stub + '.out'
+        try:
+            with open(arff_file, 'w') as f:
+                f.write('@relation unsaved\n')
+                f.write('\n'.join(model['attributes']))
+                f.write('\n\n@data\n')
+                for reactionValues in values:
+                    row = [reactionValues.get(heading) if heading is not None else None for heading in model['headings']]
+                    f.write(','.join('?' if value is None else '"{}"'.format(value) for value in row) + '\n')
+            self._runPrediction(model['modelFile'], arff_file, model['responseIndex'], results_path)
+            return {model['response']: self._readWekaOutputFile(results_path, conversionFunction(model['response']))}
+        finally:
+            for path in (arff_file, results_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def conversionFunction(response):
+    """Return the function converting weka's output for a response descriptor into a value."""
+    if isinstance(response, rxnDescriptors.BoolRxnDescriptor):
+        return booleanConversion
+    elif isinstance(response, rxnDescriptors.OrdRxnDescriptor):
+        return ordConversion
+    elif isinstance(response, rxnDescriptors.NumRxnDescriptor):
+        return numConversion
+    elif isinstance(response, rxnDescriptors.CatRxnDescriptor):
+        return str
+    raise TypeError(
+        "Response descriptor is of invalid type {}".format(type(response)))
 
 
 def numConversion(s):
@@ -0,0 +1,119 @@
+"""
+A client for a long lived Weka process, saving JVM start up on every train and predict.
+
+The worker (WekaWorker.java, alongside this module) is compiled into
+settings.TMP_DIR the first time it is needed and started once per process when
+settings.WEKA_WORKER is True. Jobs go to it over a pipe, and it keeps models it
+has deserialised in memory for later predictions, up to
+settings.WEKA_WORKER_MODEL_CACHE_SIZE of them. If it cannot be compiled or
+started, or dies, getWorker returns None and callers run java in a subprocess
+as before.
+"""
+from django.conf import settings
+import subprocess
+import atexit
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'WekaWorker.java')
+
+
+class WekaWorkerUnavailable(Exception):
+    """The worker could not be started or stopped responding."""
+
+    pass
+
+
+class WekaJobError(RuntimeError):
+    """Weka reported an error for a job."""
+
+    pass
+
+
+class WekaWorker(object):
+    """A running WekaWorker java process."""
+
+    def __init__(self, wekaVersion):
+        """Compile the worker if necessary and start it."""
+        self.wekaPath = settings.WEKA_PATH[wekaVersion]
+        classDir = os.path.join(settings.TMP_DIR, 'weka_worker', wekaVersion)
+        classFile = os.path.join(classDir, 'WekaWorker.class')
+        try:
+            if not os.path.isfile(classFile) or os.path.getmtime(classFile) < os.path.getmtime(SOURCE):
+                if not os.path.isdir(classDir):
+                    os.makedirs(classDir)
+                subprocess.check_output(['javac', '-cp', self.wekaPath, '-d', classDir, SOURCE],
+                                        stderr=subprocess.STDOUT)
+            self.process = subprocess.Popen(['java', '-cp', os.pathsep.join((classDir, self.wekaPath)), 'WekaWorker',
+                                             str(settings.WEKA_WORKER_MODEL_CACHE_SIZE)],
+                                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                            universal_newlines=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise WekaWorkerUnavailable('Could not start the weka worker: {}'.format(e))
+        self.pid = os.getpid()
+
+    def _request(self, *fields):
+        if any('\t' in field or '\n' in field for field in fields):
+            raise WekaWorkerUnavailable('Job arguments cannot be passed to the weka worker')
+        try:
+            self.process.stdin.write('\t'.join(fields) + '\n')
+            self.process.stdin.flush()
+            reply = self.process.stdout.readline()
+        except (OSError, ValueError) as e:
+            raise WekaWorkerUnavailable('Lost the weka worker: {}'.format(e))
+        if not reply:
+            raise WekaWorkerUnavailable('The weka worker exited with code {}'.format(self.process.poll()))
+        reply = reply.rstrip('\n')
+        if reply != 'ok':
+            raise WekaJobError(reply.split('\t', 1)[-1])
+
+    def run(self, args, outputPath=None):
+        """Run a weka command line (class name and options, without 'java') and write its output to outputPath if given."""
+        self._request('run', '-' if outputPath is None else outputPath, *args)
+
+    def predict(self, modelPath, arffPath, classIndex, outputPath):
+        """Write predictions for the arff file from a saved model in the layout of weka's -p 0 output."""
+        self._request('predict', outputPath, modelPath, arffPath, str(classIndex))
+
+    def close(self):
+        """Stop the worker."""
+        if self.pid == os.getpid() and self.process.poll() is None:
+            try:
+                self.process.stdin.write('quit\n')
+                self.process.stdin.close()
+                self.process.wait(timeout=10)
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+
+_workers = {}
+_failed = set()
+
+
+def getWorker(wekaVersion):
+    """Return this process's worker for a weka version, starting it if needed, or None if it is disabled or unavailable."""
+    if not settings.WEKA_WORKER or wekaVersion in _failed:
+        return None
+    worker = _workers.get(wekaVersion)
+    # a worker inherited from the parent of a forked process cannot be shared
+    if worker is None or worker.pid != os.getpid() or worker.process.poll() is not None:
+        try:
+            worker = WekaWorker(wekaVersion)
+        except WekaWorkerUnavailable as e:
+            logger.warning('{}; falling back to running java for each job'.format(e))
+            _failed.add(wekaVersion)
+            return None
+        atexit.register(worker.close)
+        _workers[wekaVersion] = worker
+        logger.info('Started weka worker for weka {}'.format(wekaVersion))
+    return worker
+
+
+def discardWorker(wekaVersion):
+    """Stop using the worker for a weka version after it has failed."""
+    worker = _workers.pop(wekaVersion, None)
+    if worker is not None:
+        worker.close()
+    _failed.add(wekaVersion)
@@ -0,0 +1,118 @@
+"""
+Prediction for reactions which have not been performed, without touching the reaction tables.
+
+ModelContainer.predict works on saved reactions: it reads their descriptor values
+from the database and stores a prediction value for every stats model. To ask
+what a container would predict for a hypothetical reaction, predictUnsaved
+instead calculates the reaction's descriptors in memory from its compound
+quantities and any manual descriptor values given, scores them against each of
+the container's stats models and returns the outcome voted for, writing nothing.
+
+Models are loaded through their visitor's loadModel and kept in a least recently
+used cache of at most settings.PREDICTION_MODEL_CACHE_SIZE entries, keyed by
+StatsModel pk and reloaded if the model file changes. Requests taking longer
+than settings.PREDICTION_LATENCY_TARGET_MS milliseconds are logged.
+
+Scikit-learn models are held in this process. Weka models are run by the
+persistent weka worker when settings.WEKA_WORKER is set, which keeps them
+deserialised between requests; otherwise each request starts java once per
+stats model, which takes seconds. The latency target is only meant to be met
+by scikit-learn containers, or weka containers with the worker enabled.
+"""
+from collections import OrderedDict
+from threading import Lock
+from time import time
+import json
+import os
+from django.conf import settings
+from DRP.models.modelContainer import visitorModules
+from DRP.models.predictionVotes import PredictionVotes
+from DRP.models.rxnDescriptors import NumRxnDescriptor
+import logging
+
+logger = logging.getLogger(__name__)
+
+_models = OrderedDict()
+_lock = Lock()
+
+
+def _loadedModel(modelVisitor):
+    """Return the loaded model of a visitor's stats model from the cache, loading it if it is absent or out of date."""
+    statsModel = modelVisitor.statsModel
+    modified = os.path.getmtime(statsModel.outputFile.name)
+    with _lock:
+        cached = _models.pop(statsModel.pk, None)
+        if cached is not None and cached[0] == modified:
+            _models[statsModel.pk] = cached
+            return cached[1]
+    model = modelVisitor.loadModel()
+    with _lock:
+        _models[statsModel.pk] = (modified, model)
+        while len(_models) > settings.PREDICTION_MODEL_CACHE_SIZE:
+            _models.popitem(last=False)
+    return model
+
+
+def clearModelCache():
+    """Forget every loaded model."""
+    with _lock:
+        _models.clear()
+
+
+def unsavedValues(container, reactions):
+    """
+    Return, for each reaction, a dictionary of descriptor heading to value for the predictors of a container.
+
+    Each reaction is a dictionary with a 'compounds' list of (compound pk, compound role pk, amount)
+    tuples and optionally a 'descriptors' dictionary of heading to value for manual descriptors such
+    as reaction_pH, which take precedence over calculated values.
+    """
+    # importing the drp plugin needs a ChemAxon install, so only do so when it is used
+    from DRP.plugins.rxndescriptors.drp import calculate_unsaved
+    whitelist = [d.heading for d in container.descriptors]
+    manual = [reaction.get('descriptors', {}) for reaction in reactions]
+    values = calculate_unsaved([reaction['compounds'] for reaction in reactions], whitelist,
+                               pHs=[reactionValues.get('reaction_pH') for reactionValues in manual])
+    for reactionValues, given in zip(values, manual):
+        reactionValues.update(given)
+    return values
+
+
+def predictUnsaved(container, reactions, latencyTarget=None, verbose=False):
+    """
+    Return the outcomes predicted by a built model container for reactions which are not in the database.
+
+    reactions are as described for unsavedValues. The result is a dictionary of response descriptor to
+    a list of the outcome predicted for each reaction, voted for by the stats models as in
+    ModelContainer.predict. latencyTarget, in milliseconds, overrides settings.PREDICTION_LATENCY_TARGET_MS.
+    Weka containers go through the weka worker, which must be enabled for low latency.
+    """
+    start = time()
+    if not container.built:
+        raise RuntimeError(
+            'A model container cannot be used to make predictions before the build method has been called')
+    if container.modelVisitorLibrary == 'weka' and not settings.WEKA_WORKER:
+        logger.debug('settings.WEKA_WORKER is not set, so container {} will start java for each stats model'.format(
+            container.pk))
+    values = unsavedValues(container, reactions)
+    reactionIndices = list(range(len(reactions)))
+    visitorOptions = json.loads(container.modelVisitorOptions)
+    votes = {}
+    for statsModel in container.statsmodel_set.all():
+        modelVisitor = getattr(visitorModules[container.modelVisitorLibrary], container.modelVisitorTool)(
+            statsModel=statsModel, **visitorOptions)
+        predictions = modelVisitor.predictUnsaved(_loadedModel(modelVisitor), values)
+        for response, outcomes in predictions.items():
+            if response not in votes:
+                votes[response] = PredictionVotes(numeric=isinstance(response, NumRxnDescriptor))
+            votes[response].add(reactionIndices, outcomes)
+    result = {response: responseVotes.winners() for response, responseVotes in votes.items()}
+
+    elapsed = (time() - start) * 1000
+    target = settings.PREDICTION_LATENCY_TARGET_MS if latencyTarget is None else latencyTarget
+    if elapsed > target:
+        logger.warning('Predicting {} reactions with container {} took {:.0f}ms, over the target of {}ms'.format(
+            len(reactions), container.pk, elapsed, target))
+    elif verbose:
+        logger.info('Predicted {} reactions with container {} in {:.0f}ms'.format(len(reactions), container.pk, elapsed))
+    return result
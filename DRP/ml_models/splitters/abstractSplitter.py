@@ -22,9 +22,23 @@ class AbstractSplitter(object):
                 'You are only using {} reactions. This may cause problems (e.g. Weka SVMs require at least 10 data points in the training set)'.format(data.count()))
 
     def package(self, data):
-        """Save the splits as datasets in the database."""
+        """
+        Save the splits as datasets in the database.
+
+        A split with the same reactions as an existing data set is that data set, under its existing name,
+        so the names of the returned sets need not follow the naming stub; several splits, such as the empty
+        test sets of the noSplitter, may even be one set.
+        """
         dataSet = DRP.models.DataSet.create('{}_{}'.format(
             self.namingStub, self.namingCounter), data)
         self.namingCounter += 1
 
         return dataSet
+
+    def packagePks(self, reactionPks):
+        """Save a split given as reaction primary keys as a dataset in the database, reusing existing sets as for package."""
+        dataSet = DRP.models.DataSet.createFromPks('{}_{}'.format(
+            self.namingStub, self.namingCounter), reactionPks)
+        self.namingCounter += 1
+
+        return dataSet
@@ -1,8 +1,8 @@
 """A splitter to create training and test sets dependent upon apparently disctinct chemistry."""
 from .abstractSplitter import AbstractSplitter
-from DRP.models.compound import Compound
-from DRP.models import CatRxnDescriptor
-from django.db.models import Count
+from DRP.models.reactionSpaceHash import updateSpaceHashes
+from django.db import transaction
+from collections import defaultdict
 import random
 import logging
 logger = logging.getLogger(__name__)
@@ -12,7 +12,7 @@ class Splitter(AbstractSplitter):
     """
     The splitter class.
 
-    This uses the reaction hash descriptor calculated from the reactant names to determine
+    This uses the reaction space hash of the reactants (see DRP.models.reactionSpaceHash) to determine
     whether or not reactions have distinct chemistry.
     """
 
@@ -26,12 +26,13 @@ class Splitter(AbstractSplitter):
     def split(self, reactions, verbose=False):
         """Actually perform the split."""
         super(Splitter, self).split(reactions, verbose=verbose)
-        key_counts = self._count_compound_sets(reactions).items()
+        compound_sets = self._compound_sets(reactions)
+        key_counts = [(key, len(pks)) for key, pks in compound_sets.items()]
         splits = [self._single_split(
-            reactions, key_counts, verbose=verbose) for i in xrange(self.num_splits)]
+            compound_sets, key_counts, verbose=verbose) for i in range(self.num_splits)]
         return splits
 
-    def _single_split(self, reactions, key_counts, verbose=False):
+    def _single_split(self, compound_sets, key_counts, verbose=False):
         random.shuffle(key_counts)
 
         total_size = sum(count for key, count in key_counts)
@@ -40,13 +41,13 @@ class Splitter(AbstractSplitter):
         test_size = 0
 
         # Determine which partitions should be tested.
-        test_keys = []
+        test_keys = set()
         for key, count in key_counts:
             if (abs(test_size + count - goal_size) < abs(test_size - goal_size)) and (test_size + count < goal_size + margin):
                 # Adding the next set gets us closer to the goal size without
                 # going over the error margin. Do it
                 test_size += count
-                test_keys.append(key)
+                test_keys.add(key)
             elif abs(test_size - goal_size) < margin:
                 # We shouldn't add the next set and we're within the error
                 # margin. We're done
@@ -57,24 +58,28 @@ class Splitter(AbstractSplitter):
             raise RuntimeError(
                 'Failed to make a split under the given parameters.')
 
-        rxnhash_descriptor = CatRxnDescriptor.objects.get(
-            heading='rxnSpaceHash1')
-        rxn_hashes = reactions.filter(
-            catrxndescriptorvalue__descriptor=rxnhash_descriptor)
-        test = rxn_hashes.filter(catrxndescriptorvalue__value__in=test_keys)
-        train = rxn_hashes.exclude(catrxndescriptorvalue__value__in=test_keys)
+        test = [pk for key in test_keys for pk in compound_sets[key]]
+        train = [pk for key, pks in compound_sets.items() if key not in test_keys for pk in pks]
 
         if verbose:
             logger.info("Split into train ({}), test ({})".format(
-                train.count(), test.count()))
+                len(train), len(test)))
 
-        return (self.package(train), self.package(test))
+        with transaction.atomic():
+            return (self.packagePks(train), self.packagePks(test))
 
-    def _count_compound_sets(self, reactions):
-        rxnhash_descriptor = CatRxnDescriptor.objects.get(
-            heading='rxnSpaceHash1')
-        rxn_hashes = reactions.filter(
-            catrxndescriptorvalue__descriptor=rxnhash_descriptor)
-        counts = {rxnhash_val: rxn_hashes.filter(catrxndescriptorvalue__value=rxnhash_val).count(
-        ) for rxnhash_val in rxn_hashes.values_list('catrxndescriptorvalue__value', flat=True).distinct()}
-        return counts
+    def _compound_sets(self, reactions):
+        """
+        Return a dictionary of reaction hash value to the primary keys of the reactions having it.
+
+        Hashes missing for any of the reactions, such as those of reactions imported in bulk, are
+        calculated and stored first, so no reaction is left out of the split.
+        """
+        missing = list(reactions.filter(spaceHash__isnull=True).values_list('pk', flat=True))
+        if missing:
+            logger.info('Calculating missing reaction space hashes for {} reactions'.format(len(missing)))
+            updateSpaceHashes(missing)
+        compound_sets = defaultdict(list)
+        for pk, space_hash in reactions.values_list('pk', 'spaceHash__value').order_by('pk'):
+            compound_sets[space_hash].append(pk)
+        return compound_sets
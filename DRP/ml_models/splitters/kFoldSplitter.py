@@ -1,5 +1,6 @@
 """Contains a class for performing k-fold validation splits."""
 import random
+from django.db import transaction
 from .abstractSplitter import AbstractSplitter
 import logging
 logger = logging.getLogger(__name__)
@@ -17,19 +18,20 @@ class Splitter(AbstractSplitter):
         """Perform the split."""
         super(Splitter, self).split(reactions, verbose=verbose)
         # Split the reactions' IDs into K randomly-organized buckets.
-        rxn_ids = [reaction.id for reaction in reactions]
+        rxn_ids = list(reactions.values_list('id', flat=True))
         random.shuffle(rxn_ids)
         buckets = [rxn_ids[i::self.k] for i in range(self.k)]
 
         if verbose:
             logger.info("Split into {} buckets with sizes: {}".format(
-                len(buckets), map(len, buckets)))
+                len(buckets), [len(b) for b in buckets]))
 
+        # the folds are written straight into data set relations; later
+        # queries join against those rather than filtering on id lists
         splits = []
-        for i in range(self.k):
-            train = reactions.filter(id__in=[item for b in buckets[:i] + buckets[i + 1:]
-                                             for item in b])
-            test = reactions.filter(id__in=buckets[i])
-            splits.append((self.package(train), self.package(test)))
+        with transaction.atomic():
+            for i in range(self.k):
+                train = [item for b in buckets[:i] + buckets[i + 1:] for item in b]
+                splits.append((self.packagePks(train), self.packagePks(buckets[i])))
 
         return splits
@@ -1,4 +1,5 @@
 """Contains a class for splitting reactions into datasets purely at pseudorandom."""
+from django.db import transaction
 from .abstractSplitter import AbstractSplitter
 import random
 import logging
@@ -19,22 +20,21 @@ class Splitter(AbstractSplitter):
         """Actually perform the split."""
         super(Splitter, self).split(reactions, verbose=verbose)
         splits = [self._single_split(reactions, verbose)
-                  for i in xrange(self.num_splits)]
+                  for i in range(self.num_splits)]
         return splits
 
     def _single_split(self, reactions, verbose=False):
-        num_rxns = reactions.count()
-        test_size = int(self.test_percent * num_rxns)
-
         # Split the reactions' IDs into two randomly-organized buckets.
-        rxn_ids = [reaction.id for reaction in reactions]
+        rxn_ids = list(reactions.values_list('id', flat=True))
         random.shuffle(rxn_ids)
+        test_size = int(self.test_percent * len(rxn_ids))
 
-        test = reactions.filter(id__in=rxn_ids[:test_size])
-        train = reactions.filter(id__in=rxn_ids[test_size:])
+        test = rxn_ids[:test_size]
+        train = rxn_ids[test_size:]
 
         if verbose:
             logger.info("Split into train ({}), test ({})".format(
-                train.count(), test.count()))
+                len(train), len(test)))
 
-        return (self.package(train), self.package(test))
+        with transaction.atomic():
+            return (self.packagePks(train), self.packagePks(test))
@@ -18,6 +18,11 @@ from .reaction import Reaction
 from .performedReaction import PerformedReaction
 from .compound import Compound, CompoundGuideEntry
 from .compoundQuantity import CompoundQuantity
+from .pendingRxnCalculation import PendingRxnCalculation
+from .pendingMolCalculation import PendingMolCalculation
+from .reactionSpaceHash import ReactionSpaceHash
+from .descriptorRegistry import DescriptorSync
+from .rxnDescriptorValuesVersion import RxnDescriptorValuesVersion
 from .recommendedReaction import RecommendedReaction
 from .statsModel import StatsModel
 from .chemicalClass import ChemicalClass
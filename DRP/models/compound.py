@@ -7,6 +7,8 @@ from .molDescriptorValues import BoolMolDescriptorValue, NumMolDescriptorValue
 from .molDescriptorValues import CatMolDescriptorValue, OrdMolDescriptorValue
 from .chemicalClass import ChemicalClass
 from .labGroup import LabGroup
+from .pendingRxnCalculation import compoundsChanged
+from .pendingMolCalculation import markCompounds
 import csv
 from .querysets import CsvQuerySet, ArffQuerySet
 from chemspipy import ChemSpider
@@ -149,7 +151,11 @@ class CompoundQuerySet(CsvQuerySet, ArffQuerySet):
             compounds = compounds.prefetch_related(
                 'nummoldescriptorvalue_set__descriptor')
             compounds = compounds.prefetch_related('chemicalClasses')
-            for item in compounds:
+            # prefetching a chunk at a time keeps memory use flat for large sets
+            pks = list(self.order_by('pk').values_list('pk', flat=True))
+            items = (item for i in range(0, len(pks), 1000)
+                     for item in compounds.filter(pk__in=pks[i:i + 1000]).order_by('pk'))
+            for item in items:
                 row = {field.name: getattr(item, field.name)
                        for field in self.model._meta.fields}
                 row.update(
@@ -224,10 +230,35 @@ class Compound(models.Model):
     objects = CompoundManager()
     calcDescriptors = True
 
+    structureFields = ('smiles', 'INCHI', 'formula')
+    """The fields descriptors are calculated from; saving a change to any other field needs no recalculation."""
+
     def __init__(self, *args, **kwargs):
         """Instantiate an object."""
         super(Compound, self).__init__(*args, **kwargs)
         self.lazyChemicalClasses = []
+        self._structure = self._loadedStructure()
+
+    def _loadedStructure(self):
+        """Return the structure fields as loaded, with None for any deferred, which therefore count as changed."""
+        return tuple(self.__dict__.get(Compound._meta.get_field(name).attname) for name in self.structureFields)
+
+    def structureChanged(self):
+        """Whether the compound is new or its structure differs from when it was loaded or last saved."""
+        return self.pk is None or self._structure != tuple(getattr(self, name) for name in self.structureFields)
+
+    def save(self, *args, **kwargs):
+        """Save the compound, queueing it and any reactions already using it for recalculation if its structure changed."""
+        existed = self.pk is not None
+        changed = self.structureChanged()
+        if changed:
+            self.dirty = True
+        super(Compound, self).save(*args, **kwargs)
+        if changed:
+            markCompounds([self.pk])
+            if existed:
+                compoundsChanged([self.pk], structure=True)
+        self._structure = self._loadedStructure()
 
     def __str__(self):
         """Unicode representation of a compound is it's name and abbreviation."""
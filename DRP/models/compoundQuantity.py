@@ -7,6 +7,8 @@ from .compoundRole import CompoundRole
 from .reaction import Reaction
 from .performedReaction import PerformedReaction
 from .validators import GreaterThanValidator
+from .pendingRxnCalculation import quantitiesChanged
+from .reactionSpaceHash import updateSpaceHashes
 
 
 class CompoundQuantityQuerySet(models.query.QuerySet):
@@ -15,13 +17,16 @@ class CompoundQuantityQuerySet(models.query.QuerySet):
     def delete(self):
         """Force the re-save of reactions pertinent to these compound quantities on deletion."""
         reactions = Reaction.objects.filter(compoundquantity_set__in=self)
+        reactionPks = list(reactions.values_list('pk', flat=True))
         for reaction in reactions:
             reaction.save()  # recalculate descriptors
             try:
                 reaction.performedreaction.save()
             except PerformedReaction.DoesNotExist:
                 pass  # we don't care about this outcome
-        super(CompdoundQuantityQuerySet, self).delete()
+        super(CompoundQuantityQuerySet, self).delete()
+        updateSpaceHashes(reactionPks)
+        quantitiesChanged(reactionPks)
 
 
 class CompoundQuantityManager(models.Manager):
@@ -55,7 +60,9 @@ class CompoundQuantity(models.Model):
         self.amount = (self.amount_grams / self.compound.getMolecularWeight()) * 1000
         """Re-save associated reactions dependent upon this quantity as this will cause descriptor values to change."""
         super(CompoundQuantity, self).save(*args, **kwargs)
-        
+        updateSpaceHashes([self.reaction_id])
+        quantitiesChanged([self.reaction_id])
+
         try:
             self.reaction.performedreaction.save(invalidate_models=True)  # invalidate models
         except PerformedReaction.DoesNotExist:
@@ -64,11 +71,15 @@ class CompoundQuantity(models.Model):
 
     def delete(self):
         """Re-save associated reactions dependent upon this quantity as this will cause descriptor values to change."""
+        reactionPk = self.reaction_id
+        reaction = self.reaction
+        super(CompoundQuantity, self).delete()
+        updateSpaceHashes([reactionPk])
+        quantitiesChanged([reactionPk])
         try:
-            self.reaction.performedreaction.save()  # invalidate models
+            reaction.performedreaction.save()  # invalidate models
         except PerformedReaction.DoesNotExist:
-            self.reaction.save()  # descriptor recalculation
-        super(CompoundQuantity, self).save()
+            reaction.save()  # descriptor recalculation
 
     def __str__(self):
         """Return the compound, amount and reaction as a unicode representation."""
@@ -0,0 +1,139 @@
+"""
+The full reaction by descriptor dataset of a model container, materialised once and shared by its stats models.
+
+Every stats model of a container draws its training and test sets from the same
+reactions and descriptors, so rather than pivoting the descriptor values out of
+the database again for every fold, ModelContainer.build writes them once to
+settings.TMP_DIR: as a sparse ARFF file together with the byte offset of each
+of its data lines, and as a matrix of encoded values (see descriptorMatrix).
+The inputs for a fold are then assembled by selecting rows, slicing lines out of
+the ARFF file or indexing the memory-mapped matrix. The files are removed once
+the build is finished.
+"""
+import os
+import mmap
+import numpy as np
+from itertools import chain
+from django.conf import settings
+from django.db.models import Q
+from .descriptorMatrix import DescriptorMatrix
+import DRP
+import logging
+
+logger = logging.getLogger(__name__)
+
+DATA_SECTION = '\n\n@data\n'
+"""The chunk of arffLines output after which each chunk is one data line."""
+
+
+class ContainerDataset(object):
+    """The shared dataset files of one model container."""
+
+    def __init__(self, container):
+        """Locate the files for a container; they may not have been written yet."""
+        self.container = container
+        base = os.path.join(settings.TMP_DIR, 'container_{}_dataset'.format(container.pk))
+        self.arffPath = base + '.arff'
+        self.matrixPath = base + '_matrix.npy'
+        self.indexPath = base + '_index.npz'
+        self._index = None
+
+    def whitelist(self):
+        """Return the csvHeaders of the container's predictors and responses, the attributes of the ARFF file."""
+        return [d.csvHeader for d in chain(self.container.descriptors, self.container.outcomeDescriptors)]
+
+    def reactions(self):
+        """Return the reactions in any training or test set of the container, ordered by pk."""
+        dataSets = DRP.models.DataSet.objects.filter(
+            Q(trainingSetFor__container=self.container) | Q(testSetsFor__container=self.container))
+        return DRP.models.PerformedReaction.objects.filter(
+            datasetrelation__dataSet__in=dataSets).distinct().order_by('pk')
+
+    def exists(self):
+        """Whether the dataset has been materialised."""
+        return os.path.isfile(self.indexPath)
+
+    def materialize(self, verbose=False):
+        """Write the ARFF file, matrix and row index for every reaction of the container."""
+        reactions = self.reactions()
+        pks = np.array(list(reactions.values_list('pk', flat=True)), dtype=np.int64)
+        if pks.size == 0:
+            return
+        whitelist = self.whitelist()
+        if verbose:
+            logger.info("Materialising dataset of {} reactions for container {}".format(pks.size, self.container.pk))
+        # the data lines are in pk order, as rows() iterates by pk
+        offsets = []
+        inData = False
+        with open(self.arffPath, 'wb') as f:
+            for chunk in reactions.arffLines(expanded=True, whitelistHeaders=whitelist, sparse=True):
+                if inData:
+                    offsets.append(f.tell())
+                f.write(chunk.encode('UTF-8'))
+                inData = inData or chunk == DATA_SECTION
+            offsets.append(f.tell())
+        if len(offsets) != pks.size + 1:
+            raise RuntimeError('Wrote {} data lines for {} reactions'.format(len(offsets) - 1, pks.size))
+
+        descriptors = sorted(self.container.descriptors, key=lambda d: d.pk) + list(self.container.outcomeDescriptors)
+        np.save(self.matrixPath, DescriptorMatrix().matrix(pks, descriptors))
+        # the index is written last, as its presence marks the dataset as usable
+        np.savez(self.indexPath, pks=pks, offsets=np.array(offsets, dtype=np.int64),
+                 columns=np.array([d.pk for d in descriptors], dtype=np.int64), whitelist=np.array(sorted(whitelist)))
+        self._index = None
+
+    def _load(self):
+        if self._index is None:
+            with np.load(self.indexPath) as data:
+                self._index = {key: data[key] for key in ('pks', 'offsets', 'columns', 'whitelist')}
+        return self._index
+
+    def rowsFor(self, reactionPks):
+        """Return the rows of these reactions, in the order given, or None if any is not in the dataset."""
+        if not self.exists():
+            return None
+        pks = self._load()['pks']
+        reactionPks = np.asarray(reactionPks, dtype=np.int64)
+        rows = np.searchsorted(pks, reactionPks)
+        rows[rows == pks.size] = 0
+        if not (pks[rows] == reactionPks).all():
+            return None
+        return rows
+
+    def writeArff(self, reactionPks, path, whitelistHeaders):
+        """
+        Write an ARFF file of these reactions, in the order given, by copying their lines from the shared file.
+
+        Return False, writing nothing, if the dataset does not hold all of the reactions with these attributes.
+        """
+        rows = self.rowsFor(reactionPks)
+        if rows is None or list(self._load()['whitelist']) != sorted(whitelistHeaders):
+            return False
+        offsets = self._load()['offsets']
+        with open(self.arffPath, 'rb') as source, open(path, 'wb') as f:
+            data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                f.write(data[:offsets[0]])
+                for row in rows:
+                    f.write(data[offsets[row]:offsets[row + 1]])
+            finally:
+                data.close()
+        return True
+
+    def matrix(self, reactionPks, descriptors):
+        """Return the encoded values of these reactions and descriptors, or None if the dataset does not hold them all."""
+        rows = self.rowsFor(reactionPks)
+        if rows is None:
+            return None
+        columnIndex = {pk: j for j, pk in enumerate(self._load()['columns'])}
+        if any(d.pk not in columnIndex for d in descriptors):
+            return None
+        columns = [columnIndex[d.pk] for d in descriptors]
+        return np.array(np.load(self.matrixPath, mmap_mode='r')[np.ix_(rows, columns)])
+
+    def remove(self):
+        """Delete the dataset files."""
+        for path in (self.indexPath, self.matrixPath, self.arffPath):
+            if os.path.exists(path):
+                os.remove(path)
+        self._index = None
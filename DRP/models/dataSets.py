@@ -7,8 +7,104 @@ an erroneous proxy for a many-to-many relationship between Reactions and Models,
 This allows the datasets to exist independently of the models.
 """
 
-from django.db import models
+from django.db import models, transaction
+from django.conf import settings
 from .performedReaction import PerformedReaction
+import hashlib
+import shutil
+import time
+import os
+
+BULK_BATCH_SIZE = 5000
+"""Maximum number of data set relations inserted by a single query."""
+
+
+def contentHash(reactionPks):
+    """Return the hash identifying a set of reactions by their primary keys, whatever their order."""
+    content = ','.join(str(pk) for pk in sorted(set(reactionPks)))
+    return hashlib.sha1(content.encode('UTF-8')).hexdigest()
+
+
+def artifactPath(reactionsHash, name):
+    """
+    Return the path for a file derived from the set of reactions with this content hash, such as an ARFF export.
+
+    The name should identify everything else the file depends on. Files live in
+    settings.DATASET_ARTIFACT_DIR and are shared by every data set with the same reactions.
+    """
+    return os.path.join(settings.DATASET_ARTIFACT_DIR, reactionsHash, name)
+
+
+def touchArtifact(path):
+    """Mark an artifact as used now, so that evictArtifacts keeps it longest."""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def linkArtifact(path, linkPath):
+    """
+    Give linkPath the content of the artifact at path and return linkPath.
+
+    A hard link is used where possible, so the copy costs nothing and survives the artifact being evicted;
+    the file is copied otherwise, such as when the two paths are on different file systems.
+    """
+    directory = os.path.dirname(linkPath)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    if os.path.lexists(linkPath):
+        os.remove(linkPath)
+    try:
+        os.link(path, linkPath)
+    except OSError:
+        shutil.copyfile(path, linkPath)
+    return linkPath
+
+
+def evictArtifacts(maxBytes=None, maxAge=None, partAge=86400):
+    """
+    Delete data set artifacts, least recently used first, and return the number of bytes freed.
+
+    Artifacts unused for more than maxAge seconds are deleted, and then more until those left take up no more
+    than maxBytes; either limit may be None. Partly written files older than partAge seconds, left by processes
+    which died, are deleted too. Anything still needing an artifact holds its own link to it (see linkArtifact)
+    or writes it again.
+    """
+    now = time.time()
+    artifacts = []
+    freed = 0
+    for directory, dirnames, filenames in os.walk(settings.DATASET_ARTIFACT_DIR):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if filename.endswith('.part'):
+                if now - stat.st_mtime > partAge:
+                    freed += _remove(path, stat.st_size)
+            else:
+                artifacts.append((stat.st_mtime, stat.st_size, path))
+    artifacts.sort()
+    total = sum(size for mtime, size, path in artifacts)
+    for mtime, size, path in artifacts:
+        if (maxAge is not None and now - mtime > maxAge) or (maxBytes is not None and total > maxBytes):
+            freed += _remove(path, size)
+            total -= size
+    for directory, dirnames, filenames in os.walk(settings.DATASET_ARTIFACT_DIR, topdown=False):
+        if directory != settings.DATASET_ARTIFACT_DIR and not os.listdir(directory):
+            os.rmdir(directory)
+    return freed
+
+
+def _remove(path, size):
+    """Delete a file, returning its size, or 0 if another process removed it first."""
+    try:
+        os.remove(path)
+        return size
+    except OSError:
+        return 0
 
 
 class DataSet(models.Model):
@@ -20,18 +116,40 @@ class DataSet(models.Model):
     name = models.CharField(max_length=200, unique=True)
     reactions = models.ManyToManyField(
         PerformedReaction, through="DataSetRelation")
+    contentHash = models.CharField(max_length=40, blank=True, default='', db_index=True)
+    """The contentHash of the primary keys of the reactions, identifying identical sets."""
 
     @classmethod
     def create(cls, name, data):
-        """Bulk create a set of datasetrelations."""
-        dataSet = cls(name=name)
-        dataSet.save()
-        dsrs = [DataSetRelation(dataSet=dataSet, reaction=datum)
-                for datum in data]
-        DataSetRelation.objects.bulk_create(dsrs)
+        """
+        Bulk create a set of datasetrelations.
+
+        If a data set with exactly these reactions exists already it is returned instead, under its own name,
+        and name is not used: callers must use the returned set's name rather than the one they asked for.
+        """
+        return cls.createFromPks(name, [datum.pk for datum in data])
+
+    @classmethod
+    def createFromPks(cls, name, reactionPks):
+        """Bulk create a set of datasetrelations from reaction primary keys, without loading the reactions, as for create."""
+        reactionPks = sorted(set(reactionPks))
+        reactionsHash = contentHash(reactionPks)
+        with transaction.atomic():
+            existing = cls.objects.filter(contentHash=reactionsHash).order_by('pk').first()
+            if existing is not None:
+                return existing
+            dataSet = cls(name=name, contentHash=reactionsHash)
+            dataSet.save()
+            dsrs = [DataSetRelation(dataSet=dataSet, reaction_id=pk)
+                    for pk in reactionPks]
+            DataSetRelation.objects.bulk_create(dsrs, batch_size=BULK_BATCH_SIZE)
 
         return dataSet
 
+    def artifactPath(self, name):
+        """Return the path for a file derived from this data set's reactions; see the module function artifactPath."""
+        return artifactPath(self.contentHash or contentHash(self.reactions.values_list('pk', flat=True)), name)
+
 
 class DataSetRelation(models.Model):
     """Defines the relationships between a data set and a reaction."""
@@ -0,0 +1,211 @@
+"""
+A column-oriented, on-disk store of reaction descriptor values.
+
+Each reaction descriptor is held as its own column: a sorted array of reaction
+primary keys and a parallel float64 array of encoded values, saved together as
+one .npz file in settings.DESCRIPTOR_MATRIX_DIR. Booleans are stored as 0/1,
+ordinals as their integer value and categoricals as the primary key of the
+permitted value; missing values are NaN.
+
+Each file also records the state of the descriptor's values it was built from
+(see rxnDescriptorValuesVersion): their latest write stamp, and the stamp up to
+which every write was known to be held. When the latest stamp is unchanged and
+every write up to it was known to be held the file is used as is; otherwise only
+the rows stamped after the settled stamp are re-read. A column is rebuilt from
+scratch when its file is missing, was written by an older format version,
+belongs to another version sequence or predates a delete.
+"""
+import os
+import uuid
+import numpy as np
+from django.conf import settings
+from .descriptors import BooleanDescriptor, CategoricalDescriptor, OrdinalDescriptor, NumericDescriptor
+from .rxnDescriptorValuesVersion import versionStates, settledStamp
+import DRP
+import logging
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+"""Bump this whenever the encoding of a column changes, forcing a rebuild."""
+
+IN_CHUNK = 1000
+"""Maximum number of primary keys placed in a single IN clause."""
+
+
+def _valueModel(descriptor):
+    """Return the reaction descriptor value class for a descriptor."""
+    if isinstance(descriptor, CategoricalDescriptor):
+        return DRP.models.CatRxnDescriptorValue
+    elif isinstance(descriptor, BooleanDescriptor):
+        return DRP.models.BoolRxnDescriptorValue
+    elif isinstance(descriptor, OrdinalDescriptor):
+        return DRP.models.OrdRxnDescriptorValue
+    elif isinstance(descriptor, NumericDescriptor):
+        return DRP.models.NumRxnDescriptorValue
+    raise TypeError('{} is not a reaction descriptor'.format(descriptor))
+
+
+def decoder(descriptor):
+    """Return a function turning an encoded (non-NaN) value back into the value output by toCsv and toArff."""
+    if isinstance(descriptor, CategoricalDescriptor):
+        permitted = dict(DRP.models.CategoricalDescriptorPermittedValue.objects.filter(
+            descriptor_id=descriptor.pk).values_list('pk', 'value'))
+        return lambda v: permitted[int(v)]
+    elif isinstance(descriptor, BooleanDescriptor):
+        return lambda v: bool(v)
+    elif isinstance(descriptor, OrdinalDescriptor):
+        return lambda v: int(v)
+    else:
+        return float
+
+
+def encoder(descriptor):
+    """Return a function turning a value, as output by toCsv or given by a user, into its encoding, None being NaN."""
+    if isinstance(descriptor, CategoricalDescriptor):
+        permitted = dict(DRP.models.CategoricalDescriptorPermittedValue.objects.filter(
+            descriptor_id=descriptor.pk).values_list('value', 'pk'))
+        return lambda v: np.nan if v is None else float(permitted[v])
+    elif isinstance(descriptor, BooleanDescriptor):
+        return lambda v: np.nan if v is None else float(bool(v))
+    else:
+        return lambda v: np.nan if v is None else float(v)
+
+
+def align(column, reactionPks):
+    """Return the values of a (pks, values) column for the given reaction pks, with NaN where absent."""
+    pks, values = column
+    result = np.full(reactionPks.size, np.nan)
+    if pks.size == 0 or reactionPks.size == 0:
+        return result
+    idx = np.searchsorted(pks, reactionPks)
+    idx[idx == pks.size] = 0
+    found = pks[idx] == reactionPks
+    result[found] = values[idx[found]]
+    return result
+
+
+def fetchMatrix(reactionPks, descriptors):
+    """
+    Read encoded values for some reactions and descriptors straight from the value tables.
+
+    Values are fetched as (reaction, descriptor, value) tuples with one values_list query per value
+    table and chunk of IN_CHUNK reactions, in reaction pk order, and scattered into a float array of
+    shape (reactions, descriptors) with NaN where missing.
+    """
+    reactionPks = np.asarray(reactionPks, dtype=np.int64)
+    result = np.full((reactionPks.size, len(descriptors)), np.nan)
+    if reactionPks.size == 0 or len(descriptors) == 0:
+        return result
+    order = np.argsort(reactionPks, kind='mergesort')
+    sortedPks = reactionPks[order]
+    byModel = {}
+    for j, descriptor in enumerate(descriptors):
+        byModel.setdefault(_valueModel(descriptor), {})[descriptor.pk] = j
+    for valueModel, columnIndex in byModel.items():
+        qs = valueModel.objects.order_by('reaction_id').values_list('reaction_id', 'descriptor_id', 'value')
+        if len(columnIndex) <= IN_CHUNK:
+            qs = qs.filter(descriptor_id__in=list(columnIndex))
+        for start in range(0, sortedPks.size, IN_CHUNK):
+            chunk = sortedPks[start:start + IN_CHUNK]
+            rows = [row for row in qs.filter(reaction_id__in=[int(pk) for pk in chunk])
+                    if row[1] in columnIndex and row[2] is not None]
+            if not rows:
+                continue
+            rowPks = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            columns = np.fromiter((columnIndex[row[1]] for row in rows), dtype=np.int64, count=len(rows))
+            values = np.fromiter((float(row[2]) for row in rows), dtype=np.float64, count=len(rows))
+            result[order[start + np.searchsorted(chunk, rowPks)], columns] = values
+    return result
+
+
+class DescriptorMatrix(object):
+    """Read and maintain the per-descriptor column files."""
+
+    def __init__(self, directory=None):
+        """Use the configured directory unless another is given."""
+        self.directory = settings.DESCRIPTOR_MATRIX_DIR if directory is None else directory
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def _path(self, descriptorPk):
+        return os.path.join(self.directory, '{}.npz'.format(descriptorPk))
+
+    def _fetch(self, descriptor, since=None):
+        """Read encoded values for a descriptor from the database, optionally only those stamped after since."""
+        qs = _valueModel(descriptor).objects.filter(descriptor_id=descriptor.pk)
+        if since is not None:
+            qs = qs.filter(version__gt=since)
+        rows = list(qs.values_list('reaction_id', 'value'))
+        pks = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        values = np.fromiter((np.nan if r[1] is None else float(r[1]) for r in rows), dtype=np.float64, count=len(rows))
+        order = np.argsort(pks, kind='mergesort')
+        return pks[order], values[order]
+
+    def _save(self, descriptorPk, pks, values, token, floor, latest, settled):
+        """Atomically replace the column file."""
+        tmp = os.path.join(self.directory, '{}.{}.tmp.npz'.format(descriptorPk, uuid.uuid4()))
+        np.savez(tmp, pks=pks, values=values, version=np.array(FORMAT_VERSION), token=np.array(token),
+                 floor=np.array(floor, dtype=np.int64), latest=np.array(latest, dtype=np.int64),
+                 settled=np.array(settled, dtype=np.int64))
+        os.replace(tmp, self._path(descriptorPk))
+
+    def _load(self, descriptorPk):
+        """Return the stored (pks, values, token, floor, latest, settled) or None if there is no usable file."""
+        try:
+            with np.load(self._path(descriptorPk)) as data:
+                if int(data['version']) != FORMAT_VERSION:
+                    return None
+                return (data['pks'], data['values'], str(data['token']), int(data['floor']),
+                        int(data['latest']), int(data['settled']))
+        except (IOError, OSError, KeyError, ValueError):
+            return None
+
+    def refresh(self, descriptor, state, settled, stored=None):
+        """
+        Bring a descriptor's column up to the (token, floor, latest) state read from the database, and store it.
+
+        The state must have been read after taking the settled stamp and before reading any values. Only
+        the values stamped after a stored column had settled are re-read when it can be brought up to date.
+        """
+        token, floor, latest = state
+        if stored is None or stored[2] != token or stored[3] != floor:
+            logger.debug('Rebuilding descriptor column for %s', descriptor)
+            pks, values = self._fetch(descriptor)
+        else:
+            newPks, newValues = self._fetch(descriptor, since=stored[5])
+            keep = ~np.in1d(stored[0], newPks)
+            pks = np.concatenate((stored[0][keep], newPks))
+            values = np.concatenate((stored[1][keep], newValues))
+            order = np.argsort(pks, kind='mergesort')
+            pks, values = pks[order], values[order]
+        self._save(descriptor.pk, pks, values, token, floor, latest, min(latest, settled))
+        return pks, values
+
+    def columns(self, descriptors):
+        """Return up to date (pks, values) columns for a sequence of descriptors, in order."""
+        # writes which become visible from now on are stamped after settled, and the states are read
+        # before the values, so a column never claims to hold writes it has not read
+        settled = settledStamp()
+        states = versionStates([descriptor.pk for descriptor in descriptors])
+        result = []
+        for descriptor in descriptors:
+            state = states[descriptor.pk]
+            stored = self._load(descriptor.pk)
+            if stored is not None and stored[2:5] == state and stored[5] >= stored[4]:
+                result.append(stored[:2])
+            else:
+                result.append(self.refresh(descriptor, state, settled, stored))
+        return result
+
+    def column(self, descriptor):
+        """Return an up to date (pks, values) column for a descriptor."""
+        return self.columns([descriptor])[0]
+
+    def matrix(self, reactionPks, descriptors):
+        """Return a float array of shape (reactions, descriptors) of encoded values, NaN where missing."""
+        reactionPks = np.asarray(reactionPks, dtype=np.int64)
+        result = np.empty((reactionPks.size, len(descriptors)))
+        for j, column in enumerate(self.columns(descriptors)):
+            result[:, j] = align(column, reactionPks)
+        return result
@@ -0,0 +1,164 @@
+"""
+The registry of the descriptors defined by descriptor plugins.
+
+Each plugin defines its descriptors as a dictionary of heading to a dictionary
+of field values with a 'type' (see the plugins' utils.setup). Loading them used
+to cost an UPDATE and a SELECT, or an INSERT, per descriptor in every process.
+Instead each set of definitions is fingerprinted. When no DescriptorSync row
+records that fingerprint the definitions are synchronised with the database in
+a few bulk statements and the fingerprint is recorded; otherwise they are
+known to be in place and are only read, from memcached when
+settings.DESCRIPTOR_REGISTRY_SHARED_CACHE is True and another process has
+already put them there, or else with one SELECT per descriptor type. Cached
+descriptors are checked to still exist, with one SELECT per descriptor type,
+so a descriptor deleted since they were cached is never handed out. The plugins'
+LazyDescDicts then keep the result for the rest of the process.
+"""
+from django.db import models, transaction
+from django.conf import settings
+from django.core.cache import cache
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'descriptor_registry_{}'
+BATCH_SIZE = 1000
+KEY_FIELDS = ('heading', 'calculatorSoftware', 'calculatorSoftwareVersion')
+
+
+def fingerprint(kind, descDict):
+    """Return a hash of a plugin's descriptor definitions."""
+    definitions = json.dumps([kind, descDict], sort_keys=True, default=str)
+    return hashlib.sha1(definitions.encode('UTF-8')).hexdigest()
+
+
+def _descriptorClasses(kind):
+    """Return a dictionary of definition type to descriptor class for 'mol' or 'rxn' descriptors."""
+    if kind == 'mol':
+        return {'num': DRP.models.NumMolDescriptor, 'bool': DRP.models.BoolMolDescriptor,
+                'ord': DRP.models.OrdMolDescriptor, 'cat': DRP.models.CatMolDescriptor}
+    elif kind == 'rxn':
+        return {'num': DRP.models.NumRxnDescriptor, 'bool': DRP.models.BoolRxnDescriptor,
+                'ord': DRP.models.OrdRxnDescriptor, 'cat': DRP.models.CatRxnDescriptor}
+    raise ValueError('Unknown descriptor kind {}'.format(kind))
+
+
+def _fields(heading, definition):
+    """Return the field values of the descriptor a definition describes."""
+    fields = {k: v for k, v in definition.items() if k not in ('type', 'permittedValues')}
+    fields['heading'] = heading
+    return fields
+
+
+def _byType(kind, descDict):
+    """Group definitions by descriptor class, as dictionaries of heading to definition."""
+    classes = _descriptorClasses(kind)
+    byType = {}
+    for heading, definition in descDict.items():
+        if definition['type'] not in classes:
+            raise RuntimeError("Invalid descriptor type provided")
+        byType.setdefault(classes[definition['type']], {})[heading] = definition
+    return byType
+
+
+def _fetch(descriptorClass, definitions):
+    """Return a dictionary of heading to the existing descriptors of this class matching these definitions."""
+    wanted = {tuple(_fields(heading, definition)[field] for field in KEY_FIELDS): heading
+              for heading, definition in definitions.items()}
+    headings = sorted(definitions)
+    found = {}
+    for i in range(0, len(headings), BATCH_SIZE):
+        for descriptor in descriptorClass.objects.filter(heading__in=headings[i:i + BATCH_SIZE]):
+            key = tuple(getattr(descriptor, field) for field in KEY_FIELDS)
+            if key in wanted:
+                found[wanted[key]] = descriptor
+    return found
+
+
+@transaction.atomic
+def _sync(kind, descDict):
+    """Bring the database in line with the definitions, returning a dictionary of heading to descriptor."""
+    descriptors = {}
+    for descriptorClass, definitions in _byType(kind, descDict).items():
+        existing = _fetch(descriptorClass, definitions)
+        for heading, definition in definitions.items():
+            fields = _fields(heading, definition)
+            descriptor = existing.get(heading)
+            if descriptor is None:
+                # descriptors use multi-table inheritance, which bulk_create does not support
+                descriptor = descriptorClass.objects.create(**fields)
+            else:
+                changed = {k: v for k, v in fields.items() if getattr(descriptor, k) != v}
+                if changed:
+                    descriptorClass.objects.filter(pk=descriptor.pk).update(**changed)
+                    for k, v in changed.items():
+                        setattr(descriptor, k, v)
+            descriptors[heading] = descriptor
+        permitted = [(descriptors[heading], value) for heading, definition in definitions.items()
+                     for value in definition.get('permittedValues', ())]
+        if permitted:
+            perm = DRP.models.CategoricalDescriptorPermittedValue
+            pks = [descriptor.pk for descriptor, value in permitted]
+            present = set()
+            for i in range(0, len(pks), BATCH_SIZE):
+                present.update(perm.objects.filter(descriptor_id__in=pks[i:i + BATCH_SIZE]).values_list('descriptor_id', 'value'))
+            perm.objects.bulk_create([perm(descriptor=descriptor, value=value) for descriptor, value in set(permitted)
+                                      if (descriptor.pk, value) not in present])
+    return descriptors
+
+
+def _load(kind, descDict):
+    """Read descriptors whose definitions are known to be in the database, returning a dictionary of heading to descriptor."""
+    descriptors = {}
+    for descriptorClass, definitions in _byType(kind, descDict).items():
+        descriptors.update(_fetch(descriptorClass, definitions))
+    return descriptors
+
+
+def _present(descriptors):
+    """Whether all of these descriptors, say from the cache, are still in the database, checked with one query per type."""
+    byClass = {}
+    for descriptor in descriptors.values():
+        byClass.setdefault(type(descriptor), []).append(descriptor.pk)
+    return all(descriptorClass.objects.filter(pk__in=pks).count() == len(pks) for descriptorClass, pks in byClass.items())
+
+
+def descriptors(kind, descDict):
+    """
+    Return a dictionary of heading to descriptor for a plugin's definitions, creating and updating them as needed.
+
+    kind is 'mol' or 'rxn'.
+    """
+    key = fingerprint(kind, descDict)
+    shared = settings.DESCRIPTOR_REGISTRY_SHARED_CACHE
+    if DescriptorSync.objects.filter(fingerprint=key).exists():
+        loaded = cache.get(CACHE_KEY.format(key)) if shared else None
+        if loaded is not None and set(loaded) == set(descDict) and _present(loaded):
+            return loaded
+        loaded = _load(kind, descDict)
+        if set(loaded) == set(descDict):
+            if shared:
+                cache.set(CACHE_KEY.format(key), loaded, None)
+            return loaded
+        logger.info('Descriptors recorded as synchronised are missing; synchronising again')
+    logger.info('Synchronising {} {} descriptor definitions'.format(len(descDict), kind))
+    loaded = _sync(kind, descDict)
+    DescriptorSync.objects.get_or_create(fingerprint=key)
+    if shared:
+        cache.set(CACHE_KEY.format(key), loaded, None)
+    return loaded
+
+
+class DescriptorSync(models.Model):
+    """A record that a set of descriptor definitions has been synchronised with the database."""
+
+    class Meta:
+        app_label = "DRP"
+
+    fingerprint = models.CharField(max_length=40, unique=True)
+    synchronised = models.DateTimeField(auto_now_add=True)
+
+
+import DRP
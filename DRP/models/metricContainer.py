@@ -2,7 +2,7 @@ from django.db import models
 from django.conf import settings
 from .rxnDescriptors import BoolRxnDescriptor, OrdRxnDescriptor, NumRxnDescriptor, CatRxnDescriptor
 from .dataSets import DataSet, DataSetRelation
-from .rxnDescriptorValues import NumRxnDescriptorValue
+from .rxnDescriptorValues import NumRxnDescriptorValue, upsertValues
 import importlib
 import os
 import datetime
@@ -253,16 +253,12 @@ class MetricContainer(models.Model):
             logger.info("Inputting values for given reactions...")
 
         for j, desc in enumerate(self.transformedRxnDescriptors.all()):
-            values = []
-            for i, rxn in enumerate(reactions):
-                try:
-                    v = NumRxnDescriptorValue.objects.get(
-                        descriptor=desc, reaction=rxn)
-                except:
-                    val = desc.createValue(rxn, transformed[i, j])
-                    values.append(val)
-
-            NumRxnDescriptorValue.objects.bulk_create(values)
+            # existing values are kept; written through upsertValues so that the descriptor's version is bumped
+            existing = set(NumRxnDescriptorValue.objects.filter(descriptor=desc).values_list('reaction_id', flat=True))
+            values = [NumRxnDescriptorValue(descriptor=desc, reaction=rxn, value=float(transformed[i, j]))
+                      for i, rxn in enumerate(reactions) if rxn.pk not in existing]
+
+            upsertValues(values)
 
             if verbose:
                 logger.info("Done with descriptor {} of {}".format(
@@ -1,17 +1,20 @@
 """A module containing the ModelContainer class and related classes for descriptor attributes."""
 from django.db import models
 from django.conf import settings
-from django.db import transaction
+from django.db import transaction, connections
 from django.core.exceptions import ValidationError
-from numpy import average
 from itertools import chain, zip_longest
-import random
 import datetime
 import importlib
 import os
+from multiprocessing import Pool
 from DRP.models.rxnDescriptors import BoolRxnDescriptor, OrdRxnDescriptor, NumRxnDescriptor, CatRxnDescriptor
-from DRP.models.rxnDescriptorValues import BoolRxnDescriptorValue, NumRxnDescriptorValue, OrdRxnDescriptorValue, CatRxnDescriptorValue
+from DRP.models.rxnDescriptorValues import upsertValues
 from .statsModel import StatsModel
+from .containerDataset import ContainerDataset
+from .trainingCache import TrainingCache
+from .predictionVotes import PredictionVotes
+from .descriptorMatrix import _valueModel
 from DRP.utils import accuracy, BCR, Matthews, confusionMatrixString, confusionMatrixTable
 import json
 import sys
@@ -35,6 +38,18 @@ FEATURE_SELECTION_TOOL_CHOICES = tuple(
     tool for library in featureVisitorModules.values() for tool in library.tools)
 
 
+def _closeConnections():
+    """Make each worker process open its own database connection."""
+    connections.close_all()
+
+
+def _buildStatsModel(args):
+    """Worker process entry point: build one stats model of a container and return its votes."""
+    containerPk, statsModelPk, verbose, retrain = args
+    container = ModelContainer.objects.get(pk=containerPk)
+    return container.buildStatsModel(StatsModel.objects.get(pk=statsModelPk), verbose=verbose, retrain=retrain)
+
+
 class PredictsDescriptorsAttribute(object):
     """An attribute manager object which allows the setting and deletion of the related predictable descriptors."""
 
@@ -364,7 +379,7 @@ class ModelContainer(models.Model):
             statsModel.save()
             statsModel.testSets.add(testSet)
 
-    def build(self, verbose=False):
+    def build(self, verbose=False, workers=0, retrain=False):
         """
         Take all options confirmed so far and generate a full model set.
 
@@ -373,6 +388,13 @@ class ModelContainer(models.Model):
 
         Run the tests for the model using the test sets of data, and then saves that information.
 
+        With workers > 0 the stats models are trained and tested concurrently in that many worker
+        processes, each with its own database connection. The votes of every stats model are
+        combined and the overall predictions stored once all of them have finished.
+
+        A stats model whose training set, descriptors, descriptor values and visitor options match one
+        trained before reuses that model and its test set predictions from the training cache (see
+        trainingCache) rather than being trained again, unless retrain is True.
         """
         if self.built:
             raise RuntimeError(
@@ -382,23 +404,79 @@ class ModelContainer(models.Model):
             logger.info("Starting building at {}".format(
                 datetime.datetime.now()))
 
-        # set up a prediction results dictionary. Hold on tight. This gets
-        # hairy real fast.
-        resDict = {}
+        # the votes of the component models on each response
+        votes = {}
 
-        num_models = self.statsmodel_set.all().count()
+        statsModelPks = list(self.statsmodel_set.values_list('pk', flat=True))
+        num_models = len(statsModelPks)
         num_finished = 0
         overall_start_time = datetime.datetime.now()
-        for statsModel in self.statsmodel_set.all():
-            visitorOptions = json.loads(self.modelVisitorOptions)
-            modelVisitor = getattr(visitorModules[self.modelVisitorLibrary], self.modelVisitorTool)(
-                statsModel=statsModel, **visitorOptions)
-            # Train the model.
-            statsModel.startTime = datetime.datetime.now()
-            # this filname stuff seems not needed
-            fileName = os.path.join(settings.STATS_MODEL_LIBS_DIR, '{}_{}_{}_{}.model'.format(
-                self.pk, statsModel.pk, self.modelVisitorLibrary, self.modelVisitorTool))
-            statsModel.outputFile = fileName
+        # every stats model takes its inputs from this one export of the container's reactions
+        dataset = ContainerDataset(self)
+        dataset.materialize(verbose=verbose)
+        try:
+            if workers > 0:
+                # forked children must not share the parent's connection
+                connections.close_all()
+                pool = Pool(workers, initializer=_closeConnections)
+                try:
+                    jobs = ((self.pk, pk, verbose, retrain) for pk in statsModelPks)
+                    for newVotes in pool.imap_unordered(_buildStatsModel, jobs):
+                        self._mergeVotes(votes, newVotes)
+                        num_finished += 1
+                        if verbose:
+                            self._logBuildProgress(num_finished, num_models, overall_start_time)
+                    pool.close()
+                except:
+                    pool.terminate()
+                    raise
+                finally:
+                    pool.join()
+            else:
+                for statsModel in self.statsmodel_set.all():
+                    self._mergeVotes(votes, self.buildStatsModel(statsModel, verbose=verbose, retrain=retrain))
+                    num_finished += 1
+                    if verbose:
+                        self._logBuildProgress(num_finished, num_models, overall_start_time)
+        finally:
+            dataset.remove()
+
+        if votes:
+            if verbose:
+                logger.info("Storing overall model predictions...")
+            self._storePredictions(votes)
+            if verbose:
+                logger.info("Predictions stored")
+        self.built = True
+        print("here!")
+        if verbose:
+            overall_end_time = datetime.datetime.now()
+            logger.info("Finished at {}".format(overall_end_time))
+
+    def buildStatsModel(self, statsModel, verbose=False, retrain=False):
+        """
+        Train one stats model, predict and store its test sets and return its votes as from _storePredictionComponents.
+
+        The model and its predictions are taken from the training cache when it has them, unless retrain is True,
+        and are added to it otherwise.
+        """
+        votes = {}
+        visitorOptions = json.loads(self.modelVisitorOptions)
+        modelVisitor = getattr(visitorModules[self.modelVisitorLibrary], self.modelVisitorTool)(
+            statsModel=statsModel, **visitorOptions)
+        # Train the model.
+        statsModel.startTime = datetime.datetime.now()
+        # this filname stuff seems not needed
+        fileName = os.path.join(settings.STATS_MODEL_LIBS_DIR, '{}_{}_{}_{}.model'.format(
+            self.pk, statsModel.pk, self.modelVisitorLibrary, self.modelVisitorTool))
+        statsModel.outputFile = fileName
+        trainingCache = TrainingCache(self, statsModel)
+        if not retrain and trainingCache.hasModel() and trainingCache.loadModel(fileName):
+            if verbose:
+                logger.info("{} statsModel {}, reused cached model {}".format(
+                    statsModel.startTime, statsModel.pk, trainingCache.modelPath))
+            statsModel.endTime = datetime.datetime.now()
+        else:
             if verbose:
                 logger.info("{} statsModel {}, saving to {}, training...".format(
                     statsModel.startTime, statsModel.pk, fileName))
@@ -407,169 +485,140 @@ class ModelContainer(models.Model):
             if verbose:
                 logger.info("\t...Trained. Finished at {}. Saving statsModel...".format(
                     statsModel.endTime)),
-            statsModel.save()
-            if verbose:
-                logger.info("saved")
+            trainingCache.saveModel(fileName)
+        statsModel.save()
+        if verbose:
+            logger.info("saved")
 
-            # Test the model.
-            for testSet in statsModel.testSets.all():
-                if testSet.reactions.all().count() != 0:
+        # Test the model.
+        for testSet in statsModel.testSets.all():
+            if testSet.reactions.all().count() != 0:
+                outcomes = None if retrain else trainingCache.predictions(testSet, self.outcomeDescriptors)
+                if outcomes is None:
                     if verbose:
                         logger.info("Predicting test set...")
                     predictions = modelVisitor.predict(
                         testSet.reactions.all(), verbose=verbose)
+                    trainingCache.savePredictions(testSet, predictions)
+                    outcomes = self._outcomes(predictions)
                     if verbose:
                         logger.info(
                             "\t...finished predicting. Storing predictions...",)
-                    newResDict = self._storePredictionComponents(
-                        predictions, statsModel)
-
-                    # Update the overall result-dictionary with these new
-                    # counts.
-                    for reaction, responseDict in newResDict.items():
-                        for response, outcomeDict in responseDict.items():
-                            for outcome, count in outcomeDict.items():
-                                if reaction not in resDict:
-                                    resDict[reaction] = {}
-                                if response not in resDict[reaction]:
-                                    resDict[reaction][response] = {}
-
-                                if outcome not in resDict[reaction][response]:
-                                    resDict[reaction][response][
-                                        outcome] = count
-                                resDict[reaction][response][outcome] += count
+                elif verbose:
+                    logger.info("Using cached test set predictions. Storing predictions...")
+                self._mergeVotes(votes, self._storeComponentOutcomes(
+                    outcomes, statsModel))
 
-                    if verbose:
-                        logger.info("predictions stored.")
-                        for response in self.outcomeDescriptors:
-                            predDesc = response.predictedDescriptorType.objects.get(
-                                modelContainer=self, statsModel=statsModel, predictionOf=response)
-                            conf_mtrx = predDesc.getConfusionMatrix()
-
-                            logger.info(
-                                "Confusion matrix for {}:".format(predDesc.heading))
-                            logger.info(confusionMatrixString(conf_mtrx))
-                            logger.info("Accuracy: {:.3}".format(
-                                accuracy(conf_mtrx)))
-                            logger.info("BCR: {:.3}".format(BCR(conf_mtrx)))
+                if verbose:
+                    logger.info("predictions stored.")
+                    for response in self.outcomeDescriptors:
+                        predDesc = response.predictedDescriptorType.objects.get(
+                            modelContainer=self, statsModel=statsModel, predictionOf=response)
+                        conf_mtrx = predDesc.getConfusionMatrix()
 
-                elif verbose:
-                    logger.info("Test set is empty.")
+                        logger.info(
+                            "Confusion matrix for {}:".format(predDesc.heading))
+                        logger.info(confusionMatrixString(conf_mtrx))
+                        logger.info("Accuracy: {:.3}".format(
+                            accuracy(conf_mtrx)))
+                        logger.info("BCR: {:.3}".format(BCR(conf_mtrx)))
 
-            if verbose:
-                num_finished += 1
-                end_time = datetime.datetime.now()
-                elapsed = (end_time - overall_start_time)
-                expected_finish = datetime.timedelta(seconds=(elapsed.total_seconds(
-                ) * (num_models / float(num_finished)))) + overall_start_time
-                logger.info("{}. {} of {} models built.".format(
-                    end_time, num_finished, num_models))
-                logger.info("Elapsed model building time: {}. Expected completion time: {}".format(
-                    elapsed, expected_finish))
-
-        if resDict:
-            if verbose:
-                logger.info("Storing overall model predictions...")
-            self._storePredictions(resDict)
-            if verbose:
-                logger.info("Predictions stored")
-        self.built = True
-        print("here!")
-        if verbose:
-            overall_end_time = datetime.datetime.now()
-            logger.info("Finished at {}".format(overall_end_time))
+            elif verbose:
+                logger.info("Test set is empty.")
+        return votes
 
-    def _storePredictionComponents(self, predictions, statsModel, resDict=None):
+    @staticmethod
+    def _mergeVotes(votes, newVotes):
+        """Add the votes in newVotes, a dictionary of response descriptor to PredictionVotes, into votes."""
+        for response, responseVotes in newVotes.items():
+            if response in votes:
+                votes[response].merge(responseVotes)
+            else:
+                votes[response] = responseVotes
+
+    @staticmethod
+    def _logBuildProgress(num_finished, num_models, overall_start_time):
+        """Log the number of stats models built and the expected completion time."""
+        end_time = datetime.datetime.now()
+        elapsed = (end_time - overall_start_time)
+        expected_finish = datetime.timedelta(seconds=(elapsed.total_seconds(
+        ) * (num_models / float(num_finished)))) + overall_start_time
+        logger.info("{}. {} of {} models built.".format(
+            end_time, num_finished, num_models))
+        logger.info("Elapsed model building time: {}. Expected completion time: {}".format(
+            elapsed, expected_finish))
+
+    def _predictionValues(self, predDesc, reactionPks, outcomes):
+        """
+        Return unsaved values of a predicted descriptor for these reactions.
+
+        Existing values are not looked up: upsertValues replaces them in place.
+        """
+        valueModel = _valueModel(predDesc)
+        if isinstance(predDesc, CatRxnDescriptor):
+            permitted = dict(predDesc.predictionOf.permittedValues.values_list('value', 'pk'))
+            return [valueModel(descriptor=predDesc, reaction_id=int(pk), value_id=permitted[outcome])
+                    for pk, outcome in zip(reactionPks, outcomes)]
+        return [valueModel(descriptor=predDesc, reaction_id=int(pk), value=outcome)
+                for pk, outcome in zip(reactionPks, outcomes)]
+
+    @staticmethod
+    def _outcomes(predictions):
+        """Turn the (reaction, outcome) tuples of a visitor's predictions into (reaction pks, outcomes) tuples."""
+        return {response: ([reaction.pk for reaction, outcome in outcomes], [outcome for reaction, outcome in outcomes])
+                for response, outcomes in predictions.items()}
+
+    def _storePredictionComponents(self, predictions, statsModel):
         """
-        Return resDict, a dictionary of dictionaries of dictionaries.
+        Store the predictions of one component stats model and return its votes.
 
-        The first key is the reaction, the second is the response descriptor
-        (the descriptor to be predicted), the third is the predicted outcome.
-        The value is 1 if that outcome is predicted and 0 otherwise.
-        This setup is for easier aggregating into the full model container
-        voting-based prediction.
+        The votes are returned as a dictionary of response descriptor (the descriptor to be predicted)
+        to PredictionVotes, for easier aggregating into the full model container voting-based prediction.
+        The values for all responses are written in a single transaction.
         """
-        resDict = {} if resDict is None else resDict
+        return self._storeComponentOutcomes(self._outcomes(predictions), statsModel)
 
-        for response, outcomes in predictions.items():
+    def _storeComponentOutcomes(self, responseOutcomes, statsModel):
+        """Store predictions given as a dictionary of response descriptor to (reaction pks, outcomes) and return the votes."""
+        votes = {}
+        values = []
+        for response, (reactionPks, outcomes) in responseOutcomes.items():
             predDesc = response.createPredictionDescriptor(self, statsModel)
             predDesc.save()
-            vals = []
-            for reaction, outcome in outcomes:
-                if reaction not in resDict:
-                    resDict[reaction] = {}
-                if response not in resDict[reaction]:
-                    resDict[reaction][response] = {}
-                if outcome not in resDict[reaction][response]:
-                    resDict[reaction][response][outcome] = 0
-                resDict[reaction][response][outcome] += 1
-                val = predDesc.createValue(reaction, outcome)
-                if val.pk is None:  # if the value already exists
-                    vals.append(val)
-                else:
-                    val.save()
-            if vals:
-                type(vals[0]).objects.bulk_create(vals)
-        return resDict
-
-    def _storePredictions(self, resDict):
-        """Store predictions from the overall container as voted for by each componenet model."""
+            values += self._predictionValues(predDesc, reactionPks, outcomes)
+            votes[response] = PredictionVotes(numeric=isinstance(response, NumRxnDescriptor))
+            votes[response].add(reactionPks, outcomes)
+        with transaction.atomic():
+            upsertValues(values)
+        return votes
+
+    def _storePredictions(self, votes, reactions=None):
+        """
+        Store predictions from the overall container as voted for by each componenet model.
+
+        Numeric responses take the mean of the component predictions; other responses take the outcome
+        with the most votes, with ties broken at random. If reactions, a dictionary of pk to reaction,
+        is given, return a dictionary of response descriptor to a list of (reaction, value) tuples.
+        """
         finalPredictions = {}
-        bool_vals = []
-        num_vals = []
-        ord_vals = []
-        cat_vals = []
-        for reaction, responseDict in resDict.items():
-            for response, outcomeDict in responseDict.items():
-                predDesc = response.createPredictionDescriptor(self)
-                if predDesc.pk is None:
-                    predDesc.save()
-                if isinstance(response, NumRxnDescriptor):
-                    # estimate the weighted average of the estimates from the
-                    # component models
-                    values = tuple(value for value in resDict[
-                                   reaction][response].keys())
-                    weights = tuple(weight for value, weight in resDict[
-                                    reaction][response].items())
-                    val = predDesc.createValue(
-                        reaction, average(values, weights=weights))
-                    num_vals.append(val)
-                else:
-                    # find the 'competitors' with the highest number of votes
-                    # and pick one at random (in case multiple categories have
-                    # equal numbers of votes)
-                    maxVotes = max(count for response,
-                                   count in outcomeDict.items())
-                    winners = [(response, count) for response,
-                               count in outcomeDict.items() if count == maxVotes]
-                    winner = random.choice(winners)
-                    val = predDesc.createValue(reaction, winner[0])
-                    if val.pk is not None:
-                        val.save()
-                    elif isinstance(val, BoolRxnDescriptorValue):
-                        bool_vals.append(val)
-                    elif isinstance(val, OrdRxnDescriptorValue):
-                        ord_vals.append(val)
-                    elif isinstance(val, CatRxnDescriptorValue):
-                        cat_vals.append(val)
-                    else:
-                        raise ValueError(
-                            "Value just created is of unexpected type {}".format(type(val)))
-
-                if response not in finalPredictions:
-                    finalPredictions[response] = []
-                finalPredictions[response].append((reaction, val))
-
-        BoolRxnDescriptorValue.objects.bulk_create(bool_vals)
-        NumRxnDescriptorValue.objects.bulk_create(num_vals)
-        OrdRxnDescriptorValue.objects.bulk_create(ord_vals)
-        CatRxnDescriptorValue.objects.bulk_create(cat_vals)
+        values = []
+        for response, responseVotes in votes.items():
+            predDesc = response.createPredictionDescriptor(self)
+            if predDesc.pk is None:
+                predDesc.save()
+            responseValues = self._predictionValues(
+                predDesc, responseVotes.reactionPks, responseVotes.winners())
+            values += responseValues
+            if reactions is not None:
+                finalPredictions[response] = [(reactions[value.reaction_id], value) for value in responseValues]
+        with transaction.atomic():
+            upsertValues(values)
         return finalPredictions
 
     def predict(self, reactions, verbose=False):
         """Make predictions from the voting for a set of provided reactions."""
         if self.built:
-            resDict = {}
+            votes = {}
 
             num_models = self.statsmodel_set.all().count()
             num_finished = 0
@@ -585,21 +634,9 @@ class ModelContainer(models.Model):
                 if verbose:
                     logger.info(
                         "\t...finished predicting. Storing predictions...")
-                newResDict = self._storePredictionComponents(
-                    predictions, model)
-
-                # Update the overall result-dictionary with these new counts.
-                for reaction, responseDict in newResDict.items():
-                    for response, outcomeDict in responseDict.items():
-                        for outcome, count in outcomeDict.items():
-                            if reaction not in resDict:
-                                resDict[reaction] = {}
-                            if response not in resDict[reaction]:
-                                resDict[reaction][response] = {}
-
-                            if outcome not in resDict[reaction][response]:
-                                resDict[reaction][response][outcome] = count
-                            resDict[reaction][response][outcome] += count
+                # Update the overall votes with these new counts.
+                self._mergeVotes(votes, self._storePredictionComponents(
+                    predictions, model))
 
                 if verbose:
                     logger.info("predictions stored.")
@@ -627,7 +664,7 @@ class ModelContainer(models.Model):
                     logger.info("Elapsed prediction time: {}. Expected completion time: {}".format(
                         elapsed, expected_finish))
 
-            return self._storePredictions(resDict)
+            return self._storePredictions(votes, {reaction.pk: reaction for reaction in reactions})
         else:
             raise RuntimeError(
                 'A model container cannot be used to make predictions before the build method has been called')
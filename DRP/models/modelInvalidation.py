@@ -0,0 +1,98 @@
+"""
+Invalidation of the stats models trained or tested on reactions whose data changes.
+
+Saving a performed reaction marks it with invalidateModelsFor, which only
+records the reaction, without duplicates, for the current thread. The models of
+every recorded reaction are invalidated by a single UPDATE when the pending
+reactions are flushed, so saving a reaction and each of its compound quantities
+costs one query rather than a lookup and a save per model for every save.
+
+Pending reactions are flushed:
+
+- at the end of every request, by DRP.middleware.ModelInvalidationMiddleware;
+- as the transaction of the outermost batchedInvalidation block commits;
+- by flushInvalidation, which scripts and management commands saving reactions
+  outside a request must call once they are done.
+
+suspendedInvalidation turns invalidation off for bulk operations which cannot
+affect any model, such as importing new reactions.
+"""
+from contextlib import contextmanager
+from threading import local
+from django.db import transaction
+from django.db.models import Q
+import DRP
+
+_state = local()
+
+
+def _pending():
+    """Return the set of reaction pks awaiting invalidation in this thread."""
+    if getattr(_state, 'pending', None) is None:
+        _state.pending = set()
+    return _state.pending
+
+
+def _invalidate(reactionPks):
+    """Mark every valid stats model trained or tested on these reactions as invalid, returning how many there were."""
+    if not reactionPks:
+        return 0
+    return DRP.models.StatsModel.objects.filter(
+        Q(trainingSet__reactions__in=reactionPks) | Q(testSets__reactions__in=reactionPks),
+        invalid=False).update(invalid=True)
+
+
+def invalidateModelsFor(reactionPks):
+    """Record that the stats models using these reactions must be invalidated at the next flush."""
+    if getattr(_state, 'suspended', 0):
+        return
+    _pending().update(reactionPks)
+
+
+def flushInvalidation():
+    """Invalidate the models of every reaction recorded in this thread so far, returning how many there were."""
+    reactionPks = list(_pending())
+    _state.pending = set()
+    return _invalidate(reactionPks)
+
+
+def discardInvalidation():
+    """Forget the reactions recorded in this thread without invalidating anything."""
+    _state.pending = set()
+
+
+@contextmanager
+def batchedInvalidation():
+    """
+    Run a block in a transaction, flushing the reactions recorded so far and in the block just before committing.
+
+    Nested blocks join the outermost one. If the block raises, its changes are rolled back and the reactions it
+    recorded are forgotten, while those recorded before it remain pending.
+    """
+    if getattr(_state, 'batches', 0):
+        yield
+        return
+    before = _pending()
+    _state.pending = set()
+    _state.batches = 1
+    committed = False
+    try:
+        with transaction.atomic():
+            yield
+            _state.pending.update(before)
+            flushInvalidation()
+        committed = True
+    finally:
+        if not committed:
+            _state.pending = before
+        _state.batches = 0
+
+
+@contextmanager
+def suspendedInvalidation():
+    """Run a block without invalidating any models, for bulk operations whose reactions are in no data set."""
+    _state.suspended = getattr(_state, 'suspended', 0) + 1
+    try:
+        yield
+    finally:
+        _state.suspended -= 1
@@ -0,0 +1,182 @@
+"""
+The queue of descriptor calculations waiting to be done.
+
+Each row is one object whose descriptors are out of date. Marking an object
+which is already queued only refreshes its `marked` time, so repeated changes
+coalesce into one calculation. Workers (see the descriptor_worker command)
+claim due rows in batches: the rows are read with a locking read in a short
+transaction and stamped with the worker's name and a lease expiry, so several
+workers on different hosts never take the same row, and the rows of a worker
+which dies become claimable again once its lease runs out. The compounds
+or reactions themselves are then claimed through their `calculating` flags
+(see claimObjects), as the calculate_descriptors command does, and a row whose
+object is already being calculated is released to be tried again later. A finished row is
+deleted unless it was marked again after being claimed, in which case it is
+released to be calculated again. A failed row is released with its next
+attempt put off by an exponentially growing delay. Workers renew their lease
+between plugins, and finishing, failing or releasing rows only touches those
+still held under the claim they were read with, so a worker whose lease ran
+out never removes or resets rows another worker has since claimed.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from django.db import models, connection, transaction
+from django.db.models import Q, F, Min
+from django.utils import timezone
+
+INSERT_BATCH_SIZE = 1000
+
+
+def upsertMarks(model, keyFields, keys):
+    """
+    Queue objects for calculation, given as tuples of the values of keyFields, in one statement per batch.
+
+    keyFields must be the model's unique_together fields. New rows are due now; existing rows only have
+    their marked time refreshed.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+    now = timezone.now()
+    attnames = [model._meta.get_field(name).attname for name in keyFields]
+    if connection.vendor == 'mysql':
+        qn = connection.ops.quote_name
+        columns = [model._meta.get_field(name).column for name in keyFields] + ['marked', 'due', 'attempts', 'claimedBy']
+        for i in range(0, len(keys), INSERT_BATCH_SIZE):
+            chunk = keys[i:i + INSERT_BATCH_SIZE]
+            sql = 'INSERT INTO {} ({}) VALUES {} ON DUPLICATE KEY UPDATE {}=VALUES({})'.format(
+                qn(model._meta.db_table), ', '.join(qn(column) for column in columns),
+                ', '.join(['({})'.format(', '.join(['%s'] * len(columns)))] * len(chunk)),
+                qn('marked'), qn('marked'))
+            params = [value for key in chunk for value in tuple(key) + (now, now, 0, '')]
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+    else:
+        with transaction.atomic():
+            for i in range(0, len(keys), INSERT_BATCH_SIZE):
+                chunk = set(tuple(key) for key in keys[i:i + INSERT_BATCH_SIZE])
+                existing = Q(pk__in=[])
+                for key in chunk:
+                    existing |= Q(**dict(zip(attnames, key)))
+                queued = model.objects.filter(existing)
+                found = set(queued.values_list(*attnames))
+                queued.update(marked=now)
+                model.objects.bulk_create([model(marked=now, due=now, **dict(zip(attnames, key)))
+                                           for key in chunk - found])
+
+
+def claimObjects(model, pks):
+    """
+    Flag those of the given compounds or reactions not already being calculated as calculating, returning their pks.
+
+    The candidate rows are locked for the duration of the claim. The descriptor_worker command claims
+    compounds and reactions through this before calculating them, and the calculate_descriptors command
+    flags those it calculates, so the two never calculate the same object at once; the caller clears the
+    flag when it is done.
+    """
+    with transaction.atomic():
+        claimed = list(model.objects.select_for_update().filter(
+            pk__in=list(pks), calculating=False).order_by('pk').values_list('pk', flat=True))
+        model.objects.filter(pk__in=claimed).update(calculating=True)
+    return claimed
+
+
+def backoff(attempts, base=5, cap=3600):
+    """Return the delay in seconds before the next attempt after this many failures."""
+    return min(cap, base * 2 ** (attempts - 1))
+
+
+class PendingCalculationQuerySet(models.query.QuerySet):
+    """A queryset of queued calculations."""
+
+    def claimable(self, now=None):
+        """Return the rows which are due and not claimed by a live worker."""
+        now = timezone.now() if now is None else now
+        return self.filter(Q(claimedUntil=None) | Q(claimedUntil__lt=now), due__lte=now)
+
+    def claim(self, worker, batchSize, lease=600):
+        """Claim up to batchSize due rows for a worker for lease seconds, returning the claimed rows."""
+        now = timezone.now()
+        with transaction.atomic():
+            pks = list(self.claimable(now).select_for_update().order_by('due', 'pk').values_list('pk', flat=True)[:batchSize])
+            self.model.objects.filter(pk__in=pks).update(
+                claimedBy=worker, claimedAt=now, claimedUntil=now + timedelta(seconds=lease))
+        return list(self.model.objects.filter(pk__in=pks, claimedBy=worker))
+
+    def held(self, rows):
+        """Return those of the claimed rows still held under the claim they were read with."""
+        claims = defaultdict(list)
+        for row in rows:
+            claims[(row.claimedBy, row.claimedAt)].append(row.pk)
+        held = Q(pk__in=[])
+        for (claimedBy, claimedAt), pks in claims.items():
+            held |= Q(pk__in=pks, claimedBy=claimedBy, claimedAt=claimedAt)
+        return self.model.objects.filter(held)
+
+    def renew(self, rows, lease=600):
+        """Extend the lease on those of the claimed rows still held for another lease seconds, returning how many there were."""
+        return self.held(rows).update(claimedUntil=timezone.now() + timedelta(seconds=lease))
+
+    def finish(self, rows):
+        """Remove the rows of a successful calculation still held, releasing those marked again since they were claimed."""
+        with transaction.atomic():
+            self.held(rows).filter(marked__lte=F('claimedAt')).delete()
+            self.held(rows).update(
+                claimedBy='', claimedAt=None, claimedUntil=None, attempts=0, due=timezone.now())
+
+    def release(self, rows, delay=0):
+        """Release the claimed rows still held without counting a failure, to be claimable again after delay seconds."""
+        self.held(rows).update(
+            claimedBy='', claimedAt=None, claimedUntil=None, due=timezone.now() + timedelta(seconds=delay))
+
+    def fail(self, rows, base=5, cap=3600):
+        """Release the rows of a failed calculation still held, putting off each one's next attempt according to backoff."""
+        now = timezone.now()
+        with transaction.atomic():
+            for row in rows:
+                self.held([row]).update(
+                    claimedBy='', claimedAt=None, claimedUntil=None, attempts=row.attempts + 1,
+                    due=now + timedelta(seconds=backoff(row.attempts + 1, base, cap)))
+
+    def stats(self):
+        """Return a dictionary of the depth of the queue, how many rows are due and the age in seconds of the oldest due mark."""
+        now = timezone.now()
+        due = self.claimable(now)
+        oldest = due.aggregate(oldest=Min('marked'))['oldest']
+        return {
+            'depth': self.count(),
+            'due': due.count(),
+            'claimed': self.filter(claimedUntil__gte=now).count(),
+            'retrying': self.filter(attempts__gt=0).count(),
+            'lag': (now - oldest).total_seconds() if oldest is not None else 0.0,
+        }
+
+
+class PendingCalculationManager(models.Manager):
+    """A manager for queued calculations."""
+
+    def get_queryset(self):
+        """Return the appropriate custom queryset."""
+        return PendingCalculationQuerySet(self.model, using=self._db)
+
+
+class PendingCalculation(models.Model):
+    """An object whose descriptors are waiting to be calculated."""
+
+    class Meta:
+        app_label = "DRP"
+        abstract = True
+
+    objects = PendingCalculationManager()
+
+    marked = models.DateTimeField(db_index=True)
+    """When the values were last made out of date."""
+    due = models.DateTimeField(db_index=True)
+    """When the calculation may next be attempted."""
+    attempts = models.PositiveIntegerField(default=0)
+    """How many times the calculation has failed since it last succeeded."""
+    claimedBy = models.CharField(max_length=200, blank=True, default='')
+    """The name of the worker calculating the values, if any."""
+    claimedAt = models.DateTimeField(null=True, blank=True)
+    claimedUntil = models.DateTimeField(null=True, blank=True)
+    """When the worker's claim lapses if it has not finished."""
@@ -0,0 +1,17 @@
+"""The compounds whose molecular descriptors are waiting to be calculated."""
+from django.db import models
+from .pendingCalculation import PendingCalculation, upsertMarks
+
+
+def markCompounds(compoundPks):
+    """Queue these compounds for molecular descriptor calculation."""
+    upsertMarks(PendingMolCalculation, ('compound',), [(pk,) for pk in set(compoundPks)])
+
+
+class PendingMolCalculation(PendingCalculation):
+    """A compound whose molecular descriptor values are out of date."""
+
+    class Meta:
+        app_label = "DRP"
+
+    compound = models.OneToOneField("DRP.Compound")
@@ -0,0 +1,118 @@
+"""
+The reaction descriptor calculations made necessary by changes to the data they are calculated from.
+
+Each reaction descriptor plugin declares, as a module level `dependencies`
+tuple, which of the following its values are calculated from:
+
+QUANTITIES
+    the compounds, roles and amounts of a reaction's compound quantities;
+MOL_DESCRIPTORS
+    the molecular descriptor values of those compounds;
+MANUAL
+    the reaction's manual descriptor values, such as its pH.
+
+A plugin which declares nothing is taken to depend on all three. When one of
+these changes, the (reaction, plugin) pairs it affects are recorded as
+PendingRxnCalculation rows: a compound leads to its reactions through their
+compound quantities, and a change leads only to the plugins depending on it.
+These rows form a queue (see pendingCalculation), so marking a pair which is
+already pending just refreshes its time and repeated changes coalesce. The
+descriptor_worker command, or calculate_descriptors --incremental, then
+recalculates only the pending pairs, plugin by plugin, rather than every reaction.
+"""
+from django.db import models
+from django.conf import settings
+from .pendingCalculation import PendingCalculation, upsertMarks
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+QUANTITIES = 'quantities'
+MOL_DESCRIPTORS = 'mol_descriptors'
+MANUAL = 'manual'
+ALL_DEPENDENCIES = (QUANTITIES, MOL_DESCRIPTORS, MANUAL)
+
+_dependencies = None
+_descriptorKinds = None
+
+
+def pluginDependencies():
+    """Return a dictionary of the name of each configured reaction descriptor plugin to what it depends on."""
+    global _dependencies
+    if _dependencies is None:
+        dependencies = {}
+        for name in settings.RXN_DESCRIPTOR_PLUGINS:
+            try:
+                dependencies[name] = getattr(importlib.import_module(name), 'dependencies', ALL_DEPENDENCIES)
+            except Exception as e:
+                logger.warning('Could not import {} ({}); assuming it depends on everything'.format(name, e))
+                dependencies[name] = ALL_DEPENDENCIES
+        _dependencies = dependencies
+    return _dependencies
+
+
+def pluginsDependingOn(dependency):
+    """Return the names of the reaction descriptor plugins whose values depend on this kind of data."""
+    return [name for name, dependencies in pluginDependencies().items() if dependency in dependencies]
+
+
+def markReactions(reactionPks, plugins):
+    """Record that the values of these plugins need recalculating for these reactions."""
+    reactionPks = set(reactionPks)
+    if not reactionPks or not plugins:
+        return
+    upsertMarks(PendingRxnCalculation, ('reaction', 'plugin'), [(pk, plugin) for pk in reactionPks for plugin in plugins])
+
+
+def quantitiesChanged(reactionPks):
+    """Mark the reactions whose compound quantities changed for recalculation."""
+    markReactions(reactionPks, pluginsDependingOn(QUANTITIES))
+
+
+def isManualDescriptor(descriptorPk):
+    """
+    Whether values of the descriptor with this pk are entered by hand rather than calculated.
+
+    The manual descriptor pks are read once per process, and read again only when a descriptor
+    not seen before turns up, so saving a value does not look up its descriptor.
+    """
+    global _descriptorKinds
+    if _descriptorKinds is None or descriptorPk not in _descriptorKinds[1]:
+        rows = list(DRP.models.Descriptor.objects.values_list('pk', 'calculatorSoftware'))
+        _descriptorKinds = (set(pk for pk, software in rows if software == 'manual'), set(pk for pk, software in rows))
+    return descriptorPk in _descriptorKinds[0]
+
+
+def manualValuesChanged(reactionPks):
+    """Mark the reactions whose manual descriptor values changed for recalculation."""
+    markReactions(reactionPks, pluginsDependingOn(MANUAL))
+
+
+def compoundsChanged(compoundPks, structure=False):
+    """
+    Mark the reactions using these compounds for recalculation after their molecular descriptors changed.
+
+    If structure is True the compounds themselves changed, which may change anything calculated from them.
+    """
+    plugins = pluginsDependingOn(MOL_DESCRIPTORS)
+    if structure:
+        plugins = sorted(set(plugins) | set(pluginsDependingOn(QUANTITIES)))
+    reactionPks = DRP.models.CompoundQuantity.objects.filter(
+        compound_id__in=list(compoundPks)).values_list('reaction_id', flat=True).distinct()
+    markReactions(reactionPks, plugins)
+
+
+class PendingRxnCalculation(PendingCalculation):
+    """A reaction whose values from one descriptor plugin are out of date."""
+
+    class Meta:
+        app_label = "DRP"
+        unique_together = ("reaction", "plugin")
+
+    reaction = models.ForeignKey("DRP.Reaction")
+    plugin = models.CharField(max_length=200)
+    """The module name of the plugin, as in settings.RXN_DESCRIPTOR_PLUGINS."""
+
+
+import DRP
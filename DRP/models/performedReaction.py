@@ -5,12 +5,12 @@ from .recommendedReaction import RecommendedReaction
 from .rxnDescriptors import NumRxnDescriptor, BoolRxnDescriptor, OrdRxnDescriptor, CatRxnDescriptor
 from .rxnDescriptorValues import NumRxnDescriptorValue, BoolRxnDescriptorValue, OrdRxnDescriptorValue, CatRxnDescriptorValue
 from django.contrib.auth.models import User
-from itertools import chain
 import DRP
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
 from django.forms.forms import NON_FIELD_ERRORS
 from .fileStorage import OverwriteStorage
+from .modelInvalidation import invalidateModelsFor
 from .validators import notInTheFuture
 from django.conf import settings
 import os.path
@@ -142,10 +142,6 @@ class PerformedReaction(Reaction):
         """Custom save method makes ure that models based on an updated reaction are invalidated, because the data changed."""
         self.reference = self.reference.lower()
         if self.pk is not None and invalidate_models:
-            test = DRP.models.StatsModel.objects.filter(
-                testSets__reactions__in=[self])
-            train = DRP.models.StatsModel.objects.filter(
-                trainingSet__reactions=self)
-            for model in chain(test, train):
-                model.invalidate()
+            # deferred to the end of the request, batch or script; see modelInvalidation
+            invalidateModelsFor([self.pk])
         super(PerformedReaction, self).save(*args, **kwargs)
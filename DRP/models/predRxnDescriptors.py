@@ -1,12 +1,14 @@
 """Module for information about predicted reaction descriptors."""
 from django.db import models
 from .rxnDescriptors import BoolRxnDescriptor, OrdRxnDescriptor, NumRxnDescriptor, CatRxnDescriptor
-from .rxnDescriptorValues import BoolRxnDescriptorValue
+from .rxnDescriptorValues import BoolRxnDescriptorValue, OrdRxnDescriptorValue, CatRxnDescriptorValue, valuesVersions
 from .descriptors import DescriptorManager
 from .modelContainer import ModelContainer
 from .statsModel import StatsModel
 from .performedReaction import PerformedReaction
-from django.db.models import F
+from django.db.models import Count
+from django.core.cache import cache
+import hashlib
 
 
 class PredictedDescriptor(models.Model):
@@ -21,6 +23,49 @@ class PredictedDescriptor(models.Model):
 
     objects = DescriptorManager()
 
+    def _countConfusionMatrix(self, valueModel, related, permittedValues, convert, reactions=None, field='value'):
+        """
+        Build a confusion matrix from a single query grouping the predictions by (actual, predicted) value.
+
+        related is the name of the value model's relation from Reaction, used to join each prediction
+        to the actual value for the same reaction, and field the field holding the value.
+        Only performed reactions are counted unless a queryset of reactions is given.
+        """
+        if reactions is None:
+            reactions = PerformedReaction.objects.all()
+        counts = valueModel.objects.filter(**{
+            'descriptor': self,
+            'reaction__in': reactions.values('pk'),
+            'reaction__{}__descriptor'.format(related): self.predictionOf_id,
+        }).order_by().values_list('reaction__{}__{}'.format(related, field), field).annotate(count=Count('pk'))
+
+        matrix = {true: {guess: 0 for guess in permittedValues} for true in permittedValues}
+        for true, guess, count in counts:
+            if true is not None and guess is not None:
+                matrix[convert(true)][convert(guess)] += count
+        return matrix
+
+    def _cachedConfusionMatrix(self, reactions, compute):
+        """
+        Return compute() through the cache.
+
+        Entries are keyed on the values versions of this descriptor and the one it predicts and on a
+        hash of the reaction pks, so they are not used once new predictions or outcomes are stored.
+        """
+        if reactions is None:
+            reactionsHash = 'all'
+        else:
+            pks = ','.join(str(pk) for pk in sorted(reactions.values_list('pk', flat=True)))
+            reactionsHash = hashlib.sha1(pks.encode('UTF-8')).hexdigest()
+        versions = valuesVersions([self.pk, self.predictionOf_id])
+        key = 'confusion_matrix_{}_{}_{}_{}'.format(
+            self.pk, versions[self.pk], versions[self.predictionOf_id], reactionsHash)
+        matrix = cache.get(key)
+        if matrix is None:
+            matrix = compute()
+            cache.set(key, matrix, None)
+        return matrix
+
 
 class PredBoolRxnDescriptor(BoolRxnDescriptor, PredictedDescriptor):
     """Reaction boolean descriptor which has been predicted by a model."""
@@ -100,21 +145,8 @@ class PredBoolRxnDescriptor(BoolRxnDescriptor, PredictedDescriptor):
            }
           }
         """
-        if reactions is None:
-            reactions = PerformedReaction.objects.filter(
-                boolrxndescriptorvalue__descriptor=self).distinct()
-
-        permittedValues = [True, False]
-
-        reactions = reactions.filter(boolrxndescriptorvalue__descriptor=self).annotate(
-            predicted_val=F('boolrxndescriptorvalue__value'))
-        reactions = reactions.filter(boolrxndescriptorvalue__descriptor=self.predictionOf).annotate(
-            actual_val=F('boolrxndescriptorvalue__value'))
-
-        matrix = {true: {guess: reactions.filter(predicted_val=guess, actual_val=true).count(
-        ) for guess in permittedValues} for true in permittedValues}
-
-        return matrix
+        return self._cachedConfusionMatrix(reactions, lambda: self._countConfusionMatrix(
+            BoolRxnDescriptorValue, 'boolrxndescriptorvalue', [True, False], bool, reactions))
 
     def getPredictionTuples(self):
         """
@@ -166,7 +198,7 @@ class PredOrdRxnDescriptor(OrdRxnDescriptor, PredictedDescriptor):
                 total += count
         return correct / total
 
-    def getConfusionMatrix(self):
+    def getConfusionMatrix(self, reactions=None):
         """
         Return a confusion matrix.
 
@@ -187,13 +219,8 @@ class PredOrdRxnDescriptor(OrdRxnDescriptor, PredictedDescriptor):
             }
            }
         """
-        matrix = {
-            true: {guess: 0 for guess in range(self.minimum, self.maximum + 1)}
-            for true in range(self.minimum, self.maximum + 1)
-        }
-        for true, guess in self.getPredictionTuples():
-            matrix[true][guess] += 1
-        return matrix
+        return self._cachedConfusionMatrix(reactions, lambda: self._countConfusionMatrix(
+            OrdRxnDescriptorValue, 'ordrxndescriptorvalue', range(self.minimum, self.maximum + 1), int, reactions))
 
     def getPredictionTuples(self):
         """
@@ -260,3 +287,14 @@ class PredCatRxnDescriptor(CatRxnDescriptor, PredictedDescriptor):
         verbose_name = 'Predicted Categorical Rxn Descriptor'
 
     objects = DescriptorManager()
+
+    def getConfusionMatrix(self, reactions=None):
+        """
+        Return a confusion matrix.
+
+        As for the other predicted descriptors, the outer keys are the true values and the inner keys
+        the guessed values, here the strings of the permitted values of the descriptor predicted.
+        """
+        permittedValues = list(self.predictionOf.permittedValues.values_list('value', flat=True))
+        return self._cachedConfusionMatrix(reactions, lambda: self._countConfusionMatrix(
+            CatRxnDescriptorValue, 'catrxndescriptorvalue', permittedValues, str, reactions, field='value__value'))
@@ -0,0 +1,87 @@
+"""Vote counts of the stats models of a model container, held as arrays indexed by reaction pk."""
+import numpy as np
+
+
+class PredictionVotes(object):
+    """
+    The votes of one or more stats models on the value of one response descriptor.
+
+    Reactions are held as a sorted array of pks. For a numeric response each
+    reaction has the sum and the number of the values predicted for it, and the
+    container predicts their mean. Otherwise each reaction has a row of a
+    (reactions x outcomes) matrix of vote counts, and the container predicts
+    the outcome with the most votes.
+    """
+
+    def __init__(self, numeric=False):
+        """Start with no votes."""
+        self.numeric = numeric
+        self.reactionPks = np.zeros(0, dtype=np.int64)
+        self.outcomes = []
+        """The outcome of each column of counts."""
+        self.counts = np.zeros((0, 1 if numeric else 0), dtype=np.int64)
+        self.sums = np.zeros(0)
+
+    def _rows(self, reactionPks):
+        """Return the rows of these reactions, adding empty rows for those not seen before."""
+        reactionPks = np.asarray(reactionPks, dtype=np.int64)
+        new = np.setdiff1d(reactionPks, self.reactionPks)
+        if new.size:
+            allPks = np.union1d(self.reactionPks, new)
+            old = np.searchsorted(allPks, self.reactionPks)
+            counts = np.zeros((allPks.size, self.counts.shape[1]), dtype=np.int64)
+            counts[old] = self.counts
+            sums = np.zeros(allPks.size)
+            sums[old] = self.sums
+            self.reactionPks, self.counts, self.sums = allPks, counts, sums
+        return np.searchsorted(self.reactionPks, reactionPks)
+
+    def _columns(self, outcomes):
+        """Return the columns of these outcomes, adding empty columns for those not seen before."""
+        index = {outcome: j for j, outcome in enumerate(self.outcomes)}
+        columns = []
+        for outcome in outcomes:
+            if outcome not in index:
+                index[outcome] = len(self.outcomes)
+                self.outcomes.append(outcome)
+            columns.append(index[outcome])
+        if len(self.outcomes) > self.counts.shape[1]:
+            self.counts = np.hstack((self.counts, np.zeros(
+                (self.counts.shape[0], len(self.outcomes) - self.counts.shape[1]), dtype=np.int64)))
+        return np.array(columns, dtype=np.int64)
+
+    def add(self, reactionPks, outcomes):
+        """Count one vote for each outcome, outcomes[i] being the vote for reactionPks[i]."""
+        rows = self._rows(reactionPks)
+        if self.numeric:
+            np.add.at(self.counts[:, 0], rows, 1)
+            np.add.at(self.sums, rows, np.asarray(outcomes, dtype=np.float64))
+        else:
+            columns = self._columns(outcomes)
+            np.add.at(self.counts, (rows, columns), 1)
+
+    def merge(self, other):
+        """Add the votes of another PredictionVotes for the same response."""
+        rows = self._rows(other.reactionPks)
+        if self.numeric:
+            self.counts[rows] += other.counts
+            self.sums[rows] += other.sums
+        else:
+            columns = self._columns(other.outcomes)
+            self.counts[np.ix_(rows, columns)] += other.counts
+
+    def winners(self, randomState=None):
+        """
+        Return the predicted outcome for each reaction, in the order of reactionPks.
+
+        For a numeric response this is the mean of the values predicted; otherwise it is the outcome
+        with the most votes, chosen at random from those with equal numbers of votes.
+        """
+        if self.reactionPks.size == 0:
+            return []
+        if self.numeric:
+            return [float(mean) for mean in self.sums / self.counts[:, 0]]
+        randomState = np.random.RandomState() if randomState is None else randomState
+        tied = self.counts == self.counts.max(axis=1)[:, np.newaxis]
+        choices = np.where(tied, randomState.random_sample(self.counts.shape), -1).argmax(axis=1)
+        return [self.outcomes[j] for j in choices]
@@ -82,6 +82,14 @@ class MultiQuerySet(object):
         return any(qs.exists() for qs in self.querysets)
 
 
+class Echo(object):
+    """A file-like object whose write method returns what it is given, so that the csv module can be used in generators."""
+
+    def write(self, value):
+        """Return the value rather than writing it."""
+        return value
+
+
 class CsvQuerySet(models.query.QuerySet):
     """This queryset permits the output of the data from a model as a csv."""
 
@@ -112,24 +120,62 @@ class CsvQuerySet(models.query.QuerySet):
         'expandedValues', which should be a dictionary like object of values, using fieldNames as keys as output
         by fetchExpandedHeaders.
         """
+        for line in self.csvLines(expanded, whitelistHeaders, missing):
+            writeable.write(line)
+
+    def csvLines(self, expanded=False, whitelistHeaders=None, missing="?"):
+        """Generate the csv output of toCsv one line at a time, for streaming."""
         if expanded:
             headers = self.expandedCsvHeaders(whitelistHeaders)
         else:
             headers = self.csvHeaders(whitelistHeaders)
 
-        writer = csv.DictWriter(writeable, fieldnames=headers, restval=missing)
+        writer = csv.DictWriter(Echo(), fieldnames=headers, restval=missing)
 
-        writer.writeheader()
+        yield writer.writerow(dict(zip(headers, headers)))
         for row in self.rows(expanded, whitelist=headers):
-            writer.writerow({k: row.get(k, missing)
-                             for k in row.keys() if k in headers})
+            yield writer.writerow({k: row.get(k, missing)
+                                   for k in row.keys() if k in headers})
 
     def rows(self, expanded):
         """Generate a dictionary, representative of a row in the csv module's dictwriter."""
-        for item in self:
+        for item in self.iterator():
             yield {field.name: getattr(item, field.name) for field in self.model._meta.fields}
 
 
+def sparseDefault(attribute):
+    """
+    Return a test for whether a value may be left out of a sparse arff row for an attribute declaration.
+
+    Sparse rows leave out numeric zeros and the first value of nominal attributes. Return None for
+    attribute types (strings, dates) whose values are always written.
+    """
+    kind = attribute.split(None, 2)[2].strip()
+    if kind.startswith('{'):
+        first = kind[1:].split(',')[0].strip().strip('}').strip('"\'')
+        return lambda value: str(value) == first
+    elif kind.lower() in ('numeric', 'real', 'integer'):
+        def isZero(value):
+            try:
+                return float(value) == 0
+            except (TypeError, ValueError):
+                return False
+        return isZero
+    return None
+
+
+def sparseAttribute(attribute):
+    """
+    Return the declaration of an attribute in sparse arff files.
+
+    Boolean attributes are declared {False, True} rather than {True, False}, so that sparse rows leave
+    out False, the more common value. Other declarations are unchanged.
+    """
+    if attribute.endswith('{True, False}'):
+        return attribute[:-len('{True, False}')] + '{False, True}'
+    return attribute
+
+
 class ArffQuerySet(models.query.QuerySet):
     """This queryset class permits data from a model to be output as a .arff file."""
 
@@ -173,23 +219,46 @@ class ArffQuerySet(models.query.QuerySet):
                         field.name, ','.join(value_set))
         return headers
 
-    def toArff(self, writeable, expanded=False, relationName='relation', whitelistHeaders=None, missing="?"):
-        """Output to an arff file-like object."""
-        writeable.write(
-            '%arff file generated by the Dark Reactions Project provided by Haverford College\n')
-        writeable.write('\n@relation {}\n'.format(relationName))
+    def toArff(self, writeable, expanded=False, relationName='relation', whitelistHeaders=None, missing="?", sparse=False):
+        """
+        Output to an arff file-like object.
+
+        With sparse, data rows are written in the sparse arff format, leaving out every value equal
+        to its attribute's default (zero for numeric attributes, the first listed value for nominal ones),
+        and boolean attributes are declared with False first (see sparseAttribute).
+        """
+        for line in self.arffLines(expanded, relationName, whitelistHeaders, missing, sparse):
+            writeable.write(line)
+
+    def arffLines(self, expanded=False, relationName='relation', whitelistHeaders=None, missing="?", sparse=False):
+        """Generate the arff output of toArff a section or data line at a time, for streaming."""
+        yield '%arff file generated by the Dark Reactions Project provided by Haverford College\n'
+        yield '\n@relation {}\n'.format(relationName)
         if expanded:
             headers = self.expandedArffHeaders(whitelistHeaders)
         else:
             headers = self.arffHeaders(whitelistHeaders)
-
-        writeable.write('\n'.join(headers.values()))
-
-        writeable.write('\n\n@data\n')
-        for row in self.rows(expanded, whitelistHeaders):
-            writeable.write(','.join(('"' + str(row.get(key)) + '"' if (row.get(key)
-                                                                        is not None) else missing) for key in headers.keys()))
-            writeable.write('\n')
+        if sparse:
+            headers = OrderedDict((key, sparseAttribute(header)) for key, header in headers.items())
+
+        yield '\n'.join(headers.values())
+
+        yield '\n\n@data\n'
+        if sparse:
+            defaults = [sparseDefault(header) for header in headers.values()]
+            for row in self.rows(expanded, whitelistHeaders):
+                entries = []
+                for index, (key, default) in enumerate(zip(headers.keys(), defaults)):
+                    value = row.get(key)
+                    if value is None:
+                        entries.append('{} {}'.format(index, missing))
+                    elif default is None or not default(value):
+                        entries.append('{} "{}"'.format(index, value))
+                yield '{' + ','.join(entries) + '}\n'
+        else:
+            for row in self.rows(expanded, whitelistHeaders):
+                yield ','.join(('"' + str(row.get(key)) + '"' if (row.get(key)
+                                                                 is not None) else missing) for key in headers.keys()) + '\n'
 
     def toNPArray(self, expanded=False, whitelistHeaders=None, missing=np.nan):
         """Return a numpy array."""
@@ -207,5 +276,5 @@ class ArffQuerySet(models.query.QuerySet):
 
     def rows(self, expanded=False):
         """Return a dictionary for writing a row of data using DictWriter from csv module."""
-        for item in self:
+        for item in self.iterator():
             yield {field.name: getattr(item, field.name) for field in self.model._meta.fields}
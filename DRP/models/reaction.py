@@ -6,7 +6,9 @@ from .querysets import CsvQuerySet, ArffQuerySet, MultiQuerySet
 from .descriptors import BooleanDescriptor, NumericDescriptor, CategoricalDescriptor, OrdinalDescriptor
 from .rxnDescriptorValues import BoolRxnDescriptorValue, NumRxnDescriptorValue, OrdRxnDescriptorValue, CatRxnDescriptorValue
 from .rxnDescriptors import BoolRxnDescriptor, NumRxnDescriptor, OrdRxnDescriptor, CatRxnDescriptor
-from itertools import chain
+from .descriptorMatrix import DescriptorMatrix, align, decoder, fetchMatrix
+from itertools import chain, islice
+import numpy as np
 from .compoundRole import CompoundRole
 from collections import OrderedDict
 import DRP
@@ -79,15 +81,33 @@ class ReactionQuerySet(CsvQuerySet, ArffQuerySet):
         """Return headers for the expanded Arff file."""
         headers = self.arffHeaders(whitelist)
         headers.update(OrderedDict(((d.csvHeader, d.arffHeader)
-                                    for d in self.descriptors.filter(csvHeader__in=whitelist))))
+                                    for d in self.descriptorsFor(whitelist))))
         return headers
 
     def expandedCsvHeaders(self, whitelist=None):
         """Generate the expanded header for the csv."""
-        if whitelist is not None:
-            return self.csvHeaders(whitelist) + [d.csvHeader for d in self.descriptors.filter(csvHeader__in=whitelist)]
-        else:
-            return self.csvHeaders(whitelist) + [d.csvHeader for d in self.descriptors]
+        return self.csvHeaders(whitelist) + [d.csvHeader for d in self.descriptorsFor(whitelist)]
+
+    def descriptorsFor(self, whitelist=None):
+        """
+        Return the reaction descriptors with csvHeaders in the whitelist, or all of them if it is None.
+
+        The csvHeaders are assembled here from one narrow query per descriptor type and the
+        descriptors then fetched by pk, rather than filtering on the concatenated annotation,
+        which cannot use an index.
+        """
+        descriptors = []
+        whitelist = None if whitelist is None else set(whitelist)
+        for model in (BoolRxnDescriptor, NumRxnDescriptor, OrdRxnDescriptor, CatRxnDescriptor):
+            if whitelist is None:
+                descriptors.extend(model.objects.order_by('pk'))
+                continue
+            pks = [pk for pk, heading, software, version in model.objects.values_list(
+                   'pk', 'heading', 'calculatorSoftware', 'calculatorSoftwareVersion')
+                   if '{}_{}_{}'.format(heading, software, version) in whitelist]
+            for i in range(0, len(pks), 1000):
+                descriptors.extend(model.objects.filter(pk__in=pks[i:i + 1000]).order_by('pk'))
+        return descriptors
 
     @property
     def descriptors(self):
@@ -106,74 +126,52 @@ class ReactionQuerySet(CsvQuerySet, ArffQuerySet):
     def rows(self, expanded, whitelist=None):
         """Return the 'rows' of information in a format suitable for a python dictwriter."""
         if expanded:
-            reactions = self
+            descriptors = self.descriptorsFor(whitelist)
+            headers = [d.csvHeader for d in descriptors]
+            decoders = [decoder(d) for d in descriptors]
             if whitelist is not None:
-                # This whole nonsense just grabs the descriptor values we actually want. Let's break it down
-                # First we annotate each descriptor value with its descriptor's csvHeader using the Concat operation
-                # Then we filter on the csvHeader so it's in the whitelist
-                # Then we prefetch descriptor values matching this queryset for each reaction and assign this to filtered __vals
-                # Then we can just iterate through these values to get what we
-                # actually want!
-                qs = BoolRxnDescriptorValue.objects.annotate(descCsvHeader=Concat('descriptor__heading', models.Value(
-                    '_'), 'descriptor__calculatorSoftware', models.Value('_'), 'descriptor__calculatorSoftwareVersion')).filter(descCsvHeader__in=whitelist)
-                reactions = reactions.prefetch_related(models.Prefetch(
-                    'boolrxndescriptorvalue_set', queryset=qs, to_attr='filtered_boolvals'))
-
-                qs = NumRxnDescriptorValue.objects.annotate(descCsvHeader=Concat('descriptor__heading', models.Value(
-                    '_'), 'descriptor__calculatorSoftware', models.Value('_'), 'descriptor__calculatorSoftwareVersion')).filter(descCsvHeader__in=whitelist)
-                reactions = reactions.prefetch_related(models.Prefetch(
-                    'numrxndescriptorvalue_set', queryset=qs, to_attr='filtered_numvals'))
-
-                qs = OrdRxnDescriptorValue.objects.annotate(descCsvHeader=Concat('descriptor__heading', models.Value(
-                    '_'), 'descriptor__calculatorSoftware', models.Value('_'), 'descriptor__calculatorSoftwareVersion')).filter(descCsvHeader__in=whitelist)
-                reactions = reactions.prefetch_related(models.Prefetch(
-                    'ordrxndescriptorvalue_set', queryset=qs, to_attr='filtered_ordvals'))
-
-                qs = CatRxnDescriptorValue.objects.annotate(descCsvHeader=Concat('descriptor__heading', models.Value(
-                    '_'), 'descriptor__calculatorSoftware', models.Value('_'), 'descriptor__calculatorSoftwareVersion')).filter(descCsvHeader__in=whitelist)
-                reactions = reactions.prefetch_related(models.Prefetch(
-                    'catrxndescriptorvalue_set', queryset=qs, to_attr='filtered_catvals'))
+                # Whitelisted descriptor values come from the column store;
+                # each chunk of reactions is aligned against the columns in
+                # one vectorised lookup.
+                columns = DescriptorMatrix().columns(descriptors)
+                reactions = self
             else:
-                reactions = reactions.prefetch_related(
-                    'boolrxndescriptorvalue_set__descriptor')
-                reactions = reactions.prefetch_related(
-                    'catrxndescriptorvalue_set__descriptor')
-                reactions = reactions.prefetch_related(
-                    'ordrxndescriptorvalue_set__descriptor')
-                reactions = reactions.prefetch_related(
-                    'numrxndescriptorvalue_set__descriptor')
-            reactions = reactions.prefetch_related('compounds')
-
-            for item in reactions.batch_iterator():
-                row = {field.name: getattr(item, field.name)
-                       for field in self.model._meta.fields}
-                if whitelist is not None:
-                    row.update(
-                        {dv.descCsvHeader: dv.value for dv in item.filtered_boolvals})
-                    row.update(
-                        {dv.descCsvHeader: dv.value for dv in item.filtered_numvals})
-                    row.update(
-                        {dv.descCsvHeader: dv.value for dv in item.filtered_ordvals})
-                    row.update(
-                        {dv.descCsvHeader: dv.value for dv in item.filtered_catvals})
-                    i = 0
-                    for compoundQ in item.compoundquantity_set.all():
-                        compound_num = 'compound_{}'.format(i)
-                        if compound_num in whitelist:
-                            row[compound_num] = compoundQ.compound.name
-                            row['compound_{}_role'.format(i)] = compoundQ.role.label
-                            row['compound_{}_amount'.format(i)] = compoundQ.amount
-                            row['compound_{}_amount_grams'.format(i)] = compoundQ.amount_grams
-                        i += 1
-                    yield row
+                # Every descriptor is wanted, so values are pivoted straight
+                # out of the value tables a chunk of reactions at a time.
+                columns = None
+                reactions = self.prefetch_related('compounds')
+
+            items = reactions.batch_iterator()
+            while True:
+                chunk = list(islice(items, 5000))
+                if not chunk:
+                    break
+                pks = np.fromiter((item.pk for item in chunk), dtype=np.int64, count=len(chunk))
+                if columns is None:
+                    values = fetchMatrix(pks, descriptors)
                 else:
-                    row.update(
-                        {dv.descriptor.csvHeader: dv.value for dv in item.descriptorValues})
-                    i = 0
-                    for compound in item.compounds.all():
-                        row['compound_{}'.format(i)] = compound.name
-                        i += 1
-                    yield row
+                    values = np.column_stack([align(column, pks) for column in columns]) if columns else np.empty((len(chunk), 0))
+                for rowIndex, item in enumerate(chunk):
+                    row = {field.name: getattr(item, field.name)
+                           for field in self.model._meta.fields}
+                    row.update({header: decode(v) for header, decode, v in zip(headers, decoders, values[rowIndex]) if not np.isnan(v)})
+                    if whitelist is not None:
+                        i = 0
+                        for compoundQ in item.compoundquantity_set.all():
+                            compound_num = 'compound_{}'.format(i)
+                            if compound_num in whitelist:
+                                row[compound_num] = compoundQ.compound.name
+                                row['compound_{}_role'.format(i)] = compoundQ.role.label
+                                row['compound_{}_amount'.format(i)] = compoundQ.amount
+                                row['compound_{}_amount_grams'.format(i)] = compoundQ.amount_grams
+                            i += 1
+                        yield row
+                    else:
+                        i = 0
+                        for compound in item.compounds.all():
+                            row['compound_{}'.format(i)] = compound.name
+                            i += 1
+                        yield row
         else:
             for item in self.batch_iterator():
                 row = {field.name: getattr(item, field.name)
@@ -187,6 +185,24 @@ class ReactionQuerySet(CsvQuerySet, ArffQuerySet):
                     i += 1
                 yield row
 
+    def toNPArray(self, expanded=False, whitelistHeaders=None, missing=np.nan):
+        """
+        Return a numpy array.
+
+        When every requested header is a reaction descriptor the array is built
+        directly from the descriptor matrix store, in which case categorical
+        values appear as the primary keys of their permitted values.
+        """
+        if expanded and whitelistHeaders is not None:
+            headers = self.expandedArffHeaders(whitelistHeaders)
+            descriptors = {d.csvHeader: d for d in self.descriptorsFor(whitelistHeaders)}
+            if all(header in descriptors for header in headers):
+                pks = np.fromiter(self.order_by('pk').values_list('pk', flat=True), dtype=np.int64)
+                matrix = DescriptorMatrix().matrix(pks, [descriptors[header] for header in headers])
+                matrix[np.isnan(matrix)] = missing
+                return matrix
+        return super(ReactionQuerySet, self).toNPArray(expanded, whitelistHeaders, missing)
+
     # From https://djangosnippets.org/snippets/1949/
     def batch_iterator(self, chunksize=5000):
         """
@@ -0,0 +1,94 @@
+"""
+The reaction space hash, identifying reactions made from the same compounds.
+
+The hash is the xxh64 of the pks of the compound of each of a reaction's
+compound quantities, in order, as in the rxnSpaceHash1 descriptor. It is kept
+in its own table, as an indexed signed 64 bit integer, so that reactions can be
+grouped by it (reactions.values_list('pk', 'spaceHash__value')) without joining
+through categorical descriptor values, and is updated whenever a reaction's
+compound quantities change. It lives outside the reaction table so that saving
+a reaction instance loaded before the change cannot overwrite it.
+"""
+from collections import defaultdict
+from django.db import models, connection, transaction
+import xxhash
+
+BATCH_SIZE = 5000
+"""The number of reactions whose compounds are read per query."""
+
+
+def reactionCompounds(reactionPks=None):
+    """
+    Return a dictionary of reaction pk to the sorted pks of the compounds of its compound quantities.
+
+    Every reaction is included if reactionPks is None; otherwise reactions with no compounds map to an empty list.
+    """
+    if reactionPks is None:
+        compounds = defaultdict(list)
+        batches = [DRP.models.CompoundQuantity.objects.all()]
+    else:
+        reactionPks = list(reactionPks)
+        compounds = {pk: [] for pk in reactionPks}
+        batches = (DRP.models.CompoundQuantity.objects.filter(reaction_id__in=reactionPks[i:i + BATCH_SIZE])
+                   for i in range(0, len(reactionPks), BATCH_SIZE))
+    for quantities in batches:
+        for reactionPk, compoundPk in quantities.values_list('reaction_id', 'compound_id'):
+            compounds[reactionPk].append(compoundPk)
+    for compoundPks in compounds.values():
+        compoundPks.sort()
+    return dict(compounds)
+
+
+def hasher(compoundPks):
+    """Return the xxh64 hasher of a sorted list of compound pks."""
+    h = xxhash.xxh64()
+    for compoundPk in compoundPks:
+        h.update('{0:20d}'.format(compoundPk))
+    return h
+
+
+def toSigned(digest):
+    """Return an unsigned 64 bit digest as the signed integer a BIGINT column holds."""
+    return digest - (1 << 64) if digest >= (1 << 63) else digest
+
+
+def spaceHash(compoundPks):
+    """Return the reaction space hash of a sorted list of compound pks, as stored in ReactionSpaceHash.value."""
+    return toSigned(hasher(compoundPks).intdigest())
+
+
+def fromHexDigest(hexDigest):
+    """Return the ReactionSpaceHash value of an rxnSpaceHash1 descriptor value."""
+    return toSigned(int(hexDigest, 16))
+
+
+def updateSpaceHashes(reactionPks=None):
+    """Recalculate and store the hashes of these reactions, or of every reaction if reactionPks is None, in bulk."""
+    hashes = [(reactionPk, spaceHash(compoundPks)) for reactionPk, compoundPks in reactionCompounds(reactionPks).items()]
+    with transaction.atomic():
+        for i in range(0, len(hashes), BATCH_SIZE):
+            chunk = hashes[i:i + BATCH_SIZE]
+            if connection.vendor == 'mysql':
+                qn = connection.ops.quote_name
+                sql = 'INSERT INTO {} ({}, {}) VALUES {} ON DUPLICATE KEY UPDATE {}=VALUES({})'.format(
+                    qn(ReactionSpaceHash._meta.db_table), qn('reaction_id'), qn('value'),
+                    ', '.join(['(%s, %s)'] * len(chunk)), qn('value'), qn('value'))
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, [item for pair in chunk for item in pair])
+            else:
+                ReactionSpaceHash.objects.filter(reaction_id__in=[pk for pk, value in chunk]).delete()
+                ReactionSpaceHash.objects.bulk_create([ReactionSpaceHash(reaction_id=pk, value=value) for pk, value in chunk])
+    return len(hashes)
+
+
+class ReactionSpaceHash(models.Model):
+    """The reaction space hash of one reaction."""
+
+    class Meta:
+        app_label = "DRP"
+
+    reaction = models.OneToOneField("DRP.Reaction", primary_key=True, related_name="spaceHash")
+    value = models.BigIntegerField(db_index=True)
+
+
+import DRP
@@ -1,17 +1,31 @@
 """A module containign only the DescriptorValue class."""
-from django.db import models
+from collections import OrderedDict
+from django.db import models, connections, router, transaction
 from .descriptorValues import CategoricalDescriptorValue, OrdinalDescriptorValue, BooleanDescriptorValue, NumericDescriptorValue
 from .rxnDescriptors import CatRxnDescriptor, NumRxnDescriptor, BoolRxnDescriptor, OrdRxnDescriptor
+from .rxnDescriptorValuesVersion import writeStamp, settledStamp, raiseFloors, versionStates
+from .pendingRxnCalculation import manualValuesChanged, isManualDescriptor
 # Needed to allow for circular dependency.
 import DRP.models
 import DRP.models.performedReaction
 import uuid
 from django.contrib.auth.models import User
 
+
 class RxnDescriptorValueQuerySet(models.query.QuerySet):
     """A queryset which represents a collection of concrete values of a Reaction Descriptor."""
 
-    pass
+    def update(self, **kwargs):
+        """Update the values, stamping them as written now."""
+        return super(RxnDescriptorValueQuerySet, self).update(version=writeStamp(), **kwargs)
+
+    def delete(self):
+        """Delete the values, forcing anything built from their descriptors' values to be rebuilt."""
+        descriptorPks = list(self.values_list('descriptor_id', flat=True).distinct())
+        result = super(RxnDescriptorValueQuerySet, self).delete()
+        raiseFloors(descriptorPks)
+        return result
+
     # def delete(self):
     # trainingModels = DRP.models.StatsModel.objects.filter(descriptors=self.descriptor, testset__in=dataSets.TestSet.objects.filter(reactions__in=set(v.reaction.performedreaction for v in self)))
     # testModels = DRP.models.StatsModel.objects.filter(descriptors=self.descriptor, trainingset__in=dataSets.TrainingSet.objects.filter(reaction__in=set(v.reaction.performedreaction for v in self)))
@@ -27,12 +41,85 @@ class RxnDescriptorValueManager(models.Manager):
         return RxnDescriptorValueQuerySet(self.model, using=self._db)
 
 
+def valuesVersions(descriptorPks):
+    """
+    Return a dictionary of descriptor pk to a token which changes whenever values of that descriptor are written or deleted.
+
+    The tokens are read from the database (see rxnDescriptorValuesVersion), so anything derived from a
+    descriptor's values can be cached under a key including its token and is then never served after the
+    values change, whichever process changed them. While writes to a descriptor may still be committing
+    its token is unique to the call, so nothing is cached against values which are not yet settled.
+    """
+    settled = settledStamp()
+    versions = {}
+    for pk, (token, floor, latest) in versionStates(descriptorPks).items():
+        versions[pk] = '{}.{}.{}'.format(token, floor, latest if latest <= settled else uuid.uuid4().hex)
+    return versions
+
+
 def rxnUid():
-    """Return a unique identifier for a reaction descriptor value."""
-    uid = uuid.uuid4()
-    while CatRxnDescriptorValue.objects.filter(uid=uid).count() > 0 or BoolRxnDescriptorValue.objects.filter(uid=uid).count() > 0 or NumRxnDescriptorValue.objects.filter(uid=uid).count() > 0 or OrdRxnDescriptorValue.objects.filter(uid=uid).count() > 0:
-        uid = uuid.uuid4()
-    return uid
+    """
+    Return a unique identifier for a reaction descriptor value.
+
+    A version 4 uuid carries 122 random bits, so the chance of a clash is negligible and the
+    existing values are not searched for it; this keeps creating values in bulk free of queries.
+    """
+    return str(uuid.uuid4())
+
+
+UPSERT_BATCH_SIZE = 1000
+
+
+def upsertValues(values, batchSize=UPSERT_BATCH_SIZE):
+    """
+    Write reaction descriptor values of any of the four types in bulk.
+
+    A value replaces any existing value for the same reaction and descriptor, which keeps its uid.
+    The values are stamped as written now, which takes no lock, so concurrent writers do not wait.
+    Values are grouped by type and written batchSize at a time with one multi-row
+    INSERT ... ON DUPLICATE KEY UPDATE per batch on MySQL; other databases delete the clashing rows
+    and bulk create. If a reaction and descriptor appear more than once the last value wins, as with
+    successive saves. Values are not validated. Return the number of values written.
+    """
+    byModel = OrderedDict()
+    for value in values:
+        byModel.setdefault(type(value), OrderedDict())[(value.reaction_id, value.descriptor_id)] = value
+    written = 0
+    for model, modelValues in byModel.items():
+        modelValues = list(modelValues.values())
+        using = router.db_for_write(model)
+        stamp = writeStamp()
+        for value in modelValues:
+            value.version = stamp
+        with transaction.atomic(using=using):
+            for i in range(0, len(modelValues), batchSize):
+                _upsertBatch(model, modelValues[i:i + batchSize], connections[using])
+        written += len(modelValues)
+    return written
+
+
+def _upsertBatch(model, values, connection):
+    """Insert or update one batch of values of a single type."""
+    if connection.vendor == 'mysql':
+        qn = connection.ops.quote_name
+        fields = model._meta.concrete_fields
+        row = '({})'.format(', '.join(['%s'] * len(fields)))
+        updates = ', '.join('{0}=VALUES({0})'.format(qn(field.column)) for field in fields
+                            if not field.primary_key and field.attname not in ('reaction_id', 'descriptor_id'))
+        sql = 'INSERT INTO {} ({}) VALUES {} ON DUPLICATE KEY UPDATE {}'.format(
+            qn(model._meta.db_table), ', '.join(qn(field.column) for field in fields), ', '.join([row] * len(values)), updates)
+        params = [field.get_db_prep_save(field.pre_save(value, True), connection=connection)
+                  for value in values for field in fields]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+    else:
+        byDescriptor = {}
+        for value in values:
+            byDescriptor.setdefault(value.descriptor_id, []).append(value.reaction_id)
+        for descriptorPk, reactionPks in byDescriptor.items():
+            models.query.QuerySet(model, using=connection.alias).filter(
+                descriptor_id=descriptorPk, reaction_id__in=reactionPks).delete()
+        model.objects.using(connection.alias).bulk_create(values)
 
 
 class RxnDescriptorValue(models.Model):
@@ -45,6 +132,25 @@ class RxnDescriptorValue(models.Model):
     uid = models.CharField(max_length=36, default=rxnUid, primary_key=True)
     objects = RxnDescriptorValueManager()
     reaction = models.ForeignKey("DRP.Reaction", unique=False)
+    version = models.BigIntegerField(default=writeStamp, db_index=True)
+    """The stamp (see rxnDescriptorValuesVersion) of the time this value was last written."""
+
+    def save(self, *args, **kwargs):
+        """Save the value, stamping it as written now."""
+        self.version = writeStamp()
+        super(RxnDescriptorValue, self).save(*args, **kwargs)
+        self._markDependents()
+
+    def delete(self, *args, **kwargs):
+        """Delete the value, forcing anything built from its descriptor's values to be rebuilt."""
+        super(RxnDescriptorValue, self).delete(*args, **kwargs)
+        raiseFloors([self.descriptor_id])
+        self._markDependents()
+
+    def _markDependents(self):
+        """Mark the reaction for recalculation by the plugins which use manual values, if this is one."""
+        if isManualDescriptor(self.descriptor_id):
+            manualValuesChanged([self.reaction_id])
 
     # def save(self, *args, **kwargs):
     # if self.pk is not None:
@@ -76,6 +182,7 @@ class CatRxnDescriptorValue(CategoricalDescriptorValue, RxnDescriptorValue):
         app_label = "DRP"
         verbose_name = 'Categorical Reaction Descriptor Value'
         unique_together = ('reaction', 'descriptor')
+        index_together = ('descriptor', 'version')
 
 
 class BoolRxnDescriptorValue(BooleanDescriptorValue, RxnDescriptorValue):
@@ -87,6 +194,7 @@ class BoolRxnDescriptorValue(BooleanDescriptorValue, RxnDescriptorValue):
         app_label = "DRP"
         verbose_name = 'Boolean Reaction Descriptor Value'
         unique_together = ('reaction', 'descriptor')
+        index_together = ('descriptor', 'version')
 
 
 class NumRxnDescriptorValue(NumericDescriptorValue, RxnDescriptorValue):
@@ -98,16 +206,18 @@ class NumRxnDescriptorValue(NumericDescriptorValue, RxnDescriptorValue):
         app_label = "DRP"
         verbose_name = 'Numeric Reaction Descriptor Value'
         unique_together = ('reaction', 'descriptor')
+        index_together = ('descriptor', 'version')
 
 
 class OrdRxnDescriptorValue(OrdinalDescriptorValue, RxnDescriptorValue):
     """Contains the ordinal value of a descriptor for a reaction."""
 
-    
     descriptorClass = OrdRxnDescriptor
+
     class Meta:
         app_label = "DRP"
         verbose_name = 'Ordinal Reaction Descriptor Value'
         unique_together = ('reaction', 'descriptor')
-    
+        index_together = ('descriptor', 'version')
+
     rater = models.ForeignKey(User)
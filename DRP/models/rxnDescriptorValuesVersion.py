@@ -0,0 +1,130 @@
+"""
+The state of the reaction values of each descriptor, read from the database.
+
+Every written value is stamped with the time it was written, in microseconds,
+which costs no query and takes no lock, so writers of the same descriptor never
+wait for each other. The latest stamp among a descriptor's values, read through
+the index on descriptor and version, is its watermark. Stamps are taken before
+the writing transaction commits, and on different hosts, so a write may become
+visible after writes stamped later than it; anything built from values read at
+time t is therefore only known to hold every write stamped up to
+t - settings.DESCRIPTOR_VALUES_SETTLE_SECONDS, and writes stamped since must be
+re-read.
+
+Deleting values leaves no rows to find, so deletes raise the descriptor's floor
+once per batch, after the values are deleted: anything built at an earlier floor
+must be rebuilt from scratch. The token is chosen at random when a version row is
+created, so that states from a database which has since been emptied or replaced
+are never mistaken for current ones.
+"""
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.db.models import Max
+import threading
+import time
+import uuid
+import DRP
+
+BATCH_SIZE = 1000
+"""Maximum number of descriptor pks placed in a single IN clause."""
+
+_stampLock = threading.Lock()
+_lastStamp = [0]
+
+
+def _token():
+    return uuid.uuid4().hex
+
+
+def writeStamp():
+    """Return a stamp for values written now: the time in microseconds, increasing within this process."""
+    with _stampLock:
+        _lastStamp[0] = max(int(time.time() * 1000000), _lastStamp[0] + 1)
+        return _lastStamp[0]
+
+
+def settledStamp():
+    """Return the latest stamp which every write still to become visible is known to be later than."""
+    return int((time.time() - settings.DESCRIPTOR_VALUES_SETTLE_SECONDS) * 1000000)
+
+
+def _ensureVersions(descriptorPks):
+    """Create the version rows missing for these descriptors."""
+    existing = set()
+    for i in range(0, len(descriptorPks), BATCH_SIZE):
+        existing.update(RxnDescriptorValuesVersion.objects.filter(
+            descriptor_id__in=descriptorPks[i:i + BATCH_SIZE]).values_list('descriptor_id', flat=True))
+    missing = [pk for pk in descriptorPks if pk not in existing]
+    if missing:
+        try:
+            with transaction.atomic():
+                RxnDescriptorValuesVersion.objects.bulk_create(
+                    [RxnDescriptorValuesVersion(descriptor_id=pk) for pk in missing])
+        except IntegrityError:
+            # another process created some of them first
+            for pk in missing:
+                RxnDescriptorValuesVersion.objects.get_or_create(descriptor_id=pk)
+
+
+def raiseFloors(descriptorPks):
+    """
+    Raise the floors of these descriptors, forcing anything built from their values to be rebuilt.
+
+    Call this once per batch after deleting values, outside the deleting transaction where there is
+    one, so that no lock is held while the values are deleted.
+    """
+    descriptorPks = sorted(set(descriptorPks))
+    if not descriptorPks:
+        return
+    _ensureVersions(descriptorPks)
+    for i in range(0, len(descriptorPks), BATCH_SIZE):
+        RxnDescriptorValuesVersion.objects.filter(descriptor_id__in=descriptorPks[i:i + BATCH_SIZE]).update(
+            floor=models.F('floor') + 1)
+
+
+def _readStates(descriptorPks):
+    states = {}
+    for i in range(0, len(descriptorPks), BATCH_SIZE):
+        for pk, token, floor in RxnDescriptorValuesVersion.objects.filter(
+                descriptor_id__in=descriptorPks[i:i + BATCH_SIZE]).values_list('descriptor_id', 'token', 'floor'):
+            states[pk] = (token, floor)
+    return states
+
+
+def _latestStamps(descriptorPks):
+    """Return a dictionary of descriptor pk to the latest stamp among its values, for those with values."""
+    latest = {}
+    for valueModel in (DRP.models.CatRxnDescriptorValue, DRP.models.BoolRxnDescriptorValue,
+                       DRP.models.OrdRxnDescriptorValue, DRP.models.NumRxnDescriptorValue):
+        for i in range(0, len(descriptorPks), BATCH_SIZE):
+            latest.update(valueModel.objects.filter(descriptor_id__in=descriptorPks[i:i + BATCH_SIZE]).order_by()
+                          .values('descriptor_id').annotate(latest=Max('version')).values_list('descriptor_id', 'latest'))
+    return latest
+
+
+def versionStates(descriptorPks):
+    """
+    Return a dictionary of descriptor pk to (token, floor, latest stamp) for these descriptors.
+
+    Version rows are created for descriptors which have none yet, giving them a fresh token. The
+    latest stamp is 0 for descriptors without values.
+    """
+    descriptorPks = list(descriptorPks)
+    states = _readStates(descriptorPks)
+    missing = [pk for pk in descriptorPks if pk not in states]
+    if missing:
+        _ensureVersions(missing)
+        states.update(_readStates(missing))
+    latest = _latestStamps(descriptorPks)
+    return {pk: (token, floor, latest.get(pk) or 0) for pk, (token, floor) in states.items()}
+
+
+class RxnDescriptorValuesVersion(models.Model):
+    """The version sequence of the reaction values of one descriptor."""
+
+    class Meta:
+        app_label = "DRP"
+
+    descriptor = models.OneToOneField("DRP.Descriptor", primary_key=True, related_name="rxnValuesVersion")
+    token = models.CharField(max_length=32, default=_token)
+    floor = models.BigIntegerField(default=0)
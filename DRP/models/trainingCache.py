@@ -0,0 +1,109 @@
+"""
+A content-addressed store of trained stats models and their test set predictions.
+
+A stats model is determined by its training set, the container's predictors and
+responses, the values of those descriptors and the visitor with its options, so
+when all of those match a model trained before the result is the same. The
+trained model file is kept as an artifact of the training set's content hash
+(see dataSets.artifactPath) under a key covering everything else, and the
+predictions it made for a test set as an artifact of that test set's hash under
+the same key. Descriptor values are covered by their version tokens (see
+rxnDescriptorValues.valuesVersions), so any change to the values misses.
+"""
+import hashlib
+import shutil
+import uuid
+import json
+import os
+from .dataSets import contentHash, artifactPath, touchArtifact
+from .rxnDescriptorValues import valuesVersions
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _setHash(dataSet):
+    """Return the content hash of a data set, computing it for sets which predate the column."""
+    return dataSet.contentHash or contentHash(dataSet.reactions.values_list('pk', flat=True))
+
+
+def _publish(writeTo, path):
+    """Call writeTo with a temporary path and move the result to path, so readers never see a partial file."""
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    partPath = '{}.{}.part'.format(path, uuid.uuid4())
+    writeTo(partPath)
+    os.rename(partPath, path)
+
+
+class TrainingCache(object):
+    """The cached training results for the configuration of one stats model."""
+
+    def __init__(self, container, statsModel):
+        """Work out the key for a stats model of a container; nothing is read until asked for."""
+        predictors = sorted(d.pk for d in container.descriptors)
+        responses = sorted(d.pk for d in container.outcomeDescriptors)
+        versions = valuesVersions(predictors + responses)
+        configuration = json.dumps({
+            'library': container.modelVisitorLibrary,
+            'tool': container.modelVisitorTool,
+            'options': json.loads(container.modelVisitorOptions),
+            'predictors': predictors,
+            'responses': responses,
+            'versions': [versions[pk] for pk in predictors + responses],
+        }, sort_keys=True)
+        self.key = hashlib.sha1(configuration.encode('UTF-8')).hexdigest()
+        self.modelPath = artifactPath(_setHash(statsModel.trainingSet), 'model_{}.model'.format(self.key))
+
+    def _predictionsPath(self, testSet):
+        return artifactPath(_setHash(testSet), 'predictions_{}.json'.format(self.key))
+
+    def hasModel(self):
+        """Whether a model has been trained with this configuration before."""
+        return os.path.isfile(self.modelPath)
+
+    def loadModel(self, outputPath):
+        """Copy the cached model to a stats model's outputFile path, returning False if it has been evicted."""
+        directory = os.path.dirname(outputPath)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        try:
+            shutil.copyfile(self.modelPath, outputPath)
+        except FileNotFoundError:
+            return False
+        touchArtifact(self.modelPath)
+        return True
+
+    def saveModel(self, outputPath):
+        """Keep a copy of a newly trained model file."""
+        _publish(lambda path: shutil.copyfile(outputPath, path), self.modelPath)
+
+    def predictions(self, testSet, outcomeDescriptors):
+        """
+        Return the stored predictions of the model for a test set, or None if there are none.
+
+        They are returned as a dictionary of response descriptor to a (reaction pks, outcomes) tuple.
+        """
+        path = self._predictionsPath(testSet)
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return None
+        touchArtifact(path)
+        responses = {str(d.pk): d for d in outcomeDescriptors}
+        if set(stored) != set(responses):
+            return None
+        return {responses[pk]: (reactionPks, outcomes) for pk, (reactionPks, outcomes) in stored.items()}
+
+    def savePredictions(self, testSet, predictions):
+        """Keep the predictions of the model for a test set, as returned by a visitor's predict."""
+        stored = {str(response.pk): ([reaction.pk for reaction, outcome in outcomes], [outcome for reaction, outcome in outcomes])
+                  for response, outcomes in predictions.items()}
+
+        def write(path):
+            with open(path, 'w') as f:
+                # numpy scalars are not serialisable as they are
+                json.dump(stored, f, default=lambda value: value.item())
+        _publish(write, self._predictionsPath(testSet))
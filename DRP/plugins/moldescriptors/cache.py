@@ -0,0 +1,163 @@
+"""
+A persistent, content-addressed cache of results from external descriptor calculators.
+
+Results are keyed by a hash of the compound's structure (its SMILES, InChI and
+formula) together with the calculatorSoftware, calculatorSoftwareVersion and
+the command used to produce them, so a value is reused for as long as none of
+those change, whatever happens to the compound and descriptor rows in the
+database. Entries live in a single sqlite file at settings.DESCRIPTOR_CACHE_PATH;
+once the stored values exceed settings.DESCRIPTOR_CACHE_MAX_SIZE bytes the least
+recently used entries are evicted. Setting DESCRIPTOR_CACHE_PATH to None turns
+the cache off.
+"""
+import os
+import json
+import sqlite3
+import hashlib
+from time import time
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# fraction of the maximum size to shrink to when evicting, so that eviction does not run on every write
+EVICT_TO = 0.9
+
+
+def structure_hash(compound):
+    """Return a hash of everything about a compound's structure that a calculator might read."""
+    structure = '\n'.join((compound.smiles or '', compound.INCHI or '', compound.formula or ''))
+    return hashlib.sha256(structure.encode('UTF-8')).hexdigest()
+
+
+def cache_key(structureHash, calculatorSoftware, calculatorSoftwareVersion, command):
+    """Return the cache key for one calculated value."""
+    key = '\n'.join((structureHash, calculatorSoftware, calculatorSoftwareVersion, command))
+    return hashlib.sha256(key.encode('UTF-8')).hexdigest()
+
+
+class CalculatorCache(object):
+    """A size-bounded, least recently used store of calculator results with hit and miss counters."""
+
+    def __init__(self, path=None, maxSize=None):
+        """Use the configured file and size unless others are given. A configured path of None disables the cache."""
+        self.path = settings.DESCRIPTOR_CACHE_PATH if path is None else path
+        self.maxSize = settings.DESCRIPTOR_CACHE_MAX_SIZE if maxSize is None else maxSize
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pid = None
+
+    @property
+    def enabled(self):
+        """Whether there is anywhere to keep the cache."""
+        return self.path is not None
+
+    def _connect(self):
+        # sqlite connections cannot be shared with forked processes
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._pid = os.getpid()
+            with self._connection:
+                self._connection.execute(
+                    'CREATE TABLE IF NOT EXISTS result (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)')
+                self._connection.execute('CREATE INDEX IF NOT EXISTS result_used ON result (used)')
+        return self._connection
+
+    def get_many(self, keys):
+        """Return a dictionary of the cached values for those of the keys present, counting hits and misses."""
+        keys = list(set(keys))
+        if not self.enabled or not keys:
+            self.misses += len(keys)
+            return {}
+        connection = self._connect()
+        found = {}
+        # stay below sqlite's limit on the number of parameters
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = connection.execute('SELECT key, value FROM result WHERE key IN ({})'.format(
+                ','.join('?' * len(chunk))), chunk).fetchall()
+            found.update((key, json.loads(value)) for key, value in rows)
+        if found:
+            now = time()
+            with connection:
+                connection.executemany('UPDATE result SET used=? WHERE key=?', ((now, key) for key in found))
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key, default=None):
+        """Return the cached value for a key, or default."""
+        return self.get_many([key]).get(key, default)
+
+    def set_many(self, values):
+        """Store a dictionary of key to (json serialisable) value, evicting old entries if needed."""
+        if not self.enabled or not values:
+            return
+        now = time()
+        rows = []
+        for key, value in values.items():
+            value = json.dumps(value)
+            rows.append((key, value, len(value), now))
+        connection = self._connect()
+        with connection:
+            connection.executemany('INSERT OR REPLACE INTO result (key, value, size, used) VALUES (?, ?, ?, ?)', rows)
+        self.evict()
+
+    def set(self, key, value):
+        """Store a single value."""
+        self.set_many({key: value})
+
+    def size(self):
+        """Return the total size in bytes of the stored values."""
+        if not self.enabled:
+            return 0
+        return self._connect().execute('SELECT COALESCE(SUM(size), 0) FROM result').fetchone()[0]
+
+    def evict(self):
+        """Remove the least recently used entries until the stored values fit within the maximum size."""
+        if not self.enabled or self.maxSize is None:
+            return 0
+        size = self.size()
+        if size <= self.maxSize:
+            return 0
+        connection = self._connect()
+        removed = []
+        target = size - int(self.maxSize * EVICT_TO)
+        cursor = connection.execute('SELECT key, size FROM result ORDER BY used')
+        for key, entrySize in cursor:
+            if target <= 0:
+                break
+            removed.append((key,))
+            target -= entrySize
+        cursor.close()
+        with connection:
+            connection.executemany('DELETE FROM result WHERE key=?', removed)
+        logger.info('Evicted {} calculator results from the cache'.format(len(removed)))
+        return len(removed)
+
+    def clear(self):
+        """Remove every entry."""
+        if self.enabled:
+            with self._connect() as connection:
+                connection.execute('DELETE FROM result')
+
+    def stats(self):
+        """Return a string summarising the hit and miss counts."""
+        total = self.hits + self.misses
+        return '{} hits, {} misses ({:.1f}% hit rate)'.format(
+            self.hits, self.misses, 100.0 * self.hits / total if total else 0)
+
+
+_cache = None
+
+
+def get_cache():
+    """Return the process-wide calculator cache."""
+    global _cache
+    if _cache is None:
+        _cache = CalculatorCache()
+    return _cache
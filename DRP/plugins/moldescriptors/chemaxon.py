@@ -5,11 +5,14 @@ Requires cxcalc (part of JChem) to be installed and licensed.
 """
 import DRP
 from .utils import setup
+from .cache import get_cache, structure_hash, cache_key
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from collections import OrderedDict
 from subprocess import Popen, PIPE
 from itertools import chain
+import os
+import uuid
 import logging
 logger = logging.getLogger("DRP")
 
@@ -40,6 +43,8 @@ if CHEMAXON_VERSION is None:
 calculatorSoftware = 'ChemAxon_cxcalc'
 # number of values to create at a time. Should probably be <= 5000
 create_threshold = 5000
+# number of compounds passed to each batched cxcalc invocation
+batch_size = 200
 
 
 # The descriptor versions correspond to either the first ChemAxon version in which they were used
@@ -267,7 +272,12 @@ def delete_descriptors(compound_set, descriptorDict, whitelist=None):
 
 
 def calculate_many(compound_set, verbose=False, whitelist=None):
-    """Bulk calculation of descriptors."""
+    """
+    Bulk calculation of descriptors.
+
+    Compounds are handled batch_size at a time with one leconformer and one descriptor invocation of cxcalc
+    per batch. Compounds the batch run gives no result for are calculated individually as before.
+    """
     if verbose:
         logger.info("Creating descriptor dictionary")
     descriptorDict = setup_pHdependentDescriptors(_descriptorDict)
@@ -282,14 +292,24 @@ def calculate_many(compound_set, verbose=False, whitelist=None):
 
     num_to_create = []
     ord_to_create = []
-    filtered_cxcalcCommands = {
-        k: v for k, v in cxcalcCommands.items() if k in descriptorDict.keys()}
-    for i, compound in enumerate(compound_set):
+    filtered_cxcalcCommands = OrderedDict(
+        (k, v) for k, v in cxcalcCommands.items() if k in descriptorDict.keys())
+    compounds = list(compound_set)
+    cache = get_cache()
+    for start in range(0, len(compounds), batch_size):
+        batch = compounds[start:start + batch_size]
         if verbose:
-            logger.info("{}; Compound {} ({}/{})".format(compound,
-                                                         compound.pk, i + 1, len(compound_set)))
-        num_to_create, ord_to_create = _calculate(
-            compound, descriptorDict, filtered_cxcalcCommands, verbose=verbose, num_to_create=num_to_create, ord_to_create=ord_to_create)
+            logger.info("Compounds {}-{} of {}".format(start + 1, start + len(batch), len(compounds)))
+        batch = _from_cache(batch, descriptorDict, filtered_cxcalcCommands, num_to_create, ord_to_create)
+        results = {}
+        num_to_create, ord_to_create, missed = _calculate_batch(
+            batch, descriptorDict, filtered_cxcalcCommands, verbose=verbose, num_to_create=num_to_create, ord_to_create=ord_to_create, results=results)
+        for compound in missed:
+            if verbose:
+                logger.info("{}; Compound {} calculated individually".format(compound, compound.pk))
+            num_to_create, ord_to_create = _calculate(
+                compound, descriptorDict, filtered_cxcalcCommands, verbose=verbose, num_to_create=num_to_create, ord_to_create=ord_to_create, results=results)
+        _store_results(results, descriptorDict, filtered_cxcalcCommands)
         if len(num_to_create) > create_threshold:
             if verbose:
                 logger.info('Creating {} numeric values'.format(
@@ -299,7 +319,7 @@ def calculate_many(compound_set, verbose=False, whitelist=None):
         if len(ord_to_create) > create_threshold:
             if verbose:
                 logger.info('Creating {} ordinal values'.format(
-                    len(Ord_to_create)))
+                    len(ord_to_create)))
             DRP.models.OrdMolDescriptorValue.objects.bulk_create(ord_to_create)
             ord_to_create = []
 
@@ -309,6 +329,8 @@ def calculate_many(compound_set, verbose=False, whitelist=None):
     if verbose:
         logger.info('Creating {} ordinal values'.format(len(ord_to_create)))
     DRP.models.OrdMolDescriptorValue.objects.bulk_create(ord_to_create)
+    if verbose:
+        logger.info('Calculator cache: {}'.format(cache.stats()))
 
 
 def calculate(compound, verbose=False, whitelist=None):
@@ -326,12 +348,17 @@ def calculate(compound, verbose=False, whitelist=None):
 
     delete_descriptors([compound], descriptorDict, whitelist=whitelist)
 
-    filtered_cxcalcCommands = {
-        k: v for k, v in cxcalcCommands.items() if k in descriptorDict.keys()}
+    filtered_cxcalcCommands = OrderedDict(
+        (k, v) for k, v in cxcalcCommands.items() if k in descriptorDict.keys())
     if verbose:
         logger.info("Creating new descriptor values.")
-    num_to_create, ord_to_create = _calculate(
-        compound, descriptorDict, filtered_cxcalcCommands, verbose=verbose)
+    num_to_create = []
+    ord_to_create = []
+    if _from_cache([compound], descriptorDict, filtered_cxcalcCommands, num_to_create, ord_to_create):
+        results = {}
+        num_to_create, ord_to_create = _calculate(
+            compound, descriptorDict, filtered_cxcalcCommands, verbose=verbose, results=results)
+        _store_results(results, descriptorDict, filtered_cxcalcCommands)
 
     if verbose:
         logger.info("Creating {} numerical and {} ordinal".format(
@@ -343,7 +370,43 @@ def calculate(compound, verbose=False, whitelist=None):
     DRP.models.OrdMolDescriptorValue.objects.bulk_create(ord_to_create)
 
 
-def _calculate(compound, descriptorDict, cxcalcCommands, verbose=False, num_to_create=None, ord_to_create=None):
+def _cxcalc_args(cxcalcCommands):
+    """Flatten the descriptor commands into cxcalc arguments."""
+    return [x for x in chain(*(command.split(' ') for command in cxcalcCommands.values()))]
+
+
+def _cache_keys(compound, descriptorDict, cxcalcCommands):
+    """Return the calculator cache keys for the results of each command for a compound, in command order."""
+    structure = structure_hash(compound)
+    return [cache_key(structure, descriptorDict[k].calculatorSoftware, descriptorDict[k].calculatorSoftwareVersion, command)
+            for k, command in cxcalcCommands.items()]
+
+
+def _from_cache(compounds, descriptorDict, cxcalcCommands, num_to_create, ord_to_create):
+    """Create values for the compounds with every result cached and return the list of those remaining."""
+    if not cxcalcCommands:
+        return list(compounds)
+    keys = {compound: _cache_keys(compound, descriptorDict, cxcalcCommands) for compound in compounds}
+    cached = get_cache().get_many(key for compoundKeys in keys.values() for key in compoundKeys)
+    commandKeys = tuple(cxcalcCommands.keys())
+    remaining = []
+    for compound in compounds:
+        if all(key in cached for key in keys[compound]):
+            _create_values(compound, descriptorDict, commandKeys, [cached[key] for key in keys[compound]], num_to_create, ord_to_create)
+        else:
+            remaining.append(compound)
+    return remaining
+
+
+def _store_results(results, descriptorDict, cxcalcCommands):
+    """Add the raw cxcalc output for each calculated compound to the calculator cache."""
+    values = {}
+    for compound, resList in results.items():
+        values.update(zip(_cache_keys(compound, descriptorDict, cxcalcCommands), resList))
+    get_cache().set_many(values)
+
+
+def _calculate(compound, descriptorDict, cxcalcCommands, verbose=False, num_to_create=None, ord_to_create=None, results=None):
     if num_to_create is None:
         num_to_create = []
     if ord_to_create is None:
@@ -354,7 +417,6 @@ def _calculate(compound, descriptorDict, cxcalcCommands, verbose=False, num_to_c
         lecProc = Popen([settings.CHEMAXON_DIR[CHEMAXON_VERSION] + 'cxcalc', compound.smiles,
                          'leconformer'], stdout=PIPE, stderr=PIPE, close_fds=True)  # lec = lowest energy conformer
         lecProc.wait()
-        print(lecProc.returncode)
         if lecProc.returncode == 0:
             lec, lecErr = lecProc.communicate()
             notFound = False
@@ -366,12 +428,10 @@ def _calculate(compound, descriptorDict, cxcalcCommands, verbose=False, num_to_c
             lec, lecErr = lecProc.communicate()
             notFound = False
 
-    print(notFound)
-    print(lec)
     if not notFound or lec != '':
         # -N ih means leave off the header row and id column
-        calcProc = Popen([settings.CHEMAXON_DIR[CHEMAXON_VERSION] + 'cxcalc', '-N', 'ih', lec] + [x for x in chain(
-            *(command.split(' ') for command in cxcalcCommands.values()))], stdout=PIPE, stderr=PIPE, close_fds=True)
+        calcProc = Popen([settings.CHEMAXON_DIR[CHEMAXON_VERSION] + 'cxcalc', '-N', 'ih', lec] + _cxcalc_args(cxcalcCommands),
+                         stdout=PIPE, stderr=PIPE, close_fds=True)
         calcProc.wait()
         if calcProc.returncode == 0:
             res, resErr = calcProc.communicate()
@@ -380,51 +440,8 @@ def _calculate(compound, descriptorDict, cxcalcCommands, verbose=False, num_to_c
                 if len(resLines) == 2:  # last line is blank
                     resList = resLines[0].split('\t')
                     commandKeys = tuple(cxcalcCommands.keys())
-
                     if len(resList) == len(commandKeys):
-                        for i in range(len(resList)):
-                            if _descriptorDict[commandKeys[i]]['type'] == 'num':
-                                n = DRP.models.NumMolDescriptorValue(descriptor=descriptorDict[commandKeys[
-                                                                     i]], compound=compound, value=float(resList[i]))
-                                # I hate this special case, but this might not
-                                # stick around so I'm leaving it for now
-                                if commandKeys[i] == 'vanderwaals' and 'N' in compound.elements.keys():
-                                    n2 = DRP.models.NumMolDescriptorValue(descriptor=descriptorDict['vdw_area_N_ratio'], compound=compound,
-                                                                          value=float(resList[i]) / compound.elements['N']['stoichiometry'])
-                                else:
-                                    n2 = None
-                                try:
-                                    n.full_clean()
-                                    if n2 is not None:
-                                        n2.full_clean()
-                                except ValidationError as e:
-                                    logger.warning('Value {} for compound {} and descriptor {} failed validation. Value set to None. Validation error message: {}'.format(
-                                        n.value, n.compound, n.descriptor, e))
-                                    n.value = None
-                                num_to_create.append(n)
-                                if n2 is not None:
-                                    num_to_create.append(n2)
-                            elif _descriptorDict[commandKeys[i]]['type'] == 'ord':
-                                o = DRP.models.OrdMolDescriptorValue(descriptor=descriptorDict[commandKeys[
-                                                                     i]], compound=compound, value=int(resList[i]))
-                                try:
-                                    o.full_clean()
-                                except ValidationError as e:
-                                    logger.warning('Value {} for compound {} and descriptor {} failed validation. Value set to None. Validation error message: {}'.format(
-                                        o.value, o.compound, o.descriptor, e))
-                                    o.value = None
-                                ord_to_create.append(o)
-                            else:
-                                return ValueError('Descriptor has unrecognized type {}'.format(_descriptorDict[commandKeys[i]]['type']))
-                            # elif _descriptorDict[commandKeys[i]]['type'] == 'bool':
-                                # Not sure whether cxcalc even returns any boolean values, but if it does I don't know how it notates them and they should be coerced correctly
-                                # commenting out this bit since it should be double checked before anyone uses it
-                                # bool_to_create.append(DRP.models.BoolMolDescriptorValue(descriptor=descriptorDict[commandKeys[i]], compound=compound, bool(int(value=resList[i])))
-                            # NOTE: No categorical descriptors are included yet, and since they are more complicated to code I've left it for the moment.
-                            # NOTE: Calculation failure values are not included in the documentation, so I've assumed that it doesn't happen, since we have no way of identifying
-                            # for it other than for the database to push it out
-                            # as a part of validation procedures.
-
+                        _create_values(compound, descriptorDict, commandKeys, resList, num_to_create, ord_to_create, results)
                     else:
                         raise RuntimeError("Number of cxcalc commands ({}) does not match number of results ({})".format(
                             len(commandKeys), len(resList)))
@@ -437,3 +454,120 @@ def _calculate(compound, descriptorDict, cxcalcCommands, verbose=False, num_to_c
         logger.warning("Compound not found!!")
 
     return num_to_create, ord_to_create
+
+
+def _calculate_batch(compounds, descriptorDict, cxcalcCommands, verbose=False, num_to_create=None, ord_to_create=None, results=None):
+    """
+    Calculate descriptors for several compounds with a fixed number of cxcalc invocations.
+
+    The SMILES of every compound are written to one file, named by compound pk, from which cxcalc produces the
+    lowest energy conformers in a single call. The conformers are then passed to a single descriptor call whose
+    tabular output has one row per conformer.
+    Return the new value lists and the compounds for which no result was obtained. The raw results for each
+    compound are added to the results dictionary if one is given.
+    """
+    if num_to_create is None:
+        num_to_create = []
+    if ord_to_create is None:
+        ord_to_create = []
+    cxcalc = settings.CHEMAXON_DIR[CHEMAXON_VERSION] + 'cxcalc'
+    withSmiles = [c for c in compounds if c.smiles is not None and c.smiles != '' and len(c.smiles.split()) == 1]
+    missed = [c for c in compounds if c not in withSmiles]
+    if not withSmiles:
+        return num_to_create, ord_to_create, missed
+    byPk = {str(c.pk): c for c in withSmiles}
+    stem = os.path.join(settings.TMP_DIR, 'cxcalc_{}'.format(uuid.uuid4()))
+    smilesPath = stem + '.smi'
+    lecPath = stem + '.sdf'
+    try:
+        with open(smilesPath, 'w') as f:
+            for compound in withSmiles:
+                f.write('{} {}\n'.format(compound.smiles, compound.pk))
+        lecProc = Popen([cxcalc, smilesPath, 'leconformer'], stdout=PIPE, stderr=PIPE, close_fds=True)
+        lec, lecErr = lecProc.communicate()
+        # split the conformers by record, keeping those whose name maps back to a compound
+        records = [r.strip('\n') for r in lec.decode('UTF-8').split('$$$$') if r.strip()]
+        conformers = []
+        for record in records:
+            compound = byPk.get(record.split('\n', 1)[0].strip())
+            if compound is not None and compound not in conformers:
+                conformers.append((compound, record))
+        if lecProc.returncode != 0 or not conformers:
+            return num_to_create, ord_to_create, missed + withSmiles
+        with open(lecPath, 'w') as f:
+            for compound, record in conformers:
+                f.write(record + '\n$$$$\n')
+        # -N h leaves off the header row; the id column is the 1-based position in the conformer file
+        calcProc = Popen([cxcalc, '-N', 'h', lecPath] + _cxcalc_args(cxcalcCommands), stdout=PIPE, stderr=PIPE, close_fds=True)
+        res, resErr = calcProc.communicate()
+    finally:
+        for path in (smilesPath, lecPath):
+            if os.path.exists(path):
+                os.remove(path)
+    if resErr:
+        logger.warning('cxcalc reported errors for a batch of {} compounds: {}'.format(len(conformers), resErr.decode('UTF-8', 'replace')))
+    calculated = set()
+    commandKeys = tuple(cxcalcCommands.keys())
+    if calcProc.returncode == 0:
+        for line in res.decode('UTF-8').split('\n'):
+            resList = line.split('\t')
+            if len(resList) != len(commandKeys) + 1:
+                continue
+            try:
+                compound = conformers[int(resList[0]) - 1][0]
+                [float(value) for value in resList[1:]]
+            except (ValueError, IndexError):
+                continue
+            if compound not in calculated:
+                _create_values(compound, descriptorDict, commandKeys, resList[1:], num_to_create, ord_to_create, results)
+                calculated.add(compound)
+    missed += [c for c in withSmiles if c not in calculated]
+    return num_to_create, ord_to_create, missed
+
+
+def _create_values(compound, descriptorDict, commandKeys, resList, num_to_create, ord_to_create, results=None):
+    """Create the descriptor values for one compound from one row of cxcalc output, recording the row in results if given."""
+    if results is not None:
+        results[compound] = resList
+    for i in range(len(resList)):
+        if _descriptorDict[commandKeys[i]]['type'] == 'num':
+            n = DRP.models.NumMolDescriptorValue(descriptor=descriptorDict[commandKeys[
+                                                 i]], compound=compound, value=float(resList[i]))
+            # I hate this special case, but this might not
+            # stick around so I'm leaving it for now
+            if commandKeys[i] == 'vanderwaals' and 'N' in compound.elements.keys():
+                n2 = DRP.models.NumMolDescriptorValue(descriptor=descriptorDict['vdw_area_N_ratio'], compound=compound,
+                                                      value=float(resList[i]) / compound.elements['N']['stoichiometry'])
+            else:
+                n2 = None
+            try:
+                n.full_clean()
+                if n2 is not None:
+                    n2.full_clean()
+            except ValidationError as e:
+                logger.warning('Value {} for compound {} and descriptor {} failed validation. Value set to None. Validation error message: {}'.format(
+                    n.value, n.compound, n.descriptor, e))
+                n.value = None
+            num_to_create.append(n)
+            if n2 is not None:
+                num_to_create.append(n2)
+        elif _descriptorDict[commandKeys[i]]['type'] == 'ord':
+            o = DRP.models.OrdMolDescriptorValue(descriptor=descriptorDict[commandKeys[
+                                                 i]], compound=compound, value=int(resList[i]))
+            try:
+                o.full_clean()
+            except ValidationError as e:
+                logger.warning('Value {} for compound {} and descriptor {} failed validation. Value set to None. Validation error message: {}'.format(
+                    o.value, o.compound, o.descriptor, e))
+                o.value = None
+            ord_to_create.append(o)
+        else:
+            raise ValueError('Descriptor has unrecognized type {}'.format(_descriptorDict[commandKeys[i]]['type']))
+        # elif _descriptorDict[commandKeys[i]]['type'] == 'bool':
+            # Not sure whether cxcalc even returns any boolean values, but if it does I don't know how it notates them and they should be coerced correctly
+            # commenting out this bit since it should be double checked before anyone uses it
+            # bool_to_create.append(DRP.models.BoolMolDescriptorValue(descriptor=descriptorDict[commandKeys[i]], compound=compound, bool(int(value=resList[i])))
+        # NOTE: No categorical descriptors are included yet, and since they are more complicated to code I've left it for the moment.
+        # NOTE: Calculation failure values are not included in the documentation, so I've assumed that it doesn't happen, since we have no way of identifying
+        # for it other than for the database to push it out
+        # as a part of validation procedures.
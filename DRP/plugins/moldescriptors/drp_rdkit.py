@@ -2,6 +2,7 @@
 # I wanted to name this module rdkit, but then we get name conflicts...
 # lol python
 from .utils import setup
+from .cache import get_cache, structure_hash, cache_key
 import DRP
 from DRP import chemical_data
 import rdkit.Chem
@@ -70,6 +71,8 @@ def calculate_many(compound_set, verbose=False, whitelist=None):
         n.save()
 #    DRP.models.NumMolDescriptorValue.objects.bulk_create(resnums)
     DRP.models.BoolMolDescriptorValue.objects.bulk_create(resbools)
+    if verbose:
+        logger.info('Calculator cache: {}'.format(get_cache().stats()))
 
 
 def validateNumeric(v):
@@ -95,36 +98,59 @@ def recurseSumCharge(atom, already_seen_ids=None):
 
 
 def calculate(compound, verbose=False, whitelist=None):
-    """Calculate the descriptors from this plugin for a compound."""
-    heading = 'mw'
+    """
+    Calculate the descriptors from this plugin for a compound.
+
+    Results are taken from the calculator cache when every requested value is there for the compound's
+    current structure, and added to it otherwise.
+    """
+    tracer.debug('Calculate function.')
+    headings = [heading for heading in _descriptorDict if whitelist is None or heading in whitelist]
+    structure = structure_hash(compound)
+    keys = {heading: cache_key(structure, calculatorSoftware, _descriptorDict[heading]['calculatorSoftwareVersion'], heading)
+            for heading in headings}
+    cache = get_cache()
+    cached = cache.get_many(keys.values())
+    if all(key in cached for key in keys.values()):
+        results = {heading: cached[keys[heading]] for heading in headings}
+    else:
+        results = _calculate(compound, whitelist=whitelist)
+        cache.set_many({keys[heading]: value for heading, value in results.items()})
+
     nums = []
     bools = []
-    tracer.debug('Calculate function.')
+    for heading, value in results.items():
+        if _descriptorDict[heading]['type'] == 'num':
+            v = DRP.models.NumMolDescriptorValue(
+                value=value, descriptor=descriptorDict[heading], compound=compound)
+            validateNumeric(v)
+            nums.append(v)
+        else:
+            v = DRP.models.BoolMolDescriptorValue(
+                value=value, descriptor=descriptorDict[heading], compound=compound)
+            validateNumeric(v)
+            bools.append(v)
+    tracer.debug("here are nums: {}".format(str(nums)))
+    tracer.debug("here are bools: {}".format(str(bools)))
+    return nums, bools
+
+
+def _calculate(compound, whitelist=None):
+    """Return a dictionary of descriptor heading to the raw value calculated for a compound."""
+    results = {}
+    heading = 'mw'
     if whitelist is None or heading in whitelist:
-        mw = sum(pt.GetAtomicWeight(pt.GetAtomicNumber(str(element))) * float(
+        results[heading] = sum(pt.GetAtomicWeight(pt.GetAtomicNumber(str(element))) * float(
             compound.elements[element]['stoichiometry']) for element in compound.elements)
-
-        v = DRP.models.NumMolDescriptorValue(
-            value=mw, descriptor=descriptorDict[heading], compound=compound)
-        validateNumeric(v)
-        nums.append(v)
     mol = rdkit.Chem.MolFromSmiles(compound.smiles)
     if mol is None:
         logger.warning(
             'Compound {} has no smiles. Skipping calculations for rdkit molecular descriptors.'.format(compound.smiles))
     else:
         if whitelist is None or 'rbc' in whitelist:
-            rbc = Descriptors.NumRotatableBonds(mol)
-            v = DRP.models.NumMolDescriptorValue(
-                value=rbc, descriptor=descriptorDict['rbc'], compound=compound)
-            validateNumeric(v)
-            nums.append(v)
+            results['rbc'] = Descriptors.NumRotatableBonds(mol)
         if whitelist is None or 'Chi0v' in whitelist:
-            chi0v = Descriptors.Chi0v(mol)
-            v = DRP.models.NumMolDescriptorValue(value=chi0v, descriptor=descriptorDict[
-                                                 'Chi0v'], compound=compound)
-            validateNumeric(v)
-            nums.append(v)
+            results['Chi0v'] = Descriptors.Chi0v(mol)
         for element in inorgElements.keys():
             oxStates = []
             for atom in mol.GetAtoms():  # weird capitalisation, but correct.
@@ -134,10 +160,5 @@ def calculate(compound, verbose=False, whitelist=None):
             for ox in range(0, 9):
                 oxString = '{}@{}'.format(element, ox)
                 if (whitelist is None) or (oxString in whitelist):
-                    v = DRP.models.BoolMolDescriptorValue(
-                        value=ox in oxStates, descriptor=descriptorDict[oxString], compound=compound)
-                    validateNumeric(v)
-                    bools.append(v)
-    tracer.debug("here are nums: {}".format(str(nums)))
-    tracer.debug("here are bools: {}".format(str(bools)))
-    return nums, bools
+                    results[oxString] = ox in oxStates
+    return results
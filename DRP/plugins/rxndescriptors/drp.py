@@ -3,6 +3,7 @@ import logging
 from itertools import chain
 
 import xxhash
+import numpy as np
 from numpy import mean, average as wmean
 from scipy.stats import gmean
 from django.db.models import Sum
@@ -15,8 +16,15 @@ from DRP.chemical_data import elements
 logger = logging.getLogger(__name__)
 
 calculatorSoftware = 'DRP'
+
+dependencies = ('quantities', 'mol_descriptors', 'manual')
+"""What the values are calculated from (see DRP.models.pendingRxnCalculation)."""
 # number of values to create at a time. Should probably be <= 5000
 create_threshold = 000
+# number of reactions handled by each pass of the vectorised batch engine
+batch_size = 500
+# maximum number of primary keys placed in a single IN clause
+in_chunk = 1000
 
 _descriptorDict = {}
 
@@ -355,71 +363,50 @@ def calculate_many(reaction_set, verbose=False, bulk_delete=True, whitelist=None
     num_vals_to_create = []
     bool_vals_to_create = []
 
-    for i, reaction in enumerate(reaction_set):
-        if verbose:
-            logger.info("{} ({}/{})".format(reaction,
-                                            i + 1, len(reaction_set)))
-        if bulk_delete:
-            if verbose:
-                logger.info("Deleting old descriptor values")
-            _delete_values([reaction], descs_to_delete)
-
+    reactions = list(reaction_set)
+    for start in range(0, len(reactions), batch_size):
+        batch = reactions[start:start + batch_size]
         if verbose:
-            logger.info("Calculating new values.".format(
-                reaction, i + 1, len(reaction_set)))
-        num_vals_to_create, bool_vals_to_create = _calculate(
-            reaction, descriptorDict, verbose=verbose, whitelist=whitelist, num_vals_to_create=num_vals_to_create, bool_vals_to_create=bool_vals_to_create)
+            logger.info("Calculating new values for reactions {}-{} of {}".format(
+                start + 1, start + len(batch), len(reactions)))
+        num_vals_to_create, bool_vals_to_create = _calculate_batch(
+            batch, descriptorDict, verbose=verbose, whitelist=whitelist, num_vals_to_create=num_vals_to_create, bool_vals_to_create=bool_vals_to_create)
 
-        if len(num_vals_to_create) > create_threshold:
+        if len(num_vals_to_create) + len(bool_vals_to_create) > create_threshold:
             if verbose:
-                logger.info("Creating {} Numeric values".format(
-                    len(num_vals_to_create)))
-            DRP.models.NumRxnDescriptorValue.objects.bulk_create(
-                num_vals_to_create)
+                logger.info("Writing {} Numeric and {} Boolean values".format(
+                    len(num_vals_to_create), len(bool_vals_to_create)))
+            DRP.models.rxnDescriptorValues.upsertValues(num_vals_to_create + bool_vals_to_create)
             num_vals_to_create = []
-        if len(bool_vals_to_create) > create_threshold:
-            if verbose:
-                logger.info("Creating {} Boolean values".format(
-                    len(bool_vals_to_create)))
-            DRP.models.BoolRxnDescriptorValue.objects.bulk_create(
-                bool_vals_to_create)
             bool_vals_to_create = []
 
     if verbose:
-        logger.info("Creating {} Numeric values".format(
-            len(num_vals_to_create)))
-    DRP.models.NumRxnDescriptorValue.objects.bulk_create(num_vals_to_create)
-    if verbose:
-        logger.info("Creating {} Boolean values".format(
-            len(bool_vals_to_create)))
-    DRP.models.BoolRxnDescriptorValue.objects.bulk_create(bool_vals_to_create)
+        logger.info("Writing {} Numeric and {} Boolean values".format(
+            len(num_vals_to_create), len(bool_vals_to_create)))
+    DRP.models.rxnDescriptorValues.upsertValues(num_vals_to_create + bool_vals_to_create)
 
     if verbose:
         logger.info("Creating reaction pH values")
 
     num_vals_to_create = []
-    for i, reaction in enumerate(reaction_set):
-        if verbose:
-            logger.info("{} ({}/{})".format(reaction,
-                                            i + 1, len(reaction_set)))
-
+    for start in range(0, len(reactions), batch_size):
+        batch = reactions[start:start + batch_size]
         if verbose:
-            logger.info("Calculating new values.".format(
-                reaction, i + 1, len(reaction_set)))
-        num_vals_to_create = _calculateRxnpH(reaction, descriptorDict, _reaction_pH_Descriptors,
-                                             verbose=verbose, whitelist=whitelist, vals_to_create=num_vals_to_create)
+            logger.info("Calculating reaction pH values for reactions {}-{} of {}".format(
+                start + 1, start + len(batch), len(reactions)))
+        num_vals_to_create = _calculate_batch_pH(batch, descriptorDict, _reaction_pH_Descriptors,
+                                                 whitelist=whitelist, vals_to_create=num_vals_to_create)
         if len(num_vals_to_create) > create_threshold:
             if verbose:
-                logger.info("Creating {} Numeric values".format(
+                logger.info("Writing {} Numeric values".format(
                     len(num_vals_to_create)))
-            DRP.models.NumRxnDescriptorValue.objects.bulk_create(
-                num_vals_to_create)
+            DRP.models.rxnDescriptorValues.upsertValues(num_vals_to_create)
             num_vals_to_create = []
 
     if verbose:
-        logger.info("Creating {} Numeric values".format(
+        logger.info("Writing {} Numeric values".format(
             len(num_vals_to_create)))
-    DRP.models.NumRxnDescriptorValue.objects.bulk_create(num_vals_to_create)
+    DRP.models.rxnDescriptorValues.upsertValues(num_vals_to_create)
 
 
 def calculate(reaction, verbose=False, whitelist=None):
@@ -427,7 +414,7 @@ def calculate(reaction, verbose=False, whitelist=None):
     # Set up the actual descriptor dictionary.
     if verbose:
         logger.info("Creating descriptor dictionary")
-    descriptorDict = make_dict()[0]
+    descriptorDict, _reaction_pH_descriptors = make_dict()
     if whitelist is None:
         descs_to_delete = descriptorDict.values()
     else:
@@ -438,27 +425,49 @@ def calculate(reaction, verbose=False, whitelist=None):
     _delete_values([reaction], descs_to_delete)
     if verbose:
         logger.info("Calculating new values")
-    num_vals_to_create, bool_vals_to_create = _calculate(
-        reaction, descriptorDict, verbose=verbose, whitelist=whitelist)
-
-    if verbose:
-        logger.info("Creating {} Numeric values".format(
-            len(num_vals_to_create)))
-    DRP.models.NumRxnDescriptorValue.objects.bulk_create(num_vals_to_create)
-    if verbose:
-        logger.info("Creating {} Boolean values".format(
-            len(bool_vals_to_create)))
-    DRP.models.BoolRxnDescriptorValue.objects.bulk_create(bool_vals_to_create)
+    num_vals_to_create, bool_vals_to_create = _calculate_batch(
+        [reaction], descriptorDict, verbose=verbose, whitelist=whitelist)
 
     if verbose:
         logger.info("Calculating reaction pH values")
-    num_vals_to_create = _calculateRxnpH(reaction, descriptorDict, _reaction_pH_descriptors,
-                                         verbose=verbose, whitelist=whitelist, vals_to_create=num_vals_to_create)
+    num_vals_to_create = _calculate_batch_pH([reaction], descriptorDict, _reaction_pH_descriptors,
+                                             whitelist=whitelist, vals_to_create=num_vals_to_create)
 
     if verbose:
-        logger.info("Creating {} Numeric values".format(
-            len(num_vals_to_create)))
-    DRP.models.NumRxnDescriptorValue.objects.bulk_create(num_vals_to_create)
+        logger.info("Writing {} Numeric and {} Boolean values".format(
+            len(num_vals_to_create), len(bool_vals_to_create)))
+    DRP.models.rxnDescriptorValues.upsertValues(num_vals_to_create + bool_vals_to_create)
+
+
+def calculate_unsaved(quantities, whitelist, pHs=None):
+    """
+    Calculate descriptor values for reactions which are not in the database, without writing anything.
+
+    quantities holds, for each reaction, a list of (compound pk, compound role pk, amount) tuples, and
+    pHs the reaction pH of each reaction, if known. Only the descriptors with headings in whitelist are
+    calculated. Return a list holding, for each reaction, a dictionary of heading to value.
+    """
+    if pHs is None:
+        pHs = [None] * len(quantities)
+    # as in _calculateRxnpH, reaction pH descriptors copy the descriptor for the reaction's own pH
+    pH_headings = [heading for heading in whitelist if '_pHreaction_' in heading]
+    sources = [{heading: heading.replace('_pHreaction_', '_pH{}_'.format(str(float(pH)).replace('.', '_')))
+                for heading in pH_headings} if pH is not None else {} for pH in pHs]
+    wanted = set(whitelist).union(*(source.values() for source in sources))
+
+    def value(reaction_id, descriptor, value):
+        return reaction_id, descriptor, value
+
+    rows = [(i, compound, role, amount) for i, reaction in enumerate(quantities) for compound, role, amount in reaction]
+    num_vals, bool_vals = _aggregate(list(range(len(quantities))), rows, {heading: heading for heading in wanted},
+                                     value, value, whitelist=wanted)
+    values = [{} for reaction in quantities]
+    for i, heading, v in chain(num_vals, bool_vals):
+        values[i][heading] = v
+    for reaction_values, source in zip(values, sources):
+        for heading in pH_headings:
+            reaction_values[heading] = reaction_values.get(source[heading]) if heading in source else None
+    return values
 
 
 def _calculate(reaction, descriptorDict, verbose=False, whitelist=None, num_vals_to_create=None, bool_vals_to_create=None):
@@ -735,6 +744,299 @@ def _calculate(reaction, descriptorDict, verbose=False, whitelist=None, num_vals
     return num_vals_to_create, bool_vals_to_create
 
 
+def _in_chunks(queryset, field, pks):
+    """Yield the rows of a values_list queryset restricted to pks, one IN clause of at most in_chunk keys at a time."""
+    pks = list(pks)
+    for i in range(0, len(pks), in_chunk):
+        for row in queryset.filter(**{'{}__in'.format(field): pks[i:i + in_chunk]}):
+            yield row
+
+
+def _mol_value_matrix(valueModel, compound_pks, descriptors):
+    """
+    Load the values of the given molecular descriptors for the given compounds in one pass.
+
+    Return a float array of shape (compounds, descriptors) in the order given, with NaN where the value is
+    missing or NULL. Categorical values are represented by the primary key of their permitted value.
+    """
+    matrix = np.full((len(compound_pks), len(descriptors)), np.nan)
+    if len(compound_pks) == 0 or len(descriptors) == 0:
+        return matrix
+    compound_index = {pk: i for i, pk in enumerate(compound_pks)}
+    descriptor_index = {d.pk: j for j, d in enumerate(descriptors)}
+    qs = valueModel.objects.filter(descriptor__in=descriptors).values_list('compound_id', 'descriptor_id', 'value')
+    for compound_id, descriptor_id, value in _in_chunks(qs, 'compound_id', compound_pks):
+        if value is not None:
+            matrix[compound_index[compound_id], descriptor_index[descriptor_id]] = float(value)
+    return matrix
+
+
+def _group_sum(groups, weights, size):
+    """Sum the rows of weights (1 or 2 dimensional) into size groups."""
+    if weights.ndim == 1:
+        return np.bincount(groups, weights=weights, minlength=size)
+    out = np.zeros((size, weights.shape[1]))
+    np.add.at(out, groups, weights)
+    return out
+
+
+def _calculate_batch(reactions, descriptorDict, verbose=False, whitelist=None, num_vals_to_create=None, bool_vals_to_create=None):
+    """
+    Calculate the values produced by _calculate for a batch of reactions at once.
+
+    All compound quantities and molecular descriptor values for the batch are loaded in a handful of queries
+    and the per-role aggregates are computed with array operations over reactions and descriptors rather
+    than with queries per reaction, role and descriptor. The values produced are the same as for _calculate.
+    """
+    if num_vals_to_create is None:
+        num_vals_to_create = []
+    if bool_vals_to_create is None:
+        bool_vals_to_create = []
+    num = DRP.models.NumRxnDescriptorValue
+    boolean = DRP.models.BoolRxnDescriptorValue
+
+    def wanted(heading):
+        return whitelist is None or heading in whitelist
+
+    reaction_pks = [reaction.pk for reaction in reactions]
+
+    heading = 'boolean_crystallisation_outcome'
+    if wanted(heading):
+        outcomes = {}
+        qs = DRP.models.OrdRxnDescriptorValue.objects.filter(
+            descriptor__heading='crystallisation_outcome', descriptor__calculatorSoftware='manual').values_list('reaction_id', 'value')
+        for reaction_id, four_class in _in_chunks(qs, 'reaction_id', reaction_pks):
+            outcomes[reaction_id] = None if four_class is None else (four_class > 2)
+        for pk in reaction_pks:
+            bool_vals_to_create.append(boolean(reaction_id=pk, descriptor=descriptorDict[heading], value=outcomes.get(pk)))
+
+    qs = DRP.models.CompoundQuantity.objects.values_list('reaction_id', 'compound_id', 'role_id', 'amount')
+    quantities = list(_in_chunks(qs, 'reaction_id', reaction_pks))
+    return _aggregate(reaction_pks, quantities, descriptorDict, num, boolean, whitelist=whitelist,
+                      num_vals_to_create=num_vals_to_create, bool_vals_to_create=bool_vals_to_create)
+
+
+def _aggregate(reaction_pks, quantities, descriptorDict, num, boolean, whitelist=None, num_vals_to_create=None, bool_vals_to_create=None):
+    """
+    Calculate the per-role aggregates of _calculate_batch from (reaction, compound, role, amount) tuples.
+
+    Values are made by calling num or boolean with reaction_id, descriptor and value keyword arguments,
+    so they need not be database rows.
+    """
+    if num_vals_to_create is None:
+        num_vals_to_create = []
+    if bool_vals_to_create is None:
+        bool_vals_to_create = []
+
+    def wanted(heading):
+        return whitelist is None or heading in whitelist
+
+    R = len(reaction_pks)
+    reaction_index = {pk: i for i, pk in enumerate(reaction_pks)}
+    compound_pks = sorted({q[1] for q in quantities})
+    compound_index = {pk: i for i, pk in enumerate(compound_pks)}
+    C = len(compound_pks)
+    q_rxn = np.array([reaction_index[q[0]] for q in quantities], dtype=np.int64)
+    q_cmp = np.array([compound_index[q[1]] for q in quantities], dtype=np.int64)
+    q_role = np.array([q[2] for q in quantities], dtype=np.int64)
+    q_amount = np.array([np.nan if q[3] is None else float(q[3]) for q in quantities], dtype=np.float64)
+    q_amount_missing = np.isnan(q_amount)
+    q_amount_zeroed = np.where(q_amount_missing, 0, q_amount)
+
+    # elemental molarities
+    element_list = [element for element in elements if wanted(element + '_mols')]
+    if element_list:
+        stoichiometry = np.zeros((C, len(element_list)))
+        for compound in DRP.models.Compound.objects.filter(pk__in=compound_pks):
+            compound_elements = compound.elements
+            for k, element in enumerate(element_list):
+                if element in compound_elements:
+                    stoichiometry[compound_index[compound.pk], k] = float(compound_elements[element]['stoichiometry'])
+        mols = _group_sum(q_rxn, stoichiometry[q_cmp] * q_amount_zeroed[:, None], R)
+        any_missing = _group_sum(q_rxn, q_amount_missing.astype(float), R) > 0
+        for k, element in enumerate(element_list):
+            descriptor = descriptorDict[element + '_mols']
+            for i, pk in enumerate(reaction_pks):
+                num_vals_to_create.append(num(reaction_id=pk, descriptor=descriptor,
+                                              value=None if any_missing[i] else float(mols[i, k])))
+
+    num_descriptors = list(DRP.models.NumMolDescriptor.objects.all())
+    ord_descriptors = list(DRP.models.OrdMolDescriptor.objects.all())
+    bool_descriptors = list(DRP.models.BoolMolDescriptor.objects.all())
+    cat_descriptors = list(DRP.models.CatMolDescriptor.objects.all())
+    permitted_values = {d.pk: list(d.permittedValues.all()) for d in cat_descriptors}
+    num_matrix = _mol_value_matrix(DRP.models.NumMolDescriptorValue, compound_pks, num_descriptors)
+    ord_matrix = _mol_value_matrix(DRP.models.OrdMolDescriptorValue, compound_pks, ord_descriptors)
+    bool_matrix = _mol_value_matrix(DRP.models.BoolMolDescriptorValue, compound_pks, bool_descriptors)
+    cat_matrix = _mol_value_matrix(DRP.models.CatMolDescriptorValue, compound_pks, cat_descriptors)
+
+    for compoundRole in DRP.models.CompoundRole.objects.all():
+        in_role = q_role == compoundRole.pk
+        r = q_rxn[in_role]
+        cmp = q_cmp[in_role]
+        amount_missing = q_amount_missing[in_role]
+        amount_zeroed = q_amount_zeroed[in_role]
+
+        count = np.bincount(r, minlength=R)
+        present = count > 0
+        role_moles = np.bincount(r, weights=amount_zeroed, minlength=R)
+        role_moles_missing = np.bincount(r, weights=amount_missing.astype(float), minlength=R) > 0
+
+        heading = '{}_amount_count'.format(compoundRole.label)
+        if wanted(heading):
+            for i, pk in enumerate(reaction_pks):
+                num_vals_to_create.append(num(reaction_id=pk, descriptor=descriptorDict[heading], value=int(count[i])))
+        heading = '{}_amount_molarity'.format(compoundRole.label)
+        if wanted(heading):
+            for i, pk in enumerate(reaction_pks):
+                num_vals_to_create.append(num(reaction_id=pk, descriptor=descriptorDict[heading],
+                                              value=None if role_moles_missing[i] else float(role_moles[i])))
+
+        if not present.any():
+            continue
+
+        # _calculate only aggregates a descriptor when every quantity in the role has a non-null value
+        # for a distinct compound, i.e. the number of descriptor values equals the number of quantities
+        distinct_pairs = np.unique(r * C + cmp)
+        distinct = np.bincount(distinct_pairs // C, minlength=R) == count
+        role_ok = present & distinct
+
+        def valid_cells(values):
+            missing = _group_sum(r, np.isnan(values).astype(float), R)
+            return role_ok[:, None] & (missing == 0)
+
+        def molarity(matches):
+            """Sum amounts of quantities where matches is true, NaN if any of those amounts is NULL."""
+            total = _group_sum(r, np.where(matches, amount_zeroed[:, None], 0), R)
+            total[_group_sum(r, (matches & amount_missing[:, None]).astype(float), R) > 0] = np.nan
+            return total
+
+        def append_num(heading, i, value):
+            num_vals_to_create.append(num(reaction_id=reaction_pks[i], descriptor=descriptorDict[heading],
+                                          value=None if value is None or np.isnan(value) else float(value)))
+
+        if num_descriptors:
+            values = num_matrix[cmp]
+            valid = valid_cells(values)
+            zeroed = np.where(np.isnan(values), 0, values)
+            maxima = np.full((R, len(num_descriptors)), -np.inf)
+            minima = np.full((R, len(num_descriptors)), np.inf)
+            np.maximum.at(maxima, r, zeroed)
+            np.minimum.at(minima, r, zeroed)
+            has_zero = _group_sum(r, (values == 0).astype(float), R) > 0
+            has_negative = _group_sum(r, (values < 0).astype(float), R) > 0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                log_values = np.log(np.where(values > 0, values, 1))
+                sum_log = _group_sum(r, log_values, R)
+                share = amount_zeroed / role_moles[r]
+                sum_log_share = np.bincount(r, weights=np.log(share), minlength=R)
+                gmean_count = np.exp(sum_log / count[:, None])
+                gmean_molarity = np.exp((sum_log + sum_log_share[:, None]) / count[:, None])
+            moles_ok = ~role_moles_missing & (role_moles != 0)
+            for i, j in zip(*np.nonzero(valid)):
+                descriptor = num_descriptors[j]
+                heading = '{}_{}_{}'.format(compoundRole.label, descriptor.csvHeader, 'Max')
+                if wanted(heading):
+                    append_num(heading, i, maxima[i, j])
+                heading = '{}_{}_{}'.format(compoundRole.label, descriptor.csvHeader, 'Range')
+                if wanted(heading):
+                    append_num(heading, i, maxima[i, j] - minima[i, j])
+                for w, gmeans in (('molarity', gmean_molarity), ('count', gmean_count)):
+                    heading = '{}_{}_{}_{}'.format(compoundRole.label, descriptor.csvHeader, 'gmean', w)
+                    if wanted(heading):
+                        if not moles_ok[i]:
+                            append_num(heading, i, None)
+                        elif has_zero[i, j]:
+                            append_num(heading, i, 0)
+                        elif has_negative[i, j]:
+                            raise ValueError(
+                                'Cannot take geometric mean of negative values. This descriptor ({}) should not use a geometric mean.'.format(descriptor))
+                        else:
+                            append_num(heading, i, gmeans[i, j])
+
+        # ordinal, boolean and categorical descriptors are all aggregated as counts and molarities per value
+        tallies = (
+            (ord_descriptors, ord_matrix, lambda d: [(i, i) for i in range(d.minimum, d.maximum + 1)]),
+            (bool_descriptors, bool_matrix, lambda d: [(True, 1.0), (False, 0.0)]),
+            (cat_descriptors, cat_matrix, lambda d: [(pv.value, pv.pk) for pv in permitted_values[d.pk]]),
+        )
+        for descriptors, matrix, labelled_codes in tallies:
+            if not descriptors:
+                continue
+            values = matrix[cmp]
+            valid = valid_cells(values)
+            for j, descriptor in enumerate(descriptors):
+                rows = np.nonzero(valid[:, j])[0]
+                if rows.size == 0:
+                    continue
+                for label, code in labelled_codes(descriptor):
+                    matches = values[:, j:j + 1] == code
+                    heading = '{}_{}_{}_count'.format(compoundRole.label, descriptor.csvHeader, label)
+                    if wanted(heading):
+                        counts = _group_sum(r, matches[:, 0].astype(float), R)
+                        for i in rows:
+                            num_vals_to_create.append(num(reaction_id=reaction_pks[i], descriptor=descriptorDict[heading], value=int(counts[i])))
+                    heading = '{}_{}_{}_molarity'.format(compoundRole.label, descriptor.csvHeader, label)
+                    if wanted(heading):
+                        totals = molarity(matches)[:, 0]
+                        for i in rows:
+                            append_num(heading, i, totals[i])
+                if descriptors is bool_descriptors:
+                    heading = '{}_{}_any'.format(compoundRole.label, descriptor.csvHeader)
+                    if wanted(heading):
+                        # _calculate takes any() of the value instances themselves, which are always true
+                        for i in rows:
+                            bool_vals_to_create.append(boolean(reaction_id=reaction_pks[i], descriptor=descriptorDict[heading], value=True))
+
+    return num_vals_to_create, bool_vals_to_create
+
+
+def _calculate_batch_pH(reactions, descriptorDict, _reaction_pH_Descriptors, whitelist=None, vals_to_create=None):
+    """
+    Calculate the values produced by _calculateRxnpH for a batch of reactions at once.
+
+    The reaction pHs, and the values of the descriptors for those pHs, are loaded into dictionaries with one
+    query per chunk of reactions rather than with queries per reaction and descriptor.
+    """
+    if vals_to_create is None:
+        vals_to_create = []
+    headings = [heading for heading in _reaction_pH_Descriptors.keys() if whitelist is None or heading in whitelist]
+    qs = DRP.models.NumRxnDescriptorValue.objects.filter(descriptor__heading='reaction_pH').values_list('reaction_id', 'value')
+    pHs = dict(_in_chunks(qs, 'reaction_id', [reaction.pk for reaction in reactions]))
+    sources = {}
+    for reaction_id, reaction_pH in pHs.items():
+        if reaction_pH is not None:
+            reaction_pH_string = str(reaction_pH).replace('.', '_')  # R compatibility
+            sources[reaction_id] = {heading: descriptorDict[heading].heading.replace(
+                '_pHreaction_', '_pH{}_'.format(reaction_pH_string)) for heading in headings}
+    found = {}
+    source_headings = set(chain.from_iterable(source.values() for source in sources.values()))
+    if source_headings:
+        qs = DRP.models.NumRxnDescriptorValue.objects.filter(
+            descriptor__heading__in=source_headings).values_list('reaction_id', 'descriptor__heading', 'value')
+        for reaction_id, heading, value in _in_chunks(qs, 'reaction_id', list(sources)):
+            found[(reaction_id, heading)] = value
+
+    for reaction in reactions:
+        if reaction.pk not in pHs:
+            logger.warning(
+                'Reaction {} has no pH value. Cannot create reaction pH descriptors'.format(reaction))
+        elif reaction.pk in sources:
+            for heading in headings:
+                reaction_pH_descriptor_heading = sources[reaction.pk][heading]
+                if (reaction.pk, reaction_pH_descriptor_heading) in found:
+                    vals_to_create.append(DRP.models.NumRxnDescriptorValue(
+                        descriptor=descriptorDict[heading], reaction=reaction,
+                        value=found[(reaction.pk, reaction_pH_descriptor_heading)]))
+                elif heading.startswith('pH_') or heading.startswith('Ox_'):
+                    logger.warning(
+                        'Could not find descriptor value for a pH or Ox role descriptor.')
+                else:
+                    logger.warning('Could not find descriptor value for descriptor {} and reaction {}'.format(
+                        reaction_pH_descriptor_heading, reaction))
+    return vals_to_create
+
+
 def _calculateRxnpH(reaction, descriptorDict, _reaction_pH_Descriptors, verbose=False, whitelist=None, vals_to_create=None):
     if vals_to_create is None:
         vals_to_create = []
@@ -3,14 +3,19 @@ from .utils import setup
 import logging
 
 import xxhash
+from django.db import transaction, IntegrityError
 
 import DRP
+from DRP.models.reactionSpaceHash import hasher, reactionCompounds
 from DRP.chemical_data import elements
 
 logger = logging.getLogger(__name__)
 
 calculatorSoftware = 'DRP_xxhash'
 
+dependencies = ('quantities',)
+"""The hash depends only on which compounds are in a reaction (see DRP.models.pendingRxnCalculation)."""
+
 _descriptorDict = {
     'rxnSpaceHash1':
         {
@@ -25,6 +30,10 @@ _descriptorDict = {
 descriptorDict = setup(_descriptorDict)
 
 
+BATCH_SIZE = 5000
+"""The number of hashes looked up per query."""
+
+
 def calculate_many(reaction_set, verbose=False, whitelist=None):
     """Calculate descriptors for this plugin for an entire set of reactions."""
     if verbose:
@@ -33,15 +42,18 @@ def calculate_many(reaction_set, verbose=False, whitelist=None):
     # spent
     descriptorDict.initialise(descriptorDict.descDict)
 
-    for i, reaction in enumerate(reaction_set):
-        if verbose:
-            logger.info("Calculating {} ({}/{})".format(reaction,
-                                                        i + 1, len(reaction_set)))
-        _calculate(reaction, descriptorDict,
-                   verbose=verbose, whitelist=whitelist)
-    
+    if hasattr(reaction_set, 'values_list'):
+        reaction_pks = list(reaction_set.values_list('pk', flat=True))
+    else:
+        reaction_pks = [reaction.pk for reaction in reaction_set]
+    if verbose:
+        logger.info("Calculating hashes for {} reactions".format(len(reaction_pks)))
+    DRP.models.rxnDescriptorValues.upsertValues(
+        _calculate(reaction_pks, descriptorDict, verbose=verbose, whitelist=whitelist))
+
     return descriptorDict
 
+
 def calculate(reaction, verbose=False, whitelist=None):
     """Calculate the descriptors for this plugin."""
     if verbose:
@@ -49,22 +61,53 @@ def calculate(reaction, verbose=False, whitelist=None):
     # We're about to use it and leaving it lazy obscures where time is being
     # spent
     descriptorDict.initialise(descriptorDict.descDict)
-    _calculate(reaction, descriptorDict, verbose=verbose, whitelist=whitelist)
+    DRP.models.rxnDescriptorValues.upsertValues(
+        _calculate([reaction.pk], descriptorDict, verbose=verbose, whitelist=whitelist))
+
 
+def reaction_hashes(reaction_pks):
+    """Return a dictionary of reaction pk to the hex digest of its reaction space hash (see DRP.models.reactionSpaceHash)."""
+    return {reaction_pk: hasher(compound_pks).hexdigest()
+            for reaction_pk, compound_pks in reactionCompounds(reaction_pks).items()}
 
-def _calculate(reaction, descriptorDict, verbose=False, whitelist=None):
-    """Calculate descriptors for this plugin with descriptorDict already created."""
+
+def _permitted_values(descriptor, values):
+    """Return a dictionary of each value to the pk of the descriptor's permitted value, creating those missing in bulk."""
+    perm = DRP.models.CategoricalDescriptorPermittedValue
+    values = sorted(set(values))
+
+    def existing():
+        found = {}
+        for i in range(0, len(values), BATCH_SIZE):
+            found.update(perm.objects.filter(descriptor=descriptor, value__in=values[i:i + BATCH_SIZE]).values_list('value', 'pk'))
+        return found
+
+    found = existing()
+    missing = [value for value in values if value not in found]
+    if missing:
+        try:
+            with transaction.atomic():
+                perm.objects.bulk_create([perm(descriptor=descriptor, value=value) for value in missing])
+        except IntegrityError:
+            # another process created some of them first
+            for value in missing:
+                perm.objects.get_or_create(descriptor=descriptor, value=value)
+        found = existing()
+    return found
+
+
+def _calculate(reaction_pks, descriptorDict, verbose=False, whitelist=None):
+    """Calculate descriptors for this plugin with descriptorDict already created. Return the unsaved values."""
     # descriptor Value classes
     cat = DRP.models.CatRxnDescriptorValue
-    perm = DRP.models.CategoricalDescriptorPermittedValue
+    values = []
 
     # reaction space descriptor
     heading = 'rxnSpaceHash1'
     if whitelist is None or heading in whitelist:
-        h = xxhash.xxh64()  # generates a hash
-        for reactant in reaction.compounds.order_by('pk'):
-            h.update('{0:20d}'.format(reactant.pk))
-        p = perm.objects.get_or_create(descriptor=descriptorDict[
-                                       heading], value=h.hexdigest())[0]
-        cat.objects.update_or_create(defaults={
-                                     'value': p}, reaction=reaction, descriptor=descriptorDict['rxnSpaceHash1'])[0]
+        descriptor = descriptorDict[heading]
+        hashes = reaction_hashes(reaction_pks)
+        permitted = _permitted_values(descriptor, hashes.values())
+        values += [cat(value_id=permitted[digest], reaction_id=reaction_pk, descriptor=descriptor)
+                   for reaction_pk, digest in hashes.items()]
+    return values
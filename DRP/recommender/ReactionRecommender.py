@@ -2,11 +2,11 @@ from copy import deepcopy
 
 from sklearn.metrics.cluster import adjusted_mutual_info_score
 
-from DRP.plugins.rxndescriptors.rxnhash import calculate
+from DRP.models.reactionSpaceHash import updateSpaceHashes
 from DRP.recommender.AbstractRecommender import AbstractRecommender
 from DRP.recommender.ReactionGenerator import ReactionGenerator
 from DRP.recommender.ReactionSieve import ReactionSieve
-from DRP.models import PerformedReaction, BoolRxnDescriptorValue, CatRxnDescriptorValue, CompoundQuantity, Reaction, Compound, RecommendedReaction, LabGroup
+from DRP.models import PerformedReaction, BoolRxnDescriptorValue, CompoundQuantity, Reaction, Compound, RecommendedReaction, LabGroup, ReactionSpaceHash
 
 headers_to_use = ['Pu_mols_DRP_0.02', 'Tb_mols_DRP_0.02', 'Lu_mols_DRP_0.02', 'Ru_mols_DRP_0.02', 'Ga_mols_DRP_0.02', 'Au_mols_DRP_0.02', 'B_mols_DRP_0.02', 'Li_mols_DRP_0.02', 'Ca_mols_DRP_0.02', 'Hf_mols_DRP_0.02', 'Pd_mols_DRP_0.02', 'In_mols_DRP_0.02', 'Org_mw_drp/rdkit_0_Range_DRP_DRP', 'Pr_mols_DRP_0.02', 'Ho_mols_DRP_0.02', 'Na_mols_DRP_0.02', 'Cu_mols_DRP_0.02', 'reaction_pH_manual_0', 'Po_mols_DRP_0.02', 'Org_mw_drp/rdkit_0_gmean_molarity_DRP_DRP', 'Zn_mols_DRP_0.02', 'Tm_mols_DRP_0.02', 'Inorg_mw_drp/rdkit_0_Range_DRP_DRP', 'H_mols_DRP_0.02', 'reaction_temperature_manual_0', 'At_mols_DRP_0.02', 'Te_mols_DRP_0.02', 'Rh_mols_DRP_0.02', 'Yb_mols_DRP_0.02', 'Inorg_amount_count_DRP_0.02', 'Pt_mols_DRP_0.02', 'Pm_mols_DRP_0.02', 'Sb_mols_DRP_0.02', 'Al_mols_DRP_0.02', 'F_mols_DRP_0.02', 'S_mols_DRP_0.02', 'Mn_mols_DRP_0.02', 'Cr_mols_DRP_0.02', 'Nd_mols_DRP_0.02', 'Co_mols_DRP_0.02', 'Fe_mols_DRP_0.02', 'C_mols_DRP_0.02', 'Os_mols_DRP_0.02', 'Ti_mols_DRP_0.02', 'Ir_mols_DRP_0.02', 'Si_mols_DRP_0.02', 'Re_mols_DRP_0.02', 'Ar_mols_DRP_0.02', 'Solv_amount_count_DRP_0.02', 'W_mols_DRP_0.02', 'Dy_mols_DRP_0.02', 'Y_mols_DRP_0.02', 'Cd_mols_DRP_0.02', 'Ce_mols_DRP_0.02', 'As_mols_DRP_0.02', 'Ag_mols_DRP_0.02', 'La_mols_DRP_0.02', 'U_mols_DRP_0.02', 'Np_mols_DRP_0.02', 'Eu_mols_DRP_0.02', 'Er_mols_DRP_0.02', 'K_mols_DRP_0.02', 'Pa_mols_DRP_0.02', 'Ni_mols_DRP_0.02', 'pH_amount_molarity_DRP_0.02', 'Ox_amount_molarity_DRP_0.02', 'N_mols_DRP_0.02', 'Am_mols_DRP_0.02', 'Tl_mols_DRP_0.02', 'Kr_mols_DRP_0.02', 'Inorg_mw_drp/rdkit_0_Max_DRP_DRP', 'Ra_mols_DRP_0.02', 'Org_amount_count_DRP_0.02', 'Se_mols_DRP_0.02', 'Be_mols_DRP_0.02', 'Th_mols_DRP_0.02', 'Inorg_mw_drp/rdkit_0_gmean_count_DRP_DRP', 'Mg_mols_DRP_0.02', 'Rn_mols_DRP_0.02', 'Tc_mols_DRP_0.02', 'Cl_mols_DRP_0.02', 'Sn_mols_DRP_0.02', 'Inorg_mw_drp/rdkit_0_gmean_molarity_DRP_DRP', 'Sc_mols_DRP_0.02', 'Ac_mols_DRP_0.02', 'Gd_mols_DRP_0.02', 'Xe_mols_DRP_0.02', 'Hg_mols_DRP_0.02', 'Ge_mols_DRP_0.02', 'Mo_mols_DRP_0.02', 'Cs_mols_DRP_0.02', 'Sr_mols_DRP_0.02', 'O_mols_DRP_0.02', 'Org_mw_drp/rdkit_0_gmean_count_DRP_DRP', 'Nb_mols_DRP_0.02', 'I_mols_DRP_0.02', 'Ta_mols_DRP_0.02', 'Fr_mols_DRP_0.02', 'Rb_mols_DRP_0.02', 'Ox_amount_count_DRP_0.02', 'pH_amount_count_DRP_0.02', 'Zr_mols_DRP_0.02', 'He_mols_DRP_0.02', 'Ne_mols_DRP_0.02', 'reaction_time_manual_0', 'Pb_mols_DRP_0.02', 'Br_mols_DRP_0.02', 'Inorg_amount_molarity_DRP_0.02', 'V_mols_DRP_0.02', 'Org_mw_drp/rdkit_0_Max_DRP_DRP', 'Bi_mols_DRP_0.02', 'Sm_mols_DRP_0.02', 'Solv_amount_molarity_DRP_0.02', 'Ba_mols_DRP_0.02', 'Org_amount_molarity_DRP_0.02', 'P_mols_DRP_0.02']
 # headers_to_use = ['Pu_mols_DRP_0.02', 'Tb_mols_DRP_0.02', 'Lu_mols_DRP_0.02', 'Ru_mols_DRP_0.02', 'Ga_mols_DRP_0.02', 'Au_mols_DRP_0.02', 'B_mols_DRP_0.02', 'Li_mols_DRP_0.02', 'Ca_mols_DRP_0.02', 'Hf_mols_DRP_0.02', 'Pd_mols_DRP_0.02', 'In_mols_DRP_0.02', 'Org_mw_drp/rdkit_0_Range_DRP_DRP', 'Pr_mols_DRP_0.02', 'Ho_mols_DRP_0.02', 'Na_mols_DRP_0.02', 'Cu_mols_DRP_0.02', 'reaction_pH_manual_0', 'Po_mols_DRP_0.02', 'Org_mw_drp/rdkit_0_gmean_molarity_DRP_DRP', 'Zn_mols_DRP_0.02', 'Tm_mols_DRP_0.02', 'Inorg_mw_drp/rdkit_0_Range_DRP_DRP', 'H_mols_DRP_0.02', 'reaction_temperature_manual_0', 'At_mols_DRP_0.02', 'Te_mols_DRP_0.02', 'Rh_mols_DRP_0.02', 'Yb_mols_DRP_0.02', 'Inorg_amount_count_DRP_0.02', 'Pt_mols_DRP_0.02', 'Pm_mols_DRP_0.02', 'Sb_mols_DRP_0.02', 'Al_mols_DRP_0.02', 'F_mols_DRP_0.02', 'S_mols_DRP_0.02', 'Mn_mols_DRP_0.02', 'Cr_mols_DRP_0.02', 'Nd_mols_DRP_0.02', 'Co_mols_DRP_0.02', 'Fe_mols_DRP_0.02', 'C_mols_DRP_0.02', 'Os_mols_DRP_0.02', 'Ti_mols_DRP_0.02', 'Ir_mols_DRP_0.02', 'Si_mols_DRP_0.02', 'Re_mols_DRP_0.02', 'Ar_mols_DRP_0.02', 'Solv_amount_count_DRP_0.02', 'W_mols_DRP_0.02', 'Dy_mols_DRP_0.02', 'Y_mols_DRP_0.02', 'Cd_mols_DRP_0.02', 'Ce_mols_DRP_0.02', 'As_mols_DRP_0.02', 'Ag_mols_DRP_0.02', 'La_mols_DRP_0.02', 'U_mols_DRP_0.02', 'Np_mols_DRP_0.02', 'Eu_mols_DRP_0.02', 'Er_mols_DRP_0.02', 'K_mols_DRP_0.02', 'Pa_mols_DRP_0.02', 'Ni_mols_DRP_0.02', 'pH_amount_molarity_DRP_0.02', 'Ox_amount_molarity_DRP_0.02', 'N_mols_DRP_0.02', 'Am_mols_DRP_0.02', 'Tl_mols_DRP_0.02', 'Kr_mols_DRP_0.02', 'Inorg_mw_drp/rdkit_0_Max_DRP_DRP', 'Ra_mols_DRP_0.02', 'Org_amount_count_DRP_0.02', 'Se_mols_DRP_0.02', 'Be_mols_DRP_0.02', 'Th_mols_DRP_0.02', 'Inorg_mw_drp/rdkit_0_gmean_count_DRP_DRP', 'Mg_mols_DRP_0.02', 'Rn_mols_DRP_0.02', 'Tc_mols_DRP_0.02', 'Cl_mols_DRP_0.02', 'Sn_mols_DRP_0.02', 'Inorg_mw_drp/rdkit_0_gmean_molarity_DRP_DRP', 'Sc_mols_DRP_0.02', 'Ac_mols_DRP_0.02', 'Gd_mols_DRP_0.02', 'Xe_mols_DRP_0.02', 'Hg_mols_DRP_0.02', 'Ge_mols_DRP_0.02', 'Mo_mols_DRP_0.02', 'Cs_mols_DRP_0.02', 'Sr_mols_DRP_0.02', 'O_mols_DRP_0.02', 'Org_mw_drp/rdkit_0_gmean_count_DRP_DRP', 'Nb_mols_DRP_0.02', 'I_mols_DRP_0.02', 'Ta_mols_DRP_0.02', 'Fr_mols_DRP_0.02', 'Rb_mols_DRP_0.02', 'Ox_amount_count_DRP_0.02', 'pH_amount_count_DRP_0.02', 'Zr_mols_DRP_0.02', 'He_mols_DRP_0.02', 'Ne_mols_DRP_0.02', 'reaction_time_manual_0', 'Pb_mols_DRP_0.02', 'Br_mols_DRP_0.02', 'Inorg_amount_molarity_DRP_0.02', 'V_mols_DRP_0.02', 'Org_mw_drp/rdkit_0_Max_DRP_DRP', 'Bi_mols_DRP_0.02', 'Sm_mols_DRP_0.02', 'Solv_amount_molarity_DRP_0.02', 'Ba_mols_DRP_0.02', 'Org_amount_molarity_DRP_0.02', 'P_mols_DRP_0.02']
@@ -46,14 +46,10 @@ class Recommender(AbstractRecommender):
         for rxn in PerformedReaction.objects.all()[:10]: # <<<< this is messed around with for debugging sake
             count +=1
             try:
-                # TODO TEST TO MAKE SURE HASH CATEGORICAL DESCRIPTOR PK DOesN'T CHANGE
-                rxn_hash = CatRxnDescriptorValue.objects.get(descriptor__pk=6793,reaction=rxn).value
-            except CatRxnDescriptorValue.DoesNotExist:
-                calculate(rxn)
-                try:
-                    rxn_hash = CatRxnDescriptorValue.objects.get(descriptor__pk=6793,reaction=rxn).value
-                except CatRxnDescriptorValue.DoesNotExist: # missing or incorrect reactant set up
-                    continue
+                rxn_hash = ReactionSpaceHash.objects.get(reaction_id=rxn.pk).value
+            except ReactionSpaceHash.DoesNotExist:
+                updateSpaceHashes([rxn.pk])
+                rxn_hash = ReactionSpaceHash.objects.get(reaction_id=rxn.pk).value
 
             try:
                 reaction_outcome = BoolRxnDescriptorValue.objects.get(descriptor__pk=2,reaction=rxn)
@@ -184,7 +180,7 @@ class Recommender(AbstractRecommender):
         dist_dict = self.get_distance_dict()
 
         for rxn in self.plausible_reactions:
-            rxn_hash = CatRxnDescriptorValue.objects.get(descriptor__pk=6793,reaction=rxn).value.value
+            rxn_hash = ReactionSpaceHash.objects.get(reaction_id=rxn.pk).value
             score_dict[rxn] = self.hash_MI[rxn_hash] * dist_dict[rxn] #*confidence
 
         return score_dict
@@ -68,13 +68,14 @@ def build_many_models(predictor_headers=None, response_headers=None, modelVisito
                 [training_set_name, response_header, str(uuid.uuid4())])
             trainingSetRxns = filter_reactions(
                 trainingSet.reactions.all(), response_header, verbose=verbose)
-            DataSet.create(mod_training_set_name, trainingSetRxns)
+            # an identical existing set is returned under its own name
+            mod_training_set_name = DataSet.create(mod_training_set_name, trainingSetRxns).name
 
             mod_test_set_name = '_'.join(
                 [test_set_name, response_header, str(uuid.uuid4())])
             testSetRxns = filter_reactions(
                 testSet.reactions.all(), response_header)
-            DataSet.create(mod_test_set_name, testSetRxns)
+            mod_test_set_name = DataSet.create(mod_test_set_name, testSetRxns).name
         else:
             mod_training_set_name = None
             mod_test_set_name = None
@@ -41,12 +41,36 @@ TMP_DIR = os.path.join(BASE_DIR, "tmp")
 RESEARCH_DIR = os.path.join(BASE_DIR + "research")
 LOG_DIR = os.path.join(BASE_DIR, "logs")
 MODEL_DIR = os.path.join(BASE_DIR, "models")
+DESCRIPTOR_MATRIX_DIR = os.path.join(BASE_DIR, "descriptor_matrix")
+# longest time between a reaction descriptor value being written and its transaction committing,
+# allowing for clock differences between hosts
+DESCRIPTOR_VALUES_SETTLE_SECONDS = 600
+DATASET_ARTIFACT_DIR = os.path.join(BASE_DIR, "dataset_artifacts")
+# limits applied by the evict_dataset_artifacts command; None for no limit
+DATASET_ARTIFACT_MAX_SIZE = 10 * 1024 * 1024 * 1024  # bytes
+DATASET_ARTIFACT_MAX_AGE = 30  # days
+# Results of external descriptor calculators, keyed by structure; None to disable
+DESCRIPTOR_CACHE_PATH = os.path.join(BASE_DIR, "descriptor_cache", "results.sqlite3")
+DESCRIPTOR_CACHE_MAX_SIZE = 512 * 1024 * 1024  # bytes
 
 CHEMAXON_DIR = {
 }
 # {version: directory}
 WEKA_PATH = {
     '3.6': '/usr/share/java/weka.jar'}  # default path on Ubuntu
+# Run weka jobs in one long lived java process per command rather than starting
+# java for every train and predict. Needs javac at first use.
+WEKA_WORKER = False
+# Deserialised models the weka worker keeps for predictions, least recently used dropped first
+WEKA_WORKER_MODEL_CACHE_SIZE = 16
+# Stats models kept loaded for predicting unperformed reactions, and the time
+# in milliseconds a prediction request should take before it is logged as slow.
+# Only scikit-learn containers, or weka ones with WEKA_WORKER, can meet it.
+PREDICTION_MODEL_CACHE_SIZE = 32
+PREDICTION_LATENCY_TARGET_MS = 250
+
+# Share loaded descriptor plugin definitions between processes through the cache
+DESCRIPTOR_REGISTRY_SHARED_CACHE = True
 
 if TESTING:
     MOL_DESCRIPTOR_PLUGINS = ('DRP.plugins.moldescriptors.example',)
@@ -208,7 +232,9 @@ MIDDLEWARE_CLASSES = (
     # FOR HTTPS
     #    'django.middleware.security.SecurityMiddleWare',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'DRP.middleware.ChemspiderErrorMiddleware'
+    'DRP.middleware.ChemspiderErrorMiddleware',
+    # last, so the models of reactions saved by a view are invalidated once it returns
+    'DRP.middleware.ModelInvalidationMiddleware',
     # Uncomment the next line for simple clickjacking protection:
     # 'django.middleware.clickjacking.XFrameOptionsMiddleware',
 )
@@ -287,6 +313,7 @@ CACHES = {
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
 STATS_MODEL_LIBS_DIR = "DRP.ml_models.model_visitors"
+# add "sklearn" to train models in process with scikit-learn
 STATS_MODEL_LIBS = ("weka",)
 REACTION_DATASET_SPLITTERS_DIR = "DRP.ml_models.splitters"
 REACTION_DATASET_SPLITTERS = (
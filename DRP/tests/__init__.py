@@ -13,6 +13,28 @@ from . import compoundToArff
 # import DataImport
 from . import modelValidators
 from . import plugin_tests
+from . import descriptorMatrix
+from . import drpRxnDescriptors
+from . import calculateDescriptors
+from . import chemaxonBatch
+from . import calculatorCache
+from . import upsertValues
+from . import streamingDownload
+from . import expandedRows
+from . import sparseArff
+from . import wekaWorker
+from . import sklearnPreprocessing
+from . import containerDataset
+from . import confusionMatrix
+from . import predictionVotes
+from . import splitFolds
+from . import dataSetArtifacts
+from . import trainingCache
+from . import modelInvalidation
+from . import pendingCalculation
+from . import rxnHashBatch
+from . import reactionSpaceHash
+from . import descriptorRegistry
 # import splitters
 
 
@@ -28,7 +50,29 @@ suite = unittest.TestSuite([
     modelValidators.suite,
     # splitters.suite,
     fileTests.suite,
-    plugin_tests.suite
+    plugin_tests.suite,
+    descriptorMatrix.suite,
+    drpRxnDescriptors.suite,
+    calculateDescriptors.suite,
+    chemaxonBatch.suite,
+    calculatorCache.suite,
+    upsertValues.suite,
+    streamingDownload.suite,
+    expandedRows.suite,
+    sparseArff.suite,
+    wekaWorker.suite,
+    sklearnPreprocessing.suite,
+    containerDataset.suite,
+    confusionMatrix.suite,
+    predictionVotes.suite,
+    splitFolds.suite,
+    dataSetArtifacts.suite,
+    trainingCache.suite,
+    modelInvalidation.suite,
+    pendingCalculation.suite,
+    rxnHashBatch.suite,
+    reactionSpaceHash.suite,
+    descriptorRegistry.suite,
 ])
 
 
@@ -44,4 +88,26 @@ modules = [
     "compoundToArff",
     "fileTests",
     "modelValidators",
+    "descriptorMatrix",
+    "drpRxnDescriptors",
+    "calculateDescriptors",
+    "chemaxonBatch",
+    "calculatorCache",
+    "upsertValues",
+    "streamingDownload",
+    "expandedRows",
+    "sparseArff",
+    "wekaWorker",
+    "sklearnPreprocessing",
+    "containerDataset",
+    "confusionMatrix",
+    "predictionVotes",
+    "splitFolds",
+    "dataSetArtifacts",
+    "trainingCache",
+    "modelInvalidation",
+    "pendingCalculation",
+    "rxnHashBatch",
+    "reactionSpaceHash",
+    "descriptorRegistry",
 ]
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Tests for claiming reactions and calculating their descriptors in chunks with the calculate_descriptors command."""
+
+import unittest
+from django.core.management import call_command
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction, createsChemicalClass
+from .decorators import createsCompound, createsCompoundRole
+from DRP.models import PerformedReaction, Reaction, Compound, CompoundRole, CompoundQuantity, CatRxnDescriptorValue
+from DRP.management.commands.calculate_descriptors import claim_reactions, release_reactions, calculate_rxn_descriptors_parallel
+import DRP.plugins.rxndescriptors.rxnhash as rxnhash
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsChemicalClass('Org', 'Organic')
+@createsCompound('EtOH', 682, 'Org', 'Narnia', custom=True)
+@createsCompound('Pyr', 8904, 'Org', 'Narnia', custom=True)
+@createsCompoundRole('Org', 'Organic')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn3')
+class ChunkedCalculation(DRPTestCase):
+    """Checks that reactions are claimed once, and that every reaction is calculated whichever way it is chunked."""
+
+    def setUp(self):
+        """Give each reaction a compound, bypassing CompoundQuantity.save, and remove any hash values."""
+        self.reactions = [PerformedReaction.objects.get(reference=ref) for ref in ('rxn1', 'rxn2', 'rxn3')]
+        self.pks = [reaction.pk for reaction in self.reactions]
+        role = CompoundRole.objects.get(label='Org')
+        compounds = [Compound.objects.get(CSID=682), Compound.objects.get(CSID=8904), Compound.objects.get(CSID=682)]
+        CompoundQuantity.objects.bulk_create([CompoundQuantity(reaction=reaction, compound=compound, role=role, amount=1)
+                                              for reaction, compound in zip(self.reactions, compounds)])
+        self.descriptor = rxnhash.descriptorDict['rxnSpaceHash1']
+        CatRxnDescriptorValue.objects.filter(descriptor=self.descriptor, reaction_id__in=self.pks).delete()
+
+    def tearDown(self):
+        """Remove the quantities, which protect the compounds, and clear any claims."""
+        CompoundQuantity.objects.filter(reaction_id__in=self.pks).delete()
+        Reaction.objects.filter(pk__in=self.pks).update(calculating=False, recalculate=False)
+
+    def assertCalculated(self):
+        """Check every reaction has its hash value and none is left claimed."""
+        values = dict(CatRxnDescriptorValue.objects.filter(descriptor=self.descriptor, reaction_id__in=self.pks).values_list(
+            'reaction_id', 'value__value'))
+        self.assertEqual(set(values), set(self.pks))
+        self.assertEqual(values[self.pks[0]], values[self.pks[2]])
+        self.assertNotEqual(values[self.pks[0]], values[self.pks[1]])
+        self.assertFalse(Reaction.objects.filter(pk__in=self.pks, calculating=True).exists())
+
+    def test_claim(self):
+        """A reaction is claimed by one caller until released, and released again only if it needs recalculating."""
+        self.assertEqual(claim_reactions(self.pks[:2]), self.pks[:2])
+        self.assertEqual(claim_reactions(self.pks), self.pks[2:])
+        self.assertEqual(claim_reactions(self.pks), [])
+        Reaction.objects.filter(pk=self.pks[2]).update(recalculate=True)
+        again = release_reactions(Reaction.objects.filter(pk__in=self.pks))
+        self.assertEqual(list(again.values_list('pk', flat=True)), self.pks[2:])
+        self.assertEqual(list(Reaction.objects.filter(pk__in=self.pks, calculating=True).values_list('pk', flat=True)),
+                         self.pks[2:])
+        self.assertEqual(claim_reactions(self.pks), self.pks[:2])
+
+    def test_parallel(self):
+        """Worker processes calculate every reaction when the reactions are split over more chunks than workers."""
+        calculate_rxn_descriptors_parallel(self.pks, 2, 1, plugins=[rxnhash.__name__])
+        self.assertCalculated()
+
+    def test_serial(self):
+        """The command calculates every reaction in this process one chunk at a time."""
+        call_command('calculate_descriptors', reactions=True, chunk_size=2, plugins=[rxnhash.__name__],
+                     whitelist=None, verbosity=0)
+        self.assertCalculated()
+
+
+suite = unittest.TestSuite([
+    loadTests(ChunkedCalculation),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""Tests for the cache of external descriptor calculator results."""
+
+import unittest
+import os
+import time
+import shutil
+import tempfile
+from django.test.utils import override_settings
+from .drpTestCase import runTests
+from DRP.models import Compound
+from DRP.plugins.moldescriptors.cache import CalculatorCache, structure_hash, cache_key
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+class Cache(unittest.TestCase):
+    """Checks results are stored, counted, evicted least recently used first, and not kept when the cache is off."""
+
+    def setUp(self):
+        """Make a directory for the cache file."""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache', 'results.sqlite')
+
+    def tearDown(self):
+        """Remove the cache file."""
+        shutil.rmtree(self.directory)
+
+    def test_hits(self):
+        """Stored values are returned as they were given, and lookups are counted as hits or misses."""
+        cache = CalculatorCache(self.path, maxSize=None)
+        cache.set_many({'a': ['1.5', '2'], 'b': '3'})
+        self.assertEqual(cache.get_many(['a', 'c']), {'a': ['1.5', '2']})
+        self.assertEqual(cache.get('b'), '3')
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        self.assertEqual(CalculatorCache(self.path).get('b'), '3')
+
+    def test_evict(self):
+        """Beyond the maximum size, the entries used longest ago go first."""
+        cache = CalculatorCache(self.path, maxSize=25)
+        cache.set('a', 'x' * 8)
+        time.sleep(0.01)
+        cache.set('b', 'x' * 8)
+        time.sleep(0.01)
+        cache.get('a')
+        time.sleep(0.01)
+        cache.set('c', 'x' * 8)
+        self.assertEqual(set(cache.get_many(['a', 'b', 'c'])), {'a', 'c'})
+        self.assertLessEqual(cache.size(), 25)
+
+    def test_disabled(self):
+        """Without a configured path nothing is stored and every lookup misses."""
+        with override_settings(DESCRIPTOR_CACHE_PATH=None):
+            cache = CalculatorCache()
+        self.assertFalse(cache.enabled)
+        cache.set('a', '1')
+        self.assertEqual(cache.get_many(['a']), {})
+        self.assertEqual(cache.misses, 1)
+
+    def test_keys(self):
+        """Keys change with the structure, the software version and the command, and with nothing else."""
+        ethanol = structure_hash(Compound(name='ethanol', smiles='CCO', INCHI='InChI=1S/C2H6O/c1-2-3/h3H,2H2,1H3', formula='C2H6O'))
+        renamed = structure_hash(Compound(name='alcohol', smiles='CCO', INCHI='InChI=1S/C2H6O/c1-2-3/h3H,2H2,1H3', formula='C2H6O'))
+        methanol = structure_hash(Compound(name='methanol', smiles='CO', INCHI='InChI=1S/CH4O/c1-2/h2H,1H3', formula='CH4O'))
+        self.assertEqual(ethanol, renamed)
+        self.assertNotEqual(ethanol, methanol)
+        key = cache_key(ethanol, 'ChemAxon_cxcalc', '15_6', 'refractivity')
+        self.assertEqual(key, cache_key(renamed, 'ChemAxon_cxcalc', '15_6', 'refractivity'))
+        self.assertNotEqual(key, cache_key(ethanol, 'ChemAxon_cxcalc', '16_5', 'refractivity'))
+        self.assertNotEqual(key, cache_key(ethanol, 'ChemAxon_cxcalc', '15_6', 'avgpol'))
+
+
+suite = unittest.TestSuite([
+    loadTests(Cache),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""Tests that the batched ChemAxon calculation gives the values of the per-compound one."""
+
+import unittest
+from collections import OrderedDict
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsChemicalClass, createsCompound
+from DRP.models import Compound
+try:
+    import DRP.plugins.moldescriptors.chemaxon as chemaxon
+except ValueError:
+    # no suitable ChemAxon install is configured
+    chemaxon = None
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+WHITELIST = ('refractivity', 'hbda_acc_nominal', 'hbda_don_nominal')
+
+
+@unittest.skipIf(chemaxon is None, 'cxcalc is not configured in CHEMAXON_DIR')
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsChemicalClass('Org', 'Organic')
+@createsCompound('EtOH', 682, 'Org', 'Narnia', custom=True)
+@createsCompound('Pyr', 8904, 'Org', 'Narnia', custom=True)
+@createsCompound('H2O', 937, 'Org', 'Narnia', custom=True)
+class BatchedValues(DRPTestCase):
+    """Checks _calculate_batch gives each compound the values _calculate does, and hands back those it cannot do."""
+
+    def setUp(self):
+        """Give two compounds SMILES and leave the third without."""
+        Compound.objects.filter(CSID=682).update(smiles='CCO')
+        Compound.objects.filter(CSID=8904).update(smiles='c1ccncc1')
+        Compound.objects.filter(CSID=937).update(smiles='')
+        self.compounds = [Compound.objects.get(CSID=csid) for csid in (682, 8904, 937)]
+        self.descriptorDict = {k: v for k, v in chemaxon.setup_pHdependentDescriptors(chemaxon._descriptorDict).items()
+                               if k in WHITELIST}
+        self.commands = OrderedDict((k, v) for k, v in chemaxon.cxcalcCommands.items() if k in self.descriptorDict)
+
+    def values(self, numValues):
+        """Return a dictionary of (compound pk, heading) to value."""
+        return {(value.compound.pk, value.descriptor.heading): value.value for value in numValues}
+
+    def test_same_values(self):
+        """Both calculations agree on every value, and the compound without SMILES is missed by the batch."""
+        results = {}
+        numValues, ordValues, missed = chemaxon._calculate_batch(self.compounds, self.descriptorDict, self.commands, results=results)
+        self.assertEqual(missed, self.compounds[2:])
+        self.assertEqual(set(results), set(self.compounds[:2]))
+        batched = self.values(numValues)
+        single = {}
+        for compound in self.compounds[:2]:
+            numValues, ordValues = chemaxon._calculate(compound, self.descriptorDict, self.commands)
+            single.update(self.values(numValues))
+        self.assertEqual(set(batched), set(single))
+        self.assertEqual(len(single), 2 * len(WHITELIST))
+        for key, value in single.items():
+            self.assertAlmostEqual(batched[key], value, places=3, msg=key)
+
+
+suite = unittest.TestSuite([
+    loadTests(BatchedValues),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""Tests for counting the confusion matrices of predicted reaction descriptors."""
+
+import unittest
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction
+from DRP.models import PerformedReaction, ModelContainer, BoolRxnDescriptor, OrdRxnDescriptor, CatRxnDescriptor
+from DRP.models import BoolRxnDescriptorValue, OrdRxnDescriptorValue, CatRxnDescriptorValue, CategoricalDescriptorPermittedValue
+from DRP.models.rxnDescriptorValues import upsertValues
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+REFERENCES = ('rxn1', 'rxn2', 'rxn3', 'rxn4')
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn3')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn4')
+class ConfusionMatrix(DRPTestCase):
+    """Checks the cells count each pair of actual and predicted values, and follow new predictions."""
+
+    def setUp(self):
+        """Make a model container to own the predicted descriptors."""
+        self.container = ModelContainer.objects.create(modelVisitorLibrary='weka', modelVisitorTool='J48')
+        self.reactions = [PerformedReaction.objects.get(reference=ref) for ref in REFERENCES]
+        self.software = {'calculatorSoftware': 'test_suite', 'calculatorSoftwareVersion': '0'}
+
+    def tearDown(self):
+        """Remove the container and its predicted descriptors."""
+        self.container.delete()
+
+    def predicted(self, response, valueModel, actual, guesses):
+        """Store actual values and predictions of a response for the reactions, None leaving one out, and return the predicted descriptor."""
+        predDesc = response.createPredictionDescriptor(self.container)
+        predDesc.save()
+        values = []
+        for descriptor, outcomes in ((response, actual), (predDesc, guesses)):
+            values += [valueModel(descriptor=descriptor, reaction=reaction, **outcome)
+                       for reaction, outcome in zip(self.reactions, outcomes) if outcome is not None]
+        upsertValues(values)
+        return predDesc
+
+    def test_bool(self):
+        """Reactions without a prediction are not counted, and a queryset of reactions limits those counted."""
+        response = BoolRxnDescriptor.objects.create(heading='confusion_bool', name='boolean', **self.software)
+        predDesc = self.predicted(response, BoolRxnDescriptorValue,
+                                  [{'value': True}, {'value': True}, {'value': False}, {'value': False}],
+                                  [{'value': True}, {'value': False}, {'value': False}, None])
+        self.assertEqual(predDesc.getConfusionMatrix(), {True: {True: 1, False: 1}, False: {True: 0, False: 1}})
+        reactions = PerformedReaction.objects.filter(pk__in=[r.pk for r in self.reactions[1:]])
+        self.assertEqual(predDesc.getConfusionMatrix(reactions), {True: {True: 0, False: 1}, False: {True: 0, False: 1}})
+
+    def test_ord(self):
+        """Every value in the ordinal range has a row and column, and new predictions are counted at once."""
+        response = OrdRxnDescriptor.objects.create(heading='confusion_ord', name='ordinal', maximum=3, minimum=1, **self.software)
+        predDesc = self.predicted(response, OrdRxnDescriptorValue,
+                                  [{'value': 1}, {'value': 2}, {'value': 2}, {'value': 3}],
+                                  [{'value': 1}, {'value': 3}, {'value': 2}, {'value': 3}])
+        expected = {1: {1: 1, 2: 0, 3: 0}, 2: {1: 0, 2: 1, 3: 1}, 3: {1: 0, 2: 0, 3: 1}}
+        self.assertEqual(predDesc.getConfusionMatrix(), expected)
+        upsertValues([OrdRxnDescriptorValue(descriptor=predDesc, reaction=self.reactions[1], value=2)])
+        expected[2] = {1: 0, 2: 2, 3: 0}
+        self.assertEqual(predDesc.getConfusionMatrix(), expected)
+
+    def test_cat(self):
+        """Categorical matrices are keyed by the permitted values of the descriptor predicted."""
+        response = CatRxnDescriptor.objects.create(heading='confusion_cat', name='categorical', **self.software)
+        red, blue = (CategoricalDescriptorPermittedValue.objects.create(descriptor=response, value=v) for v in ('red', 'blue'))
+        predDesc = self.predicted(response, CatRxnDescriptorValue,
+                                  [{'value': red}, {'value': red}, {'value': blue}, None],
+                                  [{'value': blue}, {'value': red}, {'value': blue}, {'value': red}])
+        self.assertEqual(predDesc.getConfusionMatrix(), {'red': {'red': 1, 'blue': 1}, 'blue': {'red': 0, 'blue': 1}})
+
+
+suite = unittest.TestSuite([
+    loadTests(ConfusionMatrix),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
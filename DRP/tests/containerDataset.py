@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""Tests for the dataset a model container materialises once for all of its stats models."""
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from django.test.utils import override_settings
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction
+from DRP.models import PerformedReaction, ModelContainer, DataSet, NumRxnDescriptor, BoolRxnDescriptor
+from DRP.models import NumRxnDescriptorValue, BoolRxnDescriptorValue
+from DRP.models.containerDataset import ContainerDataset
+from DRP.models.descriptorMatrix import DescriptorMatrix
+from DRP.models.rxnDescriptorValues import upsertValues
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn3')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn4')
+class SharedDataset(DRPTestCase):
+    """Checks fold inputs cut from the shared dataset match a fresh export, and reactions outside it are refused."""
+
+    def setUp(self):
+        """Make a container trained on rxn1 and rxn2 and tested on rxn3, with a predictor and a response."""
+        self.directory = tempfile.mkdtemp()
+        self.override = override_settings(TMP_DIR=self.directory)
+        self.override.enable()
+        software = {'calculatorSoftware': 'test_suite', 'calculatorSoftwareVersion': '0'}
+        self.num = NumRxnDescriptor.objects.create(heading='dataset_num', name='number', **software)
+        self.bool = BoolRxnDescriptor.objects.create(heading='dataset_bool', name='boolean', **software)
+        self.reactions = [PerformedReaction.objects.get(reference=ref) for ref in ('rxn1', 'rxn2', 'rxn3', 'rxn4')]
+        self.pks = [r.pk for r in self.reactions]
+        rxn1, rxn2, rxn3, rxn4 = self.reactions
+        upsertValues([
+            NumRxnDescriptorValue(descriptor=self.num, reaction=rxn1, value=1.5),
+            NumRxnDescriptorValue(descriptor=self.num, reaction=rxn2, value=0.0),
+            NumRxnDescriptorValue(descriptor=self.num, reaction=rxn4, value=2.0),
+            BoolRxnDescriptorValue(descriptor=self.bool, reaction=rxn1, value=True),
+            BoolRxnDescriptorValue(descriptor=self.bool, reaction=rxn2, value=False),
+            BoolRxnDescriptorValue(descriptor=self.bool, reaction=rxn3, value=True)])
+        trainingSet = DataSet.createFromPks('dataset_training', self.pks[:2])
+        testSet = DataSet.createFromPks('dataset_test', self.pks[2:3])
+        self.container = ModelContainer.create('weka', 'J48', [self.num], [self.bool],
+                                               trainingSets=[trainingSet], testSets=[testSet])
+        self.dataset = ContainerDataset(self.container)
+        self.dataset.materialize()
+
+    def tearDown(self):
+        """Remove the dataset files, the container and its data sets."""
+        self.dataset.remove()
+        self.container.delete()
+        DataSet.objects.filter(name__startswith='dataset_').delete()
+        self.override.disable()
+        shutil.rmtree(self.directory)
+
+    def test_arff(self):
+        """The ARFF file for a fold is the one exported from the database for its reactions."""
+        whitelist = self.dataset.whitelist()
+        path = os.path.join(self.directory, 'fold.arff')
+        self.assertTrue(self.dataset.writeArff([self.pks[0], self.pks[2]], path, whitelist))
+        with open(path) as f:
+            written = f.read()
+        reactions = PerformedReaction.objects.filter(pk__in=[self.pks[0], self.pks[2]])
+        self.assertEqual(written, ''.join(reactions.arffLines(expanded=True, whitelistHeaders=whitelist, sparse=True)))
+
+    def test_refused(self):
+        """Reactions outside the container, or other attributes, are left to the caller to export."""
+        path = os.path.join(self.directory, 'fold.arff')
+        self.assertIsNone(self.dataset.rowsFor(self.pks[2:]))
+        self.assertFalse(self.dataset.writeArff(self.pks[2:], path, self.dataset.whitelist()))
+        self.assertFalse(self.dataset.writeArff(self.pks[:2], path, [self.num.csvHeader]))
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNone(self.dataset.matrix(self.pks[2:], [self.num]))
+
+    def test_matrix(self):
+        """Encoded values are selected in the order asked for, as the descriptor matrix would give them."""
+        pks = [self.pks[2], self.pks[0], self.pks[1]]
+        matrix = self.dataset.matrix(pks, [self.bool, self.num])
+        np.testing.assert_array_equal(matrix, DescriptorMatrix().matrix(pks, [self.bool, self.num]))
+        np.testing.assert_array_equal(matrix, np.array([[1.0, np.nan], [1.0, 1.5], [0.0, 0.0]]))
+
+    def test_remove(self):
+        """Once removed the dataset holds nothing."""
+        self.dataset.remove()
+        self.assertFalse(self.dataset.exists())
+        self.assertIsNone(self.dataset.rowsFor(self.pks[:1]))
+        self.assertFalse(any(os.listdir(self.directory)))
+
+
+suite = unittest.TestSuite([
+    loadTests(SharedDataset),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
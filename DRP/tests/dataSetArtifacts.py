@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Tests for data sets identified by their reactions and the files derived from them."""
+
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from django.test.utils import override_settings
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction
+from DRP.models import DataSet, PerformedReaction
+from DRP.models.dataSets import artifactPath, contentHash, evictArtifacts, linkArtifact
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+class Eviction(DRPTestCase):
+    """Checks that the least recently used artifacts are evicted first and linked copies survive."""
+
+    def setUp(self):
+        """Write three artifacts of 100 bytes, used an hour, a day and a month ago."""
+        self.directory = tempfile.mkdtemp()
+        self.modelDirectory = tempfile.mkdtemp()
+        self.override = override_settings(DATASET_ARTIFACT_DIR=self.directory)
+        self.override.enable()
+        self.paths = []
+        for i, age in enumerate((3600, 86400, 30 * 86400)):
+            path = artifactPath(contentHash([i]), 'artifact.arff')
+            os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write('x' * 100)
+            os.utime(path, (time.time() - age, time.time() - age))
+            self.paths.append(path)
+
+    def tearDown(self):
+        """Remove the artifacts."""
+        self.override.disable()
+        shutil.rmtree(self.directory)
+        shutil.rmtree(self.modelDirectory)
+
+    def test_size(self):
+        """The oldest artifacts go until the rest fit."""
+        self.assertEqual(evictArtifacts(maxBytes=150), 200)
+        self.assertEqual([os.path.exists(path) for path in self.paths], [True, False, False])
+
+    def test_age(self):
+        """Artifacts unused for longer than the maximum age go, with their emptied directories."""
+        self.assertEqual(evictArtifacts(maxAge=7 * 86400), 100)
+        self.assertEqual([os.path.exists(path) for path in self.paths], [True, True, False])
+        self.assertFalse(os.path.exists(os.path.dirname(self.paths[2])))
+
+    def test_link(self):
+        """A linked copy keeps its content after the artifact is evicted."""
+        linked = linkArtifact(self.paths[2], os.path.join(self.modelDirectory, 'model.arff'))
+        evictArtifacts(maxAge=7 * 86400)
+        self.assertFalse(os.path.exists(self.paths[2]))
+        with open(linked) as f:
+            self.assertEqual(f.read(), 'x' * 100)
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+class Reuse(DRPTestCase):
+    """Checks that a data set with the same reactions as an existing one is that set, under its own name."""
+
+    def tearDown(self):
+        """Remove the data sets."""
+        DataSet.objects.filter(name__startswith='reuse_').delete()
+
+    def test_reuse(self):
+        """The existing set is returned whatever order the reactions come in."""
+        pks = list(PerformedReaction.objects.values_list('pk', flat=True))
+        first = DataSet.createFromPks('reuse_first', pks)
+        second = DataSet.createFromPks('reuse_second', reversed(pks))
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(second.name, 'reuse_first')
+        self.assertEqual(sorted(second.reactions.values_list('pk', flat=True)), sorted(pks))
+        self.assertNotEqual(DataSet.createFromPks('reuse_third', pks[:1]).pk, first.pk)
+
+
+suite = unittest.TestSuite([
+    loadTests(Eviction),
+    loadTests(Reuse),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
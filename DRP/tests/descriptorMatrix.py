@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""Tests that descriptor matrix columns follow changes to reaction descriptor values."""
+
+import unittest
+import shutil
+import tempfile
+import numpy as np
+from django.db import connection, models
+from django.test.utils import CaptureQueriesContext, override_settings
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction
+from DRP.models import PerformedReaction, NumRxnDescriptor, NumRxnDescriptorValue, RxnDescriptorValuesVersion
+from DRP.models.descriptorMatrix import DescriptorMatrix
+from DRP.models.rxnDescriptorValues import upsertValues, valuesVersions
+from DRP.models.rxnDescriptorValuesVersion import writeStamp
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn3')
+class ColumnFreshness(DRPTestCase):
+    """Checks that a stored column is brought up to date after each kind of write."""
+
+    def setUp(self):
+        """Create a descriptor with values for two reactions and build its column in two directories."""
+        self.directories = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        self.descriptor = NumRxnDescriptor.objects.create(
+            heading='matrix_test', name='matrix test', calculatorSoftware='test_suite', calculatorSoftwareVersion='0')
+        self.reactions = [PerformedReaction.objects.get(reference=ref) for ref in ('rxn1', 'rxn2', 'rxn3')]
+        for reaction, value in zip(self.reactions[:2], (1.0, 2.0)):
+            NumRxnDescriptorValue(descriptor=self.descriptor, reaction=reaction, value=value).save()
+        for directory in self.directories:
+            self.assertColumn(DescriptorMatrix(directory), {0: 1.0, 1: 2.0})
+
+    def tearDown(self):
+        """Remove the column directories."""
+        for directory in self.directories:
+            shutil.rmtree(directory)
+
+    def assertColumn(self, matrix, expected):
+        """Check a matrix's column for the descriptor holds the expected values, keyed by index into self.reactions."""
+        pks, values = matrix.column(self.descriptor)
+        self.assertEqual({int(pk): float(value) for pk, value in zip(pks, values)},
+                         {self.reactions[i].pk: value for i, value in expected.items()})
+
+    def test_save(self):
+        """Saving a new value adds it to every stored column."""
+        NumRxnDescriptorValue(descriptor=self.descriptor, reaction=self.reactions[2], value=3.0).save()
+        for directory in self.directories:
+            self.assertColumn(DescriptorMatrix(directory), {0: 1.0, 1: 2.0, 2: 3.0})
+
+    def test_update(self):
+        """Updating values in place through a queryset is seen by every stored column."""
+        NumRxnDescriptorValue.objects.filter(descriptor=self.descriptor, reaction=self.reactions[0]).update(value=5.0)
+        for directory in self.directories:
+            self.assertColumn(DescriptorMatrix(directory), {0: 5.0, 1: 2.0})
+
+    def test_delete(self):
+        """Deleting values, singly or through a queryset, removes them from every stored column."""
+        NumRxnDescriptorValue.objects.get(descriptor=self.descriptor, reaction=self.reactions[0]).delete()
+        self.assertColumn(DescriptorMatrix(self.directories[0]), {1: 2.0})
+        NumRxnDescriptorValue.objects.filter(descriptor=self.descriptor).delete()
+        for directory in self.directories:
+            self.assertColumn(DescriptorMatrix(directory), {})
+
+    def test_upsert(self):
+        """Values written in bulk, new and replacing, are seen by every stored column."""
+        upsertValues([NumRxnDescriptorValue(descriptor=self.descriptor, reaction=self.reactions[1], value=7.0),
+                      NumRxnDescriptorValue(descriptor=self.descriptor, reaction=self.reactions[2], value=8.0)])
+        for directory in self.directories:
+            self.assertColumn(DescriptorMatrix(directory), {0: 1.0, 1: 7.0, 2: 8.0})
+
+    def test_unsettled(self):
+        """A write stamped before a column was built, but committed after, is still read."""
+        matrix = DescriptorMatrix(self.directories[0])
+        stamp = writeStamp()
+        self.assertColumn(matrix, {0: 1.0, 1: 2.0})
+        models.query.QuerySet(NumRxnDescriptorValue).filter(
+            descriptor=self.descriptor, reaction=self.reactions[0]).update(value=6.0, version=stamp)
+        self.assertColumn(matrix, {0: 6.0, 1: 2.0})
+
+    def test_versions(self):
+        """Writes stamp the values without touching the version row, deletes raise the floor, and both change the token."""
+        with override_settings(DESCRIPTOR_VALUES_SETTLE_SECONDS=0):
+            token = valuesVersions([self.descriptor.pk])[self.descriptor.pk]
+            self.assertEqual(valuesVersions([self.descriptor.pk])[self.descriptor.pk], token)
+            floor = RxnDescriptorValuesVersion.objects.get(descriptor_id=self.descriptor.pk).floor
+            with CaptureQueriesContext(connection) as queries:
+                NumRxnDescriptorValue(descriptor=self.descriptor, reaction=self.reactions[2], value=3.0).save()
+                NumRxnDescriptorValue.objects.filter(descriptor=self.descriptor).update(value=0.0)
+            table = RxnDescriptorValuesVersion._meta.db_table
+            self.assertFalse([q for q in queries.captured_queries if table in q['sql']])
+            updated = valuesVersions([self.descriptor.pk])[self.descriptor.pk]
+            self.assertNotEqual(updated, token)
+            NumRxnDescriptorValue.objects.filter(descriptor=self.descriptor, reaction=self.reactions[2]).delete()
+            self.assertEqual(RxnDescriptorValuesVersion.objects.get(descriptor_id=self.descriptor.pk).floor, floor + 1)
+            self.assertNotEqual(valuesVersions([self.descriptor.pk])[self.descriptor.pk], updated)
+        self.assertNotEqual(valuesVersions([self.descriptor.pk])[self.descriptor.pk],
+                            valuesVersions([self.descriptor.pk])[self.descriptor.pk])
+
+    def test_matrix(self):
+        """The matrix aligns the column to the requested reactions with NaN where missing."""
+        matrix = DescriptorMatrix(self.directories[0]).matrix([r.pk for r in reversed(self.reactions)], [self.descriptor])
+        self.assertTrue(np.isnan(matrix[0, 0]))
+        self.assertEqual(list(matrix[1:, 0]), [2.0, 1.0])
+
+
+suite = unittest.TestSuite([
+    loadTests(ColumnFreshness),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""Tests for the registry synchronising plugin descriptor definitions with the database."""
+
+import unittest
+from django.core.cache import cache
+from django.test.utils import override_settings
+from .drpTestCase import DRPTestCase, runTests
+from DRP.models import NumRxnDescriptor, BoolRxnDescriptor
+from DRP.models.descriptorRegistry import descriptors, fingerprint, CACHE_KEY, DescriptorSync
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+class Registry(DRPTestCase):
+    """Checks that definitions are created once, then served from the cache only while they exist."""
+
+    descDict = {
+        'registry_num': {'type': 'num', 'name': 'registry number', 'calculatorSoftware': 'registry_test',
+                         'calculatorSoftwareVersion': '0'},
+        'registry_bool': {'type': 'bool', 'name': 'registry boolean', 'calculatorSoftware': 'registry_test',
+                          'calculatorSoftwareVersion': '0'},
+    }
+
+    def setUp(self):
+        """Share synchronised definitions through the cache."""
+        self.override = override_settings(DESCRIPTOR_REGISTRY_SHARED_CACHE=True)
+        self.override.enable()
+
+    def tearDown(self):
+        """Remove the descriptors and the record of their synchronisation."""
+        cache.delete(CACHE_KEY.format(fingerprint('rxn', self.descDict)))
+        DescriptorSync.objects.filter(fingerprint=fingerprint('rxn', self.descDict)).delete()
+        NumRxnDescriptor.objects.filter(calculatorSoftware='registry_test').delete()
+        BoolRxnDescriptor.objects.filter(calculatorSoftware='registry_test').delete()
+        self.override.disable()
+
+    def test_sync(self):
+        """The first load creates the descriptors and later loads return the same ones."""
+        first = descriptors('rxn', self.descDict)
+        self.assertEqual(set(first), set(self.descDict))
+        self.assertIsInstance(first['registry_num'], NumRxnDescriptor)
+        self.assertIsInstance(first['registry_bool'], BoolRxnDescriptor)
+        second = descriptors('rxn', self.descDict)
+        self.assertEqual({h: d.pk for h, d in second.items()}, {h: d.pk for h, d in first.items()})
+        self.assertEqual(NumRxnDescriptor.objects.filter(calculatorSoftware='registry_test').count(), 1)
+
+    def test_deleted(self):
+        """A cached descriptor deleted since is created again rather than returned."""
+        first = descriptors('rxn', self.descDict)
+        NumRxnDescriptor.objects.filter(pk=first['registry_num'].pk).delete()
+        second = descriptors('rxn', self.descDict)
+        self.assertNotEqual(second['registry_num'].pk, first['registry_num'].pk)
+        self.assertTrue(NumRxnDescriptor.objects.filter(pk=second['registry_num'].pk).exists())
+        self.assertEqual(second['registry_bool'].pk, first['registry_bool'].pk)
+
+
+suite = unittest.TestSuite([
+    loadTests(Registry),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
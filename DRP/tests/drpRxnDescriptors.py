@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""Tests that the batched drp reaction descriptor calculation gives the values of the per-reaction one."""
+
+import unittest
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction, createsChemicalClass
+from .decorators import createsCompound, createsCompoundRole
+from DRP.models import PerformedReaction, Compound, CompoundRole, CompoundQuantity
+from DRP.models import NumMolDescriptor, BoolMolDescriptor, OrdMolDescriptor, CatMolDescriptor, CategoricalDescriptorPermittedValue
+from DRP.models import NumMolDescriptorValue, BoolMolDescriptorValue, OrdMolDescriptorValue, CatMolDescriptorValue
+from DRP.models import NumRxnDescriptor, NumRxnDescriptorValue
+import DRP.plugins.rxndescriptors.drp as drp
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsChemicalClass('Org', 'Organic')
+@createsCompound('EtOH', 682, 'Org', 'Narnia', custom=True)
+@createsCompound('Pyr', 8904, 'Org', 'Narnia', custom=True)
+@createsCompoundRole('Org', 'Organic')
+@createsCompoundRole('Inorg', 'Inorganic')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn3')
+class BatchedValues(DRPTestCase):
+    """Checks _calculate_batch and _calculate agree on every value, including skipped and NULL ones."""
+
+    def setUp(self):
+        """Give the compounds formulae and a value of each type of molecular descriptor, and the reactions quantities."""
+        etoh = Compound.objects.get(CSID=682)
+        pyr = Compound.objects.get(CSID=8904)
+        Compound.objects.filter(pk=etoh.pk).update(formula='C_{2}H_{6}O')
+        Compound.objects.filter(pk=pyr.pk).update(formula='C_{5}H_{5}N')
+        software = {'calculatorSoftware': 'test_suite', 'calculatorSoftwareVersion': '0'}
+        mass = NumMolDescriptor.objects.create(heading='test_mass', name='mass', maximum=None, minimum=0, **software)
+        aromatic = BoolMolDescriptor.objects.create(heading='test_aromatic', name='aromatic', **software)
+        rings = OrdMolDescriptor.objects.create(heading='test_rings', name='rings', maximum=2, minimum=0, **software)
+        kind = CatMolDescriptor.objects.create(heading='test_kind', name='kind', **software)
+        alcohol = CategoricalDescriptorPermittedValue.objects.create(descriptor=kind, value='alcohol')
+        CategoricalDescriptorPermittedValue.objects.create(descriptor=kind, value='amine')
+        NumMolDescriptorValue.objects.bulk_create([
+            NumMolDescriptorValue(compound=etoh, descriptor=mass, value=46.07),
+            NumMolDescriptorValue(compound=pyr, descriptor=mass, value=79.1)])
+        BoolMolDescriptorValue.objects.bulk_create([
+            BoolMolDescriptorValue(compound=etoh, descriptor=aromatic, value=False),
+            BoolMolDescriptorValue(compound=pyr, descriptor=aromatic, value=True)])
+        OrdMolDescriptorValue.objects.bulk_create([
+            OrdMolDescriptorValue(compound=etoh, descriptor=rings, value=0),
+            OrdMolDescriptorValue(compound=pyr, descriptor=rings, value=1)])
+        # pyridine has no kind, so aggregates of kind over roles holding it are skipped
+        CatMolDescriptorValue.objects.bulk_create([CatMolDescriptorValue(compound=etoh, descriptor=kind, value=alcohol)])
+        org = CompoundRole.objects.get(label='Org')
+        inorg = CompoundRole.objects.get(label='Inorg')
+        self.reactions = [PerformedReaction.objects.get(reference=ref) for ref in ('rxn1', 'rxn2', 'rxn3')]
+        CompoundQuantity.objects.bulk_create([
+            CompoundQuantity(reaction=self.reactions[0], compound=etoh, role=org, amount=1),
+            CompoundQuantity(reaction=self.reactions[0], compound=pyr, role=org, amount=2),
+            CompoundQuantity(reaction=self.reactions[1], compound=etoh, role=org, amount='1.5'),
+            CompoundQuantity(reaction=self.reactions[1], compound=pyr, role=inorg, amount='0.5'),
+            CompoundQuantity(reaction=self.reactions[2], compound=etoh, role=org, amount=None)])
+        self.descriptorDict, _ = drp.make_dict()
+        self.descriptorDict.initialise(self.descriptorDict.descDict)
+
+    def tearDown(self):
+        """Remove the quantities, which protect the compounds."""
+        CompoundQuantity.objects.filter(reaction__in=self.reactions).delete()
+
+    def values(self, numValues, boolValues):
+        """Return a dictionary of (reaction pk, heading) to value, numbers as floats."""
+        values = {}
+        for value in numValues:
+            values[(value.reaction_id, value.descriptor.heading)] = None if value.value is None else float(value.value)
+        for value in boolValues:
+            values[(value.reaction_id, value.descriptor.heading)] = value.value
+        return values
+
+    def test_same_values(self):
+        """Every value made per reaction is made by the batch, and equal."""
+        single = {}
+        for reaction in self.reactions:
+            single.update(self.values(*drp._calculate(reaction, self.descriptorDict)))
+        batched = self.values(*drp._calculate_batch(self.reactions, self.descriptorDict))
+        self.assertEqual(set(batched), set(single))
+        for key, value in single.items():
+            if isinstance(value, float):
+                self.assertAlmostEqual(batched[key], value, msg=key)
+            else:
+                self.assertEqual(batched[key], value, msg=key)
+        self.assertEqual(single[(self.reactions[0].pk, 'Org_test_aromatic_test_suite_0_any')], True)
+        self.assertEqual(single[(self.reactions[1].pk, 'Org_test_aromatic_test_suite_0_any')], True)
+        self.assertNotIn((self.reactions[0].pk, 'Org_test_kind_test_suite_0_alcohol_count'), single)
+        self.assertIsNone(single[(self.reactions[2].pk, 'Org_test_mass_test_suite_0_gmean_count')])
+
+    def test_pH(self):
+        """Reaction pH values made for a batch are those made per reaction, copied from the descriptor at each reaction's pH."""
+        _, pHDescriptors = drp.make_dict()
+        heading = sorted(pHDescriptors)[0]
+        software = {'calculatorSoftware': 'test_suite', 'calculatorSoftwareVersion': '0'}
+        pH = NumRxnDescriptor.objects.create(heading='reaction_pH', name='reaction pH', **software)
+        source = NumRxnDescriptor.objects.create(heading=heading.replace('_pHreaction_', '_pH7_0_'), name='at pH 7', **software)
+        rxn1, rxn2, rxn3 = self.reactions
+        NumRxnDescriptorValue(descriptor=pH, reaction=rxn1, value=7.0).save()
+        NumRxnDescriptorValue(descriptor=pH, reaction=rxn2, value=3.0).save()
+        NumRxnDescriptorValue(descriptor=source, reaction=rxn1, value=2.5).save()
+        single = []
+        for reaction in self.reactions:
+            single = drp._calculateRxnpH(reaction, self.descriptorDict, pHDescriptors, whitelist=[heading], vals_to_create=single)
+        batched = drp._calculate_batch_pH(self.reactions, self.descriptorDict, pHDescriptors, whitelist=[heading])
+        self.assertEqual([(v.reaction_id, v.descriptor.heading, v.value) for v in batched],
+                         [(v.reaction_id, v.descriptor.heading, v.value) for v in single])
+        self.assertEqual([(v.reaction_id, v.value) for v in batched], [(rxn1.pk, 2.5)])
+
+    def test_truth(self):
+        """Descriptor value instances are always true, whatever their values, as the stored _any aggregates assume."""
+        self.assertTrue(BoolMolDescriptorValue(value=False))
+        self.assertTrue(BoolMolDescriptorValue(value=True))
+        self.assertTrue(NumMolDescriptorValue(value=0))
+        self.assertTrue(NumMolDescriptorValue(value=0.5))
+
+
+suite = unittest.TestSuite([
+    loadTests(BatchedValues),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""Tests for finding export descriptors by header and pivoting their values out of the value tables."""
+
+import unittest
+import numpy as np
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction
+from DRP.models import PerformedReaction, NumRxnDescriptor, BoolRxnDescriptor, OrdRxnDescriptor, CatRxnDescriptor
+from DRP.models import NumRxnDescriptorValue, BoolRxnDescriptorValue, OrdRxnDescriptorValue, CatRxnDescriptorValue
+from DRP.models import CategoricalDescriptorPermittedValue
+from DRP.models.descriptorMatrix import fetchMatrix
+from DRP.models.rxnDescriptorValues import upsertValues
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn3')
+class ExpandedRows(DRPTestCase):
+    """Checks descriptors are found by their csvHeaders and both ways of reading their values agree."""
+
+    def setUp(self):
+        """Create a descriptor of each type with values for some of the reactions."""
+        software = {'calculatorSoftware': 'test_suite', 'calculatorSoftwareVersion': '0'}
+        self.num = NumRxnDescriptor.objects.create(heading='rows_num', name='number', **software)
+        self.bool = BoolRxnDescriptor.objects.create(heading='rows_bool', name='boolean', **software)
+        self.ord = OrdRxnDescriptor.objects.create(heading='rows_ord', name='ordinal', maximum=4, minimum=1, **software)
+        self.cat = CatRxnDescriptor.objects.create(heading='rows_cat', name='categorical', **software)
+        self.red = CategoricalDescriptorPermittedValue.objects.create(descriptor=self.cat, value='red')
+        self.reactions = [PerformedReaction.objects.get(reference=ref) for ref in ('rxn1', 'rxn2', 'rxn3')]
+        rxn1, rxn2, rxn3 = self.reactions
+        upsertValues([
+            NumRxnDescriptorValue(descriptor=self.num, reaction=rxn1, value=1.5),
+            NumRxnDescriptorValue(descriptor=self.num, reaction=rxn3, value=None),
+            BoolRxnDescriptorValue(descriptor=self.bool, reaction=rxn2, value=False),
+            OrdRxnDescriptorValue(descriptor=self.ord, reaction=rxn3, value=3),
+            CatRxnDescriptorValue(descriptor=self.cat, reaction=rxn1, value=self.red)])
+        self.descriptors = [self.bool, self.num, self.ord, self.cat]
+        self.queryset = PerformedReaction.objects.filter(pk__in=[r.pk for r in self.reactions])
+
+    def test_descriptors_for(self):
+        """Only descriptors whose csvHeaders are whitelisted are returned, and all of them without a whitelist."""
+        found = self.queryset.descriptorsFor([self.num.csvHeader, self.cat.csvHeader, 'rows_missing_test_suite_0'])
+        self.assertEqual([d.pk for d in found], [self.num.pk, self.cat.pk])
+        self.assertEqual(self.queryset.descriptorsFor([]), [])
+        everything = [d.pk for d in self.queryset.descriptorsFor()]
+        self.assertTrue(all(d.pk in everything for d in self.descriptors))
+
+    def test_fetch_matrix(self):
+        """Values are placed by reaction in the order asked for, encoded, with NaN for missing and NULL values."""
+        pks = [r.pk for r in reversed(self.reactions)]
+        matrix = fetchMatrix(pks, self.descriptors)
+        expected = np.array([[np.nan, np.nan, 3.0, np.nan],
+                             [0.0, np.nan, np.nan, np.nan],
+                             [np.nan, 1.5, np.nan, float(self.red.pk)]])
+        np.testing.assert_array_equal(matrix, expected)
+        self.assertEqual(fetchMatrix([], self.descriptors).shape, (0, 4))
+
+    def test_rows(self):
+        """Expanded rows hold the same decoded values whether read from the value tables or the column store."""
+        headers = [d.csvHeader for d in self.descriptors]
+        pivoted = {row['id']: {h: row[h] for h in headers if h in row} for row in self.queryset.rows(True)}
+        stored = {row['id']: {h: row[h] for h in headers if h in row} for row in self.queryset.rows(True, whitelist=headers)}
+        self.assertEqual(pivoted, stored)
+        rxn1, rxn2, rxn3 = (r.pk for r in self.reactions)
+        self.assertEqual(pivoted[rxn1], {self.num.csvHeader: 1.5, self.cat.csvHeader: 'red'})
+        self.assertEqual(pivoted[rxn2], {self.bool.csvHeader: False})
+        self.assertEqual(pivoted[rxn3], {self.ord.csvHeader: 3})
+
+
+suite = unittest.TestSuite([
+    loadTests(ExpandedRows),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
@@ -11,6 +11,7 @@ from . import registerPage
 import unittest
 from . import compoundPages
 from . import reactionPages
+from . import predictPages
 
 suite = unittest.TestSuite([
     aboutPage.suite,
@@ -23,5 +24,6 @@ suite = unittest.TestSuite([
     licensePage.suite,
     loginPage.suite,
     registerPage.suite,
-    reactionPages.suite
+    reactionPages.suite,
+    predictPages.suite,
 ])
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""Tests for the view predicting the outcomes of reactions which have not been performed."""
+
+import unittest
+import json
+from django.core.urlresolvers import reverse
+from .httpTest import PostHttpSessionTest, logsInAs
+from DRP.tests.decorators import createsPerformedReaction, joinsLabGroup, signsExampleLicense
+from DRP.tests.decorators import createsChemicalClass, createsCompound, createsCompoundRole
+from DRP.tests import runTests
+from DRP.models import PerformedReaction, Compound, CompoundRole, ModelContainer, DataSet
+from DRP.models import NumRxnDescriptor, BoolRxnDescriptor, NumRxnDescriptorValue, BoolRxnDescriptorValue
+from DRP.models.rxnDescriptorValues import upsertValues
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+class PredictionTest(PostHttpSessionTest):
+    """Posts a JSON body to the prediction view of a container created by makeContainer."""
+
+    status = 200
+    body = {}
+
+    def makeContainer(self):
+        """Return the container to predict with."""
+        return ModelContainer.objects.create(modelVisitorLibrary='weka', modelVisitorTool='J48', built=True)
+
+    def setUp(self):
+        """Create the container and post the body with the session's csrf token."""
+        self.container = self.makeContainer()
+        self.url = self.url + reverse('predictReactions', kwargs={'container_id': self.container.pk})
+        self.headers['X-CSRFToken'] = self.s.cookies.get_dict()['csrftoken']
+        self.headers['Content-Type'] = 'application/json'
+        self.payload = self.body if isinstance(self.body, str) else json.dumps(self.body)
+        super(PredictionTest, self).setUp()
+
+    def tearDown(self):
+        """Remove the container."""
+        self.container.delete()
+        super(PredictionTest, self).tearDown()
+
+    def test_ValidHtml(self):
+        """The response is JSON, not HTML."""
+        pass
+
+
+@logsInAs('Aslan', 'old_magic')
+@signsExampleLicense('Aslan')
+@joinsLabGroup('Aslan', 'narnia')
+class MalformedPrediction(PredictionTest):
+    """A body which is not JSON is a client error."""
+
+    status = 400
+    body = 'not json'
+
+
+@logsInAs('Aslan', 'old_magic')
+@signsExampleLicense('Aslan')
+@joinsLabGroup('Aslan', 'narnia')
+@createsChemicalClass('Org', 'Organic')
+@createsCompound('EtOH', 682, 'Org', 'narnia', custom=True)
+@createsCompoundRole('Org', 'Organic')
+@createsPerformedReaction('narnia', 'Aslan', 'cold1')
+@createsPerformedReaction('narnia', 'Aslan', 'cold2')
+@createsPerformedReaction('narnia', 'Aslan', 'hot1')
+@createsPerformedReaction('narnia', 'Aslan', 'hot2')
+class WekaPrediction(PredictionTest):
+    """A weka container predicts through a temporary arff file rather than refusing the request."""
+
+    def makeContainer(self):
+        """Train a J48 tree on a manual temperature predicting a manual outcome."""
+        predictor = NumRxnDescriptor.objects.create(
+            heading='predict_temperature', name='predict temperature', calculatorSoftware='manual', calculatorSoftwareVersion='0')
+        response = BoolRxnDescriptor.objects.create(
+            heading='predict_outcome', name='predict outcome', calculatorSoftware='manual', calculatorSoftwareVersion='0')
+        values = []
+        for reference, temperature in (('cold1', 10.0), ('cold2', 20.0), ('hot1', 80.0), ('hot2', 90.0)):
+            reaction = PerformedReaction.objects.get(reference=reference)
+            values.append(NumRxnDescriptorValue(descriptor=predictor, reaction=reaction, value=temperature))
+            values.append(BoolRxnDescriptorValue(descriptor=response, reaction=reaction, value=temperature > 50))
+        upsertValues(values)
+        trainingSet = DataSet.createFromPks('predict_training', PerformedReaction.objects.values_list('pk', flat=True))
+        container = ModelContainer.create('weka', 'J48', [predictor], [response], trainingSets=[trainingSet])
+        container.build()
+        compound = Compound.objects.get(CSID=682)
+        role = CompoundRole.objects.get(label='Org')
+        self.body = {'reactions': [{'compounds': [{'compound': compound.pk, 'role': role.pk, 'amount': 1}],
+                                    'descriptors': {'predict_temperature': temperature}}
+                                   for temperature in (15.0, 85.0)]}
+        return container
+
+    def test_predictions(self):
+        """One outcome is predicted for each posted reaction."""
+        predictions = self.response.json()['predictions']
+        self.assertEqual(list(predictions), ['predict_outcome'])
+        self.assertEqual(len(predictions['predict_outcome']), 2)
+
+
+suite = unittest.TestSuite([
+    loadTests(MalformedPrediction),
+    loadTests(WekaPrediction),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
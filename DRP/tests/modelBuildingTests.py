@@ -5,6 +5,7 @@ import unittest
 from DRP.models import PerformedReaction, ModelContainer, Descriptor
 from .decorators import createsPerformedReactionSetOrd, createsPerformedReactionSetBool
 from .drpTestCase import DRPTestCase, runTests
+from DRP.models.descriptorMatrix import _valueModel
 from django.conf import settings
 loadTests = unittest.TestLoader().loadTestsFromTestCase
 
@@ -14,6 +15,7 @@ class ModelTest(DRPTestCase):
 
     splitterOptions = None
     visitorOptions = None
+    workers = 0
 
     def runTest(self):
         """The actual test."""
@@ -23,9 +25,10 @@ class ModelTest(DRPTestCase):
         container = ModelContainer.create(self.modelLibrary, self.modelTool, predictors, responses, splitter=self.splitter,
                                           reactions=reactions, splitterOptions=self.splitterOptions, visitorOptions=self.visitorOptions)
 
-        container.build()
+        container.build(workers=self.workers)
         container.save()
         container.full_clean()
+        self.container = container
 
 
 # Some of these use bool and some ord
@@ -58,6 +61,29 @@ class WekaJ48KFTest(ModelTest):
     splitter = "KFoldSplitter"
 
 
+@createsPerformedReactionSetOrd
+class WekaJ48KFParallelTest(ModelTest):
+    """Tests Weka j48 with the stats models trained in worker processes."""
+
+    modelLibrary = "weka"
+    modelTool = "J48"
+    splitter = "KFoldSplitter"
+    workers = 2
+
+    def runTest(self):
+        """Build, and check each stats model predicted its test set and the container every reaction."""
+        super(WekaJ48KFParallelTest, self).runTest()
+        response = list(self.container.outcomeDescriptors)[0]
+        valueModel = _valueModel(response)
+        summative = response.createPredictionDescriptor(self.container)
+        self.assertEqual(set(valueModel.objects.filter(descriptor_id=summative.pk).values_list('reaction_id', flat=True)),
+                         set(PerformedReaction.objects.values_list('pk', flat=True)))
+        for statsModel in self.container.statsmodel_set.all():
+            component = response.createPredictionDescriptor(self.container, statsModel)
+            tested = set(pk for testSet in statsModel.testSets.all() for pk in testSet.reactions.values_list('pk', flat=True))
+            self.assertEqual(set(valueModel.objects.filter(descriptor_id=component.pk).values_list('reaction_id', flat=True)), tested)
+
+
 @createsPerformedReactionSetBool
 class WekaKNNKFTest(ModelTest):
     """Tests Weka KNN."""
@@ -76,12 +102,58 @@ class WekaNBKFTest(ModelTest):
     splitter = "KFoldSplitter"
 
 
+@unittest.skipUnless('sklearn' in settings.STATS_MODEL_LIBS, 'sklearn is not in STATS_MODEL_LIBS')
+@createsPerformedReactionSetOrd
+class SklearnDecisionTreeKFTest(ModelTest):
+    """Tests scikit-learn decision tree."""
+
+    modelLibrary = "sklearn"
+    modelTool = "DecisionTree"
+    splitter = "KFoldSplitter"
+
+
+@unittest.skipUnless('sklearn' in settings.STATS_MODEL_LIBS, 'sklearn is not in STATS_MODEL_LIBS')
+@createsPerformedReactionSetBool
+class SklearnKNNKFTest(ModelTest):
+    """Tests scikit-learn KNN."""
+
+    modelLibrary = "sklearn"
+    modelTool = "KNN"
+    splitter = "KFoldSplitter"
+
+
+@unittest.skipUnless('sklearn' in settings.STATS_MODEL_LIBS, 'sklearn is not in STATS_MODEL_LIBS')
+@createsPerformedReactionSetOrd
+class SklearnSVMBCRKFTest(ModelTest):
+    """Tests scikit-learn SVM weighted for BCR."""
+
+    modelLibrary = "sklearn"
+    modelTool = "SVM"
+    splitter = "KFoldSplitter"
+    visitorOptions = {'BCR': True}
+
+
+@unittest.skipUnless('sklearn' in settings.STATS_MODEL_LIBS, 'sklearn is not in STATS_MODEL_LIBS')
+@createsPerformedReactionSetOrd
+class SklearnRandomForestKFTest(ModelTest):
+    """Tests scikit-learn random forest."""
+
+    modelLibrary = "sklearn"
+    modelTool = "RandomForest"
+    splitter = "KFoldSplitter"
+
+
 suite = unittest.TestSuite([
     loadTests(WekaSVMKFTest),
     loadTests(WekaSVMExpTest),
     loadTests(WekaJ48KFTest),
+    loadTests(WekaJ48KFParallelTest),
     loadTests(WekaKNNKFTest),
     loadTests(WekaNBKFTest),
+    loadTests(SklearnDecisionTreeKFTest),
+    loadTests(SklearnKNNKFTest),
+    loadTests(SklearnSVMBCRKFTest),
+    loadTests(SklearnRandomForestKFTest),
 ])
 
 if __name__ == '__main__':
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""Tests for invalidating the stats models trained or tested on reactions which are saved."""
+
+import unittest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction
+from DRP.models import PerformedReaction, ModelContainer, StatsModel, DataSet
+from DRP.models.modelInvalidation import batchedInvalidation, suspendedInvalidation, flushInvalidation
+from DRP.models.modelInvalidation import discardInvalidation
+from DRP.middleware import ModelInvalidationMiddleware
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn3')
+class Invalidation(DRPTestCase):
+    """Checks models are invalidated when flushed, at the end of a batch or request, or not at all when suspended."""
+
+    def setUp(self):
+        """Train one model on rxn1 and test it on rxn2, and train another on rxn3."""
+        self.reactions = {ref: PerformedReaction.objects.get(reference=ref) for ref in ('rxn1', 'rxn2', 'rxn3')}
+        self.container = ModelContainer.objects.create(modelVisitorLibrary='weka', modelVisitorTool='J48', built=True)
+        sets = {ref: DataSet.createFromPks('invalidation_' + ref, [reaction.pk]) for ref, reaction in self.reactions.items()}
+        self.used = StatsModel.objects.create(container=self.container, trainingSet=sets['rxn1'])
+        self.used.testSets.add(sets['rxn2'])
+        self.other = StatsModel.objects.create(container=self.container, trainingSet=sets['rxn3'])
+        discardInvalidation()
+
+    def tearDown(self):
+        """Remove the models and data sets, and forget any reactions left pending."""
+        discardInvalidation()
+        self.container.delete()
+        DataSet.objects.filter(name__startswith='invalidation_').delete()
+
+    def invalid(self):
+        """Return which of the two models are invalid."""
+        return (StatsModel.objects.get(pk=self.used.pk).invalid, StatsModel.objects.get(pk=self.other.pk).invalid)
+
+    def save(self, *refs):
+        """Save the reactions with these references again."""
+        for ref in refs:
+            PerformedReaction.objects.get(pk=self.reactions[ref].pk).save()
+
+    def test_deferred(self):
+        """Outside a batch, saving a test set reaction invalidates nothing until flushed, and then its model only."""
+        self.save('rxn2', 'rxn2')
+        self.assertEqual(self.invalid(), (False, False))
+        self.assertEqual(flushInvalidation(), 1)
+        self.assertEqual(self.invalid(), (True, False))
+        self.assertEqual(flushInvalidation(), 0)
+
+    def test_request(self):
+        """The middleware flushes the reactions saved by a view, whether it returns or raises."""
+        middleware = ModelInvalidationMiddleware()
+        middleware.process_request(None)
+        self.save('rxn1')
+        response = object()
+        self.assertIs(middleware.process_response(None, response), response)
+        self.assertEqual(self.invalid(), (True, False))
+        middleware.process_request(None)
+        self.save('rxn3')
+        self.assertIsNone(middleware.process_exception(None, RuntimeError('the view failed')))
+        self.assertEqual(self.invalid(), (True, True))
+
+    def test_batched(self):
+        """Inside a batch, models are invalidated once, by a single UPDATE, as the batch ends."""
+        table = StatsModel._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            with batchedInvalidation():
+                self.save('rxn1', 'rxn2', 'rxn1')
+                self.assertEqual(self.invalid(), (False, False))
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE') and table in q['sql']]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.invalid(), (True, False))
+
+    def test_earlier(self):
+        """A batch flushes the reactions saved before it too."""
+        self.save('rxn3')
+        with batchedInvalidation():
+            self.save('rxn1')
+        self.assertEqual(self.invalid(), (True, True))
+
+    def test_nested(self):
+        """A nested batch joins the outer one."""
+        with batchedInvalidation():
+            with batchedInvalidation():
+                self.save('rxn1')
+            self.assertEqual(self.invalid(), (False, False))
+        self.assertEqual(self.invalid(), (True, False))
+
+    def test_rollback(self):
+        """Nothing is invalidated, or saved, if the batch raises, and reactions saved before it stay pending."""
+        self.save('rxn3')
+        with self.assertRaises(RuntimeError):
+            with batchedInvalidation():
+                PerformedReaction.objects.filter(pk=self.reactions['rxn1'].pk).update(notes='rolled back')
+                self.save('rxn1')
+                raise RuntimeError('abandon the batch')
+        self.assertEqual(self.invalid(), (False, False))
+        self.assertNotEqual(PerformedReaction.objects.get(pk=self.reactions['rxn1'].pk).notes, 'rolled back')
+        flushInvalidation()
+        self.assertEqual(self.invalid(), (False, True))
+
+    def test_suspended(self):
+        """Nothing is invalidated while invalidation is suspended, however deeply, and it resumes afterwards."""
+        with suspendedInvalidation():
+            with suspendedInvalidation():
+                self.save('rxn1')
+            self.save('rxn1')
+        flushInvalidation()
+        self.assertEqual(self.invalid(), (False, False))
+        self.save('rxn3')
+        flushInvalidation()
+        self.assertEqual(self.invalid(), (False, True))
+
+
+suite = unittest.TestSuite([
+    loadTests(Invalidation),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""Tests for the queue of descriptor calculations shared by the descriptor worker and calculate_descriptors."""
+
+import unittest
+from datetime import timedelta
+from django.core.management import call_command
+from django.utils import timezone
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction, createsChemicalClass, createsCompound
+from .decorators import createsCompoundRole
+from DRP.models import PerformedReaction, Reaction, Compound, CompoundRole, CompoundQuantity, CatRxnDescriptorValue
+from DRP.models import NumRxnDescriptor, NumRxnDescriptorValue, PendingRxnCalculation, PendingMolCalculation
+from DRP.models.pendingCalculation import backoff, claimObjects
+from DRP.models.pendingRxnCalculation import markReactions, quantitiesChanged, compoundsChanged
+import DRP.models.pendingRxnCalculation as pendingRxnCalculation
+import DRP.plugins.rxndescriptors.rxnhash as rxnhash
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+class Queue(DRPTestCase):
+    """Checks that queued reactions are coalesced, leased, finished and retried."""
+
+    def setUp(self):
+        """Queue both reactions for one plugin."""
+        self.reactions = [PerformedReaction.objects.get(reference=ref) for ref in ('rxn1', 'rxn2')]
+        PendingRxnCalculation.objects.all().delete()
+        markReactions([r.pk for r in self.reactions], ['queue_test'])
+
+    def tearDown(self):
+        """Empty the queue and clear any reaction claims."""
+        PendingRxnCalculation.objects.all().delete()
+        Reaction.objects.filter(pk__in=[r.pk for r in self.reactions]).update(calculating=False)
+
+    def test_coalesce(self):
+        """Marking queued reactions again refreshes their marks rather than adding rows."""
+        before = PendingRxnCalculation.objects.get(reaction=self.reactions[0]).marked
+        markReactions([r.pk for r in self.reactions] * 2, ['queue_test'])
+        self.assertEqual(PendingRxnCalculation.objects.count(), 2)
+        self.assertGreaterEqual(PendingRxnCalculation.objects.get(reaction=self.reactions[0]).marked, before)
+
+    def test_claim(self):
+        """Each row goes to one worker until its lease runs out."""
+        first = PendingRxnCalculation.objects.all().claim('first', 1, lease=60)
+        second = PendingRxnCalculation.objects.all().claim('second', 10, lease=60)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(first[0].pk, second[0].pk)
+        self.assertEqual(PendingRxnCalculation.objects.all().claim('third', 10), [])
+        PendingRxnCalculation.objects.filter(pk=first[0].pk).update(claimedUntil=timezone.now() - timedelta(seconds=1))
+        third = PendingRxnCalculation.objects.all().claim('third', 10)
+        self.assertEqual([row.pk for row in third], [first[0].pk])
+
+    def test_finish(self):
+        """A finished row is removed unless it was marked again after being claimed, when it is released."""
+        rows = PendingRxnCalculation.objects.all().claim('worker', 10)
+        remarked = rows[1]
+        PendingRxnCalculation.objects.filter(pk=remarked.pk).update(marked=remarked.claimedAt + timedelta(minutes=1))
+        PendingRxnCalculation.objects.all().finish(rows)
+        self.assertEqual(list(PendingRxnCalculation.objects.values_list('pk', flat=True)), [remarked.pk])
+        released = PendingRxnCalculation.objects.get(pk=remarked.pk)
+        self.assertEqual(released.claimedBy, '')
+        self.assertIsNone(released.claimedUntil)
+        self.assertEqual(len(PendingRxnCalculation.objects.all().claimable()), 1)
+
+    def test_fail(self):
+        """A failed row is put off for longer after each failure, up to the cap."""
+        self.assertEqual([backoff(n) for n in (1, 2, 3)], [5, 10, 20])
+        self.assertEqual(backoff(20), 3600)
+        rows = PendingRxnCalculation.objects.all().claim('worker', 10)
+        started = timezone.now()
+        PendingRxnCalculation.objects.all().fail(rows, base=60, cap=600)
+        self.assertFalse(PendingRxnCalculation.objects.all().claimable().exists())
+        for row in PendingRxnCalculation.objects.all():
+            self.assertEqual(row.attempts, 1)
+            self.assertEqual(row.claimedBy, '')
+            self.assertGreaterEqual(row.due, started + timedelta(seconds=59))
+        PendingRxnCalculation.objects.update(due=timezone.now())
+        rows = PendingRxnCalculation.objects.all().claim('worker', 10)
+        PendingRxnCalculation.objects.all().fail(rows, base=60, cap=600)
+        for row in PendingRxnCalculation.objects.all():
+            self.assertEqual(row.attempts, 2)
+            self.assertGreaterEqual(row.due, started + timedelta(seconds=119))
+
+    def test_held(self):
+        """Once another worker has taken over rows after their lease ran out, the first can no longer renew, finish or fail them."""
+        first = PendingRxnCalculation.objects.all().claim('first', 10, lease=60)
+        self.assertEqual(PendingRxnCalculation.objects.all().renew(first, lease=60), 2)
+        PendingRxnCalculation.objects.update(claimedUntil=timezone.now() - timedelta(seconds=1))
+        second = PendingRxnCalculation.objects.all().claim('second', 10, lease=60)
+        self.assertEqual(PendingRxnCalculation.objects.all().renew(first, lease=600), 0)
+        PendingRxnCalculation.objects.all().finish(first)
+        PendingRxnCalculation.objects.all().fail(first)
+        PendingRxnCalculation.objects.all().release(first)
+        self.assertEqual(PendingRxnCalculation.objects.filter(claimedBy='second', attempts=0).count(), 2)
+        self.assertEqual(PendingRxnCalculation.objects.all().renew(second, lease=600), 2)
+        PendingRxnCalculation.objects.all().finish(second)
+        self.assertFalse(PendingRxnCalculation.objects.exists())
+
+    def test_busy(self):
+        """A reaction claimed by one calculation cannot be claimed by another until released."""
+        pks = [r.pk for r in self.reactions]
+        self.assertEqual(claimObjects(Reaction, pks[:1]), pks[:1])
+        self.assertEqual(claimObjects(Reaction, pks), pks[1:])
+        self.assertEqual(claimObjects(Reaction, pks), [])
+        rows = PendingRxnCalculation.objects.all().claim('worker', 10)
+        PendingRxnCalculation.objects.all().release(rows, 60)
+        self.assertEqual(PendingRxnCalculation.objects.filter(claimedBy='').count(), 2)
+        self.assertEqual(PendingRxnCalculation.objects.filter(attempts=0).count(), 2)
+        self.assertFalse(PendingRxnCalculation.objects.all().claimable().exists())
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsChemicalClass('Org', 'Organic')
+@createsCompound('EtOH', 682, 'Org', 'Narnia', custom=True)
+class CompoundStructure(DRPTestCase):
+    """Checks that saving a compound queues it only when its structure changes."""
+
+    def setUp(self):
+        """Empty the compound queue."""
+        PendingMolCalculation.objects.all().delete()
+        self.compound = Compound.objects.get(CSID=682)
+
+    def test_unchanged(self):
+        """Changing only the name queues nothing."""
+        self.compound.name = 'ethanol'
+        self.compound.save()
+        self.assertFalse(PendingMolCalculation.objects.filter(compound=self.compound).exists())
+
+    def test_changed(self):
+        """Changing any structure field queues the compound, once for each change."""
+        for name, value in (('smiles', 'CCO'), ('INCHI', 'InChI=1S/C2H6O/c1-2-3/h3H,2H2,1H3'), ('formula', 'C_{2}H_{6}O')):
+            PendingMolCalculation.objects.all().delete()
+            setattr(self.compound, name, value)
+            self.compound.save()
+            self.assertTrue(PendingMolCalculation.objects.filter(compound=self.compound).exists(), name)
+            PendingMolCalculation.objects.all().delete()
+            self.compound.save()
+            self.assertFalse(PendingMolCalculation.objects.filter(compound=self.compound).exists(), name)
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsChemicalClass('Org', 'Organic')
+@createsCompound('EtOH', 682, 'Org', 'Narnia', custom=True)
+@createsCompound('Pyr', 8904, 'Org', 'Narnia', custom=True)
+@createsCompoundRole('Org', 'Organic')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn3')
+class Dependencies(DRPTestCase):
+    """Checks that changes mark only the reactions and plugins depending on them, and that only those are recalculated."""
+
+    plugins = {
+        rxnhash.__name__: ('quantities',),
+        'dependencies_mol': ('mol_descriptors',),
+        'dependencies_manual': ('manual',),
+    }
+
+    def setUp(self):
+        """Give rxn1 and rxn2 ethanol and rxn3 pyridine, bypassing CompoundQuantity.save, and empty the queue."""
+        self.reactions = {ref: PerformedReaction.objects.get(reference=ref) for ref in ('rxn1', 'rxn2', 'rxn3')}
+        self.etoh = Compound.objects.get(CSID=682)
+        pyr = Compound.objects.get(CSID=8904)
+        role = CompoundRole.objects.get(label='Org')
+        CompoundQuantity.objects.bulk_create([
+            CompoundQuantity(reaction=self.reactions[ref], compound=compound, role=role, amount=1)
+            for ref, compound in (('rxn1', self.etoh), ('rxn2', self.etoh), ('rxn3', pyr))])
+        self.dependencies = pendingRxnCalculation._dependencies
+        pendingRxnCalculation._dependencies = self.plugins
+        PendingRxnCalculation.objects.all().delete()
+
+    def tearDown(self):
+        """Remove the quantities, which protect the compounds, and empty the queue."""
+        pendingRxnCalculation._dependencies = self.dependencies
+        PendingRxnCalculation.objects.all().delete()
+        CompoundQuantity.objects.filter(reaction__in=self.reactions.values()).delete()
+
+    def pending(self):
+        """Return the set of queued (reference, plugin) pairs."""
+        return set(PendingRxnCalculation.objects.values_list('reaction__performedreaction__reference', 'plugin'))
+
+    def test_mark(self):
+        """Each reaction is queued once for each plugin, and nothing is queued for no plugins."""
+        markReactions([self.reactions['rxn1'].pk], [])
+        self.assertEqual(self.pending(), set())
+        markReactions([self.reactions['rxn1'].pk] * 2, ['a', 'b'])
+        self.assertEqual(self.pending(), {('rxn1', 'a'), ('rxn1', 'b')})
+
+    def test_quantities(self):
+        """A change of quantities queues the reaction for the plugins depending on quantities."""
+        quantitiesChanged([self.reactions['rxn3'].pk])
+        self.assertEqual(self.pending(), {('rxn3', rxnhash.__name__)})
+
+    def test_compounds(self):
+        """A compound's reactions are queued for the plugins using molecular descriptors, or quantities too if its structure changed."""
+        compoundsChanged([self.etoh.pk])
+        self.assertEqual(self.pending(), {('rxn1', 'dependencies_mol'), ('rxn2', 'dependencies_mol')})
+        compoundsChanged([self.etoh.pk], structure=True)
+        self.assertEqual(self.pending(), {('rxn1', 'dependencies_mol'), ('rxn2', 'dependencies_mol'),
+                                          ('rxn1', rxnhash.__name__), ('rxn2', rxnhash.__name__)})
+
+    def test_manual(self):
+        """Saving a manual value queues its reaction for the plugins using manual values; a calculated value does not."""
+        calculated = NumRxnDescriptor.objects.create(
+            heading='dependencies_calculated', name='calculated', calculatorSoftware='test_suite', calculatorSoftwareVersion='0')
+        NumRxnDescriptorValue(descriptor=calculated, reaction=self.reactions['rxn1'], value=1.0).save()
+        self.assertEqual(self.pending(), set())
+        # created after the manual descriptors were first read
+        manual = NumRxnDescriptor.objects.create(
+            heading='dependencies_manual', name='manual', calculatorSoftware='manual', calculatorSoftwareVersion='0')
+        NumRxnDescriptorValue(descriptor=manual, reaction=self.reactions['rxn2'], value=1.0).save()
+        self.assertEqual(self.pending(), {('rxn2', 'dependencies_manual')})
+
+    def test_incremental(self):
+        """calculate_descriptors --incremental calculates only the queued reactions and empties the queue."""
+        descriptor = rxnhash.descriptorDict['rxnSpaceHash1']
+        CatRxnDescriptorValue.objects.filter(descriptor=descriptor, reaction__in=self.reactions.values()).delete()
+        quantitiesChanged([self.reactions['rxn1'].pk])
+        call_command('calculate_descriptors', incremental=True, plugins=[rxnhash.__name__], whitelist=None, verbosity=0)
+        calculated = set(CatRxnDescriptorValue.objects.filter(descriptor=descriptor, reaction__in=self.reactions.values()).values_list(
+            'reaction__performedreaction__reference', flat=True))
+        self.assertEqual(calculated, {'rxn1'})
+        self.assertFalse(PendingRxnCalculation.objects.filter(plugin=rxnhash.__name__).exists())
+
+
+suite = unittest.TestSuite([
+    loadTests(Queue),
+    loadTests(CompoundStructure),
+    loadTests(Dependencies),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
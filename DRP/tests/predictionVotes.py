@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""Tests for counting the votes of a model container's stats models and turning the winners into values."""
+
+import unittest
+import numpy as np
+from .drpTestCase import DRPTestCase, runTests
+from DRP.models import ModelContainer, CatRxnDescriptor, NumRxnDescriptor, CategoricalDescriptorPermittedValue
+from DRP.models import PredCatRxnDescriptor, PredNumRxnDescriptor, CatRxnDescriptorValue, NumRxnDescriptorValue
+from DRP.models.predictionVotes import PredictionVotes
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+class Votes(DRPTestCase):
+    """Checks votes are merged by reaction and outcome and the winner is the mean or the most voted outcome."""
+
+    def test_numeric(self):
+        """A numeric response predicts the mean of the values, whichever order the reactions come in."""
+        votes = PredictionVotes(numeric=True)
+        votes.add([3, 1], [2.0, 4.0])
+        other = PredictionVotes(numeric=True)
+        other.add([1], [6.0])
+        votes.merge(other)
+        self.assertEqual(list(votes.reactionPks), [1, 3])
+        self.assertEqual(votes.winners(), [5.0, 2.0])
+
+    def test_merge(self):
+        """Votes for new reactions and outcomes, in another column order, are added to the right cells."""
+        votes = PredictionVotes()
+        votes.add([1, 2], ['x', 'y'])
+        other = PredictionVotes()
+        other.add([3, 2, 2], ['z', 'z', 'y'])
+        votes.merge(other)
+        self.assertEqual(list(votes.reactionPks), [1, 2, 3])
+        counts = {outcome: list(votes.counts[:, j]) for j, outcome in enumerate(votes.outcomes)}
+        self.assertEqual(counts, {'x': [1, 0, 0], 'y': [0, 2, 0], 'z': [0, 1, 1]})
+        self.assertEqual(votes.winners(), ['x', 'y', 'z'])
+
+    def test_ties(self):
+        """A tie is broken at random between the tied outcomes only, repeatably for a given random state."""
+        votes = PredictionVotes()
+        votes.add([1, 1, 1, 1, 1], ['x', 'y', 'w', 'x', 'y'])
+        winners = set(votes.winners(np.random.RandomState(seed))[0] for seed in range(50))
+        self.assertEqual(winners, {'x', 'y'})
+        self.assertEqual(votes.winners(np.random.RandomState(7)), votes.winners(np.random.RandomState(7)))
+
+    def test_empty(self):
+        """Without votes nothing is predicted."""
+        self.assertEqual(PredictionVotes().winners(), [])
+        self.assertEqual(PredictionVotes(numeric=True).winners(), [])
+
+
+class PredictionValues(DRPTestCase):
+    """Checks predicted outcomes become values of the predicted descriptor."""
+
+    def setUp(self):
+        """Create a categorical and a numeric response."""
+        software = {'calculatorSoftware': 'test_suite', 'calculatorSoftwareVersion': '0'}
+        self.cat = CatRxnDescriptor.objects.create(heading='votes_cat', name='categorical', **software)
+        self.permitted = {value: CategoricalDescriptorPermittedValue.objects.create(descriptor=self.cat, value=value).pk
+                          for value in ('red', 'blue')}
+        self.num = NumRxnDescriptor.objects.create(heading='votes_num', name='number', **software)
+
+    def test_categorical(self):
+        """Categorical outcomes are mapped to the permitted values of the descriptor predicted."""
+        predDesc = PredCatRxnDescriptor(predictionOf=self.cat, heading='votes_cat_prediction')
+        values = ModelContainer()._predictionValues(predDesc, np.array([5, 6], dtype=np.int64), ['blue', 'red'])
+        self.assertTrue(all(isinstance(value, CatRxnDescriptorValue) for value in values))
+        self.assertEqual([(value.reaction_id, value.value_id) for value in values],
+                         [(5, self.permitted['blue']), (6, self.permitted['red'])])
+        self.assertTrue(all(type(value.reaction_id) is int for value in values))
+
+    def test_numeric(self):
+        """Numeric outcomes are used as they are."""
+        predDesc = PredNumRxnDescriptor(predictionOf=self.num, heading='votes_num_prediction')
+        values = ModelContainer()._predictionValues(predDesc, [5], [2.5])
+        self.assertIsInstance(values[0], NumRxnDescriptorValue)
+        self.assertEqual((values[0].reaction_id, values[0].value), (5, 2.5))
+
+
+suite = unittest.TestSuite([
+    loadTests(Votes),
+    loadTests(PredictionValues),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
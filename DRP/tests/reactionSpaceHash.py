@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Tests for the stored reaction space hashes and the splitter grouping by them."""
+
+import unittest
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction, createsChemicalClass
+from .decorators import createsCompound, createsCompoundRole
+from DRP.models import PerformedReaction, Compound, CompoundRole, CompoundQuantity, CatRxnDescriptorValue, ReactionSpaceHash
+from DRP.models.reactionSpaceHash import updateSpaceHashes, fromHexDigest
+from DRP.ml_models.splitters.exploratorySplitter import Splitter
+import DRP.plugins.rxndescriptors.rxnhash as rxnhash
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsChemicalClass('Org', 'Organic')
+@createsCompound('EtOH', 682, 'Org', 'Narnia', custom=True)
+@createsCompound('Pyr', 8904, 'Org', 'Narnia', custom=True)
+@createsCompoundRole('Org', 'Organic')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn3')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn4')
+class SpaceHashes(DRPTestCase):
+    """Checks reactions imported in bulk, without hashes, are hashed and grouped as by the rxnSpaceHash1 descriptor."""
+
+    def setUp(self):
+        """Give rxn1 and rxn2 both compounds and rxn3 one, bypassing CompoundQuantity.save as import_data does."""
+        self.reactions = {ref: PerformedReaction.objects.get(reference=ref) for ref in ('rxn1', 'rxn2', 'rxn3', 'rxn4')}
+        etoh = Compound.objects.get(CSID=682)
+        pyr = Compound.objects.get(CSID=8904)
+        role = CompoundRole.objects.get(label='Org')
+        CompoundQuantity.objects.bulk_create([
+            CompoundQuantity(reaction=self.reactions[ref], compound=compound, role=role, amount=1)
+            for ref, compound in (('rxn1', etoh), ('rxn1', pyr), ('rxn2', pyr), ('rxn2', etoh), ('rxn3', etoh))])
+        ReactionSpaceHash.objects.all().delete()
+        self.queryset = PerformedReaction.objects.filter(pk__in=[r.pk for r in self.reactions.values()])
+
+    def tearDown(self):
+        """Remove the quantities, which protect the compounds."""
+        CompoundQuantity.objects.filter(reaction__in=self.queryset).delete()
+
+    def test_update(self):
+        """Stored hashes match the rxnSpaceHash1 descriptor's digests and are replaced in place when recalculated."""
+        self.assertEqual(updateSpaceHashes([r.pk for r in self.reactions.values()]), 4)
+        expected = {pk: fromHexDigest(digest) for pk, digest in rxnhash.reaction_hashes(list(self.queryset.values_list('pk', flat=True))).items()}
+        self.assertEqual(dict(ReactionSpaceHash.objects.values_list('reaction_id', 'value')), expected)
+        updateSpaceHashes()
+        self.assertEqual(dict(ReactionSpaceHash.objects.values_list('reaction_id', 'value')), expected)
+        self.assertEqual(expected[self.reactions['rxn1'].pk], expected[self.reactions['rxn2'].pk])
+        self.assertNotEqual(expected[self.reactions['rxn1'].pk], expected[self.reactions['rxn3'].pk])
+
+    def test_delete(self):
+        """Deleting a single quantity deletes it and rehashes its reaction from the compounds left."""
+        updateSpaceHashes()
+        quantity = CompoundQuantity.objects.get(reaction=self.reactions['rxn1'], compound__CSID=8904)
+        quantity.delete()
+        self.assertFalse(CompoundQuantity.objects.filter(pk=quantity.pk).exists())
+        stored = dict(ReactionSpaceHash.objects.values_list('reaction_id', 'value'))
+        self.assertEqual(stored[self.reactions['rxn1'].pk], stored[self.reactions['rxn3'].pk])
+        self.assertNotEqual(stored[self.reactions['rxn1'].pk], stored[self.reactions['rxn2'].pk])
+
+    def test_splitter_matches_descriptor(self):
+        """The splitter groups the same reactions as grouping by rxnSpaceHash1 values did, hashing the missing ones."""
+        rxnhash.calculate_many(self.queryset)
+        old = {}
+        for pk, value in self.queryset.filter(catrxndescriptorvalue__descriptor=rxnhash.descriptorDict['rxnSpaceHash1']).values_list(
+                'pk', 'catrxndescriptorvalue__value'):
+            old.setdefault(value, set()).add(pk)
+        new = Splitter('space_hash_test')._compound_sets(self.queryset)
+        self.assertEqual(sorted(sorted(pks) for pks in old.values()), sorted(sorted(pks) for pks in new.values()))
+        self.assertEqual(ReactionSpaceHash.objects.filter(reaction__in=self.queryset).count(), 4)
+
+
+suite = unittest.TestSuite([
+    loadTests(SpaceHashes),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Tests that the rxnhash plugin hashes reactions in bulk as it did one at a time."""
+
+import unittest
+import xxhash
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction, createsChemicalClass
+from .decorators import createsCompound, createsCompoundRole
+from DRP.models import PerformedReaction, Compound, CompoundRole, CompoundQuantity, CatRxnDescriptorValue
+from DRP.models import CategoricalDescriptorPermittedValue
+import DRP.plugins.rxndescriptors.rxnhash as rxnhash
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+REFERENCES = ('rxn1', 'rxn2', 'rxn3', 'rxn4', 'rxn5')
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsChemicalClass('Org', 'Organic')
+@createsCompound('EtOH', 682, 'Org', 'Narnia', custom=True)
+@createsCompound('Pyr', 8904, 'Org', 'Narnia', custom=True)
+@createsCompoundRole('Org', 'Organic')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn3')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn4')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn5')
+class BulkHashes(DRPTestCase):
+    """Checks bulk hashes match the per-reaction digest, share permitted values and take a fixed number of queries."""
+
+    def setUp(self):
+        """Give the reactions compounds, in different orders, repeated and none at all, and remove any hashes."""
+        self.reactions = {ref: PerformedReaction.objects.get(reference=ref) for ref in REFERENCES}
+        etoh = Compound.objects.get(CSID=682)
+        pyr = Compound.objects.get(CSID=8904)
+        role = CompoundRole.objects.get(label='Org')
+        CompoundQuantity.objects.bulk_create([
+            CompoundQuantity(reaction=self.reactions[ref], compound=compound, role=role, amount=1)
+            for ref, compound in (('rxn1', etoh), ('rxn1', pyr), ('rxn2', pyr), ('rxn2', etoh),
+                                  ('rxn3', etoh), ('rxn4', etoh), ('rxn4', etoh))])
+        self.queryset = PerformedReaction.objects.filter(pk__in=[r.pk for r in self.reactions.values()])
+        self.descriptor = rxnhash.descriptorDict['rxnSpaceHash1']
+        CatRxnDescriptorValue.objects.filter(descriptor=self.descriptor, reaction__in=self.queryset).delete()
+        CategoricalDescriptorPermittedValue.objects.filter(descriptor=self.descriptor).delete()
+
+    def tearDown(self):
+        """Remove the quantities, which protect the compounds."""
+        CompoundQuantity.objects.filter(reaction__in=self.queryset).delete()
+
+    def digest(self, reaction):
+        """Return the hash as the plugin calculated it one reaction at a time."""
+        h = xxhash.xxh64()
+        for reactant in reaction.compounds.order_by('pk'):
+            h.update('{0:20d}'.format(reactant.pk))
+        return h.hexdigest()
+
+    def stored(self):
+        """Return a dictionary of reference to stored hash."""
+        return dict(CatRxnDescriptorValue.objects.filter(descriptor=self.descriptor, reaction__in=self.queryset).values_list(
+            'reaction__performedreaction__reference', 'value__value'))
+
+    def test_same_hashes(self):
+        """Bulk hashes are the per-reaction digests, and reactions with the same compounds share one permitted value."""
+        rxnhash.calculate_many(self.queryset)
+        stored = self.stored()
+        self.assertEqual(stored, {ref: self.digest(reaction) for ref, reaction in self.reactions.items()})
+        self.assertEqual(stored['rxn1'], stored['rxn2'])
+        self.assertEqual(len(set(stored.values())), 4)
+        permitted = CategoricalDescriptorPermittedValue.objects.filter(descriptor=self.descriptor, value__in=stored.values())
+        self.assertEqual(permitted.count(), 4)
+        rxnhash.calculate_many(self.queryset)
+        self.assertEqual(permitted.count(), 4)
+        self.assertEqual(self.stored(), stored)
+
+    def test_single(self):
+        """A single reaction is hashed as in bulk."""
+        rxnhash.calculate(self.reactions['rxn4'])
+        self.assertEqual(self.stored(), {'rxn4': self.digest(self.reactions['rxn4'])})
+
+    def test_queries(self):
+        """The number of queries does not grow with the number of reactions."""
+        with CaptureQueriesContext(connection) as few:
+            rxnhash.calculate_many(self.queryset.filter(reference__in=('rxn1', 'rxn3')))
+        CatRxnDescriptorValue.objects.filter(descriptor=self.descriptor, reaction__in=self.queryset).delete()
+        with CaptureQueriesContext(connection) as many:
+            rxnhash.calculate_many(self.queryset)
+        self.assertEqual(len(many.captured_queries), len(few.captured_queries))
+
+
+suite = unittest.TestSuite([
+    loadTests(BulkHashes),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""Tests for the way scikit-learn model visitors prepare descriptor values for their estimators."""
+
+import unittest
+import numpy as np
+from .drpTestCase import runTests
+from DRP.ml_models.model_visitors.sklearn.abstractSklearnModelVisitor import AbstractSklearnModelVisitor
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+class Visitor(AbstractSklearnModelVisitor):
+    """A visitor without an estimator, for testing the preprocessing alone."""
+
+    def estimator(self, regression=False):
+        """Return nothing."""
+        return None
+
+
+class Preprocessing(unittest.TestCase):
+    """Checks categorical values are one-hot encoded, missing values filled and predictors rescaled."""
+
+    def setUp(self):
+        """Make a visitor and a matrix of a numeric and a categorical column with a missing value in each."""
+        self.visitor = Visitor(statsModel=None)
+        self.X = np.array([[1.0, 5.0], [np.nan, 6.0], [3.0, np.nan]])
+
+    def test_encode(self):
+        """A categorical column becomes an indicator column per permitted value, all zero where it is missing."""
+        encoded = self.visitor._encode(self.X, [10, 20], {20: [5, 6]})
+        np.testing.assert_array_equal(encoded, np.array([[1.0, 1.0, 0.0], [np.nan, 0.0, 1.0], [3.0, 0.0, 0.0]]))
+        self.assertEqual(self.visitor._encode(np.empty((2, 0)), [], {}).shape, (2, 0))
+
+    def test_transform(self):
+        """Missing values are replaced by the fill of their column and then rescaled as recorded."""
+        model = {'fill': np.array([2.0, 0.5]), 'minimum': None, 'spread': None}
+        filled = self.visitor._transform(self.X.copy(), model)
+        np.testing.assert_array_equal(filled, np.array([[1.0, 5.0], [2.0, 6.0], [3.0, 0.5]]))
+        model.update({'minimum': np.array([1.0, 0.5]), 'spread': np.array([2.0, 5.5])})
+        scaled = self.visitor._transform(self.X.copy(), model)
+        np.testing.assert_allclose(scaled, np.array([[0.0, 4.5 / 5.5], [0.5, 1.0], [1.0, 0.0]]))
+
+    def test_class_weights(self):
+        """Each instance is weighted by the number of instances over the size of its class."""
+        np.testing.assert_array_equal(self.visitor.classWeights(np.array([2.0, 2.0, 5.0, 2.0])),
+                                      np.array([4 / 3, 4 / 3, 4.0, 4 / 3]))
+
+
+suite = unittest.TestSuite([
+    loadTests(Preprocessing),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""Tests that sparse arff output holds the same data as the dense format."""
+
+import unittest
+import csv
+from io import StringIO
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction
+from DRP.models import PerformedReaction, NumRxnDescriptor, BoolRxnDescriptor
+from DRP.models import NumRxnDescriptorValue, BoolRxnDescriptorValue
+from DRP.models.querysets import sparseDefault, sparseAttribute
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+def readArff(text):
+    """Return the attribute declarations and the data rows of an arff file, filling in the values sparse rows leave out."""
+    attributes = []
+    rows = []
+    data = False
+    for line in text.splitlines():
+        if line.lower().startswith('@attribute'):
+            attributes.append(line)
+        elif line.lower().startswith('@data'):
+            data = True
+        elif data and line.startswith('{'):
+            row = [implicitValue(attribute) for attribute in attributes]
+            for entry in next(csv.reader([line[1:-1]])):
+                index, value = entry.split(' ', 1)
+                row[int(index)] = value.strip('"')
+            rows.append(row)
+        elif data and line:
+            rows.append(next(csv.reader([line])))
+    numeric = [attribute.split(None, 2)[2].lower() in ('numeric', 'real', 'integer') for attribute in attributes]
+    return attributes, [[float(v) if isNumeric and v != '?' else v for v, isNumeric in zip(row, numeric)] for row in rows]
+
+
+def implicitValue(attribute):
+    """Return the value a sparse row implies for an attribute it leaves out."""
+    kind = attribute.split(None, 2)[2]
+    if kind.startswith('{'):
+        return kind[1:-1].split(',')[0].strip().strip('"')
+    return '0'
+
+
+class SparseDefault(unittest.TestCase):
+    """Checks which values sparse rows may leave out for each kind of attribute."""
+
+    def test_numeric(self):
+        """Numeric attributes leave out zeros only."""
+        isDefault = sparseDefault('@attribute mass numeric')
+        self.assertTrue(all(isDefault(v) for v in (0, 0.0, '0', '0.0')))
+        self.assertFalse(any(isDefault(v) for v in (2.5, '-1', 'heavy')))
+        self.assertIsNotNone(sparseDefault('@attribute count INTEGER'))
+
+    def test_nominal(self):
+        """Nominal attributes leave out their first value, quoted or not."""
+        isDefault = sparseDefault(sparseAttribute('@attribute aromatic {True, False}'))
+        self.assertTrue(isDefault(False))
+        self.assertFalse(isDefault(True))
+        isDefault = sparseDefault('@attribute role {"Org","Inorg"}')
+        self.assertTrue(isDefault('Org'))
+        self.assertFalse(isDefault('Inorg'))
+
+    def test_declared(self):
+        """Only boolean declarations change in sparse files, listing False first."""
+        self.assertEqual(sparseAttribute('@attribute aromatic {True, False}'), '@attribute aromatic {False, True}')
+        self.assertEqual(sparseAttribute('@attribute role {"Org","Inorg"}'), '@attribute role {"Org","Inorg"}')
+        self.assertEqual(sparseAttribute('@attribute mass numeric'), '@attribute mass numeric')
+
+    def test_written(self):
+        """String and date attributes are always written."""
+        self.assertIsNone(sparseDefault('@attribute notes string'))
+        self.assertIsNone(sparseDefault('@attribute performed date "yyyy-MM-dd"'))
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn3')
+class SparseRows(DRPTestCase):
+    """Checks sparse rows read back as the dense rows, with defaults left out and missing values kept."""
+
+    def setUp(self):
+        """Give the reactions a zero, a non-zero and a missing number, and booleans of both values, mostly False."""
+        software = {'calculatorSoftware': 'test_suite', 'calculatorSoftwareVersion': '0'}
+        num = NumRxnDescriptor.objects.create(heading='sparse_num', name='number', **software)
+        boolean = BoolRxnDescriptor.objects.create(heading='sparse_bool', name='boolean', **software)
+        self.reactions = PerformedReaction.objects.filter(reference__in=('rxn1', 'rxn2', 'rxn3')).order_by('pk')
+        rxn1, rxn2, rxn3 = (PerformedReaction.objects.get(reference=ref) for ref in ('rxn1', 'rxn2', 'rxn3'))
+        NumRxnDescriptorValue.objects.bulk_create([
+            NumRxnDescriptorValue(descriptor=num, reaction=rxn1, value=0.0),
+            NumRxnDescriptorValue(descriptor=num, reaction=rxn2, value=2.5)])
+        BoolRxnDescriptorValue.objects.bulk_create([
+            BoolRxnDescriptorValue(descriptor=boolean, reaction=rxn1, value=False),
+            BoolRxnDescriptorValue(descriptor=boolean, reaction=rxn2, value=True),
+            BoolRxnDescriptorValue(descriptor=boolean, reaction=rxn3, value=False)])
+        self.numHeader = num.csvHeader
+        self.boolHeader = boolean.csvHeader
+
+    def arff(self, sparse, whitelistHeaders=None):
+        """Return the expanded arff text for the reactions."""
+        f = StringIO()
+        self.reactions.toArff(f, expanded=True, whitelistHeaders=whitelistHeaders, sparse=sparse)
+        return f.getvalue()
+
+    def test_same_data(self):
+        """Both formats declare the same attributes, booleans in another order, and read back as the same rows."""
+        denseAttributes, dense = readArff(self.arff(False))
+        sparseAttributes, sparse = readArff(self.arff(True))
+        self.assertEqual(sparseAttributes, [sparseAttribute(attribute) for attribute in denseAttributes])
+        self.assertIn('@attribute {} {{True, False}}'.format(self.boolHeader), denseAttributes)
+        self.assertEqual(len(dense), 3)
+        self.assertEqual(sparse, dense)
+        names = [attribute.split()[1] for attribute in denseAttributes]
+        num = names.index(self.numHeader)
+        boolean = names.index(self.boolHeader)
+        self.assertEqual([row[num] for row in dense], [0.0, 2.5, '?'])
+        self.assertEqual([row[boolean] for row in dense], ['False', 'True', 'False'])
+
+    def test_left_out(self):
+        """Zeros and first nominal values are left out of sparse rows, and missing values are written."""
+        attributes, _ = readArff(self.arff(False))
+        names = [attribute.split()[1] for attribute in attributes]
+        num = str(names.index(self.numHeader))
+        boolean = str(names.index(self.boolHeader))
+        lines = self.arff(True).split('@data\n', 1)[1].splitlines()
+        written = [{entry.split(' ', 1)[0]: entry.split(' ', 1)[1] for entry in next(csv.reader([line[1:-1]]))}
+                   for line in lines]
+        self.assertEqual([row.get(num) for row in written], [None, '"2.5"', '?'])
+        self.assertEqual([row.get(boolean) for row in written], [None, '"True"', None])
+
+    def test_size(self):
+        """Leaving out zeros and False makes the data of mostly default values smaller than in dense rows."""
+        # boolean descriptors come before numeric ones
+        whitelist = [self.numHeader, self.boolHeader]
+        dense = self.arff(False, whitelist).split('@data\n', 1)[1]
+        sparse = self.arff(True, whitelist).split('@data\n', 1)[1]
+        self.assertEqual(dense, '"False","0.0"\n"True","2.5"\n"False",?\n')
+        self.assertEqual(sparse, '{}\n{0 "True",1 "2.5"}\n{1 ?}\n')
+        self.assertLess(len(sparse), len(dense))
+
+
+suite = unittest.TestSuite([
+    loadTests(SparseDefault),
+    loadTests(SparseRows),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
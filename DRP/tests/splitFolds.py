@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""Tests that the splitters partition the reactions they are given into training and test sets."""
+
+import unittest
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction, createsChemicalClass
+from .decorators import createsCompound, createsCompoundRole
+from DRP.models import PerformedReaction, Compound, CompoundRole, CompoundQuantity, DataSet
+from DRP.ml_models.splitters import kFoldSplitter, randomSplitter, exploratorySplitter
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+REFERENCES = ('rxn1', 'rxn2', 'rxn3', 'rxn4', 'rxn5', 'rxn6')
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsChemicalClass('Org', 'Organic')
+@createsCompound('EtOH', 682, 'Org', 'Narnia', custom=True)
+@createsCompound('Pyr', 8904, 'Org', 'Narnia', custom=True)
+@createsCompoundRole('Org', 'Organic')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn3')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn4')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn5')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn6')
+class Partitions(DRPTestCase):
+    """Checks every split puts each reaction in exactly one of its training and test sets."""
+
+    def setUp(self):
+        """Give the reactions three distinct combinations of compounds, two reactions each, bypassing CompoundQuantity.save."""
+        reactions = {ref: PerformedReaction.objects.get(reference=ref) for ref in REFERENCES}
+        etoh = Compound.objects.get(CSID=682)
+        pyr = Compound.objects.get(CSID=8904)
+        role = CompoundRole.objects.get(label='Org')
+        CompoundQuantity.objects.bulk_create([
+            CompoundQuantity(reaction=reactions[ref], compound=compound, role=role, amount=1)
+            for ref, compound in (('rxn1', etoh), ('rxn2', etoh), ('rxn3', pyr), ('rxn4', pyr),
+                                  ('rxn5', etoh), ('rxn5', pyr), ('rxn6', etoh), ('rxn6', pyr))])
+        self.pks = {ref: reaction.pk for ref, reaction in reactions.items()}
+        self.queryset = PerformedReaction.objects.filter(pk__in=self.pks.values())
+
+    def tearDown(self):
+        """Remove the data sets and the quantities, which protect the reactions and compounds."""
+        DataSet.objects.filter(name__startswith='split_').delete()
+        CompoundQuantity.objects.filter(reaction__in=self.queryset).delete()
+
+    def assertPartition(self, train, test):
+        """Check a training and test set are disjoint and hold all the reactions between them, and return the test pks."""
+        train = set(train.reactions.values_list('pk', flat=True))
+        test = set(test.reactions.values_list('pk', flat=True))
+        self.assertFalse(train & test)
+        self.assertEqual(train | test, set(self.pks.values()))
+        return test
+
+    def test_k_fold(self):
+        """The test sets of the folds are the same size and together hold every reaction once."""
+        splits = kFoldSplitter.Splitter('split_kfold', num_folds=3).split(self.queryset)
+        self.assertEqual(len(splits), 3)
+        tests = [self.assertPartition(train, test) for train, test in splits]
+        self.assertEqual([len(test) for test in tests], [2, 2, 2])
+        self.assertEqual(set.union(*tests), set(self.pks.values()))
+
+    def test_random(self):
+        """Each random split has the requested share of the reactions in its test set."""
+        splits = randomSplitter.Splitter('split_random', test_percent=0.5, num_splits=2).split(self.queryset)
+        self.assertEqual(len(splits), 2)
+        for train, test in splits:
+            self.assertEqual(len(self.assertPartition(train, test)), 3)
+
+    def test_exploratory(self):
+        """Reactions with the same compounds are never split between training and test sets."""
+        splits = exploratorySplitter.Splitter('split_exploratory', num_splits=3).split(self.queryset)
+        groups = [{self.pks['rxn1'], self.pks['rxn2']}, {self.pks['rxn3'], self.pks['rxn4']},
+                  {self.pks['rxn5'], self.pks['rxn6']}]
+        for train, test in splits:
+            self.assertIn(self.assertPartition(train, test), groups)
+
+
+suite = unittest.TestSuite([
+    loadTests(Partitions),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
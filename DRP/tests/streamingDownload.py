@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""Tests for streaming downloads, gzipped when the client accepts it."""
+
+import unittest
+import gzip
+from django.test import RequestFactory
+from .drpTestCase import runTests
+from DRP.views.helpers import streamingDownload, _chunked
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+class StreamingDownload(unittest.TestCase):
+    """Checks the streamed body holds the generated lines, compressed or not, and is only generated when read."""
+
+    def setUp(self):
+        """Make a thousand lines of output and count how many are generated."""
+        self.lines = ['{},"row {}"\n'.format(i, i) for i in range(1000)]
+        self.generated = 0
+
+    def generate(self):
+        """Yield the lines, counting them."""
+        for line in self.lines:
+            self.generated += 1
+            yield line
+
+    def get(self, **headers):
+        """Return the response to a request with these headers."""
+        request = RequestFactory().get('/reactions.csv', **headers)
+        return streamingDownload(request, self.generate(), 'text/csv', 'reactions.csv')
+
+    def test_plain(self):
+        """Without gzip in Accept-Encoding the lines are sent as they are."""
+        response = self.get()
+        self.assertEqual(self.generated, 0)
+        self.assertEqual(b''.join(response.streaming_content).decode('utf-8'), ''.join(self.lines))
+        self.assertEqual(self.generated, len(self.lines))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="reactions.csv"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_gzip(self):
+        """Clients accepting gzip are sent the lines compressed."""
+        response = self.get(HTTP_ACCEPT_ENCODING='deflate, gzip')
+        self.assertEqual(self.generated, 0)
+        body = b''.join(response.streaming_content)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body).decode('utf-8'), ''.join(self.lines))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_chunked(self):
+        """Lines are joined into pieces of at least the given size, except the last."""
+        pieces = list(_chunked(self.generate(), size=1000))
+        self.assertEqual(b''.join(pieces).decode('utf-8'), ''.join(self.lines))
+        self.assertTrue(all(len(piece) >= 1000 for piece in pieces[:-1]))
+        self.assertTrue(all(len(piece) < 1000 + max(len(line) for line in self.lines) for piece in pieces))
+
+
+suite = unittest.TestSuite([
+    loadTests(StreamingDownload),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
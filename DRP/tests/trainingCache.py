@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""Tests that results cached under descriptor value versions are missed once the values change."""
+
+import unittest
+import json
+import os
+import tempfile
+from django.core.cache import cache
+from django.test.utils import override_settings
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction
+from DRP.models import PerformedReaction, NumRxnDescriptor, NumRxnDescriptorValue, BoolRxnDescriptor
+from DRP.models.rxnDescriptorValues import upsertValues, valuesVersions
+from DRP.models.trainingCache import TrainingCache
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+class Container(object):
+    """The parts of a model container which a training cache key is built from."""
+
+    def __init__(self, descriptors, outcomeDescriptors):
+        """Use sklearn SVM with no options for the given descriptors."""
+        self.descriptors = descriptors
+        self.outcomeDescriptors = outcomeDescriptors
+        self.modelVisitorLibrary = 'sklearn'
+        self.modelVisitorTool = 'SVM_PUK'
+        self.modelVisitorOptions = json.dumps({})
+
+
+class StatsModel(object):
+    """The parts of a stats model which a training cache key is built from."""
+
+    def __init__(self, trainingSet):
+        """Train on the given set."""
+        self.trainingSet = trainingSet
+
+
+class TrainingSet(object):
+    """A training set identified only by its content hash."""
+
+    contentHash = 'training_cache_test'
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+class VersionedCacheKeys(DRPTestCase):
+    """Checks that a cached model is not reused once a predictor or response value changes."""
+
+    def setUp(self):
+        """Create a predictor and response with values and keep a model trained with them."""
+        # values are settled at once, so that unchanged values give the same key
+        self.override = override_settings(DESCRIPTOR_VALUES_SETTLE_SECONDS=0)
+        self.override.enable()
+        self.predictor = NumRxnDescriptor.objects.create(
+            heading='cache_predictor', name='cache predictor', calculatorSoftware='test_suite', calculatorSoftwareVersion='0')
+        self.response = BoolRxnDescriptor.objects.create(
+            heading='cache_response', name='cache response', calculatorSoftware='test_suite', calculatorSoftwareVersion='0')
+        self.reactions = list(PerformedReaction.objects.filter(reference__in=('rxn1', 'rxn2')).order_by('pk'))
+        for i, reaction in enumerate(self.reactions):
+            NumRxnDescriptorValue(descriptor=self.predictor, reaction=reaction, value=float(i)).save()
+        self.container = Container([self.predictor], [self.response])
+        self.statsModel = StatsModel(TrainingSet())
+        handle, self.modelFile = tempfile.mkstemp()
+        os.close(handle)
+        self.cached = TrainingCache(self.container, self.statsModel)
+        self.cached.saveModel(self.modelFile)
+
+    def tearDown(self):
+        """Remove the model files."""
+        os.remove(self.modelFile)
+        if os.path.isfile(self.cached.modelPath):
+            os.remove(self.cached.modelPath)
+        self.override.disable()
+
+    def hit(self):
+        """Whether a training cache built now finds the model."""
+        return TrainingCache(self.container, self.statsModel).hasModel()
+
+    def test_unchanged(self):
+        """The model is found while the values are unchanged, even if the django cache is emptied."""
+        cache.clear()
+        self.assertTrue(self.hit())
+
+    def test_save(self):
+        """Saving a value misses."""
+        NumRxnDescriptorValue.objects.get(descriptor=self.predictor, reaction=self.reactions[0]).save()
+        self.assertFalse(self.hit())
+
+    def test_update(self):
+        """Updating values through a queryset misses."""
+        NumRxnDescriptorValue.objects.filter(descriptor=self.predictor).update(value=3.0)
+        self.assertFalse(self.hit())
+
+    def test_upsert(self):
+        """Writing a response value in bulk misses."""
+        upsertValues([self.response.createValue(self.reactions[0], True)])
+        self.assertFalse(self.hit())
+
+    def test_delete(self):
+        """Deleting a value misses."""
+        NumRxnDescriptorValue.objects.filter(descriptor=self.predictor, reaction=self.reactions[1]).delete()
+        self.assertFalse(self.hit())
+
+    def test_unsettled(self):
+        """Values which may still be committing are never hit."""
+        with override_settings(DESCRIPTOR_VALUES_SETTLE_SECONDS=600):
+            self.assertFalse(self.hit())
+
+    def test_tokens(self):
+        """Only the changed descriptor's token changes."""
+        before = valuesVersions([self.predictor.pk, self.response.pk])
+        NumRxnDescriptorValue.objects.filter(descriptor=self.predictor).update(value=3.0)
+        after = valuesVersions([self.predictor.pk, self.response.pk])
+        self.assertNotEqual(before[self.predictor.pk], after[self.predictor.pk])
+        self.assertEqual(before[self.response.pk], after[self.response.pk])
+
+
+suite = unittest.TestSuite([
+    loadTests(VersionedCacheKeys),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
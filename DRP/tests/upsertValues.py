@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""Tests for writing reaction descriptor values and queue marks in bulk."""
+
+import unittest
+from .drpTestCase import DRPTestCase, runTests
+from .decorators import createsUser, joinsLabGroup, createsPerformedReaction
+from DRP.models import PerformedReaction, NumRxnDescriptor, BoolRxnDescriptor, OrdRxnDescriptor, CatRxnDescriptor
+from DRP.models import NumRxnDescriptorValue, BoolRxnDescriptorValue, OrdRxnDescriptorValue, CatRxnDescriptorValue
+from DRP.models import CategoricalDescriptorPermittedValue, PendingRxnCalculation
+from DRP.models.rxnDescriptorValues import upsertValues
+from DRP.models.pendingCalculation import upsertMarks
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+class Upsert(DRPTestCase):
+    """Checks that values are inserted, replace existing values in place, and may be of any type at once."""
+
+    def setUp(self):
+        """Create a descriptor of each type."""
+        software = {'calculatorSoftware': 'test_suite', 'calculatorSoftwareVersion': '0'}
+        self.num = NumRxnDescriptor.objects.create(heading='upsert_num', name='number', **software)
+        self.bool = BoolRxnDescriptor.objects.create(heading='upsert_bool', name='boolean', **software)
+        self.ord = OrdRxnDescriptor.objects.create(heading='upsert_ord', name='ordinal', maximum=4, minimum=1, **software)
+        self.cat = CatRxnDescriptor.objects.create(heading='upsert_cat', name='categorical', **software)
+        self.red = CategoricalDescriptorPermittedValue.objects.create(descriptor=self.cat, value='red')
+        self.blue = CategoricalDescriptorPermittedValue.objects.create(descriptor=self.cat, value='blue')
+        self.reactions = [PerformedReaction.objects.get(reference=ref) for ref in ('rxn1', 'rxn2')]
+
+    def test_insert(self):
+        """New values are all written."""
+        written = upsertValues([NumRxnDescriptorValue(descriptor=self.num, reaction=reaction, value=float(i))
+                                for i, reaction in enumerate(self.reactions)])
+        self.assertEqual(written, 2)
+        self.assertEqual(dict(NumRxnDescriptorValue.objects.filter(descriptor=self.num).values_list('reaction_id', 'value')),
+                         {self.reactions[0].pk: 0.0, self.reactions[1].pk: 1.0})
+
+    def test_update(self):
+        """A value for an existing reaction and descriptor replaces it, keeping its uid, and the last of duplicates wins."""
+        existing = NumRxnDescriptorValue(descriptor=self.num, reaction=self.reactions[0], value=1.0)
+        existing.save()
+        upsertValues([NumRxnDescriptorValue(descriptor=self.num, reaction=self.reactions[0], value=2.0),
+                      NumRxnDescriptorValue(descriptor=self.num, reaction=self.reactions[0], value=3.0)])
+        values = NumRxnDescriptorValue.objects.filter(descriptor=self.num)
+        self.assertEqual(list(values.values_list('uid', 'value')), [(existing.uid, 3.0)])
+
+    def test_mixed(self):
+        """Values of all four types are written in one call."""
+        BoolRxnDescriptorValue(descriptor=self.bool, reaction=self.reactions[1], value=True).save()
+        written = upsertValues([
+            NumRxnDescriptorValue(descriptor=self.num, reaction=self.reactions[0], value=1.5),
+            BoolRxnDescriptorValue(descriptor=self.bool, reaction=self.reactions[1], value=False),
+            OrdRxnDescriptorValue(descriptor=self.ord, reaction=self.reactions[0], value=3),
+            CatRxnDescriptorValue(descriptor=self.cat, reaction=self.reactions[0], value=self.red),
+            CatRxnDescriptorValue(descriptor=self.cat, reaction=self.reactions[1], value=self.blue),
+        ])
+        self.assertEqual(written, 5)
+        self.assertEqual(NumRxnDescriptorValue.objects.get(descriptor=self.num).value, 1.5)
+        self.assertEqual(BoolRxnDescriptorValue.objects.get(descriptor=self.bool).value, False)
+        self.assertEqual(OrdRxnDescriptorValue.objects.get(descriptor=self.ord).value, 3)
+        self.assertEqual(dict(CatRxnDescriptorValue.objects.filter(descriptor=self.cat).values_list('reaction_id', 'value_id')),
+                         {self.reactions[0].pk: self.red.pk, self.reactions[1].pk: self.blue.pk})
+
+
+@createsUser('Aslan', 'old_magic')
+@joinsLabGroup('Aslan', 'Narnia')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn1')
+@createsPerformedReaction('Narnia', 'Aslan', 'rxn2')
+class Marks(DRPTestCase):
+    """Checks that queue marks are inserted once and existing ones only have their time refreshed."""
+
+    def setUp(self):
+        """Empty the queue."""
+        self.reactions = [PerformedReaction.objects.get(reference=ref) for ref in ('rxn1', 'rxn2')]
+        PendingRxnCalculation.objects.all().delete()
+
+    def tearDown(self):
+        """Empty the queue."""
+        PendingRxnCalculation.objects.all().delete()
+
+    def test_upsert(self):
+        """Marking a claimed, failed row keeps its claim and attempts, and new rows start unclaimed."""
+        upsertMarks(PendingRxnCalculation, ('reaction', 'plugin'), [(self.reactions[0].pk, 'marks')])
+        row = PendingRxnCalculation.objects.get()
+        PendingRxnCalculation.objects.filter(pk=row.pk).update(attempts=2, claimedBy='worker')
+        upsertMarks(PendingRxnCalculation, ('reaction', 'plugin'),
+                    [(self.reactions[0].pk, 'marks'), (self.reactions[1].pk, 'marks'), (self.reactions[1].pk, 'marks')])
+        rows = {r.reaction_id: r for r in PendingRxnCalculation.objects.all()}
+        self.assertEqual(set(rows), {r.pk for r in self.reactions})
+        self.assertEqual((rows[self.reactions[0].pk].attempts, rows[self.reactions[0].pk].claimedBy), (2, 'worker'))
+        self.assertGreaterEqual(rows[self.reactions[0].pk].marked, row.marked)
+        self.assertEqual((rows[self.reactions[1].pk].attempts, rows[self.reactions[1].pk].claimedBy), (0, ''))
+
+
+suite = unittest.TestSuite([
+    loadTests(Upsert),
+    loadTests(Marks),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
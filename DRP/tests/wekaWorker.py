@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Tests for the long lived Weka process used by the Weka model visitors."""
+
+import unittest
+import os
+import shutil
+import tempfile
+from django.test.utils import override_settings
+from .drpTestCase import DRPTestCase, runTests
+from DRP.ml_models.model_visitors.weka.worker import WekaWorker
+loadTests = unittest.TestLoader().loadTestsFromTestCase
+
+ARFF = """@relation worker_test
+@attribute x numeric
+@attribute y {{no,yes}}
+@data
+10,{0}
+20,{0}
+80,{1}
+90,{1}
+"""
+
+
+class ModelCache(DRPTestCase):
+    """Checks that models evicted from the worker's bounded cache are read again and predict as before."""
+
+    def setUp(self):
+        """Start a worker keeping one model and train two trees with opposite labels."""
+        self.override = override_settings(WEKA_WORKER_MODEL_CACHE_SIZE=1)
+        self.override.enable()
+        self.directory = tempfile.mkdtemp()
+        self.worker = WekaWorker('3.6')
+        self.models = {}
+        for name, labels in (('rising', ('no', 'yes')), ('falling', ('yes', 'no'))):
+            arff = os.path.join(self.directory, name + '.arff')
+            with open(arff, 'w') as f:
+                f.write(ARFF.format(*labels))
+            model = os.path.join(self.directory, name + '.model')
+            self.worker.run(['weka.classifiers.trees.J48', '-M', '1', '-t', arff, '-d', model])
+            self.models[name] = (model, arff)
+
+    def tearDown(self):
+        """Stop the worker and remove the files."""
+        self.worker.close()
+        shutil.rmtree(self.directory)
+        self.override.disable()
+
+    def predict(self, name):
+        """Return the labels predicted by a model for its own training data."""
+        model, arff = self.models[name]
+        output = os.path.join(self.directory, 'predictions.txt')
+        self.worker.predict(model, arff, 2, output)
+        with open(output) as f:
+            rows = [line.split() for line in f if line.strip()[:1].isdigit()]
+        return [row[2].split(':')[1] for row in rows]
+
+    def test_eviction(self):
+        """Alternating between more models than are kept gives the same predictions each time."""
+        for _ in range(2):
+            self.assertEqual(self.predict('rising'), ['no', 'no', 'yes', 'yes'])
+            self.assertEqual(self.predict('falling'), ['yes', 'yes', 'no', 'no'])
+
+
+suite = unittest.TestSuite([
+    loadTests(ModelCache),
+])
+
+if __name__ == '__main__':
+    runTests(suite)
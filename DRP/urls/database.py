@@ -51,6 +51,7 @@ urls = [
     url('^/lab_notes/(?P<labgroup_id>\d+)_(?P<reference>[^//]*).jpg',
         DRP.views.reaction.labBookImage, name="labBookImage"),
     url('^/import/apiv1/(?P<component>[^//]*).xml', DRP.views.api1),
+    url('^/predict/container_(?P<container_id>\d+).json$', DRP.views.predictReactions, name='predictReactions'),
     url('^/select_viewing_group.html', DRP.views.selectGroup, name='selectGroup'),
     url('^/compoundguide(?P<filetype>.csv|.html|.arff|/)$',
         DRP.views.compound.ListCompound.as_view(), name='compoundguide'),
@@ -10,4 +10,4 @@ from . import compound
 from . import decorators
 from .import reaction
 from .leaveGroupView import leaveGroup
-from .api import api1
+from .api import api1, predictReactions
@@ -1,14 +1,20 @@
 """Views which correspond to the data extraction api."""
 
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden, HttpResponse, Http404
+from django.http import HttpResponseForbidden, HttpResponse, Http404, JsonResponse
+from django.views.decorators.http import require_POST
+from django.shortcuts import get_object_or_404
 from django.core.exceptions import PermissionDenied
 from django.core import serializers
 from django.contrib.auth.models import User
 from DRP.models import License, LicenseAgreement
 from DRP.models import Compound, CompoundRole, CompoundQuantity
 from DRP.models import ChemicalClass, Reaction
-from DRP.models import LabGroup, PerformedReaction
+from DRP.models import LabGroup, PerformedReaction, ModelContainer
+from DRP.ml_models.predictionService import predictUnsaved
+from .decorators import userHasLabGroup, hasSignedLicense
+from time import time
+import json
 
 
 @login_required
@@ -72,3 +78,39 @@ def api1(request, component):
                                                 raise Http404
     else:
         raise PermissionDenied
+
+
+@require_POST
+@login_required
+@hasSignedLicense
+@userHasLabGroup
+def predictReactions(request, container_id):
+    """
+    Predict the outcomes of reactions which have not been performed with a built model container.
+
+    The request body is a JSON object with a "reactions" list, each reaction being an object with a
+    "compounds" list of {"compound": pk, "role": pk, "amount": amount} objects and an optional
+    "descriptors" object of manual descriptor heading to value, and optionally a "latencyTarget" in
+    milliseconds. Compounds must be in one of the user's lab groups.
+    """
+    container = get_object_or_404(ModelContainer, pk=container_id, built=True)
+    try:
+        body = json.loads(request.body.decode('UTF-8'))
+        reactions = [{'compounds': [(int(q['compound']), int(q['role']), float(q['amount'])) for q in reaction['compounds']],
+                      'descriptors': dict(reaction.get('descriptors', {}))}
+                     for reaction in body['reactions']]
+        latencyTarget = body.get('latencyTarget')
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return JsonResponse({'error': 'Malformed request: {}'.format(e)}, status=400)
+    compoundPks = {compound for reaction in reactions for compound, role, amount in reaction['compounds']}
+    visible = Compound.objects.filter(pk__in=compoundPks, labGroups__in=request.user.labgroup_set.all()).distinct()
+    if visible.count() != len(compoundPks):
+        raise PermissionDenied
+    start = time()
+    try:
+        predictions = predictUnsaved(container, reactions, latencyTarget=latencyTarget)
+    except NotImplementedError as e:
+        # the request was fine; this server cannot predict with the container's kind of model
+        return JsonResponse({'error': str(e)}, status=501)
+    return JsonResponse({'predictions': {response.heading: outcomes for response, outcomes in predictions.items()},
+                         'milliseconds': (time() - start) * 1000})
@@ -6,6 +6,7 @@ from DRP.models import Compound
 from DRP.forms import CompoundForm, LabGroupSelectionForm, CompoundEditForm, CompoundDeleteForm
 from django.utils.decorators import method_decorator
 from .decorators import userHasLabGroup, hasSignedLicense, labGroupSelected
+from .helpers import streamingDownload
 from django.contrib.auth.decorators import login_required
 from django.core.urlresolvers import reverse_lazy as reverse
 from django.shortcuts import render, redirect
@@ -117,20 +118,19 @@ class ListCompound(ListView):
         if fileType in ('/', '.html', None):
             return super(ListCompound, self).dispatch(request, *args, **kwargs)
         elif fileType == '.csv':
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = 'attachment; filename="compounds.csv"'
+            compounds = Compound.objects.filter(compoundguideentry__labGroup=self.labGroup)
             if 'expanded' in request.GET:
-                self.queryset.toCsv(response, True)
+                lines = compounds.csvLines(True)
             else:
-                self.queryset.toCsv(response)
+                lines = compounds.csvLines()
+            response = streamingDownload(request, lines, 'text/csv', 'compounds.csv')
         elif fileType == '.arff':
-            response = HttpResponse(content_type='text/vnd.weka.arff')
-            response[
-                'Content-Disposition'] = 'attachment; filename="compounds.arff"'
+            compounds = Compound.objects.filter(compoundguideentry__labGroup=self.labGroup)
             if 'expanded' in request.GET:
-                self.queryset.toArff(response, True)
+                lines = compounds.arffLines(True)
             else:
-                self.queryset.toArff(response)
+                lines = compounds.arffLines()
+            response = streamingDownload(request, lines, 'text/vnd.weka.arff', 'compounds.arff')
         else:
             raise RuntimeError(
                 'The user should not be able to provoke this code')
@@ -1,7 +1,16 @@
 """A module of small useful functions for helpers."""
+import re
 from django.shortcuts import redirect as django_redir
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
 import urllib
 
+# approximate number of characters sent in each piece of a streamed download
+STREAM_CHUNK_SIZE = 64 * 1024
+
+acceptsGzip = re.compile(r'\bgzip\b')
+
 
 def redirect(url, *args, **kwargs):
     """Substitute for django's inbuilt redirect, but add get perameters to the uri."""
@@ -10,3 +19,37 @@ def redirect(url, *args, **kwargs):
     if len(params) > 0:
         response['Location'] += '?' + urllib.parse.urlencode(params)
     return response
+
+
+def _chunked(lines, size=STREAM_CHUNK_SIZE):
+    """Join generated strings into utf-8 encoded pieces of roughly size characters."""
+    buffered = []
+    length = 0
+    for line in lines:
+        buffered.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(buffered).encode('utf-8')
+            buffered = []
+            length = 0
+    if buffered:
+        yield ''.join(buffered).encode('utf-8')
+
+
+def streamingDownload(request, lines, contentType, filename):
+    """
+    Return a response streaming the generated lines as an attachment.
+
+    The body is gzip encoded when the client accepts it. Nothing is generated until the
+    response is iterated, so the first bytes go out as soon as the first rows are produced.
+    """
+    content = _chunked(lines)
+    gzipped = acceptsGzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')) is not None
+    if gzipped:
+        content = compress_sequence(content)
+    response = StreamingHttpResponse(content, content_type=contentType)
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
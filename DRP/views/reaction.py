@@ -3,6 +3,7 @@ from django.conf import settings
 from django.views.generic import CreateView, ListView, UpdateView
 from DRP.models import PerformedReaction, OrdRxnDescriptorValue, CompoundQuantity
 from DRP.models import NumRxnDescriptorValue, BoolRxnDescriptorValue, CatRxnDescriptorValue
+from DRP.models.modelInvalidation import batchedInvalidation
 from DRP.forms import PerformedRxnForm, PerformedRxnDeleteForm
 from DRP.forms import NumRxnDescValFormFactory, OrdRxnDescValFormFactory, BoolRxnDescValFormFactory, CatRxnDescValFormFactory
 from DRP.forms import PerformedRxnInvalidateForm, PerformedRxnDeleteForm
@@ -13,7 +14,7 @@ from django.forms.models import modelformset_factory
 from DRP.forms import compoundQuantityFormFactory
 from django.forms.formsets import TOTAL_FORM_COUNT
 from django.shortcuts import render
-from .helpers import redirect
+from .helpers import redirect, streamingDownload
 from django.http import HttpResponse, Http404, HttpResponseForbidden
 from django.views.decorators.http import require_POST
 from django.core.exceptions import PermissionDenied
@@ -64,22 +65,19 @@ class ListPerformedReactions(ListView):
                 request, *args, **kwargs)
         elif filetype == '.csv':
             self.paginate_by = None
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = 'attachment; filename="reactions.csv"'
             if 'expanded' in request.GET and request.user.is_authenticated() and request.user.is_staff:
                 headers = self.load_from_dsc(settings.RECOMMENDED_WHITE_LIST)
-                self.queryset.toCsv(response, expanded=True, whitelistHeaders=headers)
+                lines = self.queryset.csvLines(expanded=True, whitelistHeaders=headers)
             else:
-                self.queryset.toCsv(response)
+                lines = self.queryset.csvLines()
+            response = streamingDownload(request, lines, 'text/csv', 'reactions.csv')
         elif filetype == '.arff':
             self.paginate_by = None
-            response = HttpResponse(content_type='text/vnd.weka.arff')
-            response[
-                'Content-Disposition'] = 'attachment; filename="reactions.arff"'
             if 'expanded' in request.GET and request.user.is_authenticated() and request.user.is_staff:
-                self.queryset.toArff(response, True)
+                lines = self.queryset.arffLines(True)
             else:
-                self.queryset.toArff(response)
+                lines = self.queryset.arffLines()
+            response = streamingDownload(request, lines, 'text/vnd.weka.arff', 'reactions.arff')
         return response
 
     def get_context_data(self, **kwargs):
@@ -131,10 +129,12 @@ def addCompoundDetails(request, rxn_id):
         formset = CompoundQuantityFormset(
             queryset=compoundQuantities, data=request.POST, prefix='quantities')
         if formset.is_valid():
-            formset.save()
-            # copes with a bug in deletion from django
-            CompoundQuantity.objects.filter(
-                id__in=[cq.id for cq in formset.deleted_objects]).delete()
+            # every quantity saved re-saves the reaction; invalidate its models once
+            with batchedInvalidation():
+                formset.save()
+                # copes with a bug in deletion from django
+                CompoundQuantity.objects.filter(
+                    id__in=[cq.id for cq in formset.deleted_objects]).delete()
             messages.success(request, 'Compound details successfully updated')
             if 'creating' in request.GET:
                 return redirect('createNumDescVals', rxn_id, params={'creating': True})